@@ -84,9 +84,10 @@ def api_incremental_sync():
 
 @admin_bp.route('/api/integrity/check', methods=['POST'])
 def api_check_integrity():
-    """API: 检查数据完整性"""
+    """API: 检查数据完整性（incremental=true 时只检查有变更的股票）"""
     try:
-        result = DataSyncService.check_data_integrity()
+        data = request.get_json(silent=True) or {}
+        result = DataSyncService.check_data_integrity(incremental=bool(data.get('incremental', False)))
         
         return jsonify({
             'success': True,
@@ -17,4 +17,5 @@ from . import sector_routes
 from . import analytics_routes
 from . import non_trading_day_routes
 from . import historical_trade_routes
-from . import trade_review_routes
\ No newline at end of file
+from . import trade_review_routes
+from . import search_routes
\ No newline at end of file
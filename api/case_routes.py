@@ -24,6 +24,8 @@ def get_cases():
         end_date = request.args.get('end_date')
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         # 处理日期参数
         if start_date:
@@ -39,11 +41,15 @@ def get_cases():
             start_date=start_date,
             end_date=end_date,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return create_success_response(result)
         
+    except ValidationError as e:
+        return create_error_response("VALIDATION_ERROR", e.message, 400, getattr(e, "field", None))
     except ValueError as e:
         return create_error_response("INVALID_PARAMETER", "参数格式错误", 400, str(e))
     except Exception as e:
@@ -226,11 +232,15 @@ def search_cases():
             start_date=datetime.strptime(data['start_date'], '%Y-%m-%d') if data.get('start_date') else None,
             end_date=datetime.strptime(data['end_date'], '%Y-%m-%d') if data.get('end_date') else None,
             page=data.get('page', 1),
-            per_page=data.get('per_page', 20)
+            per_page=data.get('per_page', 20),
+            cursor=data.get('cursor'),
+            include_total=bool(data.get('include_total', False))
         )
         
         return create_success_response(result)
         
+    except ValidationError as e:
+        return create_error_response("VALIDATION_ERROR", e.message, 400, getattr(e, "field", None))
     except ValueError as e:
         return create_error_response("INVALID_DATE_FORMAT", "日期格式错误", 400, str(e))
     except Exception as e:
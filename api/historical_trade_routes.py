@@ -28,6 +28,9 @@ def get_historical_trades():
     - is_profitable: 是否盈利筛选 (可选，true/false)
     - sort_by: 排序字段 (可选，默认completion_date)
     - sort_order: 排序方向 (可选，asc/desc，默认desc)
+    - cursor: 游标分页的游标 (可选，首页传空值，之后传上一页返回的next_cursor)
+    - include_total: 游标分页时是否返回近似总数 (可选，true/false)
+    - fields: 只返回的列，逗号分隔 (可选，如 stock_code,return_rate，总是包含id)
     
     Requirements: 1.1, 1.4
     """
@@ -126,13 +129,23 @@ def get_historical_trades():
         
         current_app.logger.info(f"排序参数: sort_by={sort_by}, sort_order={sort_order}")
         
+        # 游标分页参数
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        
+        # 只返回指定的列（逗号分隔）
+        fields = request.args.get('fields')
+        
         # 获取历史交易记录
         result = HistoricalTradeService.get_historical_trades(
             filters=filters,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total,
+            fields=fields
         )
         
         current_app.logger.info(f"获取到 {result.get('total', 0)} 条历史交易记录")
@@ -217,6 +230,33 @@ def get_historical_trade(trade_id):
         raise DatabaseError(f"获取历史交易记录详情失败: {str(e)}")
 
 
+@api_bp.route('/historical-trades/by-trade-record/<int:trade_record_id>', methods=['GET'])
+def get_historical_trades_by_trade_record(trade_record_id):
+    """
+    查询包含指定交易记录的历史交易
+    
+    Path Parameters:
+    - trade_record_id: 交易记录ID
+    """
+    try:
+        if trade_record_id <= 0:
+            raise ValidationError("交易记录ID必须大于0", "trade_record_id")
+        
+        trades = HistoricalTradeService.get_trades_containing_record(trade_record_id)
+        
+        return create_success_response(
+            data={'trades': trades, 'total': len(trades)},
+            message='获取交易记录所属历史交易成功'
+        )
+    
+    except ValidationError as e:
+        current_app.logger.error(f"获取交易记录所属历史交易失败: {str(e)}")
+        raise e
+    except Exception as e:
+        current_app.logger.error(f"获取交易记录所属历史交易失败: {str(e)}")
+        raise DatabaseError(f"获取交易记录所属历史交易失败: {str(e)}")
+
+
 @api_bp.route('/historical-trades/sync', methods=['POST'])
 def sync_historical_trades():
     """
@@ -1,12 +1,14 @@
 """
 股票价格API路由
 """
-from flask import request, jsonify
+from flask import request, jsonify, Response, current_app
 from datetime import date, datetime
 import logging
 
 from . import api_bp
 from services.price_service import PriceService
+from services.daily_bar_service import DailyBarService
+from services.price_stream_service import PriceStreamService
 from error_handlers import ValidationError, ExternalAPIError
 from utils.validators import validate_stock_code
 
@@ -206,6 +208,27 @@ def get_price_history(stock_code):
     try:
         # 获取查询参数
         days = request.args.get('days', 30, type=int)
+        start_date_str = request.args.get('start_date')
+        end_date_str = request.args.get('end_date')
+        
+        # 指定日期区间时跨日线与归档层返回完整价格序列
+        if start_date_str or end_date_str:
+            try:
+                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else date.today()
+                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else date.min
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': {
+                        'code': 'VALIDATION_ERROR',
+                        'message': '日期格式不正确，请使用YYYY-MM-DD格式'
+                    }
+                }), 400
+            
+            return jsonify({
+                'success': True,
+                'data': price_service.get_price_series(stock_code, start_date, end_date)
+            })
         
         if days <= 0:
             return jsonify({
@@ -294,20 +317,44 @@ def cleanup_cache():
     try:
         data = request.get_json() or {}
         days_to_keep = data.get('days_to_keep', 90)
+        weekly_days_to_keep = data.get('weekly_days_to_keep')
+        
+        # 保留天数必须是正整数（JSON中的字符串、小数和布尔值都不接受）
+        def is_positive_int(value):
+            return isinstance(value, int) and not isinstance(value, bool) and value > 0
         
-        if days_to_keep <= 0:
+        if not is_positive_int(days_to_keep):
             return jsonify({
                 'success': False,
                 'error': {
                     'code': 'VALIDATION_ERROR',
-                    'message': '保留天数必须大于0'
+                    'message': '保留天数必须大于0且为整数'
                 }
             }), 400
         
-        result = price_service.cleanup_old_prices(days_to_keep)
+        if weekly_days_to_keep is not None and not is_positive_int(weekly_days_to_keep):
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': '周线保留天数必须大于0且为整数'
+                }
+            }), 400
+        
+        result = price_service.cleanup_old_prices(days_to_keep, weekly_days_to_keep)
         
         return jsonify(result)
     
+    except ValidationError as e:
+        logger.error(f"清理缓存验证失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }), 400
+    
     except ExternalAPIError as e:
         logger.error(f"清理缓存失败: {e}")
         return jsonify({
@@ -389,4 +436,141 @@ def get_batch_prices():
                 'code': 'INTERNAL_ERROR',
                 'message': '服务器内部错误'
             }
-        }), 500
\ No newline at end of file
+        }), 500
+
+@api_bp.route('/prices/latest', methods=['POST'])
+def get_latest_prices():
+    """批量获取股票最新价格（单次查询）"""
+    try:
+        data = request.get_json() or {}
+        stock_codes = data.get('stock_codes', [])
+        
+        if not stock_codes:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': '请提供股票代码列表'
+                }
+            }), 400
+        
+        latest_prices = price_service.get_latest_prices(stock_codes)
+        
+        return jsonify({
+            'success': True,
+            'data': latest_prices
+        })
+    
+    except ValidationError as e:
+        logger.error(f"批量获取最新价格验证失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }), 400
+    
+    except Exception as e:
+        logger.error(f"批量获取最新价格时发生未知错误: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INTERNAL_ERROR',
+                'message': '服务器内部错误'
+            }
+        }), 500
+
+
+@api_bp.route('/prices/stream', methods=['GET'])
+def stream_prices():
+    """推送价格变动与持仓浮盈（Server-Sent Events）"""
+    app = current_app._get_current_object()
+    subscriber = PriceStreamService.subscribe(app)
+    heartbeat_interval = app.config.get(
+        'PRICE_STREAM_HEARTBEAT_INTERVAL', PriceStreamService.DEFAULT_HEARTBEAT_INTERVAL
+    )
+    
+    return Response(
+        PriceStreamService.stream(subscriber, heartbeat_interval),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@api_bp.route('/prices/bars/ingest', methods=['POST'])
+def ingest_daily_bars():
+    """批量拉取日线数据到本地存储（增量）"""
+    try:
+        data = request.get_json() or {}
+        
+        result = DailyBarService().ingest(
+            stock_codes=data.get('stock_codes') or None,
+            start_date=data.get('start_date'),
+            end_date=data.get('end_date')
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'日线数据拉取完成，更新 {result["updated_count"]} 只，失败 {result["failed_count"]} 只',
+            'data': result
+        })
+    
+    except ValidationError as e:
+        logger.error(f"日线数据拉取验证失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }), 400
+    
+    except Exception as e:
+        logger.error(f"拉取日线数据时发生未知错误: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INTERNAL_ERROR',
+                'message': '服务器内部错误'
+            }
+        }), 500
+
+
+@api_bp.route('/prices/<stock_code>/bars', methods=['GET'])
+def get_daily_bars(stock_code):
+    """获取本地存储的日线数据"""
+    try:
+        bars = DailyBarService().get_bars(
+            stock_code,
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )[stock_code]
+        
+        return jsonify({
+            'success': True,
+            'data': DailyBarService.bars_to_dicts(bars)
+        })
+    
+    except ValidationError as e:
+        logger.error(f"获取日线数据验证失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }), 400
+    
+    except Exception as e:
+        logger.error(f"获取日线数据时发生未知错误: {e}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INTERNAL_ERROR',
+                'message': '服务器内部错误'
+            }
+        }), 500
@@ -0,0 +1,33 @@
+"""
+统一检索API路由
+"""
+from flask import request
+from . import api_bp
+from services.search_service import SearchService
+from error_handlers import create_success_response
+
+
+@api_bp.route('/search', methods=['GET'])
+def search():
+    """
+    全文检索交易记录、复盘、案例、股票池和历史交易
+    
+    Query Parameters:
+    - q: 检索词 (必需，空格分隔的多个词须同时出现)
+    - types: 检索类型，逗号分隔 (可选，trades/reviews/cases/stocks/historical_trades，默认全部)
+    - limit: 最大结果数 (可选，默认20，最大100)
+    """
+    try:
+        query = request.args.get('q', '')
+        types = [t.strip() for t in request.args.get('types', '').split(',') if t.strip()]
+        limit = request.args.get('limit', type=int)
+        
+        result = SearchService.search(query, types=types or None, limit=limit)
+        
+        return create_success_response(
+            data=result,
+            message='检索成功'
+        )
+    
+    except Exception as e:
+        raise e
@@ -71,8 +71,8 @@ def get_sector_ranking():
         if limit is not None:
             validate_positive_integer(limit, 'limit')
         
-        # 获取排名数据
-        ranking_data = sector_service.get_sector_ranking(target_date, limit)
+        # 获取排名数据（fields: 只返回的列，逗号分隔）
+        ranking_data = sector_service.get_sector_ranking(target_date, limit, fields=request.args.get('fields'))
         
         return jsonify({
             'success': True,
@@ -119,7 +119,7 @@ def get_sector_history():
         validate_positive_integer(days, 'days')
         
         # 获取历史数据
-        history_data = sector_service.get_sector_history(sector_name, days)
+        history_data = sector_service.get_sector_history(sector_name, days, fields=request.args.get('fields'))
         
         return jsonify({
             'success': True,
@@ -196,6 +196,50 @@ def get_top_performers():
         }), 500
 
 
+@sector_bp.route('/momentum', methods=['GET'])
+def get_sector_momentum():
+    """获取最近N天全部板块的排名动量"""
+    try:
+        # 获取查询参数
+        days = request.args.get('days', default=30, type=int)
+        top_k = request.args.get('top_k', default=10, type=int)
+        
+        # 验证参数
+        validate_positive_integer(days, 'days')
+        validate_positive_integer(top_k, 'top_k')
+        
+        momentum = sector_service.get_sector_momentum(days, top_k)
+        
+        return jsonify({
+            'success': True,
+            'data': momentum,
+            'meta': {
+                'days': days,
+                'top_k': top_k,
+                'count': len(momentum)
+            }
+        }), 200
+        
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e),
+                'field': getattr(e, 'field', None)
+            }
+        }), 400
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INTERNAL_ERROR',
+                'message': '获取板块排名动量时发生内部错误'
+            }
+        }), 500
+
+
 @sector_bp.route('/summary', methods=['GET'])
 def get_analysis_summary():
     """获取板块分析汇总信息"""
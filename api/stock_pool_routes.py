@@ -52,13 +52,19 @@ def get_stock_pool():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         
+        # 游标分页参数（传入cursor时使用游标分页，首页传空值）
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        
         # 获取股票池列表
         result = StockPoolService.search_stocks(
             filters=filters,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return create_success_response(
@@ -157,13 +163,17 @@ def get_watch_pool():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         status = request.args.get('status', 'active')
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         result = StockPoolService.get_watch_pool(
             status=status,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return create_success_response(
@@ -185,13 +195,17 @@ def get_buy_ready_pool():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         status = request.args.get('status', 'active')
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         result = StockPoolService.get_buy_ready_pool(
             status=status,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return create_success_response(
@@ -5,7 +5,8 @@ from flask import request, jsonify
 from datetime import datetime, date
 from . import api_bp
 from extensions import db
-from services.strategy_service import StrategyService, StrategyEvaluator, HoldingAlertService
+from services.strategy_service import StrategyService, StrategyEvaluator, HoldingAlertService, StrategyAlertEngine
+from services.strategy_backtest_service import StrategyBacktestService
 from error_handlers import create_success_response, ValidationError, NotFoundError, DatabaseError
 import logging
 
@@ -33,13 +34,19 @@ def get_strategies():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         
+        # 游标分页参数（传入cursor时使用游标分页，首页传空值）
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        
         # 获取策略列表
         result = StrategyService.get_strategies(
             filters=filters,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return create_success_response(
@@ -267,12 +274,14 @@ def evaluate_holdings():
         stock_code = data.get('stock_code')
         
         if stock_code:
-            # 评估特定股票
-            alerts = StrategyEvaluator.evaluate_single_holding(stock_code)
+            # 评估特定股票并更新提醒表
+            StrategyAlertEngine.refresh([stock_code])
+            alerts = HoldingAlertService.get_alerts_by_stock(stock_code)
             message = f'评估股票{stock_code}持仓策略成功'
         else:
-            # 评估所有持仓
-            alerts = StrategyEvaluator.evaluate_all_holdings()
+            # 评估所有持仓并更新提醒表
+            StrategyAlertEngine.refresh()
+            alerts = HoldingAlertService.get_all_alerts()
             message = '评估所有持仓策略成功'
         
         return create_success_response(
@@ -284,6 +293,38 @@ def evaluate_holdings():
         raise e
 
 
+@api_bp.route('/strategies/backtest', methods=['POST'])
+def backtest_strategies():
+    """用历史交易和本地日线数据回测策略"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        strategy_ids = data.get('strategy_ids') or []
+        strategies = data.get('strategies') or []
+        if not isinstance(strategy_ids, list) or not isinstance(strategies, list):
+            raise ValidationError("strategy_ids和strategies必须是数组")
+        
+        filters = {
+            key: data.get(key) for key in ('stock_code', 'start_date', 'end_date')
+            if data.get(key)
+        }
+        
+        result = StrategyBacktestService.run_backtest(
+            strategy_ids=[int(strategy_id) for strategy_id in strategy_ids],
+            strategies=strategies,
+            filters=filters,
+            include_trades=bool(data.get('include_trades', False))
+        )
+        
+        return create_success_response(
+            data=result,
+            message='策略回测完成'
+        )
+    
+    except Exception as e:
+        raise e
+
+
 @api_bp.route('/strategies/test-rule', methods=['POST'])
 def test_strategy_rule():
     """测试策略规则"""
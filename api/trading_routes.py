@@ -54,13 +54,23 @@ def get_trades():
         sort_by = request.args.get('sort_by', 'trade_date')
         sort_order = request.args.get('sort_order', 'desc')
         
+        # 游标分页参数（传入cursor时使用游标分页，首页传空值）
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        
+        # 只返回指定的列（逗号分隔）
+        fields = request.args.get('fields')
+        
         # 获取交易记录
         result = TradingService.get_trades(
             filters=filters,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total,
+            fields=fields
         )
         
         return create_success_response(
@@ -400,6 +410,21 @@ def get_correction_history(trade_id):
         raise e
 
 
+@api_bp.route('/trades/<int:trade_id>/chain', methods=['GET'])
+def get_correction_chain(trade_id):
+    """获取交易记录所在的完整订正链"""
+    try:
+        chain = TradingService.get_correction_chain(trade_id)
+        
+        return create_success_response(
+            data=chain,
+            message='获取订正链成功'
+        )
+    
+    except Exception as e:
+        raise e
+
+
 @api_bp.route('/trades/config', methods=['GET'])
 def get_trade_config():
     """获取交易配置"""
@@ -653,6 +678,44 @@ def calculate_batch_profit():
         raise e
 
 
+@api_bp.route('/trades/import', methods=['POST'])
+def import_trades():
+    """
+    从券商导出的成交记录文件批量导入交易记录
+    
+    Form Data:
+    - file: CSV或Excel(.xlsx)文件 (必需)
+    - default_reason: 文件中没有交易原因时使用的原因 (可选，默认"批量导入")
+    - chunk_size: 每块读取和写入的行数 (可选)
+    - sync: 导入后是否同步历史交易记录 (可选，默认true)
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is None or not upload.filename:
+            raise ValidationError("请上传成交记录文件", "file")
+        
+        chunk_size = request.form.get('chunk_size', type=int)
+        sync = request.form.get('sync', 'true').lower() != 'false'
+        
+        from services.trade_import_service import TradeImportService
+        result = TradeImportService.import_trades(
+            upload.stream,
+            upload.filename,
+            default_reason=request.form.get('default_reason'),
+            chunk_size=chunk_size,
+            sync=sync
+        )
+        
+        return create_success_response(
+            data=result,
+            message=f"导入完成，成功 {result['imported_count']} 条，重复 {result['duplicate_count']} 条，"
+                    f"错误 {result['error_count']} 条"
+        )
+    
+    except Exception as e:
+        raise e
+
+
 @api_bp.route('/trades/stats', methods=['GET'])
 def get_trade_stats():
     """获取交易统计信息"""
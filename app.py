@@ -6,6 +6,8 @@ from config import Config
 from extensions import db, migrate
 from api import api_bp
 from error_handlers import register_error_handlers
+from utils.structured_logging import configure_logging
+from utils.serialization import FastJSONProvider
 
 # 导入所有模型以确保它们被SQLAlchemy注册
 from models import *
@@ -14,9 +16,11 @@ def create_app(config_class=Config):
     """应用工厂函数"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
     
     # 初始化应用配置
     config_class.init_app(app)
+    configure_logging(app)
     
     # 初始化扩展
     db.init_app(app)
@@ -50,9 +50,27 @@ class Config:
     AKSHARE_RETRY_COUNT = int(os.environ.get('AKSHARE_RETRY_COUNT', 3))
     AKSHARE_CACHE_TIMEOUT = int(os.environ.get('AKSHARE_CACHE_TIMEOUT', 300))  # 5 minutes
     
+    # 日线行情本地存储目录（按股票分区的NumPy文件）
+    DAILY_BAR_STORE_DIR = Path(os.environ.get('DAILY_BAR_STORE_DIR', basedir / 'data' / 'daily_bars'))
+    
+    # 价格分层保留配置（超过该天数的日线价格压缩为月线，之前为周线）
+    PRICE_RETENTION_WEEKLY_DAYS = int(os.environ.get('PRICE_RETENTION_WEEKLY_DAYS', 730))
+    
+    # 价格推送配置（SSE广播线程检查数据版本的间隔，单位秒）
+    PRICE_STREAM_POLL_INTERVAL = int(os.environ.get('PRICE_STREAM_POLL_INTERVAL', 5))
+    PRICE_STREAM_HEARTBEAT_INTERVAL = int(os.environ.get('PRICE_STREAM_HEARTBEAT_INTERVAL', 15))
+    
+    # 生成历史交易记录时每批插入的记录数
+    HISTORICAL_TRADE_INSERT_BATCH_SIZE = int(os.environ.get('HISTORICAL_TRADE_INSERT_BATCH_SIZE', 1000))
+    
+    # 批量导入交易记录时每块读取和写入的行数
+    TRADE_IMPORT_CHUNK_SIZE = int(os.environ.get('TRADE_IMPORT_CHUNK_SIZE', 5000))
+    
     # 分页配置
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 20))
     MAX_ITEMS_PER_PAGE = int(os.environ.get('MAX_ITEMS_PER_PAGE', 100))
+    # 游标分页近似总数的缓存有效期（秒）
+    KEYSET_COUNT_CACHE_TTL = int(os.environ.get('KEYSET_COUNT_CACHE_TTL', 60))
     
     # 安全配置
     WTF_CSRF_ENABLED = os.environ.get('WTF_CSRF_ENABLED', 'true').lower() == 'true'
@@ -63,6 +81,11 @@ class Config:
     LOG_FILE = os.environ.get('LOG_FILE', 'logs/app.log')
     LOG_MAX_SIZE = int(os.environ.get('LOG_MAX_SIZE', 10 * 1024 * 1024))  # 10MB
     LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+    # 按模块前缀设置日志级别和采样率，如 "models=WARNING,services.trading_service=DEBUG"、"models=100"
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+    # 是否通过队列在后台线程写日志
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', 'false').lower() == 'true'
     
     # 缓存配置
     CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')
@@ -122,6 +145,9 @@ class ProductionConfig(Config):
     # 强制HTTPS
     PREFERRED_URL_SCHEME = 'https'
     
+    # 日志文件写入不占用请求线程
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() == 'true'
+    
     @classmethod
     def init_app(cls, app):
         """生产环境初始化"""
@@ -0,0 +1,74 @@
+"""
+添加股票价格归档表
+超出日线保留期的价格压缩为周线/月线OHLC，替代直接删除
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from app import create_app
+from sqlalchemy import text
+
+
+def upgrade():
+    """创建股票价格归档表"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS stock_price_archives (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stock_code VARCHAR(10) NOT NULL,
+                    stock_name VARCHAR(50),
+                    period_type VARCHAR(10) NOT NULL,
+                    period_start DATE NOT NULL,
+                    period_end DATE NOT NULL,
+                    first_date DATE NOT NULL,
+                    last_date DATE NOT NULL,
+                    open_price NUMERIC(10, 2),
+                    high_price NUMERIC(10, 2),
+                    low_price NUMERIC(10, 2),
+                    close_price NUMERIC(10, 2),
+                    close_change_percent NUMERIC(5, 2),
+                    sample_count INTEGER NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT unique_stock_price_archive_period UNIQUE (stock_code, period_type, period_start),
+                    CONSTRAINT check_archive_period_type CHECK (period_type IN ('week', 'month'))
+                )
+            """))
+            
+            # 创建索引
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_stock_price_archives_stock_code ON stock_price_archives(stock_code)
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_stock_price_archive_code_date
+                ON stock_price_archives(stock_code, first_date, last_date)
+            """))
+            
+            conn.commit()
+        
+        print("✓ 股票价格归档表创建完成")
+
+
+def downgrade():
+    """删除股票价格归档表"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS idx_stock_price_archive_code_date"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_stock_price_archives_stock_code"))
+            conn.execute(text("DROP TABLE IF EXISTS stock_price_archives"))
+            
+            conn.commit()
+        
+        print("✓ 股票价格归档表删除完成")
+
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,96 @@
+"""
+添加策略提醒表
+持久化持仓策略提醒，按去重键记录首次/最近触发时间
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from app import create_app
+from sqlalchemy import text
+
+
+def upgrade():
+    """创建策略提醒表"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS strategy_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key VARCHAR(100) NOT NULL UNIQUE,
+                    stock_code VARCHAR(10) NOT NULL,
+                    stock_name VARCHAR(50),
+                    strategy_id INTEGER NOT NULL,
+                    strategy_name VARCHAR(100),
+                    rule_index INTEGER NOT NULL,
+                    strategy_rule VARCHAR(200),
+                    alert_type VARCHAR(20) NOT NULL,
+                    triggered_condition VARCHAR(50),
+                    alert_message VARCHAR(200),
+                    holding_days INTEGER,
+                    buy_price FLOAT,
+                    current_price FLOAT,
+                    current_quantity INTEGER,
+                    profit_loss_ratio FLOAT,
+                    profit_loss_amount FLOAT,
+                    sell_ratio FLOAT,
+                    suggested_sell_quantity INTEGER,
+                    is_active BOOLEAN NOT NULL DEFAULT 1,
+                    first_seen_at DATETIME NOT NULL,
+                    last_seen_at DATETIME NOT NULL,
+                    resolved_at DATETIME,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            
+            # 创建索引
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_strategy_alerts_stock_code ON strategy_alerts(stock_code)
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_strategy_alerts_strategy_id ON strategy_alerts(strategy_id)
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_strategy_alerts_alert_type ON strategy_alerts(alert_type)
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_strategy_alerts_is_active ON strategy_alerts(is_active)
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_strategy_alert_active_stock
+                ON strategy_alerts(is_active, stock_code)
+            """))
+            
+            conn.commit()
+        
+        print("✓ 策略提醒表创建完成")
+
+
+def downgrade():
+    """删除策略提醒表"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS idx_strategy_alert_active_stock"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_strategy_alerts_is_active"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_strategy_alerts_alert_type"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_strategy_alerts_strategy_id"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_strategy_alerts_stock_code"))
+            conn.execute(text("DROP TABLE IF EXISTS strategy_alerts"))
+            
+            conn.commit()
+        
+        print("✓ 策略提醒表删除完成")
+
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,78 @@
+"""
+添加历史交易关联表
+将历史交易记录的 buy_records_ids/sell_records_ids JSON列拆分为 (历史交易ID, 交易记录ID, 方向) 关联
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from app import create_app
+from sqlalchemy import text
+
+
+def upgrade():
+    """创建历史交易关联表并从JSON列迁移数据"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS historical_trade_links (
+                    historical_trade_id INTEGER NOT NULL,
+                    trade_record_id INTEGER NOT NULL,
+                    side VARCHAR(4) NOT NULL,
+                    PRIMARY KEY (historical_trade_id, trade_record_id),
+                    FOREIGN KEY (historical_trade_id) REFERENCES historical_trades (id) ON DELETE CASCADE,
+                    FOREIGN KEY (trade_record_id) REFERENCES trade_records (id),
+                    CONSTRAINT check_link_side CHECK (side IN ('buy', 'sell'))
+                )
+            """))
+            
+            # 创建索引
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_historical_link_record
+                ON historical_trade_links(trade_record_id, side)
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_historical_link_trade_side
+                ON historical_trade_links(historical_trade_id, side)
+            """))
+            
+            # 从JSON列迁移（已有关联的记录跳过，可重复执行）
+            result = conn.execute(text("""
+                INSERT OR IGNORE INTO historical_trade_links (historical_trade_id, trade_record_id, side)
+                SELECT ht.id, CAST(je.value AS INTEGER), 'buy'
+                FROM historical_trades ht, json_each(ht.buy_records_ids) je
+                WHERE json_valid(ht.buy_records_ids)
+                  AND NOT EXISTS (SELECT 1 FROM historical_trade_links l WHERE l.historical_trade_id = ht.id)
+                UNION ALL
+                SELECT ht.id, CAST(je.value AS INTEGER), 'sell'
+                FROM historical_trades ht, json_each(ht.sell_records_ids) je
+                WHERE json_valid(ht.sell_records_ids)
+                  AND NOT EXISTS (SELECT 1 FROM historical_trade_links l WHERE l.historical_trade_id = ht.id)
+            """))
+            
+            conn.commit()
+        
+        print(f"✓ 历史交易关联表创建完成，迁移 {result.rowcount} 条关联")
+
+
+def downgrade():
+    """删除历史交易关联表（JSON列仍保留完整数据）"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS idx_historical_link_trade_side"))
+            conn.execute(text("DROP INDEX IF EXISTS idx_historical_link_record"))
+            conn.execute(text("DROP TABLE IF EXISTS historical_trade_links"))
+            
+            conn.commit()
+        
+        print("✓ 历史交易关联表删除完成")
+
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,42 @@
+"""
+添加全文检索索引
+为交易记录、复盘记录、案例、股票池和历史交易建立 FTS5 索引（trigram分词）及同步触发器
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from app import create_app
+from models.search_index import SearchIndex
+
+
+def upgrade():
+    """建立全文索引并从源表导入现有数据"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            available = SearchIndex.create_all(conn)
+            conn.commit()
+        
+        if available:
+            print("✓ 全文检索索引创建完成")
+        else:
+            print("⚠ 当前SQLite未启用FTS5或trigram分词，检索将继续使用LIKE查询")
+
+
+def downgrade():
+    """删除全文索引和同步触发器"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            SearchIndex.drop_all(conn)
+            conn.commit()
+        
+        print("✓ 全文检索索引删除完成")
+
+
+if __name__ == '__main__':
+    upgrade()
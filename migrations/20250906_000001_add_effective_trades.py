@@ -0,0 +1,54 @@
+"""
+添加有效交易映射
+建立 effective_trades 表及同步触发器（写入时解析订正链），并为未被订正的交易记录建立部分索引
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from app import create_app
+from models.trade_record import TradeRecord
+from models.effective_trade import EffectiveTrade
+
+# 只包含未被订正记录的部分索引
+PARTIAL_INDEXES = ('idx_trade_records_effective_stock', 'idx_trade_records_effective_date')
+
+
+def upgrade():
+    """建立映射表、触发器和部分索引，并从现有交易记录重建映射"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            EffectiveTrade.__table__.create(conn, checkfirst=True)
+            for index in TradeRecord.__table__.indexes:
+                if index.name in PARTIAL_INDEXES:
+                    index.create(conn, checkfirst=True)
+            available = EffectiveTrade.create_all(conn)
+            conn.commit()
+        
+        if available:
+            print("✓ 有效交易映射和部分索引创建完成")
+        else:
+            print("⚠ 当前数据库不是SQLite，未建立有效交易映射的同步触发器")
+
+
+def downgrade():
+    """删除映射表、触发器和部分索引"""
+    
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            EffectiveTrade.drop_all(conn)
+            EffectiveTrade.__table__.drop(conn, checkfirst=True)
+            for index in TradeRecord.__table__.indexes:
+                if index.name in PARTIAL_INDEXES:
+                    index.drop(conn, checkfirst=True)
+            conn.commit()
+        
+        print("✓ 有效交易映射和部分索引删除完成")
+
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,47 @@
+"""
+为交易记录添加券商成交编号
+批量导入时记录对账单中的成交编号/合同编号，按编号识别已导入的成交
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from app import create_app
+
+
+def upgrade():
+    """添加broker_fill_id字段及索引"""
+
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            field_exists = conn.execute(db.text(
+                "SELECT COUNT(*) FROM pragma_table_info('trade_records') WHERE name = 'broker_fill_id'"
+            )).scalar() > 0
+
+            if not field_exists:
+                conn.execute(db.text("ALTER TABLE trade_records ADD COLUMN broker_fill_id VARCHAR(50)"))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_trade_records_broker_fill_id ON trade_records(broker_fill_id)"
+            ))
+            conn.commit()
+
+        print("✓ broker_fill_id字段添加完成")
+
+
+def downgrade():
+    """删除broker_fill_id字段及索引"""
+
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(db.text("DROP INDEX IF EXISTS ix_trade_records_broker_fill_id"))
+            conn.execute(db.text("ALTER TABLE trade_records DROP COLUMN broker_fill_id"))
+            conn.commit()
+
+        print("✓ broker_fill_id字段删除完成")
+
+
+if __name__ == '__main__':
+    upgrade()
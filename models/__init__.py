@@ -8,13 +8,17 @@ from .review_record import ReviewRecord
 from .stock_pool import StockPool
 from .case_study import CaseStudy
 from .configuration import Configuration
-from .stock_price import StockPrice
+from .stock_price import StockPrice, StockPriceArchive
 from .sector_data import SectorData, SectorRanking
 from .trading_strategy import TradingStrategy
 from .non_trading_day import NonTradingDay
 from .profit_distribution_config import ProfitDistributionConfig
-from .historical_trade import HistoricalTrade
+from .historical_trade import HistoricalTrade, HistoricalTradeLink
 from .trade_review import TradeReview, ReviewImage
+from .strategy_alert import StrategyAlert
+from .search_index import SearchIndex
+from .effective_trade import EffectiveTrade
+from .read_models import TradeReadModel, TradeRow
 
 __all__ = [
     'BaseModel',
@@ -26,12 +30,19 @@ __all__ = [
     'CaseStudy',
     'Configuration',
     'StockPrice',
+    'StockPriceArchive',
     'SectorData',
     'SectorRanking',
     'TradingStrategy',
     'NonTradingDay',
     'ProfitDistributionConfig',
     'HistoricalTrade',
+    'HistoricalTradeLink',
     'TradeReview',
-    'ReviewImage'
+    'ReviewImage',
+    'StrategyAlert',
+    'SearchIndex',
+    'EffectiveTrade',
+    'TradeReadModel',
+    'TradeRow'
 ]
\ No newline at end of file
@@ -1,8 +1,15 @@
 """
 基础数据模型类
 """
+import threading
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from extensions import db
+from utils.structured_logging import get_logger, lazy
+from utils.serialization import get_serializer
+
+logger = get_logger(__name__)
 
 class BaseModel(db.Model):
     """基础模型类，包含通用字段和方法"""
@@ -16,24 +23,13 @@ class BaseModel(db.Model):
     def save(self):
         """保存模型到数据库"""
         try:
-            from flask import current_app
-            current_app.logger.info(f"=== BaseModel.save 开始 ===")
-            current_app.logger.info(f"模型类型: {self.__class__.__name__}")
-            current_app.logger.info(f"模型数据: {self.to_dict()}")
-            
-            current_app.logger.info("添加到数据库会话")
+            logger.debug("保存模型", model=self.__class__.__name__, data=lazy(self.to_dict))
             db.session.add(self)
-            
-            current_app.logger.info("提交数据库事务")
             db.session.commit()
-            
-            current_app.logger.info(f"保存成功，ID: {self.id}")
+            logger.debug("保存成功", model=self.__class__.__name__, id=self.id)
             return self
         except Exception as e:
-            current_app.logger.error(f"BaseModel.save 发生错误: {str(e)}")
-            current_app.logger.error(f"错误类型: {type(e)}")
-            import traceback
-            current_app.logger.error(f"错误堆栈: {traceback.format_exc()}")
+            logger.error("保存模型失败", exc_info=True, model=self.__class__.__name__, error=str(e))
             db.session.rollback()
             raise e
     
@@ -47,15 +43,13 @@ class BaseModel(db.Model):
             db.session.rollback()
             raise e
     
+    # 序列化时 DateTime 列总是转为ISO字符串；子类可列出需要转为 float 的 Numeric 列和转为ISO字符串的 Date 列
+    serialize_as_float = ()
+    serialize_as_iso_date = ()
+    
     def to_dict(self):
-        """将模型转换为字典"""
-        result = {}
-        for column in self.__table__.columns:
-            value = getattr(self, column.name)
-            if isinstance(value, datetime):
-                value = value.isoformat()
-            result[column.name] = value
-        return result
+        """将模型转换为字典（使用按表结构生成的序列化器）"""
+        return get_serializer(type(self)).serialize(self)
     
     @classmethod
     def get_by_id(cls, id):
@@ -68,4 +62,68 @@ class BaseModel(db.Model):
         return cls.query.all()
     
     def __repr__(self):
-        return f'<{self.__class__.__name__} {self.id}>'
\ No newline at end of file
+        return f'<{self.__class__.__name__} {self.id}>'
+
+
+class DataVersionMixin:
+    """
+    数据版本号，用于缓存按模型数据计算的结果
+    
+    ORM写入在 flush 时自动标记会话，core语句需手动调用 mark_data_changed；修改数据的事务提交或回滚后
+    递增版本号，按旧版本缓存的结果随之失效。版本号保存在进程内：其他进程写入的数据不会使本进程的缓存失效，
+    按版本号缓存的结果只适用于单进程部署。
+    """
+    
+    _data_version = 0
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._data_version = 0
+        _versioned_models.append(cls)
+    
+    @classmethod
+    def _changed_key(cls) -> str:
+        """会话 info 中标记未提交修改的键（每个模型一个）"""
+        return f'{cls.__tablename__}_changed'
+    
+    @classmethod
+    def get_data_version(cls) -> int:
+        """当前数据版本号"""
+        return cls._data_version
+    
+    @classmethod
+    def mark_data_changed(cls, session):
+        """标记会话修改了该模型的数据（core语句和批量删除不触发ORM事件时手动调用）"""
+        session.info[cls._changed_key()] = True
+    
+    @classmethod
+    def has_uncommitted_changes(cls, session) -> bool:
+        """会话当前事务内是否有尚未提交的修改"""
+        return bool(session.info.get(cls._changed_key()))
+    
+    @classmethod
+    def bump_data_version(cls):
+        """递增数据版本号，使按旧版本缓存的结果失效"""
+        with _data_version_lock:
+            cls._data_version += 1
+
+
+_versioned_models = []
+_data_version_lock = threading.Lock()
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_versioned_data_flushed(session, flush_context):
+    """会话写入带数据版本号的模型时做标记"""
+    for model in {type(obj) for obj in (*session.new, *session.dirty, *session.deleted)}:
+        if issubclass(model, DataVersionMixin):
+            model.mark_data_changed(session)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _bump_data_versions(session):
+    """修改数据的事务提交或回滚后递增对应模型的数据版本号"""
+    for model in _versioned_models:
+        if session.info.pop(model._changed_key(), False):
+            model.bump_data_version()
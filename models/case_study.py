@@ -5,6 +5,7 @@ import json
 import os
 from extensions import db
 from models.base import BaseModel
+from models.search_index import SearchIndex
 from utils.validators import validate_stock_code
 from error_handlers import ValidationError
 
@@ -91,18 +92,15 @@ class CaseStudy(BaseModel):
     @classmethod
     def get_by_tag(cls, tag):
         """根据标签获取案例"""
-        return cls.query.filter(cls.tags.like(f'%"{tag}"%')).order_by(cls.created_at.desc()).all()
+        return cls.query.filter(
+            SearchIndex.like_filter(cls, 'cases', 'tags', f'%"{tag}"%')
+        ).order_by(cls.created_at.desc()).all()
     
     @classmethod
     def search_by_keyword(cls, keyword):
         """根据关键词搜索案例"""
         return cls.query.filter(
-            db.or_(
-                cls.title.like(f'%{keyword}%'),
-                cls.notes.like(f'%{keyword}%'),
-                cls.stock_code.like(f'%{keyword}%'),
-                cls.tags.like(f'%{keyword}%')
-            )
+            SearchIndex.keyword_filter(cls, 'cases', keyword)
         ).order_by(cls.created_at.desc()).all()
     
     def to_dict(self):
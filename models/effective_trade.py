@@ -0,0 +1,157 @@
+"""
+有效交易映射
+每条交易记录对应一行：所在订正链的根记录、链上当前有效（最新订正）的记录和订正深度。
+映射由 trade_records 上的触发器在写入时维护，读取时不需要沿 original_record_id 逐条回溯订正链
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from extensions import db
+
+# 单次IN查询的最大参数数量（SQLite默认限制为999）
+BATCH_QUERY_SIZE = 500
+
+
+class EffectiveTrade(db.Model):
+    """交易记录 -> 订正链根记录 / 当前有效记录"""
+    
+    __tablename__ = 'effective_trades'
+    
+    trade_id = db.Column(db.Integer, db.ForeignKey('trade_records.id'), primary_key=True, autoincrement=False)
+    root_trade_id = db.Column(db.Integer, nullable=False, index=True)
+    effective_trade_id = db.Column(db.Integer, nullable=False, index=True)
+    depth = db.Column(db.Integer, nullable=False, default=0)
+    
+    TRIGGERS = ('effective_trades_ai', 'effective_trades_ad')
+    
+    @classmethod
+    def ddl_statements(cls) -> List[str]:
+        """
+        同步触发器
+        
+        插入订正记录时继承上级记录的根记录和深度，并把整条链的有效记录指向新记录，同时标记上级记录已订正；
+        删除记录时把指向它的链改指向链上剩余的最新记录
+        """
+        return [
+            "CREATE TRIGGER IF NOT EXISTS effective_trades_ai AFTER INSERT ON trade_records BEGIN "
+            "INSERT OR REPLACE INTO effective_trades(trade_id, root_trade_id, effective_trade_id, depth) VALUES ("
+            "new.id, "
+            "COALESCE((SELECT root_trade_id FROM effective_trades WHERE trade_id = new.original_record_id), new.id), "
+            "new.id, "
+            "COALESCE((SELECT depth + 1 FROM effective_trades WHERE trade_id = new.original_record_id), 0)); "
+            "UPDATE effective_trades SET effective_trade_id = new.id "
+            "WHERE root_trade_id = (SELECT root_trade_id FROM effective_trades WHERE trade_id = new.id) "
+            "AND trade_id != new.id; "
+            "UPDATE trade_records SET is_corrected = 1 "
+            "WHERE id = new.original_record_id AND is_corrected = 0; END",
+            "CREATE TRIGGER IF NOT EXISTS effective_trades_ad AFTER DELETE ON trade_records BEGIN "
+            "UPDATE effective_trades SET effective_trade_id = COALESCE(("
+            "SELECT MAX(chain.trade_id) FROM effective_trades AS chain "
+            "WHERE chain.root_trade_id = effective_trades.root_trade_id AND chain.trade_id != old.id), trade_id) "
+            "WHERE effective_trade_id = old.id; "
+            "DELETE FROM effective_trades WHERE trade_id = old.id; END",
+        ]
+    
+    @classmethod
+    def rebuild(cls, connection) -> None:
+        """
+        从交易记录重建映射（递归展开订正链，链上最新的记录为有效记录）
+        
+        上级记录已被删除的订正记录也作为链的起点，与删除时触发器的处理一致：
+        根记录仍为被删除的上级记录ID，深度为1
+        """
+        connection.execute(text("DELETE FROM effective_trades"))
+        connection.execute(text(
+            "INSERT INTO effective_trades(trade_id, root_trade_id, effective_trade_id, depth) "
+            "WITH RECURSIVE chain(trade_id, root_trade_id, depth) AS ("
+            "SELECT id, id, 0 FROM trade_records WHERE original_record_id IS NULL "
+            "UNION ALL "
+            "SELECT id, original_record_id, 1 FROM trade_records AS t WHERE original_record_id IS NOT NULL "
+            "AND NOT EXISTS (SELECT 1 FROM trade_records AS parent WHERE parent.id = t.original_record_id) "
+            "UNION ALL "
+            "SELECT t.id, chain.root_trade_id, chain.depth + 1 FROM trade_records AS t "
+            "JOIN chain ON t.original_record_id = chain.trade_id) "
+            "SELECT trade_id, root_trade_id, MAX(trade_id) OVER (PARTITION BY root_trade_id), depth FROM chain"
+        ))
+    
+    @classmethod
+    def create_all(cls, connection) -> bool:
+        """
+        建立同步触发器，新建触发器时从交易记录重建映射
+        
+        Returns:
+            bool: 是否建立成功（非SQLite数据库返回False）
+        """
+        if connection.dialect.name != 'sqlite':
+            return False
+        
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"), {'name': cls.TRIGGERS[0]}
+        ).first() is not None
+        for statement in cls.ddl_statements():
+            connection.execute(text(statement))
+        if not exists:
+            cls.rebuild(connection)
+        return True
+    
+    @classmethod
+    def drop_all(cls, connection) -> None:
+        """删除同步触发器"""
+        if connection.dialect.name != 'sqlite':
+            return
+        for trigger in cls.TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    
+    @classmethod
+    def resolve(cls, trade_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        批量查询交易记录当前有效的记录ID
+        
+        Returns:
+            Dict[int, int]: 交易记录ID -> 有效记录ID（不存在的记录不包含在结果中）
+        """
+        ids = sorted(set(trade_ids))
+        result = {}
+        for i in range(0, len(ids), BATCH_QUERY_SIZE):
+            rows = db.session.execute(
+                db.select(cls.trade_id, cls.effective_trade_id).where(cls.trade_id.in_(ids[i:i + BATCH_QUERY_SIZE]))
+            )
+            result.update(rows.tuples().all())
+        return result
+    
+    @classmethod
+    def effective_id(cls, trade_id: int) -> Optional[int]:
+        """交易记录当前有效的记录ID，记录不存在时返回None"""
+        return db.session.execute(
+            db.select(cls.effective_trade_id).where(cls.trade_id == trade_id)
+        ).scalar_one_or_none()
+    
+    @classmethod
+    def root_id(cls, trade_id: int) -> Optional[int]:
+        """交易记录所在订正链的根记录ID（根记录被删除后仍为原ID），记录不存在时返回None"""
+        return db.session.execute(
+            db.select(cls.root_trade_id).where(cls.trade_id == trade_id)
+        ).scalar_one_or_none()
+    
+    @classmethod
+    def chain_ids(cls, trade_id: int) -> List[int]:
+        """交易记录所在订正链的全部记录ID（按订正深度排序），记录不存在时返回空列表"""
+        root = db.select(cls.root_trade_id).where(cls.trade_id == trade_id).scalar_subquery()
+        return list(db.session.execute(
+            db.select(cls.trade_id).where(cls.root_trade_id == root).order_by(cls.depth, cls.trade_id)
+        ).scalars())
+    
+    def __repr__(self):
+        return f'<EffectiveTrade {self.trade_id} -> {self.effective_trade_id}>'
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_effective_trade_triggers(target, connection, **kw):
+    """建表后建立有效交易映射的同步触发器"""
+    EffectiveTrade.create_all(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_effective_trade_triggers(target, connection, **kw):
+    """删表前删除同步触发器"""
+    EffectiveTrade.drop_all(connection)
@@ -2,19 +2,29 @@
 历史交易记录数据模型
 """
 import json
+import re
+import threading
 from datetime import datetime
 from decimal import Decimal
+import numpy as np
+from sqlalchemy import event, text
 from extensions import db
-from models.base import BaseModel
+from models.base import BaseModel, DataVersionMixin
+from models.trade_record import TradeRecord
 from utils.validators import validate_stock_code, validate_price
 from error_handlers import ValidationError
+from utils.structured_logging import get_logger, lazy
 
+logger = get_logger(__name__)
 
-class HistoricalTrade(BaseModel):
+
+class HistoricalTrade(DataVersionMixin, BaseModel):
     """历史交易记录模型 - 存储已完成的完整交易"""
     
     __tablename__ = 'historical_trades'
     
+    serialize_as_float = ('total_investment', 'total_return', 'return_rate')
+    
     # 基本信息
     stock_code = db.Column(db.String(10), nullable=False, index=True)
     stock_name = db.Column(db.String(50), nullable=False)
@@ -47,25 +57,23 @@ class HistoricalTrade(BaseModel):
         db.Index('idx_historical_return_rate', 'return_rate'),
     )
     
+    # 上次同步后交易记录发生变更的股票和被删除的交易记录ID（进程内）
+    _changes_lock = threading.Lock()
+    _changed_codes = set()
+    _deleted_trade_ids = set()
+    
     def __init__(self, **kwargs):
         """初始化历史交易记录"""
-        from flask import current_app
-        current_app.logger.info(f"=== HistoricalTrade.__init__ 开始 ===")
-        current_app.logger.info(f"初始化参数: {kwargs}")
+        logger.debug("创建历史交易记录", params=lazy(lambda: dict(kwargs)))
         
         # 数据验证
         self._validate_data(kwargs)
         
         # 调用父类构造函数
         super().__init__(**kwargs)
-        
-        current_app.logger.info("=== HistoricalTrade.__init__ 完成 ===")
     
     def _validate_data(self, data):
         """验证历史交易数据"""
-        from flask import current_app
-        current_app.logger.info(f"=== _validate_data 开始 ===")
-        
         # 验证股票代码
         if 'stock_code' in data:
             validate_stock_code(data['stock_code'])
@@ -95,8 +103,54 @@ class HistoricalTrade(BaseModel):
                         data[field] = json.dumps(data[field])
                 except (json.JSONDecodeError, TypeError):
                     raise ValidationError(f"{field}必须是有效的JSON格式", field)
+    
+    @classmethod
+    def validate_rows(cls, rows):
+        """
+        批量验证历史交易数据（与 _validate_data 规则一致），整列一次性判断
+        
+        Args:
+            rows: 历史交易数据字典列表，记录ID列表字段会被就地转换为JSON字符串
+            
+        Returns:
+            Dict[int, str]: 验证失败的行下标及错误信息
+        """
+        errors = {}
+        if not rows:
+            return errors
+        
+        def fail(mask, message):
+            for index in np.flatnonzero(mask):
+                errors.setdefault(int(index), message)
+        
+        stock_codes = np.array([row.get('stock_code') or '' for row in rows], dtype=object)
+        code_valid = np.vectorize(lambda code: bool(re.fullmatch(r'\d{6}', code)), otypes=[bool])(stock_codes)
+        fail(~code_valid, "股票代码格式不正确，应为6位数字")
+        
+        investments = np.array([
+            float(row['total_investment']) if row.get('total_investment') is not None else np.nan
+            for row in rows
+        ])
+        fail(~(investments > 0), "总投入本金必须大于0")
+        
+        holding_days = np.array([
+            row['holding_days'] if row.get('holding_days') is not None else -1 for row in rows
+        ])
+        fail(holding_days < 0, "持仓天数不能为负数")
         
-        current_app.logger.info("=== _validate_data 完成 ===")
+        buy_dates = np.array([row.get('buy_date') for row in rows], dtype='datetime64[us]')
+        sell_dates = np.array([row.get('sell_date') for row in rows], dtype='datetime64[us]')
+        fail(sell_dates < buy_dates, "卖出日期不能早于买入日期")
+        
+        for field in ('buy_records_ids', 'sell_records_ids'):
+            for index, row in enumerate(rows):
+                value = row.get(field)
+                if isinstance(value, list):
+                    row[field] = json.dumps(value)
+                elif value is not None and not isinstance(value, str):
+                    errors.setdefault(index, f"{field}必须是有效的JSON格式")
+        
+        return errors
     
     @property
     def buy_records_list(self):
@@ -178,11 +232,6 @@ class HistoricalTrade(BaseModel):
         """转换为字典，包含特殊字段处理"""
         result = super().to_dict()
         
-        # 转换Decimal类型为float
-        for field in ['total_investment', 'total_return', 'return_rate']:
-            if result.get(field) is not None:
-                result[field] = float(result[field])
-        
         # 添加记录ID列表
         result['buy_records_list'] = self.buy_records_list
         result['sell_records_list'] = self.sell_records_list
@@ -193,4 +242,125 @@ class HistoricalTrade(BaseModel):
         return result
     
     def __repr__(self):
-        return f'<HistoricalTrade {self.stock_code} {self.buy_date.strftime("%Y-%m-%d")} -> {self.sell_date.strftime("%Y-%m-%d")}>'
\ No newline at end of file
+        return f'<HistoricalTrade {self.stock_code} {self.buy_date.strftime("%Y-%m-%d")} -> {self.sell_date.strftime("%Y-%m-%d")}>'
+    
+    @classmethod
+    def mark_trades_changed(cls, stock_codes, deleted_trade_ids=()):
+        """记录交易记录变更涉及的股票，供增量同步使用"""
+        with cls._changes_lock:
+            cls._changed_codes.update(code for code in stock_codes if code)
+            cls._deleted_trade_ids.update(trade_id for trade_id in deleted_trade_ids if trade_id)
+    
+    @classmethod
+    def take_trade_changes(cls):
+        """取出并清空已记录的变更，返回 (股票代码集合, 被删除的交易记录ID集合)"""
+        with cls._changes_lock:
+            changes = (cls._changed_codes, cls._deleted_trade_ids)
+            cls._changed_codes = set()
+            cls._deleted_trade_ids = set()
+            return changes
+
+
+class HistoricalTradeLink(db.Model):
+    """历史交易与交易记录的关联表（买入/卖出）
+    
+    与 buy_records_ids/sell_records_ids JSON列同步维护，完整性检查和
+    "某条交易记录属于哪个交易周期"的反向查询都通过关联表一次连接完成。
+    """
+    
+    __tablename__ = 'historical_trade_links'
+    
+    historical_trade_id = db.Column(
+        db.Integer, db.ForeignKey('historical_trades.id', ondelete='CASCADE'), primary_key=True
+    )
+    # 不随交易记录级联删除，失效的引用由完整性检查发现
+    trade_record_id = db.Column(db.Integer, db.ForeignKey('trade_records.id'), primary_key=True)
+    side = db.Column(db.String(4), nullable=False)  # 'buy' or 'sell'
+    
+    __table_args__ = (
+        db.CheckConstraint("side IN ('buy', 'sell')", name='check_link_side'),
+        db.Index('idx_historical_link_record', 'trade_record_id', 'side'),
+        db.Index('idx_historical_link_trade_side', 'historical_trade_id', 'side'),
+    )
+    
+    # 根据JSON列补齐没有任何关联的历史交易记录（迁移和批量插入使用）
+    BACKFILL_SQL = text("""
+        INSERT OR IGNORE INTO historical_trade_links (historical_trade_id, trade_record_id, side)
+        SELECT ht.id, CAST(je.value AS INTEGER), 'buy'
+        FROM historical_trades ht, json_each(ht.buy_records_ids) je
+        WHERE json_valid(ht.buy_records_ids)
+          AND NOT EXISTS (SELECT 1 FROM historical_trade_links l WHERE l.historical_trade_id = ht.id)
+        UNION ALL
+        SELECT ht.id, CAST(je.value AS INTEGER), 'sell'
+        FROM historical_trades ht, json_each(ht.sell_records_ids) je
+        WHERE json_valid(ht.sell_records_ids)
+          AND NOT EXISTS (SELECT 1 FROM historical_trade_links l WHERE l.historical_trade_id = ht.id)
+    """)
+    
+    @classmethod
+    def backfill_from_json(cls, session) -> int:
+        """为尚无关联的历史交易记录按JSON列生成关联，返回新增的关联数"""
+        return session.execute(cls.BACKFILL_SQL).rowcount
+    
+    @classmethod
+    def replace_links(cls, connection, historical_trade: 'HistoricalTrade') -> None:
+        """按历史交易记录当前的JSON列重建其关联"""
+        connection.execute(
+            cls.__table__.delete().where(cls.historical_trade_id == historical_trade.id)
+        )
+        rows = [
+            {'historical_trade_id': historical_trade.id, 'trade_record_id': record_id, 'side': side}
+            for side, record_ids in (('buy', historical_trade.buy_records_list),
+                                     ('sell', historical_trade.sell_records_list))
+            for record_id in dict.fromkeys(record_ids)
+        ]
+        if rows:
+            connection.execute(cls.__table__.insert().prefix_with('OR IGNORE'), rows)
+    
+    @classmethod
+    def get_historical_trades_for_record(cls, trade_record_id: int):
+        """反向查询包含指定交易记录的历史交易记录"""
+        return HistoricalTrade.query.join(
+            cls, cls.historical_trade_id == HistoricalTrade.id
+        ).filter(cls.trade_record_id == trade_record_id).order_by(
+            HistoricalTrade.completion_date.desc()
+        ).all()
+    
+    def __repr__(self):
+        return f'<HistoricalTradeLink {self.historical_trade_id} {self.side} {self.trade_record_id}>'
+
+
+@event.listens_for(HistoricalTrade, 'after_insert')
+def _create_links(mapper, connection, target):
+    """新建历史交易记录时写入关联"""
+    HistoricalTradeLink.replace_links(connection, target)
+
+
+@event.listens_for(HistoricalTrade, 'after_update')
+def _update_links(mapper, connection, target):
+    """买入/卖出记录ID列表变化时重建关联"""
+    state = db.inspect(target)
+    if state.attrs.buy_records_ids.history.has_changes() or state.attrs.sell_records_ids.history.has_changes():
+        HistoricalTradeLink.replace_links(connection, target)
+
+
+@event.listens_for(HistoricalTrade, 'after_delete')
+def _delete_links(mapper, connection, target):
+    """删除历史交易记录时删除关联（SQLite默认不执行外键级联）"""
+    connection.execute(
+        HistoricalTradeLink.__table__.delete().where(HistoricalTradeLink.historical_trade_id == target.id)
+    )
+
+
+@event.listens_for(TradeRecord, 'after_insert')
+@event.listens_for(TradeRecord, 'after_update')
+def _mark_trade_changed(mapper, connection, target):
+    """交易记录新增或修改时记录所属股票（修改股票代码时新旧代码都记录）"""
+    history = db.inspect(target).attrs.stock_code.history
+    HistoricalTrade.mark_trades_changed([target.stock_code, *(history.deleted or ())])
+
+
+@event.listens_for(TradeRecord, 'after_delete')
+def _mark_trade_deleted(mapper, connection, target):
+    """交易记录删除时记录所属股票和记录ID"""
+    HistoricalTrade.mark_trades_changed([target.stock_code], [target.id])
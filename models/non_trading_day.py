@@ -2,7 +2,7 @@
 非交易日数据模型
 """
 from datetime import date, timedelta
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, event
 from extensions import db
 from .base import BaseModel
 
@@ -20,6 +20,29 @@ class NonTradingDay(BaseModel):
     def __repr__(self):
         return f'<NonTradingDay {self.date} - {self.name}>'
     
+    # 进程内交易日历缓存，非交易日变更时失效
+    _calendar = None
+    
+    @classmethod
+    def get_calendar(cls):
+        """获取内存交易日历（首次调用时一次性加载所有非交易日）"""
+        calendar = cls._calendar
+        if calendar is None:
+            from utils.trading_calendar import TradingCalendar
+            calendar = TradingCalendar(cls._load_non_trading_dates())
+            cls._calendar = calendar
+        return calendar
+    
+    @classmethod
+    def invalidate_calendar(cls):
+        """使交易日历缓存失效，下次查询时重新加载"""
+        cls._calendar = None
+    
+    @classmethod
+    def _load_non_trading_dates(cls):
+        """加载所有配置的非交易日日期"""
+        return [row.date for row in db.session.query(cls.date).all()]
+    
     @classmethod
     def is_trading_day(cls, check_date):
         """判断是否为交易日"""
@@ -30,9 +53,7 @@ class NonTradingDay(BaseModel):
         if check_date.weekday() >= 5:  # 5=Saturday, 6=Sunday
             return False
         
-        # 检查是否在配置的非交易日中
-        non_trading = cls.query.filter_by(date=check_date).first()
-        return non_trading is None
+        return cls.get_calendar().is_trading_day(check_date)
     
     @classmethod
     def calculate_trading_days(cls, start_date, end_date):
@@ -44,16 +65,8 @@ class NonTradingDay(BaseModel):
             
         if start_date > end_date:
             return 0
-            
-        current_date = start_date
-        trading_days = 0
-        
-        while current_date <= end_date:
-            if cls.is_trading_day(current_date):
-                trading_days += 1
-            current_date += timedelta(days=1)
         
-        return trading_days
+        return cls.get_calendar().count_trading_days(start_date, end_date)
     
     @classmethod
     def get_non_trading_days_in_range(cls, start_date, end_date):
@@ -78,32 +91,29 @@ class NonTradingDay(BaseModel):
         """获取指定日期之后的下一个交易日"""
         if isinstance(check_date, str):
             check_date = date.fromisoformat(check_date)
-            
-        next_date = check_date + timedelta(days=1)
-        max_attempts = 30  # 防止无限循环
-        attempts = 0
         
-        while not cls.is_trading_day(next_date) and attempts < max_attempts:
-            next_date += timedelta(days=1)
-            attempts += 1
-            
-        return next_date if attempts < max_attempts else None
+        return cls.get_calendar().next_trading_day(check_date)
     
     @classmethod
     def get_previous_trading_day(cls, check_date):
         """获取指定日期之前的上一个交易日"""
         if isinstance(check_date, str):
             check_date = date.fromisoformat(check_date)
-            
-        prev_date = check_date - timedelta(days=1)
-        max_attempts = 30  # 防止无限循环
-        attempts = 0
         
-        while not cls.is_trading_day(prev_date) and attempts < max_attempts:
-            prev_date -= timedelta(days=1)
-            attempts += 1
-            
-        return prev_date if attempts < max_attempts else None
+        return cls.get_calendar().previous_trading_day(check_date)
+    
+    @classmethod
+    def calculate_trading_days_bulk(cls, start_dates, end_dates):
+        """批量计算多组日期区间的交易日数量，返回numpy整数数组"""
+        return cls.get_calendar().count_trading_days_bulk(start_dates, end_dates)
+    
+    @classmethod
+    def offset_trading_days(cls, check_date, trading_days):
+        """获取指定日期之后（正数）或之前（负数）第N个交易日"""
+        if isinstance(check_date, str):
+            check_date = date.fromisoformat(check_date)
+        
+        return cls.get_calendar().offset(check_date, trading_days)
     
     def to_dict(self):
         """转换为字典格式"""
@@ -111,4 +121,12 @@ class NonTradingDay(BaseModel):
         # 确保日期格式正确
         if self.date:
             result['date'] = self.date.isoformat()
-        return result
\ No newline at end of file
+        return result
+
+
+@event.listens_for(NonTradingDay, 'after_insert')
+@event.listens_for(NonTradingDay, 'after_update')
+@event.listens_for(NonTradingDay, 'after_delete')
+def _invalidate_trading_calendar(mapper, connection, target):
+    """非交易日记录变更时使交易日历缓存失效"""
+    NonTradingDay.invalidate_calendar()
@@ -12,6 +12,8 @@ class ProfitTakingTarget(BaseModel):
     
     __tablename__ = 'profit_taking_targets'
     
+    serialize_as_float = ('target_price', 'profit_ratio', 'sell_ratio', 'expected_profit_ratio')
+    
     # 关联字段
     trade_record_id = db.Column(db.Integer, db.ForeignKey('trade_records.id'), nullable=False)
     
@@ -195,15 +197,5 @@ class ProfitTakingTarget(BaseModel):
             db.session.rollback()
             raise e
     
-    def to_dict(self):
-        """转换为字典，包含特殊字段处理"""
-        result = super().to_dict()
-        # 转换Decimal类型为float
-        for field in ['target_price', 'profit_ratio', 'sell_ratio', 'expected_profit_ratio']:
-            if result.get(field) is not None:
-                result[field] = float(result[field])
-        
-        return result
-    
     def __repr__(self):
         return f'<ProfitTakingTarget {self.trade_record_id} #{self.sequence_order} {self.target_price}>'
\ No newline at end of file
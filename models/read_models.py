@@ -0,0 +1,104 @@
+"""
+交易记录只读查询模型
+统计分析只需要交易记录的少数几列，这里用 core select() 直接返回命名元组，
+不创建 ORM 对象（没有身份映射、关系和变更跟踪），价格在 SQL 中换算为整数分，读取时不经过 Decimal
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, NamedTuple, Optional
+
+from extensions import db
+from models.trade_record import TradeRecord
+from utils.money import fen_to_decimal, to_fen
+
+# 单次IN查询的最大参数数量（SQLite默认限制为999）
+BATCH_QUERY_SIZE = 500
+
+
+class TradeRow(NamedTuple):
+    """统计分析使用的交易记录行"""
+    
+    id: int
+    stock_code: str
+    stock_name: str
+    trade_type: str
+    price_fen: int
+    quantity: int
+    trade_date: datetime
+    
+    @property
+    def price(self) -> Decimal:
+        """成交价（元），与 TradeRecord.price 的取值一致"""
+        return fen_to_decimal(self.price_fen)
+    
+    @property
+    def amount_fen(self) -> int:
+        """成交金额（分）"""
+        return self.price_fen * self.quantity
+
+
+def price_fen_of(trade) -> int:
+    """成交价（分）：TradeRow 直接取 price_fen，ORM 记录等其他对象由 price 换算"""
+    return trade.price_fen if isinstance(trade, TradeRow) else to_fen(trade.price)
+
+
+class TradeReadModel:
+    """交易记录只读查询"""
+    
+    COLUMNS = (
+        TradeRecord.id,
+        TradeRecord.stock_code,
+        TradeRecord.stock_name,
+        TradeRecord.trade_type,
+        db.cast(db.func.round(TradeRecord.price * 100), db.Integer).label('price_fen'),
+        TradeRecord.quantity,
+        TradeRecord.trade_date
+    )
+    
+    @classmethod
+    def select_trades(cls, *criteria, include_corrected: bool = False, order_by_stock: bool = True):
+        """
+        构造交易记录行查询
+        
+        Args:
+            *criteria: 附加的过滤条件
+            include_corrected: 是否包含已被订正的记录
+            order_by_stock: 是否按股票代码、交易日期排序
+        """
+        stmt = db.select(*cls.COLUMNS)
+        if not include_corrected:
+            stmt = stmt.where(TradeRecord.is_corrected == False)
+        if criteria:
+            stmt = stmt.where(*criteria)
+        if order_by_stock:
+            stmt = stmt.order_by(TradeRecord.stock_code.asc(), TradeRecord.trade_date.asc(), TradeRecord.id.asc())
+        return stmt
+    
+    @classmethod
+    def load_trades(cls, *criteria, stock_codes: Optional[Iterable[str]] = None,
+                    include_corrected: bool = False, order_by_stock: bool = True) -> List[TradeRow]:
+        """
+        查询交易记录行
+        
+        Args:
+            *criteria: 附加的过滤条件
+            stock_codes: 只查询指定股票（可选，按批执行IN查询，同一股票的记录总在同一批内）
+            include_corrected: 是否包含已被订正的记录
+            order_by_stock: 是否按股票代码、交易日期排序
+        
+        Returns:
+            List[TradeRow]: 交易记录行
+        """
+        if stock_codes is None:
+            stmt = cls.select_trades(*criteria, include_corrected=include_corrected, order_by_stock=order_by_stock)
+            return [TradeRow._make(row) for row in db.session.execute(stmt)]
+        
+        codes = sorted(set(stock_codes))
+        rows = []
+        for i in range(0, len(codes), BATCH_QUERY_SIZE):
+            stmt = cls.select_trades(
+                TradeRecord.stock_code.in_(codes[i:i + BATCH_QUERY_SIZE]), *criteria,
+                include_corrected=include_corrected, order_by_stock=order_by_stock
+            )
+            rows.extend(TradeRow._make(row) for row in db.session.execute(stmt))
+        return rows
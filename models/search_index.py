@@ -0,0 +1,233 @@
+"""
+全文检索索引
+为交易记录、复盘、案例、股票池和历史交易建立 SQLite FTS5 外部内容索引（trigram分词，支持中文子串），
+索引由源表上的触发器同步维护
+"""
+import re
+import weakref
+from typing import List, Sequence, Tuple
+
+from sqlalchemy import event, text, select, or_, table, column, literal_column
+from sqlalchemy.exc import OperationalError
+from extensions import db
+
+
+class SearchIndex:
+    """FTS5 全文索引定义与查询"""
+    
+    # 索引名称 -> (源表, 索引列)
+    INDEXES = {
+        'trades': ('trade_records', ('stock_code', 'stock_name', 'reason', 'notes')),
+        'reviews': ('review_records', ('stock_code', 'analysis', 'reason')),
+        'cases': ('case_studies', ('stock_code', 'title', 'notes', 'tags')),
+        'stocks': ('stock_pool', ('stock_code', 'stock_name', 'add_reason')),
+        'historical_trades': ('historical_trades', ('stock_code', 'stock_name')),
+    }
+    
+    # trigram 分词的最短可索引长度，更短的词只能扫描索引表
+    MIN_TERM_LENGTH = 3
+    
+    # 各数据库引擎是否已建立索引
+    _available = weakref.WeakKeyDictionary()
+    _tables = {}
+    
+    @classmethod
+    def fts_table_name(cls, name: str) -> str:
+        """索引表名"""
+        return f'{cls.INDEXES[name][0]}_fts'
+    
+    @classmethod
+    def fts_table(cls, name: str):
+        """索引表的轻量表对象，用于构造查询"""
+        return cls._lightweight_table(cls.fts_table_name(name), 'rowid', cls.INDEXES[name][1])
+    
+    @classmethod
+    def source_table(cls, name: str):
+        """源表的轻量表对象（只含ID和索引列）"""
+        source, columns = cls.INDEXES[name]
+        return cls._lightweight_table(source, 'id', columns)
+    
+    @classmethod
+    def _lightweight_table(cls, table_name: str, key: str, columns: Sequence[str]):
+        """同名表复用同一个表对象，避免同一查询中出现重复的FROM"""
+        lightweight = cls._tables.get(table_name)
+        if lightweight is None:
+            lightweight = cls._tables[table_name] = table(
+                table_name, column(key), *(column(c) for c in columns)
+            )
+        return lightweight
+    
+    @classmethod
+    def ddl_statements(cls, name: str) -> List[str]:
+        """建立索引表和同步触发器的语句"""
+        source, columns = cls.INDEXES[name]
+        fts = cls.fts_table_name(name)
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{c}' for c in columns)
+        old_values = ', '.join(f'old.{c}' for c in columns)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{column_list}, content='{source}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {source} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        ]
+    
+    @classmethod
+    def create_all(cls, connection) -> bool:
+        """
+        建立全部索引，新建的索引从源表重建内容
+        
+        Returns:
+            bool: 是否建立成功（SQLite未启用FTS5或trigram分词时返回False，查询回退到LIKE）
+        """
+        if connection.dialect.name != 'sqlite':
+            return False
+        
+        try:
+            for name in cls.INDEXES:
+                fts = cls.fts_table_name(name)
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+                ).first() is not None
+                for statement in cls.ddl_statements(name):
+                    connection.execute(text(statement))
+                if not exists:
+                    connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        except OperationalError:
+            cls._available[connection.engine] = False
+            return False
+        
+        cls._available[connection.engine] = True
+        return True
+    
+    @classmethod
+    def drop_all(cls, connection) -> None:
+        """删除全部索引表和触发器"""
+        if connection.dialect.name != 'sqlite':
+            return
+        for name in cls.INDEXES:
+            fts = cls.fts_table_name(name)
+            for suffix in ('ai', 'ad', 'au'):
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {fts}_{suffix}"))
+            connection.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+        cls._available.pop(connection.engine, None)
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        """当前数据库是否已建立索引"""
+        engine = db.engine
+        available = cls._available.get(engine)
+        if available is None:
+            if engine.dialect.name != 'sqlite':
+                available = False
+            else:
+                with engine.connect() as connection:
+                    available = all(
+                        connection.execute(
+                            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                            {'name': cls.fts_table_name(name)}
+                        ).first() is not None
+                        for name in cls.INDEXES
+                    )
+            cls._available[engine] = available
+        return available
+    
+    @classmethod
+    def like_filter(cls, model, name: str, column_name: str, pattern: str):
+        """
+        与 column LIKE pattern 等价的筛选条件
+        
+        模式中有不少于3个字符的连续字面量时在索引上匹配，否则直接在源表上 LIKE
+        （trigram 索引无法匹配更短的片段）。
+        
+        Args:
+            model: 源表模型
+            name: 索引名称
+            column_name: 索引列
+            pattern: LIKE 模式
+        """
+        literal_runs = re.split(r'[%_]', pattern)
+        if max(len(run) for run in literal_runs) < cls.MIN_TERM_LENGTH or not cls.is_available():
+            return getattr(model, column_name).like(pattern)
+        
+        fts = cls.fts_table(name)
+        return model.id.in_(select(fts.c.rowid).where(fts.c[column_name].like(pattern)))
+    
+    @classmethod
+    def keyword_filter(cls, model, name: str, keyword: str, columns: Sequence[str] = None):
+        """
+        任一列包含关键词的筛选条件（子串匹配），与各列 LIKE '%keyword%' 取或等价
+        
+        Args:
+            model: 源表模型
+            name: 索引名称
+            keyword: 关键词
+            columns: 参与匹配的列（可选，默认全部索引列）
+        """
+        columns = tuple(columns or cls.INDEXES[name][1])
+        if len(keyword) < cls.MIN_TERM_LENGTH or not cls.is_available():
+            return or_(*(getattr(model, c).like(f'%{keyword}%') for c in columns))
+        
+        fts = cls.fts_table(name)
+        return model.id.in_(select(fts.c.rowid).where(cls._match(name, [keyword], columns)))
+    
+    @classmethod
+    def search(cls, name: str, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        全文检索，按相关度排序
+        
+        空白分隔的多个词须同时出现（子串匹配）；长度不少于3的词在索引上匹配并按 bm25 排序，
+        更短的词在源表上 LIKE 过滤；只有短词时按记录ID倒序返回。索引不可用时全部使用 LIKE。
+        
+        Returns:
+            List[Tuple[int, float]]: (源表记录ID, 相关度得分，越大越相关)
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        
+        source = cls.source_table(name)
+        columns = cls.INDEXES[name][1]
+        if cls.is_available():
+            long_terms = [term for term in terms if len(term) >= cls.MIN_TERM_LENGTH]
+            short_terms = [term for term in terms if len(term) < cls.MIN_TERM_LENGTH]
+        else:
+            long_terms, short_terms = [], terms
+        
+        conditions = [or_(*(source.c[c].like(f'%{term}%') for c in columns)) for term in short_terms]
+        if long_terms:
+            fts = cls.fts_table(name)
+            rank = literal_column(f'bm25({cls.fts_table_name(name)})')
+            statement = select(source.c.id, rank).select_from(
+                source.join(fts, fts.c.rowid == source.c.id)
+            ).where(cls._match(name, long_terms, columns), *conditions).order_by(rank)
+        else:
+            statement = select(source.c.id, literal_column('0')).where(*conditions).order_by(source.c.id.desc())
+        
+        rows = db.session.execute(statement.limit(limit)).all()
+        return [(row[0], -float(row[1]) or 0.0) for row in rows]
+    
+    @classmethod
+    def _match(cls, name: str, terms: Sequence[str], columns: Sequence[str]):
+        """索引表上的 MATCH 条件，每个词作为短语（trigram 下即子串）且须同时出现"""
+        phrases = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        if set(columns) != set(cls.INDEXES[name][1]):
+            phrases = '{%s} : (%s)' % (' '.join(columns), phrases)
+        return literal_column(cls.fts_table_name(name)).op('MATCH')(phrases)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_indexes(target, connection, **kw):
+    """建表后建立全文索引"""
+    SearchIndex.create_all(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_indexes(target, connection, **kw):
+    """删表前删除全文索引"""
+    SearchIndex.drop_all(connection)
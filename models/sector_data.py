@@ -4,15 +4,18 @@
 import json
 from datetime import date
 from extensions import db
-from models.base import BaseModel
+from models.base import BaseModel, DataVersionMixin
 from error_handlers import ValidationError
 
 
-class SectorData(BaseModel):
+class SectorData(DataVersionMixin, BaseModel):
     """板块数据模型"""
     
     __tablename__ = 'sector_data'
     
+    serialize_as_float = ('change_percent', 'market_cap')
+    serialize_as_iso_date = ('record_date',)
+    
     sector_name = db.Column(db.String(50), nullable=False, index=True)
     sector_code = db.Column(db.String(20))
     change_percent = db.Column(db.Numeric(5, 2), nullable=False)
@@ -135,18 +138,6 @@ class SectorData(BaseModel):
         """检查指定日期是否已有数据"""
         return cls.query.filter_by(record_date=target_date).first() is not None
     
-    def to_dict(self):
-        """转换为字典，包含特殊字段处理"""
-        result = super().to_dict()
-        # 转换Decimal类型为float
-        for field in ['change_percent', 'market_cap']:
-            if result.get(field) is not None:
-                result[field] = float(result[field])
-        # 转换日期
-        if result.get('record_date'):
-            result['record_date'] = result['record_date'].isoformat()
-        return result
-    
     def __repr__(self):
         return f'<SectorData {self.sector_name} {self.change_percent}% {self.record_date}>'
 
@@ -12,6 +12,8 @@ class StockPool(BaseModel):
     
     __tablename__ = 'stock_pool'
     
+    serialize_as_float = ('target_price',)
+    
     stock_code = db.Column(db.String(10), nullable=False, index=True)
     stock_name = db.Column(db.String(50), nullable=False)
     pool_type = db.Column(db.String(20), nullable=False)  # 'watch' or 'buy_ready'
@@ -95,13 +97,5 @@ class StockPool(BaseModel):
             self.add_reason = f"{self.add_reason} | 移除原因: {reason}"
         return self.save()
     
-    def to_dict(self):
-        """转换为字典，包含特殊字段处理"""
-        result = super().to_dict()
-        # 转换Decimal类型为float
-        if result.get('target_price') is not None:
-            result['target_price'] = float(result['target_price'])
-        return result
-    
     def __repr__(self):
         return f'<StockPool {self.stock_code} {self.pool_type} {self.status}>'
\ No newline at end of file
@@ -1,7 +1,8 @@
 """
 股票价格数据模型
 """
-from datetime import date
+from datetime import date, timedelta
+from sqlalchemy import event
 from extensions import db
 from models.base import BaseModel
 from utils.validators import validate_stock_code, validate_price
@@ -13,6 +14,9 @@ class StockPrice(BaseModel):
     
     __tablename__ = 'stock_prices'
     
+    serialize_as_float = ('current_price', 'change_percent')
+    serialize_as_iso_date = ('record_date',)
+    
     stock_code = db.Column(db.String(10), nullable=False, index=True)
     stock_name = db.Column(db.String(50))
     current_price = db.Column(db.Numeric(10, 2))
@@ -50,10 +54,81 @@ class StockPrice(BaseModel):
         if 'record_date' in data and data['record_date'] is None:
             raise ValidationError("记录日期不能为空", "record_date")
     
+    # 单次IN查询的最大参数数量（SQLite默认限制为999）
+    BATCH_QUERY_SIZE = 500
+    
     @classmethod
     def get_latest_price(cls, stock_code):
         """获取股票最新价格"""
-        return cls.query.filter_by(stock_code=stock_code).order_by(cls.record_date.desc()).first()
+        return cls.get_latest_prices([stock_code]).get(stock_code)
+    
+    @classmethod
+    def get_latest_prices(cls, stock_codes):
+        """批量获取多只股票的最新价格
+        
+        每批股票只执行一次查询（按股票分组取最大日期再关联回价格表），
+        在请求上下文中结果会被缓存，同一请求内重复查询不再访问数据库。
+        
+        Returns:
+            Dict[str, StockPrice]: {股票代码: 最新价格记录}，无价格数据的股票不包含在结果中
+        """
+        codes = list(dict.fromkeys(code for code in stock_codes if code))
+        memo = cls._get_request_memo()
+        
+        result = {}
+        missing = []
+        for code in codes:
+            if memo is not None and code in memo:
+                if memo[code] is not None:
+                    result[code] = memo[code]
+            else:
+                missing.append(code)
+        
+        for i in range(0, len(missing), cls.BATCH_QUERY_SIZE):
+            batch = missing[i:i + cls.BATCH_QUERY_SIZE]
+            
+            latest_dates = db.session.query(
+                cls.stock_code,
+                db.func.max(cls.record_date).label('max_date')
+            ).filter(cls.stock_code.in_(batch)).group_by(cls.stock_code).subquery()
+            
+            rows = cls.query.join(
+                latest_dates,
+                db.and_(
+                    cls.stock_code == latest_dates.c.stock_code,
+                    cls.record_date == latest_dates.c.max_date
+                )
+            ).all()
+            
+            fetched = {row.stock_code: row for row in rows}
+            result.update(fetched)
+            
+            if memo is not None:
+                for code in batch:
+                    memo[code] = fetched.get(code)
+        
+        return result
+    
+    @staticmethod
+    def _get_request_memo():
+        """获取当前请求的最新价格缓存，不在请求上下文中时返回None"""
+        from flask import g, has_request_context
+        if not has_request_context():
+            return None
+        if not hasattr(g, '_latest_price_memo'):
+            g._latest_price_memo = {}
+        return g._latest_price_memo
+    
+    @classmethod
+    def clear_request_memo(cls, stock_code=None):
+        """清除当前请求的最新价格缓存（价格写入后调用）"""
+        memo = cls._get_request_memo()
+        if memo is None:
+            return
+        if stock_code is None:
+            memo.clear()
+        else:
+            memo.pop(stock_code, None)
     
     @classmethod
     def get_price_by_date(cls, stock_code, target_date):
@@ -73,6 +148,8 @@ class StockPrice(BaseModel):
         if record_date is None:
             record_date = date.today()
         
+        cls.clear_request_memo(stock_code)
+        
         # 查找是否存在记录
         existing = cls.query.filter_by(stock_code=stock_code, record_date=record_date).first()
         
@@ -93,17 +170,126 @@ class StockPrice(BaseModel):
             )
             return new_price.save()
     
-    def to_dict(self):
-        """转换为字典，包含特殊字段处理"""
-        result = super().to_dict()
-        # 转换Decimal类型为float
-        for field in ['current_price', 'change_percent']:
-            if result.get(field) is not None:
-                result[field] = float(result[field])
-        # 转换日期
-        if result.get('record_date'):
-            result['record_date'] = result['record_date'].isoformat()
-        return result
+    def __repr__(self):
+        return f'<StockPrice {self.stock_code} {self.current_price} {self.record_date}>'
+
+class StockPriceArchive(BaseModel):
+    """股票价格归档模型（按周/按月压缩的历史价格）
+    
+    超出日线保留期的价格不再逐日存储，而是聚合为周期OHLC记录。
+    周期不跨月（月初所在的半周单独成段），因此周线可以精确合并为月线。
+    """
+    
+    __tablename__ = 'stock_price_archives'
+    
+    PERIOD_WEEK = 'week'
+    PERIOD_MONTH = 'month'
+    PERIOD_TYPES = (PERIOD_WEEK, PERIOD_MONTH)
+    
+    stock_code = db.Column(db.String(10), nullable=False, index=True)
+    stock_name = db.Column(db.String(50))
+    period_type = db.Column(db.String(10), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    first_date = db.Column(db.Date, nullable=False)
+    last_date = db.Column(db.Date, nullable=False)
+    open_price = db.Column(db.Numeric(10, 2))
+    high_price = db.Column(db.Numeric(10, 2))
+    low_price = db.Column(db.Numeric(10, 2))
+    close_price = db.Column(db.Numeric(10, 2))
+    close_change_percent = db.Column(db.Numeric(5, 2))
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # 表约束
+    __table_args__ = (
+        db.UniqueConstraint('stock_code', 'period_type', 'period_start', name='unique_stock_price_archive_period'),
+        db.Index('idx_stock_price_archive_code_date', 'stock_code', 'first_date', 'last_date'),
+        db.CheckConstraint("period_type IN ('week', 'month')", name='check_archive_period_type'),
+    )
+    
+    @classmethod
+    def get_period_bounds(cls, record_date, period_type):
+        """计算日期所在周期的起止日期（周线在月边界处截断）"""
+        month_start = record_date.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        month_end = next_month - timedelta(days=1)
+        
+        if period_type == cls.PERIOD_MONTH:
+            return month_start, month_end
+        if period_type == cls.PERIOD_WEEK:
+            week_start = record_date - timedelta(days=record_date.weekday())
+            week_end = week_start + timedelta(days=6)
+            return max(week_start, month_start), min(week_end, month_end)
+        raise ValidationError(f"不支持的归档周期: {period_type}", "period_type")
+    
+    @classmethod
+    def get_covering_period(cls, stock_code, target_date):
+        """获取覆盖指定日期的归档记录（存在重叠时优先返回粒度更细的周线）"""
+        return cls.query.filter(
+            cls.stock_code == stock_code,
+            cls.period_start <= target_date,
+            cls.period_end >= target_date
+        ).order_by(cls.period_end.asc()).first()
+    
+    @classmethod
+    def get_latest_before(cls, stock_code, target_date):
+        """获取指定日期及之前最后一条归档记录（周期最后交易日不晚于该日期，存在重叠时优先返回周线）"""
+        return cls.query.filter(
+            cls.stock_code == stock_code,
+            cls.last_date <= target_date
+        ).order_by(cls.last_date.desc(), cls.period_end.asc()).first()
+    
+    @classmethod
+    def get_range(cls, stock_code, start_date, end_date):
+        """获取与日期区间有交集的归档记录，按日期升序"""
+        return cls.query.filter(
+            cls.stock_code == stock_code,
+            cls.last_date >= start_date,
+            cls.first_date <= end_date
+        ).order_by(cls.first_date.asc()).all()
+    
+    def merge_bar(self, first_date, last_date, open_price, high_price, low_price,
+                  close_price, close_change_percent, sample_count, stock_name=None):
+        """将一段OHLC聚合数据合并进当前归档记录"""
+        if self.first_date is None or first_date < self.first_date:
+            self.first_date = first_date
+            self.open_price = open_price
+        if self.last_date is None or last_date >= self.last_date:
+            self.last_date = last_date
+            self.close_price = close_price
+            self.close_change_percent = close_change_percent
+            if stock_name:
+                self.stock_name = stock_name
+        if high_price is not None and (self.high_price is None or high_price > self.high_price):
+            self.high_price = high_price
+        if low_price is not None and (self.low_price is None or low_price < self.low_price):
+            self.low_price = low_price
+        self.sample_count = (self.sample_count or 0) + sample_count
+    
+    def to_price_dict(self):
+        """转换为与StockPrice.to_dict兼容的价格字典（以周期收盘价作为当前价）"""
+        return {
+            'stock_code': self.stock_code,
+            'stock_name': self.stock_name,
+            'current_price': float(self.close_price) if self.close_price is not None else None,
+            'change_percent': float(self.close_change_percent) if self.close_change_percent is not None else None,
+            'record_date': self.last_date.isoformat(),
+            'granularity': self.period_type,
+            'period_start': self.period_start.isoformat(),
+            'period_end': self.period_end.isoformat(),
+            'open_price': float(self.open_price) if self.open_price is not None else None,
+            'high_price': float(self.high_price) if self.high_price is not None else None,
+            'low_price': float(self.low_price) if self.low_price is not None else None,
+            'sample_count': self.sample_count
+        }
     
     def __repr__(self):
-        return f'<StockPrice {self.stock_code} {self.current_price} {self.record_date}>'
\ No newline at end of file
+        return f'<StockPriceArchive {self.stock_code} {self.period_type} {self.period_start} {self.close_price}>'
+
+
+@event.listens_for(StockPrice, 'after_insert')
+@event.listens_for(StockPrice, 'after_update')
+@event.listens_for(StockPrice, 'after_delete')
+def _clear_latest_price_memo(mapper, connection, target):
+    """价格记录变更时清除当前请求中该股票的最新价格缓存"""
+    StockPrice.clear_request_memo(target.stock_code)
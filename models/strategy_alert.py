@@ -0,0 +1,128 @@
+"""
+策略提醒数据模型
+持久化持仓策略提醒，按去重键记录首次/最近触发时间；
+影响提醒的修改记录在会话中，由提醒引擎在同一事务提交前重新评估
+"""
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from extensions import db
+from models.base import BaseModel
+from models.trade_record import TradeRecord
+from models.stock_price import StockPrice
+from models.review_record import ReviewRecord
+from models.trading_strategy import TradingStrategy
+
+
+class StrategyAlert(BaseModel):
+    """策略提醒模型"""
+    
+    __tablename__ = 'strategy_alerts'
+    
+    # 去重键：股票代码 + 当前持仓周期开始日期 + 策略ID + 规则下标
+    dedupe_key = db.Column(db.String(100), nullable=False, unique=True)
+    stock_code = db.Column(db.String(10), nullable=False, index=True)
+    stock_name = db.Column(db.String(50))
+    strategy_id = db.Column(db.Integer, nullable=False, index=True)
+    strategy_name = db.Column(db.String(100))
+    rule_index = db.Column(db.Integer, nullable=False)
+    strategy_rule = db.Column(db.String(200))
+    alert_type = db.Column(db.String(20), nullable=False, index=True)
+    triggered_condition = db.Column(db.String(50))
+    alert_message = db.Column(db.String(200))
+    holding_days = db.Column(db.Integer)
+    buy_price = db.Column(db.Float)
+    current_price = db.Column(db.Float)
+    current_quantity = db.Column(db.Integer)
+    profit_loss_ratio = db.Column(db.Float)
+    profit_loss_amount = db.Column(db.Float)
+    sell_ratio = db.Column(db.Float)
+    suggested_sell_quantity = db.Column(db.Integer)
+    is_active = db.Column(db.Boolean, nullable=False, default=True, index=True)
+    first_seen_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_seen_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    resolved_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_strategy_alert_active_stock', 'is_active', 'stock_code'),
+    )
+    
+    # 提醒内容字段（评估结果直接写入）
+    ALERT_FIELDS = (
+        'stock_code', 'stock_name', 'strategy_id', 'strategy_name', 'rule_index', 'strategy_rule',
+        'alert_type', 'triggered_condition', 'alert_message', 'holding_days', 'buy_price',
+        'current_price', 'current_quantity', 'profit_loss_ratio', 'profit_loss_amount',
+        'sell_ratio', 'suggested_sell_quantity'
+    )
+    
+    @staticmethod
+    def build_dedupe_key(stock_code, holding_start_date, strategy_id, rule_index) -> str:
+        """生成去重键，新的持仓周期产生新的提醒"""
+        return f'{stock_code}|{holding_start_date}|{strategy_id}|{rule_index}'
+    
+    @classmethod
+    def mark_changed(cls, session, stock_codes=None):
+        """标记会话修改了影响提醒的数据，提交前重新评估这些股票（不传股票代码时全量评估）"""
+        if stock_codes is None:
+            session.info['strategy_alert_full'] = True
+        else:
+            session.info.setdefault('strategy_alert_codes', set()).update(code for code in stock_codes if code)
+    
+    @classmethod
+    def take_changes(cls, session):
+        """取出并清空会话中待评估的变更，返回 (是否全量, 股票代码集合)"""
+        return session.info.pop('strategy_alert_full', False), session.info.pop('strategy_alert_codes', set())
+    
+    def apply_alert(self, alert, seen_at: datetime):
+        """写入最新评估结果；已解除的提醒再次触发时开始新的提醒周期"""
+        for field in self.ALERT_FIELDS:
+            setattr(self, field, alert.get(field))
+        if not self.is_active or self.first_seen_at is None:
+            self.first_seen_at = seen_at
+            self.resolved_at = None
+        self.is_active = True
+        self.last_seen_at = seen_at
+    
+    def to_dict(self):
+        """转换为与实时评估结果一致的提醒字典"""
+        result = super().to_dict()
+        for field in ('first_seen_at', 'last_seen_at', 'resolved_at'):
+            value = getattr(self, field)
+            result[field] = value.isoformat() if value else None
+        result['created_at'] = result['first_seen_at']
+        return result
+    
+    def __repr__(self):
+        return f'<StrategyAlert {self.stock_code} {self.alert_type} {"Active" if self.is_active else "Resolved"}>'
+
+
+@event.listens_for(TradeRecord, 'after_insert')
+@event.listens_for(TradeRecord, 'after_update')
+@event.listens_for(TradeRecord, 'after_delete')
+@event.listens_for(StockPrice, 'after_insert')
+@event.listens_for(StockPrice, 'after_update')
+@event.listens_for(StockPrice, 'after_delete')
+@event.listens_for(ReviewRecord, 'after_insert')
+@event.listens_for(ReviewRecord, 'after_update')
+@event.listens_for(ReviewRecord, 'after_delete')
+def _mark_stock_changed(mapper, connection, target):
+    """交易、价格或复盘（手动持仓天数）变更时只重新评估对应股票"""
+    session = object_session(target)
+    if session is not None and target.stock_code:
+        StrategyAlert.mark_changed(session, [target.stock_code])
+
+
+@event.listens_for(TradingStrategy, 'after_insert')
+@event.listens_for(TradingStrategy, 'after_update')
+@event.listens_for(TradingStrategy, 'after_delete')
+def _mark_all_changed(mapper, connection, target):
+    """策略变更影响所有持仓"""
+    session = object_session(target)
+    if session is not None:
+        StrategyAlert.mark_changed(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """回滚的修改不需要重新评估"""
+    StrategyAlert.take_changes(session)
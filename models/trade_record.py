@@ -6,6 +6,9 @@ from extensions import db
 from models.base import BaseModel
 from utils.validators import validate_stock_code, validate_price, validate_quantity, validate_trade_type, validate_ratio
 from error_handlers import ValidationError
+from utils.structured_logging import get_logger, lazy
+
+logger = get_logger(__name__)
 
 
 class TradeRecord(BaseModel):
@@ -13,6 +16,9 @@ class TradeRecord(BaseModel):
     
     __tablename__ = 'trade_records'
     
+    serialize_as_float = ('price', 'stop_loss_price', 'take_profit_ratio', 'sell_ratio',
+                          'expected_loss_ratio', 'expected_profit_ratio')
+    
     # 基本交易信息
     stock_code = db.Column(db.String(10), nullable=False, index=True)
     stock_name = db.Column(db.String(50), nullable=False)
@@ -35,6 +41,9 @@ class TradeRecord(BaseModel):
     # 分批止盈相关字段
     use_batch_profit_taking = db.Column(db.Boolean, default=False)
     
+    # 券商成交编号（批量导入时记录，用于去重）
+    broker_fill_id = db.Column(db.String(50), index=True)
+    
     # 订正相关字段
     is_corrected = db.Column(db.Boolean, default=False)
     original_record_id = db.Column(db.Integer, db.ForeignKey('trade_records.id'))
@@ -47,88 +56,62 @@ class TradeRecord(BaseModel):
     __table_args__ = (
         db.CheckConstraint("trade_type IN ('buy', 'sell')", name='check_trade_type'),
         db.Index('idx_stock_date', 'stock_code', 'trade_date'),
+        # 统计分析只读取未被订正的记录，部分索引只包含这些行
+        db.Index('idx_trade_records_effective_stock', 'stock_code', 'trade_date', 'id',
+                 sqlite_where=db.text('is_corrected = 0')),
+        db.Index('idx_trade_records_effective_date', 'trade_date', sqlite_where=db.text('is_corrected = 0')),
     )
     
     def __init__(self, **kwargs):
-        from flask import current_app
-        current_app.logger.info(f"=== TradeRecord.__init__ 开始 ===")
-        current_app.logger.info(f"初始化参数: {kwargs}")
+        logger.debug("创建交易记录", params=lazy(lambda: dict(kwargs)))
         
         # 数据验证
-        current_app.logger.info("开始数据验证")
         self._validate_data(kwargs)
-        current_app.logger.info("数据验证通过")
         
-        current_app.logger.info("调用父类构造函数")
         super().__init__(**kwargs)
-        current_app.logger.info("父类构造函数完成")
         
         # 如果是买入记录，自动计算止损止盈比例
         if self.trade_type == 'buy' and self.price:
-            current_app.logger.info("开始计算风险收益比")
             self._calculate_risk_reward()
-            current_app.logger.info("风险收益比计算完成")
-        
-        current_app.logger.info("=== TradeRecord.__init__ 完成 ===")
     
     def _validate_data(self, data):
         """验证交易记录数据"""
-        from flask import current_app
-        current_app.logger.info(f"=== _validate_data 开始 ===")
-        current_app.logger.info(f"验证数据: {data}")
-        
         if 'stock_code' in data:
-            current_app.logger.info(f"验证股票代码: {data['stock_code']}")
             validate_stock_code(data['stock_code'])
         
         if 'price' in data:
-            current_app.logger.info(f"验证价格: {data['price']}")
             data['price'] = validate_price(data['price'])
-            current_app.logger.info(f"价格验证后: {data['price']}")
         
         if 'quantity' in data:
             stock_code = data.get('stock_code')
-            current_app.logger.info(f"验证数量: {data['quantity']}, 股票代码: {stock_code}")
             data['quantity'] = validate_quantity(data['quantity'], stock_code)
-            current_app.logger.info(f"数量验证后: {data['quantity']}")
         
         if 'trade_type' in data:
-            current_app.logger.info(f"验证交易类型: {data['trade_type']}")
             validate_trade_type(data['trade_type'])
         
         if 'take_profit_ratio' in data and data['take_profit_ratio'] is not None:
-            current_app.logger.info(f"验证止盈比例: {data['take_profit_ratio']}")
             data['take_profit_ratio'] = validate_ratio(data['take_profit_ratio'], 'take_profit_ratio')
-            current_app.logger.info(f"止盈比例验证后: {data['take_profit_ratio']}")
         
         if 'sell_ratio' in data and data['sell_ratio'] is not None:
-            current_app.logger.info(f"验证卖出比例: {data['sell_ratio']}")
             data['sell_ratio'] = validate_ratio(data['sell_ratio'], 'sell_ratio')
-            current_app.logger.info(f"卖出比例验证后: {data['sell_ratio']}")
         
         # 验证止损价格
         if 'stop_loss_price' in data and data['stop_loss_price'] is not None:
-            current_app.logger.info(f"验证止损价格: {data['stop_loss_price']}")
             # 先验证并转换止损价格为数值类型
             data['stop_loss_price'] = validate_price(data['stop_loss_price'])
-            current_app.logger.info(f"止损价格验证后: {data['stop_loss_price']}")
             
             # 然后进行价格比较
             if 'price' in data and data['stop_loss_price'] >= data['price']:
-                current_app.logger.error(f"止损价格 {data['stop_loss_price']} >= 买入价格 {data['price']}")
+                logger.warning("止损价格不小于买入价格", stop_loss_price=data['stop_loss_price'], price=data['price'])
                 raise ValidationError("止损价格必须小于买入价格", "stop_loss_price")
         
         # 验证交易日期
         if 'trade_date' in data and data['trade_date'] is None:
-            current_app.logger.error("交易日期为None")
             raise ValidationError("交易日期不能为空", "trade_date")
         
         # 验证原因
         if 'reason' in data and not data['reason']:
-            current_app.logger.error(f"交易原因为空: {data['reason']}")
             raise ValidationError("交易原因不能为空", "reason")
-        
-        current_app.logger.info("=== _validate_data 完成 ===")
     
     def _calculate_risk_reward(self):
         """计算风险收益比"""
@@ -206,11 +189,6 @@ class TradeRecord(BaseModel):
     def to_dict(self):
         """转换为字典，包含特殊字段处理"""
         result = super().to_dict()
-        # 转换Decimal类型为float
-        for field in ['price', 'stop_loss_price', 'take_profit_ratio', 'sell_ratio', 
-                     'expected_loss_ratio', 'expected_profit_ratio']:
-            if result.get(field) is not None:
-                result[field] = float(result[field])
         
         # 确保 use_batch_profit_taking 字段有默认值
         if result.get('use_batch_profit_taking') is None:
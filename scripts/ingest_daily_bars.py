@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+日线行情批量拉取脚本
+增量拉取所有交易过、持有和关注股票的日线数据，可用于定时任务
+"""
+import sys
+import os
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.daily_bar_service import DailyBarService
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='日线行情批量拉取工具')
+    parser.add_argument('codes', nargs='*', help='股票代码，默认为所有交易过、持有和关注的股票')
+    parser.add_argument('--start-date', help='新股票首次拉取的开始日期 (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='拉取截止日期 (YYYY-MM-DD)，默认今天')
+    parser.add_argument('--adjust', default='', choices=['', 'qfq', 'hfq'],
+                        help='复权方式，默认不复权')
+    args = parser.parse_args()
+    
+    app = create_app()
+    
+    with app.app_context():
+        service = DailyBarService(adjust=args.adjust)
+        result = service.ingest(
+            stock_codes=args.codes or None,
+            start_date=args.start_date,
+            end_date=args.end_date
+        )
+        
+        print(f"\n=== 日线数据拉取结果 ===")
+        print(f"股票总数: {result['total_stocks']}")
+        print(f"更新股票数: {result['updated_count']}")
+        print(f"无需更新数: {result['up_to_date_count']}")
+        print(f"失败股票数: {result['failed_count']}")
+        print(f"新增K线数: {result['appended_bars']}")
+        print(f"耗时: {result['performance']['total_time']:.2f}s")
+        
+        if result['errors']:
+            print("\n错误详情:")
+            for error in result['errors']:
+                print(f"  - {error['stock_code']}: {error['error']}")
+        
+        print("=" * 30)
+        return 0 if result['failed_count'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,10 +10,12 @@ from collections import defaultdict
 from sqlalchemy import func, and_, or_, desc, asc, extract
 from extensions import db
 from models.trade_record import TradeRecord
+from models.read_models import TradeReadModel, price_fen_of
 from models.stock_price import StockPrice
 from models.profit_distribution_config import ProfitDistributionConfig
 from services.base_service import BaseService
 from services.trade_pair_analyzer import TradePairAnalyzer
+from utils.money import FEN_PER_YUAN, fen_to_yuan, group_sum_fen, ratio, to_fen
 from error_handlers import ValidationError, DatabaseError
 
 
@@ -31,7 +33,7 @@ class AnalyticsService(BaseService):
         """
         try:
             # 获取所有交易记录
-            trades = TradeRecord.query.filter_by(is_corrected=False).all()
+            trades = TradeReadModel.load_trades()
             
             # 计算持仓情况
             holdings = cls._calculate_current_holdings(trades)
@@ -112,7 +114,7 @@ class AnalyticsService(BaseService):
     def _get_legacy_profit_distribution(cls, profit_configs: List) -> Dict[str, Any]:
         """旧版收益分布分析（基于股票，保持向后兼容）"""
         # 获取所有交易记录
-        trades = TradeRecord.query.filter_by(is_corrected=False).all()
+        trades = TradeReadModel.load_trades()
         
         # 计算持仓情况
         holdings = cls._calculate_current_holdings(trades)
@@ -222,12 +224,7 @@ class AnalyticsService(BaseService):
                 raise ValidationError(f"年份必须在2000到{current_year + 1}之间")
             
             # 获取指定年份的交易记录
-            trades = TradeRecord.query.filter(
-                and_(
-                    extract('year', TradeRecord.trade_date) == year,
-                    TradeRecord.is_corrected == False
-                )
-            ).all()
+            trades = TradeReadModel.load_trades(extract('year', TradeRecord.trade_date) == year)
             
             # 按月份分组统计
             monthly_stats = {}
@@ -256,19 +253,33 @@ class AnalyticsService(BaseService):
                 
                 if trade.trade_type == 'buy':
                     monthly_stats[month]['buy_count'] += 1
-                    monthly_stats[month]['buy_amount'] += float(trade.price * trade.quantity)
                 elif trade.trade_type == 'sell':
                     monthly_stats[month]['sell_count'] += 1
-                    monthly_stats[month]['sell_amount'] += float(trade.price * trade.quantity)
                 
                 monthly_stats[month]['total_trades'] += 1
             
+            # 每月买入、卖出金额按整数分汇总
+            months = [trade.trade_date.month for trade in trades]
+            amounts = [price_fen_of(trade) * trade.quantity for trade in trades]
+            buy_amounts = group_sum_fen(
+                months, [amount if trade.trade_type == 'buy' else 0 for trade, amount in zip(trades, amounts)], 13
+            )
+            sell_amounts = group_sum_fen(
+                months, [amount if trade.trade_type == 'sell' else 0 for trade, amount in zip(trades, amounts)], 13
+            )
+            for month, stats in monthly_stats.items():
+                stats['buy_amount'] = fen_to_yuan(int(buy_amounts[month]))
+                stats['sell_amount'] = fen_to_yuan(int(sell_amounts[month]))
+            
+            # 一次查询获取所有相关股票的最新价格，供各月份计算浮盈浮亏复用
+            latest_prices = StockPrice.get_latest_prices({trade.stock_code for trade in trades})
+            
             # 计算每月的收益率和成功率
             for month, stats in monthly_stats.items():
                 if stats['has_data']:
                     # 计算当月已完成交易的收益情况
                     month_profit, month_success_trades, month_cost = cls._calculate_monthly_realized_profit_and_success(
-                        trades, month, year
+                        trades, month, year, latest_prices
                     )
                     stats['profit_amount'] = month_profit
                     
@@ -279,7 +290,7 @@ class AnalyticsService(BaseService):
                         stats['profit_rate'] = 0 if month_profit == 0 else None
                     
                     # 修正成功率计算：计算该月盈利股票数占该月交易股票数的比例
-                    month_success_stocks = cls._calculate_monthly_success_stocks(trades, month, year)
+                    month_success_stocks = cls._calculate_monthly_success_stocks(trades, month, year, latest_prices)
                     stats['success_count'] = month_success_stocks
                     stats['success_rate'] = (month_success_stocks / len(stats['stocks']) * 100) if len(stats['stocks']) > 0 else 0
                 else:
@@ -380,14 +391,20 @@ class AnalyticsService(BaseService):
                 monthly_df.to_excel(writer, sheet_name='月度统计', index=False)
                 
                 # 5. 持仓明细表
-                trades = TradeRecord.query.filter_by(is_corrected=False).all()
+                trades = TradeReadModel.load_trades()
                 holdings = cls._calculate_current_holdings(trades)
+                # 所有持仓的持仓交易日数一次性向量化计算
+                from services.non_trading_day_service import NonTradingDayService
+                holding_days = NonTradingDayService.calculate_holding_days_bulk(
+                    [holding['first_buy_date'] for holding in holdings.values()]
+                )
                 holdings_data = []
-                for stock_code, holding in holdings.items():
+                for (stock_code, holding), days in zip(holdings.items(), holding_days):
                     holdings_data.append({
                         '股票代码': stock_code,
                         '股票名称': holding['stock_name'],
                         '持仓数量': holding['quantity'],
+                        '持仓交易日': days,
                         '平均成本': round(holding['avg_cost'], 2),
                         '当前价格': round(holding['current_price'], 2),
                         '持仓市值': round(holding['market_value'], 2),
@@ -414,7 +431,7 @@ class AnalyticsService(BaseService):
         for trade in trades:
             stock_trades[trade.stock_code].append(trade)
         
-        holdings = {}
+        holding_infos = {}
         
         for stock_code, stock_trade_list in stock_trades.items():
             # 按时间排序
@@ -424,28 +441,39 @@ class AnalyticsService(BaseService):
             holding_info = cls._calculate_fifo_holdings(stock_trade_list)
             
             if holding_info['quantity'] > 0:
-                # 获取当前价格
-                latest_price = StockPrice.get_latest_price(stock_code)
-                if latest_price:
-                    current_price = float(latest_price.current_price)
-                else:
-                    current_price = holding_info['avg_cost']  # 如果没有价格数据，使用成本价
-                
-                market_value = current_price * holding_info['quantity']
-                profit_amount = market_value - holding_info['total_cost']
-                profit_rate = profit_amount / holding_info['total_cost'] if holding_info['total_cost'] > 0 else 0
-                
-                holdings[stock_code] = {
-                    'stock_name': holding_info['stock_name'],
-                    'quantity': holding_info['quantity'],
-                    'total_cost': holding_info['total_cost'],
-                    'avg_cost': holding_info['avg_cost'],
-                    'current_price': current_price,
-                    'market_value': market_value,
-                    'profit_amount': profit_amount,
-                    'profit_rate': profit_rate
-                }
+                holding_infos[stock_code] = holding_info
         
+        # 一次查询获取所有持仓股票的最新价格
+        latest_prices = StockPrice.get_latest_prices(holding_infos.keys())
+        
+        holdings = {}
+        
+        for stock_code, holding_info in holding_infos.items():
+            # 获取当前价格
+            latest_price = latest_prices.get(stock_code)
+            cost_fen = holding_info['total_cost_fen']
+            if latest_price:
+                current_price_fen = to_fen(latest_price.current_price)
+                current_price = fen_to_yuan(current_price_fen)
+                market_value_fen = current_price_fen * holding_info['quantity']
+            else:
+                current_price = holding_info['avg_cost']  # 如果没有价格数据，使用成本价
+                market_value_fen = cost_fen
+            
+            profit_fen = market_value_fen - cost_fen
+            
+            holdings[stock_code] = {
+                'stock_name': holding_info['stock_name'],
+                'quantity': holding_info['quantity'],
+                'total_cost': holding_info['total_cost'],
+                'avg_cost': holding_info['avg_cost'],
+                'current_price': current_price,
+                'market_value': fen_to_yuan(market_value_fen),
+                'profit_amount': fen_to_yuan(profit_fen),
+                'profit_rate': ratio(profit_fen, cost_fen),
+                'first_buy_date': holding_info['first_buy_date']
+            }
+    
         return holdings
     
     @classmethod
@@ -458,8 +486,9 @@ class AnalyticsService(BaseService):
             if trade.trade_type == 'buy':
                 buy_queue.append({
                     'quantity': trade.quantity,
-                    'price': float(trade.price),
-                    'remaining': trade.quantity
+                    'price_fen': price_fen_of(trade),
+                    'remaining': trade.quantity,
+                    'trade_date': trade.trade_date
                 })
             elif trade.trade_type == 'sell':
                 sell_quantity = trade.quantity
@@ -481,14 +510,16 @@ class AnalyticsService(BaseService):
         
         # 计算剩余持仓
         total_quantity = sum(item['remaining'] for item in buy_queue)
-        total_cost = sum(item['remaining'] * item['price'] for item in buy_queue)
-        avg_cost = total_cost / total_quantity if total_quantity > 0 else 0
+        total_cost_fen = sum(item['remaining'] * item['price_fen'] for item in buy_queue)
         
         return {
             'stock_name': stock_name,
             'quantity': total_quantity,
-            'total_cost': total_cost,
-            'avg_cost': avg_cost
+            'total_cost': fen_to_yuan(total_cost_fen),
+            'total_cost_fen': total_cost_fen,
+            'avg_cost': total_cost_fen / (total_quantity * FEN_PER_YUAN) if total_quantity > 0 else 0,
+            # 剩余持仓中最早一笔买入的日期
+            'first_buy_date': buy_queue[0]['trade_date'] if buy_queue else None
         }
     
     @classmethod
@@ -508,22 +539,22 @@ class AnalyticsService(BaseService):
             
             # 计算该股票的收益
             position = 0  # 当前持仓
-            total_cost = 0  # 总成本
-            total_revenue = 0  # 总收入
+            total_cost = 0  # 总成本（分）
+            total_revenue = 0  # 总收入（分）
             
             for trade in stock_trade_list:
                 if trade.trade_type == 'buy':
                     position += trade.quantity
-                    total_cost += float(trade.price * trade.quantity)
+                    total_cost += price_fen_of(trade) * trade.quantity
                 elif trade.trade_type == 'sell':
                     position -= trade.quantity
-                    total_revenue += float(trade.price * trade.quantity)
+                    total_revenue += price_fen_of(trade) * trade.quantity
             
             # 如果已清仓（持仓为0），计算收益
             if position == 0:
                 total_profit += (total_revenue - total_cost)
         
-        return total_profit
+        return fen_to_yuan(total_profit)
     
     @classmethod
     def _calculate_floating_profit(cls, holdings: Dict[str, Dict[str, Any]]) -> float:
@@ -534,11 +565,11 @@ class AnalyticsService(BaseService):
     def _calculate_total_investment(cls, trades: List[TradeRecord]) -> float:
         """计算总投入资金"""
         total_buy_amount = sum(
-            float(trade.price * trade.quantity) 
+            price_fen_of(trade) * trade.quantity
             for trade in trades 
             if trade.trade_type == 'buy'
         )
-        return total_buy_amount
+        return fen_to_yuan(total_buy_amount)
     
     @classmethod
     def _calculate_success_rate(cls, trades: List[TradeRecord]) -> float:
@@ -564,10 +595,10 @@ class AnalyticsService(BaseService):
             for trade in stock_trade_list:
                 if trade.trade_type == 'buy':
                     position += trade.quantity
-                    total_cost += float(trade.price * trade.quantity)
+                    total_cost += price_fen_of(trade) * trade.quantity
                 elif trade.trade_type == 'sell':
                     position -= trade.quantity
-                    total_revenue += float(trade.price * trade.quantity)
+                    total_revenue += price_fen_of(trade) * trade.quantity
             
             # 如果已清仓
             if position == 0:
@@ -601,23 +632,22 @@ class AnalyticsService(BaseService):
             for trade in stock_trade_list:
                 if trade.trade_type == 'buy':
                     position += trade.quantity
-                    total_cost += float(trade.price * trade.quantity)
+                    total_cost += price_fen_of(trade) * trade.quantity
                 elif trade.trade_type == 'sell':
                     position -= trade.quantity
-                    total_revenue += float(trade.price * trade.quantity)
+                    total_revenue += price_fen_of(trade) * trade.quantity
             
             # 如果已清仓
             if position == 0:
                 profit_amount = total_revenue - total_cost
-                profit_rate = profit_amount / total_cost if total_cost > 0 else 0
                 
                 closed_positions.append({
                     'stock_code': stock_code,
                     'stock_name': stock_name,
-                    'total_cost': total_cost,
-                    'total_revenue': total_revenue,
-                    'profit_amount': profit_amount,
-                    'profit_rate': profit_rate
+                    'total_cost': fen_to_yuan(total_cost),
+                    'total_revenue': fen_to_yuan(total_revenue),
+                    'profit_amount': fen_to_yuan(profit_amount),
+                    'profit_rate': ratio(profit_amount, total_cost)
                 })
         
         return closed_positions
@@ -643,27 +673,26 @@ class AnalyticsService(BaseService):
             stock_trade_list.sort(key=lambda x: x.trade_date)
             
             # 使用FIFO方法计算已实现收益
-            realized_profit = cls._calculate_fifo_realized_profit(stock_trade_list)
-            total_realized_profit += realized_profit
+            total_realized_profit += cls._calculate_fifo_realized_profit_fen(stock_trade_list)
         
-        return total_realized_profit
+        return fen_to_yuan(total_realized_profit)
     
     @classmethod
-    def _calculate_fifo_realized_profit(cls, stock_trades: List[TradeRecord]) -> float:
-        """使用FIFO方法计算单只股票的已实现收益"""
-        buy_queue = []  # 买入队列：[{'quantity': int, 'price': float, 'remaining': int}]
+    def _calculate_fifo_realized_profit_fen(cls, stock_trades: List[TradeRecord]) -> int:
+        """使用FIFO方法计算单只股票的已实现收益（分）"""
+        buy_queue = []  # 买入队列：[{'quantity': int, 'price': int（分）, 'remaining': int}]
         realized_profit = 0
         
         for trade in stock_trades:
             if trade.trade_type == 'buy':
                 buy_queue.append({
                     'quantity': trade.quantity,
-                    'price': float(trade.price),
+                    'price': price_fen_of(trade),
                     'remaining': trade.quantity
                 })
             elif trade.trade_type == 'sell':
                 sell_quantity = trade.quantity
-                sell_price = float(trade.price)
+                sell_price = price_fen_of(trade)
                 
                 # 从买入队列中匹配卖出
                 while sell_quantity > 0 and buy_queue:
@@ -699,7 +728,8 @@ class AnalyticsService(BaseService):
     
     @classmethod
     def _calculate_monthly_realized_profit_and_success(cls, trades: List[TradeRecord], 
-                                                     month: int, year: int) -> Tuple[float, int, float]:
+                                                     month: int, year: int,
+                                                     latest_prices: Optional[Dict[str, StockPrice]] = None) -> Tuple[float, int, float]:
         """计算指定月份的总收益、成功股票数和投入成本
         
         Requirements: 5.2
@@ -723,6 +753,9 @@ class AnalyticsService(BaseService):
         for trade in trades:
             stock_trades[trade.stock_code].append(trade)
         
+        if latest_prices is None:
+            latest_prices = StockPrice.get_latest_prices(stock_trades.keys())
+        
         # 分析每只股票，计算该月买入产生的总收益
         for stock_code, stock_trade_list in stock_trades.items():
             # 按时间排序
@@ -730,23 +763,23 @@ class AnalyticsService(BaseService):
             
             # 计算该月买入产生的总收益（已实现 + 持仓浮盈浮亏）
             monthly_total_profits = cls._get_monthly_buy_total_profits(
-                stock_trade_list, month_start, month_end
+                stock_trade_list, month_start, month_end, latest_prices
             )
             
             for buy_profit in monthly_total_profits:
-                profit = buy_profit['total_profit']
-                cost = buy_profit['cost']
+                profit = buy_profit['total_profit_fen']
                 
                 month_profit += profit
-                month_cost += cost
+                month_cost += buy_profit['cost_fen']
                 
                 if profit > 0:
                     success_count += 1
         
-        return month_profit, success_count, month_cost
+        return fen_to_yuan(month_profit), success_count, fen_to_yuan(month_cost)
     
     @classmethod
-    def _calculate_monthly_success_stocks(cls, trades: List[TradeRecord], month: int, year: int) -> int:
+    def _calculate_monthly_success_stocks(cls, trades: List[TradeRecord], month: int, year: int,
+                                          latest_prices: Optional[Dict[str, StockPrice]] = None) -> int:
         """计算指定月份成功（盈利）的股票数量
         
         Returns:
@@ -772,6 +805,9 @@ class AnalyticsService(BaseService):
         
         success_stocks = 0
         
+        if latest_prices is None:
+            latest_prices = StockPrice.get_latest_prices(monthly_stocks)
+        
         # 对每只该月有交易的股票，计算其总体收益情况
         for stock_code in monthly_stocks:
             if stock_code in stock_trades:
@@ -779,7 +815,7 @@ class AnalyticsService(BaseService):
                 stock_trade_list.sort(key=lambda x: x.trade_date)
                 
                 # 计算该股票的总体收益（已实现 + 持仓浮盈浮亏）
-                total_profit = cls._calculate_stock_total_profit(stock_trade_list)
+                total_profit = cls._calculate_stock_total_profit(stock_trade_list, latest_prices)
                 
                 if total_profit > 0:
                     success_stocks += 1
@@ -787,33 +823,45 @@ class AnalyticsService(BaseService):
         return success_stocks
     
     @classmethod
-    def _calculate_stock_total_profit(cls, stock_trades: List[TradeRecord]) -> float:
-        """计算单只股票的总体收益（已实现收益 + 持仓浮盈浮亏）"""
-        from models.stock_price import StockPrice
+    def _calculate_stock_total_profit(cls, stock_trades: List[TradeRecord],
+                                      latest_prices: Optional[Dict[str, StockPrice]] = None) -> float:
+        """计算单只股票的总体收益（已实现收益 + 持仓浮盈浮亏）
+        
+        Args:
+            latest_prices: 预先批量查询的最新价格，未提供时单独查询
+        """
         
-        # 计算已实现收益
-        realized_profit = cls._calculate_fifo_realized_profit(stock_trades)
+        # 计算已实现收益（分）
+        realized_profit = cls._calculate_fifo_realized_profit_fen(stock_trades)
         
-        # 计算持仓浮盈浮亏
+        # 计算持仓浮盈浮亏（分）
         holding_info = cls._calculate_fifo_holdings(stock_trades)
         floating_profit = 0
         
         if holding_info['quantity'] > 0:
             stock_code = stock_trades[0].stock_code
-            latest_price = StockPrice.get_latest_price(stock_code)
+            if latest_prices is not None:
+                latest_price = latest_prices.get(stock_code)
+            else:
+                latest_price = StockPrice.get_latest_price(stock_code)
             if latest_price:
-                current_price = float(latest_price.current_price)
-                market_value = current_price * holding_info['quantity']
-                floating_profit = market_value - holding_info['total_cost']
+                market_value = to_fen(latest_price.current_price) * holding_info['quantity']
+                floating_profit = market_value - holding_info['total_cost_fen']
             # 如果没有价格数据，浮盈浮亏为0（按成本价计算）
         
-        return realized_profit + floating_profit
+        return fen_to_yuan(realized_profit + floating_profit)
     
     @classmethod
     def _get_monthly_buy_total_profits(cls, stock_trades: List[TradeRecord], 
-                                     month_start: datetime, month_end: datetime) -> List[Dict]:
-        """获取指定月份买入的股票产生的总收益（已实现收益 + 持仓浮盈浮亏）"""
-        from models.stock_price import StockPrice
+                                     month_start: datetime, month_end: datetime,
+                                     latest_prices: Optional[Dict[str, StockPrice]] = None) -> List[Dict]:
+        """获取指定月份买入的股票产生的总收益（已实现收益 + 持仓浮盈浮亏）
+        
+        每条记录同时给出元（cost、total_profit 等）和整数分（*_fen）两套金额字段，汇总时使用分
+        
+        Args:
+            latest_prices: 预先批量查询的最新价格，未提供时单独查询
+        """
         
         monthly_profits = []
         
@@ -822,23 +870,26 @@ class AnalyticsService(BaseService):
         stock_code = stock_trades[0].stock_code if stock_trades else None
         
         # 获取当前价格
-        current_price = None
+        current_price_fen = None
         if stock_code:
-            latest_price = StockPrice.get_latest_price(stock_code)
+            if latest_prices is not None:
+                latest_price = latest_prices.get(stock_code)
+            else:
+                latest_price = StockPrice.get_latest_price(stock_code)
             if latest_price:
-                current_price = float(latest_price.current_price)
+                current_price_fen = to_fen(latest_price.current_price)
         
         for trade in stock_trades:
             if trade.trade_type == 'buy':
                 buy_queue.append({
                     'trade': trade,
                     'remaining_quantity': trade.quantity,
-                    'unit_cost': float(trade.price),
+                    'unit_cost_fen': price_fen_of(trade),
                     'is_monthly_buy': month_start <= trade.trade_date <= month_end  # 标记是否为该月买入
                 })
             elif trade.trade_type == 'sell':
                 sell_quantity = trade.quantity
-                sell_price = float(trade.price)
+                sell_price_fen = price_fen_of(trade)
                 sell_date = trade.trade_date
                 
                 # 从买入队列中匹配
@@ -851,20 +902,24 @@ class AnalyticsService(BaseService):
                     
                     # 如果买入发生在指定月份内，记录该交易的已实现收益
                     if buy_item['is_monthly_buy']:
-                        cost = match_quantity * buy_item['unit_cost']
-                        revenue = match_quantity * sell_price
-                        realized_profit = revenue - cost
+                        cost = match_quantity * buy_item['unit_cost_fen']
+                        revenue = match_quantity * sell_price_fen
                         
                         monthly_profits.append({
                             'type': 'realized',
                             'buy_date': buy_trade.trade_date,
                             'sell_date': sell_date,
                             'quantity': match_quantity,
-                            'buy_price': buy_item['unit_cost'],
-                            'sell_price': sell_price,
-                            'cost': cost,
-                            'revenue': revenue,
-                            'total_profit': realized_profit
+                            'buy_price': fen_to_yuan(buy_item['unit_cost_fen']),
+                            'sell_price': fen_to_yuan(sell_price_fen),
+                            'cost': fen_to_yuan(cost),
+                            'revenue': fen_to_yuan(revenue),
+                            'total_profit': fen_to_yuan(revenue - cost),
+                            'buy_price_fen': buy_item['unit_cost_fen'],
+                            'sell_price_fen': sell_price_fen,
+                            'cost_fen': cost,
+                            'revenue_fen': revenue,
+                            'total_profit_fen': revenue - cost
                         })
                     
                     # 更新数量
@@ -876,22 +931,26 @@ class AnalyticsService(BaseService):
                         buy_queue.pop(0)
         
         # 处理剩余持仓（该月买入但未卖出的部分）
-        if current_price is not None:
+        if current_price_fen is not None:
             for buy_item in buy_queue:
                 if buy_item['is_monthly_buy'] and buy_item['remaining_quantity'] > 0:
-                    cost = buy_item['remaining_quantity'] * buy_item['unit_cost']
-                    market_value = buy_item['remaining_quantity'] * current_price
-                    unrealized_profit = market_value - cost
+                    cost = buy_item['remaining_quantity'] * buy_item['unit_cost_fen']
+                    market_value = buy_item['remaining_quantity'] * current_price_fen
                     
                     monthly_profits.append({
                         'type': 'unrealized',
                         'buy_date': buy_item['trade'].trade_date,
                         'quantity': buy_item['remaining_quantity'],
-                        'buy_price': buy_item['unit_cost'],
-                        'current_price': current_price,
-                        'cost': cost,
-                        'market_value': market_value,
-                        'total_profit': unrealized_profit
+                        'buy_price': fen_to_yuan(buy_item['unit_cost_fen']),
+                        'current_price': fen_to_yuan(current_price_fen),
+                        'cost': fen_to_yuan(cost),
+                        'market_value': fen_to_yuan(market_value),
+                        'total_profit': fen_to_yuan(market_value - cost),
+                        'buy_price_fen': buy_item['unit_cost_fen'],
+                        'current_price_fen': current_price_fen,
+                        'cost_fen': cost,
+                        'market_value_fen': market_value,
+                        'total_profit_fen': market_value - cost
                     })
         
         return monthly_profits
@@ -902,7 +961,7 @@ class AnalyticsService(BaseService):
         """获取指定月份买入的股票产生的已实现收益（保留向后兼容）"""
         buy_based_profits = []
         
-        # 使用FIFO方法匹配买入和卖出
+        # 使用FIFO方法匹配买入和卖出（金额按分计算，输出时转为元）
         buy_queue = []  # 买入队列
         
         for trade in stock_trades:
@@ -910,12 +969,12 @@ class AnalyticsService(BaseService):
                 buy_queue.append({
                     'trade': trade,
                     'remaining_quantity': trade.quantity,
-                    'unit_cost': float(trade.price),
+                    'unit_cost_fen': price_fen_of(trade),
                     'is_monthly_buy': month_start <= trade.trade_date <= month_end  # 标记是否为该月买入
                 })
             elif trade.trade_type == 'sell':
                 sell_quantity = trade.quantity
-                sell_price = float(trade.price)
+                sell_price_fen = price_fen_of(trade)
                 sell_date = trade.trade_date
                 
                 # 从买入队列中匹配
@@ -928,19 +987,18 @@ class AnalyticsService(BaseService):
                     
                     # 如果买入发生在指定月份内，记录该交易的收益
                     if buy_item['is_monthly_buy']:
-                        cost = match_quantity * buy_item['unit_cost']
-                        revenue = match_quantity * sell_price
-                        profit = revenue - cost
+                        cost = match_quantity * buy_item['unit_cost_fen']
+                        revenue = match_quantity * sell_price_fen
                         
                         buy_based_profits.append({
                             'buy_date': buy_trade.trade_date,
                             'sell_date': sell_date,
                             'quantity': match_quantity,
-                            'buy_price': buy_item['unit_cost'],
-                            'sell_price': sell_price,
-                            'cost': cost,
-                            'revenue': revenue,
-                            'profit': profit
+                            'buy_price': fen_to_yuan(buy_item['unit_cost_fen']),
+                            'sell_price': fen_to_yuan(sell_price_fen),
+                            'cost': fen_to_yuan(cost),
+                            'revenue': fen_to_yuan(revenue),
+                            'profit': fen_to_yuan(revenue - cost)
                         })
                     
                     # 更新数量
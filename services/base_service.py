@@ -3,6 +3,9 @@
 """
 from extensions import db
 from error_handlers import DatabaseError, NotFoundError
+from utils.structured_logging import get_logger, lazy
+
+logger = get_logger(__name__)
 
 class BaseService:
     """基础服务类，提供通用的数据库操作方法"""
@@ -52,25 +55,12 @@ class BaseService:
             raise NotImplementedError("子类必须设置model属性")
         
         try:
-            from flask import current_app
-            current_app.logger.info(f"=== BaseService.create 开始 ===")
-            current_app.logger.info(f"模型类: {cls.model.__name__}")
-            current_app.logger.info(f"创建数据: {data}")
-            
-            current_app.logger.info("开始创建模型实例")
+            logger.debug("创建记录", model=cls.model.__name__, data=lazy(lambda: dict(data)))
             record = cls.model(**data)
-            current_app.logger.info(f"模型实例创建成功: {record}")
-            
-            current_app.logger.info("开始保存记录")
             saved_record = record.save()
-            current_app.logger.info(f"记录保存成功，ID: {saved_record.id}")
-            
             return saved_record
         except Exception as e:
-            current_app.logger.error(f"BaseService.create 发生错误: {str(e)}")
-            current_app.logger.error(f"错误类型: {type(e)}")
-            import traceback
-            current_app.logger.error(f"错误堆栈: {traceback.format_exc()}")
+            logger.error("创建记录失败", exc_info=True, model=cls.model.__name__, error=str(e))
             raise DatabaseError(f"创建{cls.model.__name__}记录失败: {str(e)}")
     
     @classmethod
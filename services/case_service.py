@@ -9,6 +9,8 @@ from PIL import Image
 from werkzeug.utils import secure_filename
 from services.base_service import BaseService
 from models.case_study import CaseStudy
+from models.search_index import SearchIndex
+from utils.pagination import keyset_paginate
 from error_handlers import ValidationError, FileOperationError
 from config import Config
 from extensions import db
@@ -240,7 +242,8 @@ class CaseService(BaseService):
         return [case.to_dict() for case in cases]
     
     def search_cases(self, keyword=None, stock_code=None, tags=None, 
-                    start_date=None, end_date=None, page=1, per_page=20):
+                    start_date=None, end_date=None, page=1, per_page=20,
+                    cursor=None, include_total=False):
         """
         搜索案例
         
@@ -252,6 +255,8 @@ class CaseService(BaseService):
             end_date: 结束日期
             page: 页码
             per_page: 每页数量
+            cursor: 游标分页的游标（首页传空字符串），传入时忽略 page
+            include_total: 游标分页时是否返回近似总数
             
         Returns:
             dict: 包含案例列表和分页信息的字典
@@ -261,12 +266,7 @@ class CaseService(BaseService):
         # 关键词搜索
         if keyword:
             query = query.filter(
-                self.db.or_(
-                    CaseStudy.title.like(f'%{keyword}%'),
-                    CaseStudy.notes.like(f'%{keyword}%'),
-                    CaseStudy.stock_code.like(f'%{keyword}%'),
-                    CaseStudy.tags.like(f'%{keyword}%')
-                )
+                SearchIndex.keyword_filter(CaseStudy, 'cases', keyword)
             )
         
         # 股票代码筛选
@@ -276,7 +276,7 @@ class CaseService(BaseService):
         # 标签筛选
         if tags:
             for tag in tags:
-                query = query.filter(CaseStudy.tags.like(f'%"{tag}"%'))
+                query = query.filter(SearchIndex.like_filter(CaseStudy, 'cases', 'tags', f'%"{tag}"%'))
         
         # 日期范围筛选
         if start_date:
@@ -284,6 +284,15 @@ class CaseService(BaseService):
         if end_date:
             query = query.filter(CaseStudy.created_at <= end_date)
         
+        # 游标分页
+        if cursor is not None:
+            result = keyset_paginate(
+                query, CaseStudy, 'created_at', 'desc', per_page,
+                cursor=cursor, include_total=include_total
+            )
+            result['cases'] = [case.to_dict() for case in result.pop('items')]
+            return result
+        
         # 排序和分页
         query = query.order_by(CaseStudy.created_at.desc())
         pagination = query.paginate(
@@ -0,0 +1,408 @@
+"""
+日线行情服务
+批量拉取日线OHLCV历史数据，按股票分区存储为紧凑的NumPy文件，
+供分析和策略评估离线读取，避免重复访问外部接口
+"""
+import os
+import threading
+import akshare as ak
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+import logging
+
+from sqlalchemy import func
+from extensions import db
+from models.trade_record import TradeRecord
+from models.stock_pool import StockPool
+from error_handlers import ValidationError, ExternalAPIError
+from utils.validators import validate_stock_code
+
+
+logger = logging.getLogger(__name__)
+
+
+# 日线数据的紧凑存储格式：日期按天精度，价格使用float32，成交量使用int64
+BAR_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'f4'),
+    ('high', 'f4'),
+    ('low', 'f4'),
+    ('close', 'f4'),
+    ('volume', 'i8'),
+])
+
+# AKShare日线接口的列名映射
+AKSHARE_COLUMN_MAP = {
+    '日期': 'date',
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+}
+
+
+class DailyBarService:
+    """日线行情服务类"""
+    
+    # 新股票首次拉取时默认回溯的自然日数
+    DEFAULT_HISTORY_DAYS = 730
+    # 首次拉取时在最早交易日期之前额外回溯的自然日数
+    LOOKBACK_DAYS = 30
+    
+    # 进程内缓存：{文件路径: (修改时间, 数组)}
+    _bar_cache = {}
+    _cache_lock = threading.Lock()
+    
+    def __init__(self, store_dir: Optional[Union[str, Path]] = None, adjust: str = ''):
+        """
+        Args:
+            store_dir: 数据存储目录，默认读取配置 DAILY_BAR_STORE_DIR
+            adjust: 复权方式，''为不复权（与成交价一致），'qfq'前复权，'hfq'后复权
+        """
+        if store_dir is None:
+            store_dir = self._default_store_dir()
+        self.store_dir = Path(store_dir)
+        self.adjust = adjust
+    
+    @staticmethod
+    def _default_store_dir() -> Path:
+        """获取默认存储目录"""
+        try:
+            from flask import current_app
+            configured = current_app.config.get('DAILY_BAR_STORE_DIR')
+            if configured:
+                return Path(configured)
+        except RuntimeError:
+            pass
+        return Path(__file__).parent.parent / 'data' / 'daily_bars'
+    
+    # ========== 读取接口 ==========
+    
+    def get_bars(self, stock_codes: Union[str, Iterable[str]], start_date=None,
+                 end_date=None) -> Dict[str, np.ndarray]:
+        """
+        读取本地日线数据，不访问网络
+        
+        Args:
+            stock_codes: 股票代码或股票代码列表
+            start_date: 开始日期（包含），默认不限
+            end_date: 结束日期（包含），默认不限
+        
+        Returns:
+            Dict[str, np.ndarray]: {股票代码: BAR_DTYPE结构化数组}，无数据的股票返回空数组
+        """
+        if isinstance(stock_codes, str):
+            stock_codes = [stock_codes]
+        
+        start = self._to_datetime64(start_date)
+        end = self._to_datetime64(end_date)
+        
+        result = {}
+        for stock_code in stock_codes:
+            validate_stock_code(stock_code)
+            bars = self._load_bars(stock_code)
+            if len(bars) and (start is not None or end is not None):
+                dates = bars['date']
+                lo = np.searchsorted(dates, start, side='left') if start is not None else 0
+                hi = np.searchsorted(dates, end, side='right') if end is not None else len(bars)
+                bars = bars[lo:hi]
+            result[stock_code] = bars
+        return result
+    
+    def get_close_matrix(self, stock_codes: List[str], start_date=None, end_date=None):
+        """
+        读取收盘价矩阵（股票 × 日期），缺失值为NaN
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (日期数组, 形状为 len(stock_codes) × len(日期) 的收盘价矩阵)
+        """
+        bars_by_code = self.get_bars(stock_codes, start_date, end_date)
+        non_empty = [bars['date'] for bars in bars_by_code.values() if len(bars)]
+        if not non_empty:
+            return np.array([], dtype='datetime64[D]'), np.empty((len(stock_codes), 0), dtype='f4')
+        
+        dates = np.unique(np.concatenate(non_empty))
+        matrix = np.full((len(stock_codes), len(dates)), np.nan, dtype='f4')
+        for row, stock_code in enumerate(stock_codes):
+            bars = bars_by_code[stock_code]
+            if len(bars):
+                matrix[row, np.searchsorted(dates, bars['date'])] = bars['close']
+        return dates, matrix
+    
+    def get_last_date(self, stock_code: str) -> Optional[date]:
+        """获取本地已存储的最后一个交易日"""
+        bars = self._load_bars(stock_code)
+        if not len(bars):
+            return None
+        return bars['date'][-1].astype(date)
+    
+    def get_store_status(self, stock_codes: Optional[List[str]] = None) -> Dict:
+        """获取本地存储状态"""
+        if stock_codes is None:
+            stock_codes = sorted(path.stem for path in self.store_dir.glob('*.npy')) if self.store_dir.exists() else []
+        
+        details = []
+        total_bars = 0
+        for stock_code in stock_codes:
+            bars = self._load_bars(stock_code)
+            total_bars += len(bars)
+            details.append({
+                'stock_code': stock_code,
+                'bar_count': len(bars),
+                'first_date': bars['date'][0].astype(date).isoformat() if len(bars) else None,
+                'last_date': bars['date'][-1].astype(date).isoformat() if len(bars) else None
+            })
+        
+        return {
+            'store_dir': str(self.store_dir),
+            'total_stocks': len(stock_codes),
+            'total_bars': total_bars,
+            'details': details
+        }
+    
+    # ========== 批量拉取 ==========
+    
+    @classmethod
+    def get_target_stock_codes(cls) -> List[str]:
+        """获取需要维护日线数据的股票：所有交易过（含当前持仓）及股票池中关注的股票"""
+        traded_codes = db.session.query(TradeRecord.stock_code).filter(
+            TradeRecord.is_corrected == False
+        ).distinct().all()
+        
+        pool_codes = db.session.query(StockPool.stock_code).filter(
+            StockPool.status == 'active'
+        ).distinct().all()
+        
+        return sorted({row.stock_code for row in traded_codes} | {row.stock_code for row in pool_codes})
+    
+    def ingest(self, stock_codes: Optional[List[str]] = None, start_date=None,
+               end_date=None) -> Dict:
+        """
+        批量拉取日线数据并增量追加到本地存储，只拉取缺失的日期
+        
+        Args:
+            stock_codes: 股票代码列表，默认为所有交易过、持有和关注的股票
+            start_date: 新股票首次拉取的开始日期，默认根据最早交易日期推算
+            end_date: 拉取截止日期，默认今天
+        
+        Returns:
+            Dict: 拉取结果统计
+        """
+        if stock_codes is None:
+            stock_codes = self.get_target_stock_codes()
+        
+        end = self._to_date(end_date) or date.today()
+        explicit_start = self._to_date(start_date)
+        first_trade_dates = self._get_first_trade_dates(stock_codes) if explicit_start is None else {}
+        
+        results = {
+            'total_stocks': len(stock_codes),
+            'updated_count': 0,
+            'up_to_date_count': 0,
+            'failed_count': 0,
+            'appended_bars': 0,
+            'errors': [],
+            'performance': {}
+        }
+        
+        start_time = datetime.now()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        
+        for stock_code in stock_codes:
+            try:
+                validate_stock_code(stock_code)
+                
+                existing = self._load_bars(stock_code)
+                if len(existing):
+                    fetch_start = existing['date'][-1].astype(date) + timedelta(days=1)
+                else:
+                    fetch_start = explicit_start or self._default_start(first_trade_dates.get(stock_code), end)
+                
+                if fetch_start > end:
+                    results['up_to_date_count'] += 1
+                    continue
+                
+                new_bars = self._fetch_daily_bars_from_akshare(stock_code, fetch_start, end)
+                if not len(new_bars):
+                    results['up_to_date_count'] += 1
+                    continue
+                
+                merged = self._merge_bars(existing, new_bars)
+                self._save_bars(stock_code, merged)
+                
+                results['updated_count'] += 1
+                results['appended_bars'] += len(merged) - len(existing)
+            
+            except (ValidationError, ExternalAPIError) as e:
+                results['failed_count'] += 1
+                results['errors'].append({'stock_code': stock_code, 'error': str(e)})
+                logger.error(f"拉取股票 {stock_code} 日线数据失败: {e}")
+            except Exception as e:
+                results['failed_count'] += 1
+                results['errors'].append({'stock_code': stock_code, 'error': str(e)})
+                logger.error(f"处理股票 {stock_code} 日线数据时发生未知错误: {e}")
+        
+        total_time = (datetime.now() - start_time).total_seconds()
+        results['performance'] = {
+            'total_time': total_time,
+            'stocks_per_second': len(stock_codes) / total_time if total_time > 0 else 0
+        }
+        
+        logger.info(f"日线数据拉取完成: 更新 {results['updated_count']} 只, "
+                    f"无需更新 {results['up_to_date_count']} 只, 失败 {results['failed_count']} 只, "
+                    f"新增 {results['appended_bars']} 条, 耗时 {total_time:.2f}s")
+        
+        return results
+    
+    def _fetch_daily_bars_from_akshare(self, stock_code: str, start_date: date,
+                                       end_date: date) -> np.ndarray:
+        """
+        从AKShare获取指定区间的日线数据
+        
+        Returns:
+            np.ndarray: BAR_DTYPE结构化数组，按日期升序
+        """
+        try:
+            df = ak.stock_zh_a_hist(
+                symbol=stock_code,
+                period='daily',
+                start_date=start_date.strftime('%Y%m%d'),
+                end_date=end_date.strftime('%Y%m%d'),
+                adjust=self.adjust
+            )
+        except Exception as e:
+            raise ExternalAPIError(f"获取股票 {stock_code} 日线数据失败: {str(e)}")
+        
+        return self._frame_to_bars(df)
+    
+    @staticmethod
+    def _frame_to_bars(df: Optional[pd.DataFrame]) -> np.ndarray:
+        """将AKShare返回的DataFrame转换为结构化数组"""
+        if df is None or df.empty:
+            return np.empty(0, dtype=BAR_DTYPE)
+        
+        frame = df.rename(columns=AKSHARE_COLUMN_MAP)
+        missing = [column for column in BAR_DTYPE.names if column not in frame.columns]
+        if missing:
+            raise ExternalAPIError(f"日线数据缺少字段: {', '.join(missing)}")
+        
+        frame = frame[list(BAR_DTYPE.names)].dropna(subset=['date', 'close'])
+        
+        bars = np.empty(len(frame), dtype=BAR_DTYPE)
+        bars['date'] = pd.to_datetime(frame['date']).to_numpy().astype('datetime64[D]')
+        for column in ('open', 'high', 'low', 'close'):
+            bars[column] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype='f4')
+        bars['volume'] = pd.to_numeric(frame['volume'], errors='coerce').fillna(0).to_numpy(dtype='i8')
+        
+        bars.sort(order='date')
+        return bars
+    
+    # ========== 存储 ==========
+    
+    def _bar_path(self, stock_code: str) -> Path:
+        return self.store_dir / f'{stock_code}.npy'
+    
+    def _load_bars(self, stock_code: str) -> np.ndarray:
+        """加载单只股票的日线数据（按文件修改时间缓存）"""
+        path = self._bar_path(stock_code)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return np.empty(0, dtype=BAR_DTYPE)
+        
+        key = str(path)
+        with self._cache_lock:
+            cached = self._bar_cache.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        
+        bars = np.load(path, allow_pickle=False)
+        bars.flags.writeable = False
+        
+        with self._cache_lock:
+            self._bar_cache[key] = (mtime, bars)
+        return bars
+    
+    def _save_bars(self, stock_code: str, bars: np.ndarray) -> None:
+        """原子写入单只股票的日线数据"""
+        path = self._bar_path(stock_code)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, bars, allow_pickle=False)
+        os.replace(tmp_path, path)
+        
+        with self._cache_lock:
+            self._bar_cache.pop(str(path), None)
+    
+    @staticmethod
+    def _merge_bars(existing: np.ndarray, new_bars: np.ndarray) -> np.ndarray:
+        """合并新旧数据，同一日期以新数据为准"""
+        if not len(existing):
+            return new_bars
+        combined = np.concatenate([existing, new_bars])
+        # 反转后取首次出现的位置，即保留最后写入的数据
+        _, last_index = np.unique(combined['date'][::-1], return_index=True)
+        return combined[len(combined) - 1 - last_index]
+    
+    # ========== 辅助方法 ==========
+    
+    @classmethod
+    def _get_first_trade_dates(cls, stock_codes: List[str]) -> Dict[str, date]:
+        """一次查询获取各股票的最早交易日期"""
+        if not stock_codes:
+            return {}
+        rows = db.session.query(
+            TradeRecord.stock_code,
+            func.min(TradeRecord.trade_date).label('first_trade_date')
+        ).filter(
+            TradeRecord.stock_code.in_(stock_codes),
+            TradeRecord.is_corrected == False
+        ).group_by(TradeRecord.stock_code).all()
+        return {row.stock_code: cls._to_date(row.first_trade_date) for row in rows}
+    
+    @classmethod
+    def _default_start(cls, first_trade_date: Optional[date], end_date: date) -> date:
+        """推算新股票首次拉取的开始日期"""
+        default_start = end_date - timedelta(days=cls.DEFAULT_HISTORY_DAYS)
+        if first_trade_date:
+            return min(default_start, first_trade_date - timedelta(days=cls.LOOKBACK_DAYS))
+        return default_start
+    
+    @staticmethod
+    def _to_date(value) -> Optional[date]:
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        if isinstance(value, str):
+            try:
+                return datetime.strptime(value.replace('/', '-')[:10], '%Y-%m-%d').date()
+            except ValueError:
+                raise ValidationError(f"日期格式不正确: {value}，请使用YYYY-MM-DD格式")
+        raise ValidationError(f"无效的日期类型: {type(value)}")
+    
+    @classmethod
+    def _to_datetime64(cls, value) -> Optional[np.datetime64]:
+        value = cls._to_date(value)
+        return np.datetime64(value, 'D') if value is not None else None
+    
+    @staticmethod
+    def bars_to_dicts(bars: np.ndarray) -> List[Dict]:
+        """将结构化数组转换为字典列表（用于API输出）"""
+        return [
+            {
+                'date': str(row['date']),
+                'open': round(float(row['open']), 2),
+                'high': round(float(row['high']), 2),
+                'low': round(float(row['low']), 2),
+                'close': round(float(row['close']), 2),
+                'volume': int(row['volume'])
+            }
+            for row in bars
+        ]
@@ -1,20 +1,38 @@
 """
 数据同步服务 - 负责历史交易数据的同步和初始化
 """
+import hashlib
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
-from sqlalchemy import and_, or_, func, text
+from typing import Dict, List, Any, Optional, Set, Tuple
+from sqlalchemy import and_, or_, func, text, case, exists
 from extensions import db
 from models.trade_record import TradeRecord
-from models.historical_trade import HistoricalTrade
+from models.historical_trade import HistoricalTrade, HistoricalTradeLink
+from models.configuration import Configuration
 from services.historical_trade_service import HistoricalTradeService
 from error_handlers import ValidationError, DatabaseError
 
+# 单次IN查询的最大参数数量（SQLite默认限制为999）
+BATCH_QUERY_SIZE = 500
+
+# 金额比较允许的误差
+AMOUNT_TOLERANCE = 0.01
+
 
 class DataSyncService:
     """数据同步服务类"""
     
+    # 增量完整性检查的状态（各股票校验和及违规结果）的配置键
+    INTEGRITY_STATE_KEY = 'data_integrity_state'
+    
+    # 约束违反类型及问题描述
+    CONSTRAINT_MESSAGES = {
+        'invalid_investment': "发现 {count} 条总投入本金小于等于0的记录",
+        'invalid_holding_days': "发现 {count} 条持仓天数为负数的记录",
+        'invalid_date_order': "发现 {count} 条卖出日期早于买入日期的记录"
+    }
+    
     @classmethod
     def initialize_historical_data(cls, force_regenerate: bool = False) -> Dict[str, Any]:
         """
@@ -114,10 +132,17 @@ class DataSyncService:
             raise DatabaseError(f"增量同步失败: {str(e)}")
     
     @classmethod
-    def check_data_integrity(cls) -> Dict[str, Any]:
+    def check_data_integrity(cls, incremental: bool = False) -> Dict[str, Any]:
         """
         检查数据完整性
         
+        每项检查都是一次聚合或反连接查询，批量返回违规记录。
+        增量模式下按股票校验和找出上次检查后有变更的股票，只重新检查这些股票，
+        其余股票沿用上次的检查结果。
+        
+        Args:
+            incremental: 是否只检查上次检查后有变更的股票
+        
         Returns:
             Dict: 完整性检查结果
         """
@@ -125,9 +150,6 @@ class DataSyncService:
             from flask import current_app
             current_app.logger.info("=== check_data_integrity 开始 ===")
             
-            issues = []
-            warnings = []
-            
             # 1. 检查基础数据统计
             total_trade_records = TradeRecord.query.filter_by(is_corrected=False).count()
             total_historical_trades = HistoricalTrade.query.count()
@@ -135,32 +157,65 @@ class DataSyncService:
             current_app.logger.info(f"交易记录总数: {total_trade_records}")
             current_app.logger.info(f"历史交易记录总数: {total_historical_trades}")
             
-            # 2. 检查是否有孤立的交易记录（买入但没有对应卖出）
-            orphaned_buys = cls._check_orphaned_buy_records()
-            if orphaned_buys:
-                warnings.append(f"发现 {len(orphaned_buys)} 条孤立的买入记录（没有对应的卖出记录）")
+            # 2. 确定检查范围：增量模式只检查校验和变化的股票
+            checksums = cls._compute_stock_checksums()
+            state = Configuration.get_value(cls.INTEGRITY_STATE_KEY) if incremental else None
             
-            # 3. 检查历史交易记录的数据一致性
-            inconsistent_records = cls._check_historical_trade_consistency()
-            if inconsistent_records:
-                issues.extend(inconsistent_records)
+            if isinstance(state, dict) and isinstance(state.get('checksums'), dict):
+                previous_checksums = state['checksums']
+                changed_codes = {
+                    code for code, checksum in checksums.items() if previous_checksums.get(code) != checksum
+                }
+                # 未变化股票沿用上次结果；已无数据的股票直接丢弃
+                stock_violations = {
+                    code: violations for code, violations in (state.get('violations') or {}).items()
+                    if code in checksums and code not in changed_codes
+                }
+                # 变更股票过多时直接全量检查
+                check_scope = changed_codes if len(changed_codes) <= BATCH_QUERY_SIZE else None
+            else:
+                stock_violations = {}
+                check_scope = None
             
-            # 4. 检查重复的历史交易记录
-            duplicate_records = cls._check_duplicate_historical_trades()
+            current_app.logger.info(
+                f"检查范围: {'全部股票' if check_scope is None else f'{len(check_scope)} 只变更股票'}"
+            )
+            
+            # 3. 批量查询各项违规并按股票汇总
+            if check_scope is None or check_scope:
+                stock_violations.update(cls._collect_violations(check_scope))
+            
+            Configuration.set_value(cls.INTEGRITY_STATE_KEY, {
+                'checksums': checksums,
+                'violations': stock_violations
+            }, '数据完整性检查的股票校验和与违规结果')
+            
+            # 4. 汇总结果
+            orphaned_buys = []
+            consistency_issues = []
+            reference_issues = []
+            duplicate_records = []
+            constraint_counts = dict.fromkeys(cls.CONSTRAINT_MESSAGES, 0)
+            for code in sorted(stock_violations):
+                violations = stock_violations[code]
+                if violations.get('orphaned_buy'):
+                    orphaned_buys.append(violations['orphaned_buy'])
+                consistency_issues.extend(violations.get('consistency', []))
+                reference_issues.extend(violations.get('references', []))
+                duplicate_records.extend(violations.get('duplicates', []))
+                for kind, count in (violations.get('constraints') or {}).items():
+                    constraint_counts[kind] = constraint_counts.get(kind, 0) + count
+            
+            issues = list(consistency_issues)
+            warnings = []
+            if orphaned_buys:
+                warnings.append(f"发现 {len(orphaned_buys)} 条孤立的买入记录（没有对应的卖出记录）")
             if duplicate_records:
                 issues.append(f"发现 {len(duplicate_records)} 条重复的历史交易记录")
+            issues.extend(cls._format_constraint_issues(constraint_counts))
+            issues.extend(reference_issues)
             
-            # 5. 检查数据类型和约束
-            constraint_violations = cls._check_data_constraints()
-            if constraint_violations:
-                issues.extend(constraint_violations)
-            
-            # 6. 检查关联记录的有效性
-            invalid_references = cls._check_record_references()
-            if invalid_references:
-                issues.extend(invalid_references)
-            
-            # 7. 统计分析
+            # 5. 统计分析
             statistics = cls._calculate_integrity_statistics()
             
             # 判断整体完整性
@@ -170,6 +225,8 @@ class DataSyncService:
             result = {
                 'is_valid': is_valid,
                 'severity': severity,
+                'mode': 'full' if check_scope is None else 'incremental',
+                'checked_stock_count': len(checksums) if check_scope is None else len(check_scope),
                 'total_trade_records': total_trade_records,
                 'total_historical_trades': total_historical_trades,
                 'issues': issues,
@@ -177,7 +234,7 @@ class DataSyncService:
                 'statistics': statistics,
                 'check_time': datetime.now().isoformat(),
                 'orphaned_buys_count': len(orphaned_buys),
-                'duplicate_records_count': len(duplicate_records) if duplicate_records else 0
+                'duplicate_records_count': len(duplicate_records)
             }
             
             current_app.logger.info(f"数据完整性检查完成: {result}")
@@ -312,199 +369,324 @@ class DataSyncService:
         return query.order_by(TradeRecord.trade_date.asc()).all()
     
     @classmethod
-    def _check_orphaned_buy_records(cls) -> List[Dict[str, Any]]:
-        """检查孤立的买入记录"""
-        # 获取所有买入记录
-        buy_records = TradeRecord.query.filter(
-            and_(
-                TradeRecord.trade_type == 'buy',
-                TradeRecord.is_corrected == False
-            )
-        ).all()
+    def _compute_stock_checksums(cls) -> Dict[str, str]:
+        """
+        计算每只股票的数据校验和（交易记录、历史交易记录和关联表各一次分组聚合）
         
-        orphaned_buys = []
+        记录的增删改都会改变数量、ID之和、最后更新时间或金额之和中的至少一项；
+        关联记录没有更新时间，增删和改指向都会改变数量、两个ID之和或买入关联数中的至少一项。
+        """
+        parts = {}
+        for slot, (model, amount) in enumerate((
+            (TradeRecord, func.total(TradeRecord.price * TradeRecord.quantity)),
+            (HistoricalTrade, func.total(HistoricalTrade.total_investment + HistoricalTrade.total_return))
+        )):
+            for row in db.session.query(
+                model.stock_code,
+                func.count(model.id),
+                func.total(model.id),
+                func.max(model.updated_at),
+                amount
+            ).group_by(model.stock_code):
+                parts.setdefault(row[0], ['', '', ''])[slot] = '|'.join(str(value) for value in row[1:])
+        
+        for row in db.session.query(
+            HistoricalTrade.stock_code,
+            func.count(),
+            func.total(HistoricalTradeLink.historical_trade_id),
+            func.total(HistoricalTradeLink.trade_record_id),
+            func.total(case((HistoricalTradeLink.side == 'buy', 1), else_=0))
+        ).select_from(HistoricalTradeLink).join(
+            HistoricalTrade, HistoricalTrade.id == HistoricalTradeLink.historical_trade_id
+        ).group_by(HistoricalTrade.stock_code):
+            parts.setdefault(row[0], ['', '', ''])[2] = '|'.join(str(value) for value in row[1:])
         
-        # 按股票代码分组检查
-        stock_codes = set(record.stock_code for record in buy_records)
+        return {
+            code: hashlib.sha1('/'.join(values).encode('utf-8')).hexdigest()
+            for code, values in parts.items()
+        }
+    
+    @classmethod
+    def _collect_violations(cls, stock_codes: Optional[Set[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询各项违规并按股票汇总
         
-        for stock_code in stock_codes:
-            stock_buys = [r for r in buy_records if r.stock_code == stock_code]
-            stock_sells = TradeRecord.query.filter(
-                and_(
-                    TradeRecord.stock_code == stock_code,
-                    TradeRecord.trade_type == 'sell',
-                    TradeRecord.is_corrected == False
+        Args:
+            stock_codes: 检查范围，None 表示全部股票
+            
+        Returns:
+            Dict: 股票代码 -> 违规信息（只包含存在违规的股票）
+        """
+        violations = {}
+        
+        def entry(code):
+            return violations.setdefault(code, {})
+        
+        for orphaned in cls._check_orphaned_buy_records(stock_codes):
+            entry(orphaned['stock_code'])['orphaned_buy'] = orphaned
+        for code, message in cls._find_consistency_violations(stock_codes):
+            entry(code).setdefault('consistency', []).append(message)
+        for code, message in cls._find_reference_violations(stock_codes):
+            entry(code).setdefault('references', []).append(message)
+        for duplicate in cls._check_duplicate_historical_trades(stock_codes):
+            entry(duplicate['stock_code']).setdefault('duplicates', []).append(duplicate)
+        for code, counts in cls._count_constraint_violations(stock_codes).items():
+            entry(code)['constraints'] = counts
+        
+        return violations
+    
+    @staticmethod
+    def _in_scope(query, column, stock_codes: Optional[Set[str]]):
+        """按检查范围过滤查询"""
+        if stock_codes is None:
+            return query
+        return query.filter(column.in_(sorted(stock_codes)))
+    
+    @classmethod
+    def _check_orphaned_buy_records(cls, stock_codes: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """检查孤立的买入记录（按股票一次分组聚合买入和卖出数量）"""
+        is_buy = TradeRecord.trade_type == 'buy'
+        is_sell = TradeRecord.trade_type == 'sell'
+        buy_quantity = func.sum(case((is_buy, TradeRecord.quantity), else_=0))
+        sell_quantity = func.sum(case((is_sell, TradeRecord.quantity), else_=0))
+        
+        query = db.session.query(
+            TradeRecord.stock_code,
+            buy_quantity.label('total_buy_quantity'),
+            sell_quantity.label('total_sell_quantity'),
+            func.sum(case((is_buy, 1), else_=0)).label('buy_records_count')
+        ).filter(TradeRecord.is_corrected == False)
+        query = cls._in_scope(query, TradeRecord.stock_code, stock_codes)
+        
+        # 如果买入数量大于卖出数量，说明有未完成的持仓
+        rows = query.group_by(TradeRecord.stock_code).having(
+            buy_quantity > sell_quantity
+        ).order_by(TradeRecord.stock_code).all()
+        
+        return [{
+            'stock_code': row.stock_code,
+            'total_buy_quantity': int(row.total_buy_quantity),
+            'total_sell_quantity': int(row.total_sell_quantity),
+            'remaining_quantity': int(row.total_buy_quantity - row.total_sell_quantity),
+            'buy_records_count': int(row.buy_records_count)
+        } for row in rows]
+    
+    @classmethod
+    def _check_historical_trade_consistency(cls, stock_codes: Optional[Set[str]] = None) -> List[str]:
+        """检查历史交易记录的数据一致性"""
+        return [message for _, message in cls._find_consistency_violations(stock_codes)]
+    
+    @classmethod
+    def _find_consistency_violations(cls, stock_codes: Optional[Set[str]] = None) -> List[Tuple[str, str]]:
+        """历史交易记录一致性违规 (股票代码, 问题描述)，基于关联表的集合查询"""
+        violations = []
+        
+        # 缺少买入或卖出关联的记录（反连接）
+        missing_ids = set()
+        query = db.session.query(HistoricalTrade.stock_code, HistoricalTrade.id).filter(
+            or_(~cls._has_link('buy'), ~cls._has_link('sell'))
+        )
+        for code, trade_id in cls._in_scope(query, HistoricalTrade.stock_code, stock_codes).order_by(HistoricalTrade.id):
+            missing_ids.add(trade_id)
+            violations.append((code, f"历史交易记录 {trade_id} 缺少买入或卖出记录ID"))
+        
+        # 引用了不存在的交易记录
+        for code, trade_id, side in cls._find_dangling_links(stock_codes):
+            if trade_id not in missing_ids:
+                violations.append(
+                    (code, f"历史交易记录 {trade_id} 的{'买入' if side == 'buy' else '卖出'}记录ID列表包含无效ID")
                 )
-            ).all()
+        
+        # 验证计算结果
+        linked_metrics = cls._aggregate_linked_records(stock_codes)
+        for trade_id in sorted(linked_metrics):
+            metrics = linked_metrics[trade_id]
+            if trade_id in missing_ids:
+                continue
             
-            # 计算买入和卖出的数量
-            total_buy_quantity = sum(r.quantity for r in stock_buys)
-            total_sell_quantity = sum(r.quantity for r in stock_sells)
+            # 检查投入本金
+            if abs(metrics['recorded_investment'] - metrics['total_investment']) > AMOUNT_TOLERANCE:
+                violations.append((metrics['stock_code'], f"历史交易记录 {trade_id} 的总投入本金计算不正确"))
             
-            # 如果买入数量大于卖出数量，说明有未完成的持仓
-            if total_buy_quantity > total_sell_quantity:
-                orphaned_buys.append({
-                    'stock_code': stock_code,
-                    'total_buy_quantity': total_buy_quantity,
-                    'total_sell_quantity': total_sell_quantity,
-                    'remaining_quantity': total_buy_quantity - total_sell_quantity,
-                    'buy_records_count': len(stock_buys)
-                })
+            # 检查收益
+            if abs(metrics['recorded_return'] - metrics['total_return']) > AMOUNT_TOLERANCE:
+                violations.append((metrics['stock_code'], f"历史交易记录 {trade_id} 的总收益计算不正确"))
         
-        return orphaned_buys
+        return violations
+    
+    @staticmethod
+    def _has_link(side: str):
+        """历史交易记录存在指定方向关联的EXISTS条件"""
+        return exists().where(and_(
+            HistoricalTradeLink.historical_trade_id == HistoricalTrade.id,
+            HistoricalTradeLink.side == side
+        ))
     
     @classmethod
-    def _check_historical_trade_consistency(cls) -> List[str]:
-        """检查历史交易记录的数据一致性"""
-        issues = []
+    def _find_dangling_links(cls, stock_codes: Optional[Set[str]] = None) -> List[Tuple[str, int, str]]:
+        """引用了不存在交易记录的 (股票代码, 历史交易ID, 方向)，一次左连接完成"""
+        query = db.session.query(
+            HistoricalTrade.stock_code,
+            HistoricalTradeLink.historical_trade_id,
+            HistoricalTradeLink.side
+        ).join(
+            HistoricalTrade, HistoricalTrade.id == HistoricalTradeLink.historical_trade_id
+        ).outerjoin(
+            TradeRecord, TradeRecord.id == HistoricalTradeLink.trade_record_id
+        ).filter(
+            TradeRecord.id.is_(None)
+        )
+        return cls._in_scope(query, HistoricalTrade.stock_code, stock_codes).distinct().order_by(
+            HistoricalTradeLink.historical_trade_id,
+            HistoricalTradeLink.side
+        ).all()
+    
+    @classmethod
+    def _aggregate_linked_records(cls, stock_codes: Optional[Set[str]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        按历史交易汇总关联交易记录，一次连接聚合计算各记录的应有指标
         
-        # 获取所有历史交易记录
-        historical_trades = HistoricalTrade.query.all()
+        Returns:
+            Dict: 历史交易ID -> 股票代码、记录值、总投入本金、总收益、收益率、持仓天数
+                  （只包含买卖关联都存在的记录）
+        """
+        amount = TradeRecord.price * TradeRecord.quantity
+        is_buy = HistoricalTradeLink.side == 'buy'
+        is_sell = HistoricalTradeLink.side == 'sell'
         
-        for trade in historical_trades:
-            try:
-                # 检查买入记录ID列表
-                buy_records_ids = trade.buy_records_list
-                sell_records_ids = trade.sell_records_list
-                
-                if not buy_records_ids or not sell_records_ids:
-                    issues.append(f"历史交易记录 {trade.id} 缺少买入或卖出记录ID")
-                    continue
-                
-                # 验证记录是否存在
-                buy_records = TradeRecord.query.filter(
-                    TradeRecord.id.in_(buy_records_ids)
-                ).all()
-                
-                sell_records = TradeRecord.query.filter(
-                    TradeRecord.id.in_(sell_records_ids)
-                ).all()
-                
-                if len(buy_records) != len(buy_records_ids):
-                    issues.append(f"历史交易记录 {trade.id} 的买入记录ID列表包含无效ID")
-                
-                if len(sell_records) != len(sell_records_ids):
-                    issues.append(f"历史交易记录 {trade.id} 的卖出记录ID列表包含无效ID")
-                
-                # 验证计算结果
-                if buy_records and sell_records:
-                    calculated_metrics = HistoricalTradeService.calculate_trade_metrics(
-                        buy_records, sell_records
-                    )
-                    
-                    # 检查投入本金
-                    if abs(float(trade.total_investment) - calculated_metrics['total_investment']) > 0.01:
-                        issues.append(f"历史交易记录 {trade.id} 的总投入本金计算不正确")
-                    
-                    # 检查收益
-                    if abs(float(trade.total_return) - calculated_metrics['total_return']) > 0.01:
-                        issues.append(f"历史交易记录 {trade.id} 的总收益计算不正确")
-                
-            except Exception as e:
-                issues.append(f"检查历史交易记录 {trade.id} 时发生错误: {str(e)}")
+        query = db.session.query(
+            HistoricalTradeLink.historical_trade_id,
+            HistoricalTrade.stock_code,
+            HistoricalTrade.total_investment.label('recorded_investment'),
+            HistoricalTrade.total_return.label('recorded_return'),
+            func.sum(case((is_buy, amount), else_=0)).label('buy_amount'),
+            func.sum(case((is_sell, amount), else_=0)).label('sell_amount'),
+            func.sum(case((is_buy, 1), else_=0)).label('buy_count'),
+            func.sum(case((is_sell, 1), else_=0)).label('sell_count'),
+            func.min(case((is_buy, TradeRecord.trade_date))).label('first_buy_date'),
+            func.max(case((is_sell, TradeRecord.trade_date))).label('last_sell_date')
+        ).join(
+            HistoricalTrade, HistoricalTrade.id == HistoricalTradeLink.historical_trade_id
+        ).join(
+            TradeRecord, TradeRecord.id == HistoricalTradeLink.trade_record_id
+        )
+        rows = cls._in_scope(query, HistoricalTrade.stock_code, stock_codes).group_by(
+            HistoricalTradeLink.historical_trade_id,
+            HistoricalTrade.stock_code,
+            HistoricalTrade.total_investment,
+            HistoricalTrade.total_return
+        ).all()
         
-        return issues
+        metrics = {}
+        for row in rows:
+            if not row.buy_count or not row.sell_count:
+                continue
+            total_investment = float(row.buy_amount)
+            total_return = float(row.sell_amount) - total_investment
+            metrics[row.historical_trade_id] = {
+                'stock_code': row.stock_code,
+                'recorded_investment': float(row.recorded_investment),
+                'recorded_return': float(row.recorded_return),
+                'total_investment': total_investment,
+                'total_return': total_return,
+                'return_rate': total_return / total_investment if total_investment > 0 else 0,
+                'holding_days': (row.last_sell_date - row.first_buy_date).days
+            }
+        return metrics
     
     @classmethod
-    def _check_duplicate_historical_trades(cls) -> List[Dict[str, Any]]:
-        """检查重复的历史交易记录"""
-        # 使用SQL查询查找重复记录
-        duplicate_query = db.session.query(
+    def _check_duplicate_historical_trades(cls, stock_codes: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """检查重复的历史交易记录（重复分组及其记录ID一次连接查出）"""
+        duplicate_groups = db.session.query(
             HistoricalTrade.stock_code,
             HistoricalTrade.buy_date,
-            HistoricalTrade.sell_date,
-            func.count(HistoricalTrade.id).label('count')
-        ).group_by(
+            HistoricalTrade.sell_date
+        )
+        duplicate_groups = cls._in_scope(duplicate_groups, HistoricalTrade.stock_code, stock_codes).group_by(
             HistoricalTrade.stock_code,
             HistoricalTrade.buy_date,
             HistoricalTrade.sell_date
-        ).having(func.count(HistoricalTrade.id) > 1)
-        
-        duplicates = []
-        for row in duplicate_query.all():
-            # 获取重复记录的详细信息
-            duplicate_records = HistoricalTrade.query.filter(
-                and_(
-                    HistoricalTrade.stock_code == row.stock_code,
-                    HistoricalTrade.buy_date == row.buy_date,
-                    HistoricalTrade.sell_date == row.sell_date
-                )
-            ).all()
-            
-            duplicates.append({
-                'stock_code': row.stock_code,
-                'buy_date': row.buy_date.isoformat(),
-                'sell_date': row.sell_date.isoformat(),
-                'count': row.count,
-                'record_ids': [r.id for r in duplicate_records]
+        ).having(func.count(HistoricalTrade.id) > 1).subquery()
+        
+        rows = db.session.query(
+            HistoricalTrade.stock_code,
+            HistoricalTrade.buy_date,
+            HistoricalTrade.sell_date,
+            HistoricalTrade.id
+        ).join(duplicate_groups, and_(
+            HistoricalTrade.stock_code == duplicate_groups.c.stock_code,
+            HistoricalTrade.buy_date == duplicate_groups.c.buy_date,
+            HistoricalTrade.sell_date == duplicate_groups.c.sell_date
+        )).order_by(
+            HistoricalTrade.stock_code,
+            HistoricalTrade.buy_date,
+            HistoricalTrade.sell_date,
+            HistoricalTrade.id
+        ).all()
+        
+        duplicates = {}
+        for stock_code, buy_date, sell_date, record_id in rows:
+            group = duplicates.setdefault((stock_code, buy_date, sell_date), {
+                'stock_code': stock_code,
+                'buy_date': buy_date.isoformat(),
+                'sell_date': sell_date.isoformat(),
+                'count': 0,
+                'record_ids': []
             })
+            group['count'] += 1
+            group['record_ids'].append(record_id)
         
-        return duplicates
+        return list(duplicates.values())
     
     @classmethod
-    def _check_data_constraints(cls) -> List[str]:
+    def _check_data_constraints(cls, stock_codes: Optional[Set[str]] = None) -> List[str]:
         """检查数据约束违反"""
-        issues = []
-        
-        # 检查历史交易记录的约束
-        invalid_investments = HistoricalTrade.query.filter(
-            HistoricalTrade.total_investment <= 0
-        ).count()
-        
-        if invalid_investments > 0:
-            issues.append(f"发现 {invalid_investments} 条总投入本金小于等于0的记录")
-        
-        invalid_holding_days = HistoricalTrade.query.filter(
-            HistoricalTrade.holding_days < 0
-        ).count()
-        
-        if invalid_holding_days > 0:
-            issues.append(f"发现 {invalid_holding_days} 条持仓天数为负数的记录")
-        
-        invalid_date_order = HistoricalTrade.query.filter(
-            HistoricalTrade.sell_date < HistoricalTrade.buy_date
-        ).count()
-        
-        if invalid_date_order > 0:
-            issues.append(f"发现 {invalid_date_order} 条卖出日期早于买入日期的记录")
+        totals = dict.fromkeys(cls.CONSTRAINT_MESSAGES, 0)
+        for counts in cls._count_constraint_violations(stock_codes).values():
+            for kind, count in counts.items():
+                totals[kind] += count
+        return cls._format_constraint_issues(totals)
+    
+    @classmethod
+    def _count_constraint_violations(cls, stock_codes: Optional[Set[str]] = None) -> Dict[str, Dict[str, int]]:
+        """按股票一次分组统计各类约束违反的记录数（只返回存在违反的股票）"""
+        conditions = {
+            'invalid_investment': HistoricalTrade.total_investment <= 0,
+            'invalid_holding_days': HistoricalTrade.holding_days < 0,
+            'invalid_date_order': HistoricalTrade.sell_date < HistoricalTrade.buy_date
+        }
+        query = db.session.query(
+            HistoricalTrade.stock_code,
+            *[func.sum(case((condition, 1), else_=0)) for condition in conditions.values()]
+        ).filter(or_(*conditions.values()))
         
-        return issues
+        return {
+            row[0]: {kind: int(count) for kind, count in zip(conditions, row[1:]) if count}
+            for row in cls._in_scope(query, HistoricalTrade.stock_code, stock_codes).group_by(
+                HistoricalTrade.stock_code
+            )
+        }
     
     @classmethod
-    def _check_record_references(cls) -> List[str]:
+    def _format_constraint_issues(cls, counts: Dict[str, int]) -> List[str]:
+        """将约束违反数量转换为问题描述"""
+        return [
+            cls.CONSTRAINT_MESSAGES[kind].format(count=counts[kind])
+            for kind in cls.CONSTRAINT_MESSAGES if counts.get(kind)
+        ]
+    
+    @classmethod
+    def _check_record_references(cls, stock_codes: Optional[Set[str]] = None) -> List[str]:
         """检查记录引用的有效性"""
-        issues = []
-        
-        # 检查历史交易记录中引用的交易记录ID是否有效
-        historical_trades = HistoricalTrade.query.all()
-        
-        for trade in historical_trades:
-            try:
-                buy_ids = trade.buy_records_list
-                sell_ids = trade.sell_records_list
-                
-                # 检查买入记录引用
-                if buy_ids:
-                    existing_buy_count = TradeRecord.query.filter(
-                        TradeRecord.id.in_(buy_ids)
-                    ).count()
-                    
-                    if existing_buy_count != len(buy_ids):
-                        issues.append(f"历史交易记录 {trade.id} 引用了不存在的买入记录ID")
-                
-                # 检查卖出记录引用
-                if sell_ids:
-                    existing_sell_count = TradeRecord.query.filter(
-                        TradeRecord.id.in_(sell_ids)
-                    ).count()
-                    
-                    if existing_sell_count != len(sell_ids):
-                        issues.append(f"历史交易记录 {trade.id} 引用了不存在的卖出记录ID")
-                        
-            except Exception as e:
-                issues.append(f"检查历史交易记录 {trade.id} 的引用时发生错误: {str(e)}")
-        
-        return issues
+        return [message for _, message in cls._find_reference_violations(stock_codes)]
+    
+    @classmethod
+    def _find_reference_violations(cls, stock_codes: Optional[Set[str]] = None) -> List[Tuple[str, str]]:
+        """引用了不存在交易记录的违规 (股票代码, 问题描述)"""
+        return [
+            (code, f"历史交易记录 {trade_id} 引用了不存在的{'买入' if side == 'buy' else '卖出'}记录ID")
+            for code, trade_id, side in cls._find_dangling_links(stock_codes)
+        ]
     
     @classmethod
     def _calculate_integrity_statistics(cls) -> Dict[str, Any]:
@@ -563,43 +745,28 @@ class DataSyncService:
     
     @classmethod
     def _fix_data_inconsistencies(cls) -> Dict[str, Any]:
-        """修复数据不一致"""
+        """修复数据不一致（按关联交易记录重新计算，只更新有差异的记录）"""
         fixed_count = 0
         
-        # 重新计算所有历史交易记录的指标
-        historical_trades = HistoricalTrade.query.all()
-        
-        for trade in historical_trades:
-            try:
-                buy_records_ids = trade.buy_records_list
-                sell_records_ids = trade.sell_records_list
-                
-                if buy_records_ids and sell_records_ids:
-                    buy_records = TradeRecord.query.filter(
-                        TradeRecord.id.in_(buy_records_ids)
-                    ).all()
-                    
-                    sell_records = TradeRecord.query.filter(
-                        TradeRecord.id.in_(sell_records_ids)
-                    ).all()
-                    
-                    if buy_records and sell_records:
-                        # 重新计算指标
-                        metrics = HistoricalTradeService.calculate_trade_metrics(
-                            buy_records, sell_records
-                        )
-                        
-                        # 更新记录
-                        trade.total_investment = metrics['total_investment']
-                        trade.total_return = metrics['total_return']
-                        trade.return_rate = metrics['return_rate']
-                        trade.holding_days = metrics['holding_days']
-                        
-                        fixed_count += 1
-                        
-            except Exception as e:
-                from flask import current_app
-                current_app.logger.error(f"修复历史交易记录 {trade.id} 时发生错误: {str(e)}")
+        linked_metrics = cls._aggregate_linked_records()
+        if not linked_metrics:
+            return {'action': 'fix_inconsistencies', 'fixed_count': 0}
+        
+        for trade in HistoricalTrade.query.all():
+            metrics = linked_metrics.get(trade.id)
+            if metrics is None:
+                continue
+            
+            if (abs(float(trade.total_investment) - metrics['total_investment']) > AMOUNT_TOLERANCE or
+                    abs(float(trade.total_return) - metrics['total_return']) > AMOUNT_TOLERANCE or
+                    abs(float(trade.return_rate) - metrics['return_rate']) > 0.0001 or
+                    trade.holding_days != metrics['holding_days']):
+                # 更新记录
+                trade.total_investment = metrics['total_investment']
+                trade.total_return = metrics['total_return']
+                trade.return_rate = metrics['return_rate']
+                trade.holding_days = metrics['holding_days']
+                fixed_count += 1
         
         return {
             'action': 'fix_inconsistencies',
@@ -609,45 +776,20 @@ class DataSyncService:
     @classmethod
     def _fix_invalid_references(cls) -> Dict[str, Any]:
         """修复无效引用"""
-        fixed_count = 0
-        
-        # 删除引用了不存在记录的历史交易记录
-        historical_trades = HistoricalTrade.query.all()
+        # 删除引用了不存在记录的历史交易记录（关联随ORM删除事件一并删除）
+        trade_ids = sorted({trade_id for _, trade_id, _ in cls._find_dangling_links()})
         
-        for trade in historical_trades:
-            try:
-                buy_ids = trade.buy_records_list
-                sell_ids = trade.sell_records_list
-                
-                # 检查引用的有效性
-                valid_buy_ids = []
-                valid_sell_ids = []
-                
-                if buy_ids:
-                    existing_buys = TradeRecord.query.filter(
-                        TradeRecord.id.in_(buy_ids)
-                    ).all()
-                    valid_buy_ids = [r.id for r in existing_buys]
-                
-                if sell_ids:
-                    existing_sells = TradeRecord.query.filter(
-                        TradeRecord.id.in_(sell_ids)
-                    ).all()
-                    valid_sell_ids = [r.id for r in existing_sells]
-                
-                # 如果引用无效，删除该历史交易记录
-                if (buy_ids and len(valid_buy_ids) != len(buy_ids)) or \
-                   (sell_ids and len(valid_sell_ids) != len(sell_ids)):
-                    db.session.delete(trade)
-                    fixed_count += 1
-                    
-            except Exception as e:
-                from flask import current_app
-                current_app.logger.error(f"修复历史交易记录 {trade.id} 的引用时发生错误: {str(e)}")
+        removed_count = 0
+        for i in range(0, len(trade_ids), BATCH_QUERY_SIZE):
+            for trade in HistoricalTrade.query.filter(
+                HistoricalTrade.id.in_(trade_ids[i:i + BATCH_QUERY_SIZE])
+            ).all():
+                db.session.delete(trade)
+                removed_count += 1
         
         return {
             'action': 'fix_invalid_references',
-            'removed_count': fixed_count
+            'removed_count': removed_count
         }
     
     @classmethod
@@ -8,7 +8,9 @@ from collections import defaultdict
 from sqlalchemy import and_, extract
 from extensions import db
 from models.trade_record import TradeRecord
+from models.read_models import TradeReadModel, TradeRow, price_fen_of
 from services.base_service import BaseService
+from utils.money import div_round, fen_to_yuan, ratio, to_fen
 from error_handlers import ValidationError, DatabaseError
 
 
@@ -151,7 +153,7 @@ class ExpectationComparisonService(BaseService):
                 }
             
             # 计算实际投入资金
-            total_buy_amount = sum(float(t.price) * t.quantity for t in trades if t.trade_type == 'buy')
+            total_buy_amount = fen_to_yuan(sum(price_fen_of(t) * t.quantity for t in trades if t.trade_type == 'buy'))
             
             # 计算已完成交易的实际指标
             completed_trades_data = cls._calculate_completed_trades_metrics(trades)
@@ -256,7 +258,7 @@ class ExpectationComparisonService(BaseService):
             raise ValidationError("基准本金必须大于0")
     
     @classmethod
-    def _get_trades_by_time_range(cls, time_range: str) -> List[TradeRecord]:
+    def _get_trades_by_time_range(cls, time_range: str) -> List[TradeRow]:
         """根据时间范围获取交易记录
         
         Args:
@@ -269,12 +271,7 @@ class ExpectationComparisonService(BaseService):
         """
         try:
             # 基础查询：未订正的交易记录，且在320万本金起始日期之后
-            query = TradeRecord.query.filter(
-                and_(
-                    TradeRecord.is_corrected == False,
-                    TradeRecord.trade_date >= cls.BASE_CAPITAL_START_DATE
-                )
-            )
+            start_date = cls.BASE_CAPITAL_START_DATE
             
             if time_range != 'all':
                 # 计算时间范围的开始日期
@@ -288,9 +285,8 @@ class ExpectationComparisonService(BaseService):
                 
                 # 确保开始日期不早于320万本金起始日期
                 start_date = max(start_date, cls.BASE_CAPITAL_START_DATE)
-                query = query.filter(TradeRecord.trade_date >= start_date)
             
-            return query.all()
+            return TradeReadModel.load_trades(TradeRecord.trade_date >= start_date, order_by_stock=False)
         except Exception as e:
             raise DatabaseError(f"获取交易记录失败: {str(e)}")
     
@@ -313,8 +309,8 @@ class ExpectationComparisonService(BaseService):
                 stock_trades[trade.stock_code].append(trade)
             
             completed_trades = []
-            total_cost = 0
-            total_profit = 0
+            total_cost = 0  # 分
+            total_profit = 0  # 分
             total_holding_days = 0
             successful_trades = 0
             
@@ -327,11 +323,11 @@ class ExpectationComparisonService(BaseService):
                 
                 for completed_trade in stock_completed:
                     completed_trades.append(completed_trade)
-                    total_cost += completed_trade['cost']
-                    total_profit += completed_trade['profit']
+                    total_cost += completed_trade['cost_fen']
+                    total_profit += completed_trade['profit_fen']
                     total_holding_days += completed_trade['holding_days']
                     
-                    if completed_trade['profit'] > 0:
+                    if completed_trade['profit_fen'] > 0:
                         successful_trades += 1
             
             if not completed_trades:
@@ -343,7 +339,7 @@ class ExpectationComparisonService(BaseService):
                 }
             
             # 计算加权平均收益率
-            weighted_return_rate = total_profit / total_cost if total_cost > 0 else 0
+            weighted_return_rate = ratio(total_profit, total_cost)
             
             # 计算平均持仓天数
             avg_holding_days = total_holding_days / len(completed_trades)
@@ -356,7 +352,7 @@ class ExpectationComparisonService(BaseService):
                 'avg_holding_days': avg_holding_days,
                 'success_rate': success_rate,
                 'completed_count': len(completed_trades),
-                'total_realized_profit': total_profit
+                'total_realized_profit': fen_to_yuan(total_profit)
             }
         except Exception as e:
             raise DatabaseError(f"计算已完成交易指标失败: {str(e)}")
@@ -378,13 +374,13 @@ class ExpectationComparisonService(BaseService):
             if trade.trade_type == 'buy':
                 buy_queue.append({
                     'quantity': trade.quantity,
-                    'price': float(trade.price),
+                    'price_fen': price_fen_of(trade),
                     'date': trade.trade_date,
                     'remaining': trade.quantity
                 })
             elif trade.trade_type == 'sell':
                 sell_quantity = trade.quantity
-                sell_price = float(trade.price)
+                sell_price_fen = price_fen_of(trade)
                 sell_date = trade.trade_date
                 
                 # 从买入队列中匹配卖出
@@ -394,9 +390,9 @@ class ExpectationComparisonService(BaseService):
                     # 计算本次匹配的数量
                     match_quantity = min(sell_quantity, buy_item['remaining'])
                     
-                    # 计算本次匹配的成本和收益
-                    cost = match_quantity * buy_item['price']
-                    revenue = match_quantity * sell_price
+                    # 计算本次匹配的成本和收益（分）
+                    cost = match_quantity * buy_item['price_fen']
+                    revenue = match_quantity * sell_price_fen
                     profit = revenue - cost
                     
                     # 计算持仓天数
@@ -405,14 +401,16 @@ class ExpectationComparisonService(BaseService):
                     # 记录完成交易
                     completed_trades.append({
                         'quantity': match_quantity,
-                        'buy_price': buy_item['price'],
-                        'sell_price': sell_price,
-                        'cost': cost,
-                        'revenue': revenue,
-                        'profit': profit,
+                        'buy_price': fen_to_yuan(buy_item['price_fen']),
+                        'sell_price': fen_to_yuan(sell_price_fen),
+                        'cost': fen_to_yuan(cost),
+                        'revenue': fen_to_yuan(revenue),
+                        'profit': fen_to_yuan(profit),
                         'holding_days': holding_days,
                         'buy_date': buy_item['date'],
-                        'sell_date': sell_date
+                        'sell_date': sell_date,
+                        'cost_fen': cost,
+                        'profit_fen': profit
                     })
                     
                     # 更新数量
@@ -440,34 +438,38 @@ class ExpectationComparisonService(BaseService):
             from collections import defaultdict
             
             # 计算当前持仓
+            # 持仓成本按整数分累计，卖出按平均成本扣减（四舍五入到分）
             holdings = defaultdict(lambda: {'quantity': 0, 'total_cost': 0})
             
             for trade in trades:
                 if trade.trade_type == 'buy':
                     holdings[trade.stock_code]['quantity'] += trade.quantity
-                    holdings[trade.stock_code]['total_cost'] += float(trade.price) * trade.quantity
+                    holdings[trade.stock_code]['total_cost'] += price_fen_of(trade) * trade.quantity
                 elif trade.trade_type == 'sell':
                     # 按FIFO计算卖出成本
                     if holdings[trade.stock_code]['quantity'] > 0:
-                        avg_cost = holdings[trade.stock_code]['total_cost'] / holdings[trade.stock_code]['quantity']
-                        cost_reduction = avg_cost * trade.quantity
+                        cost_reduction = div_round(
+                            holdings[trade.stock_code]['total_cost'] * trade.quantity,
+                            holdings[trade.stock_code]['quantity']
+                        )
                         holdings[trade.stock_code]['total_cost'] -= cost_reduction
                         holdings[trade.stock_code]['quantity'] -= trade.quantity
             
-            # 计算未实现收益
-            total_unrealized_profit = 0.0
+            # 计算未实现收益（分）
+            total_unrealized_profit = 0
+            
+            # 一次查询获取所有持仓股票的最新价格
+            held_codes = [code for code, holding in holdings.items() if holding['quantity'] > 0]
+            latest_prices = StockPrice.get_latest_prices(held_codes)
             
-            for stock_code, holding in holdings.items():
-                if holding['quantity'] > 0:
-                    # 获取最新价格
-                    stock_price = StockPrice.get_latest_price(stock_code)
-                    if stock_price and stock_price.current_price:
-                        current_price = float(stock_price.current_price)
-                        market_value = current_price * holding['quantity']
-                        unrealized_profit = market_value - holding['total_cost']
-                        total_unrealized_profit += unrealized_profit
+            for stock_code in held_codes:
+                holding = holdings[stock_code]
+                stock_price = latest_prices.get(stock_code)
+                if stock_price and stock_price.current_price:
+                    market_value = to_fen(stock_price.current_price) * holding['quantity']
+                    total_unrealized_profit += market_value - holding['total_cost']
             
-            return total_unrealized_profit
+            return fen_to_yuan(total_unrealized_profit)
             
         except Exception as e:
             # 如果无法获取价格数据，返回0
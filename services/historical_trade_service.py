@@ -1,28 +1,58 @@
 """
 历史交易识别和数据生成服务
 """
+import copy
 import json
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import List, Dict, Optional, Any, Tuple
-from sqlalchemy import and_, or_, desc, asc, func
+from typing import Callable, List, Dict, Optional, Any, Tuple, Set
+import numpy as np
+from sqlalchemy import and_, or_, desc, asc, func, case, type_coerce
 from extensions import db
 from models.trade_record import TradeRecord
-from models.historical_trade import HistoricalTrade
+from models.read_models import TradeReadModel, price_fen_of
+from models.historical_trade import HistoricalTrade, HistoricalTradeLink
+from models.configuration import Configuration
+from models.search_index import SearchIndex
 from services.base_service import BaseService
+from services.non_trading_day_service import NonTradingDayService
+from utils.pagination import keyset_paginate
+from utils.serialization import parse_fields, project_query, serialize_items
+from utils.money import FEN_PER_YUAN, fen_to_decimal, fen_to_yuan, ratio
+from utils.structured_logging import get_logger
 from error_handlers import ValidationError, NotFoundError, DatabaseError
 
+logger = get_logger(__name__)
+
+# 单次IN查询的最大参数数量（SQLite默认限制为999）
+BATCH_QUERY_SIZE = 500
+
+# 生成历史交易记录时每批插入的默认记录数
+DEFAULT_INSERT_BATCH_SIZE = 1000
+
+# 统计信息中的分位数
+STATISTICS_PERCENTILES = (10, 25, 50, 75, 90)
+
 
 class HistoricalTradeService(BaseService):
     """历史交易识别和数据生成服务"""
     
     model = HistoricalTrade
     
+    # 增量同步水位（交易记录最大ID、最后更新时间和水位内记录数）的配置键
+    SYNC_WATERMARK_KEY = 'historical_trade_sync_watermark'
+    
+    # 统计信息缓存：(数据版本号, 统计结果)，仅在当前进程内有效
+    _statistics_cache = None
+    
     @classmethod
-    def identify_completed_trades(cls) -> List[Dict[str, Any]]:
+    def identify_completed_trades(cls, stock_codes: List[str] = None) -> List[Dict[str, Any]]:
         """
         识别已完成的交易（已完成清仓的交易）
         
+        Args:
+            stock_codes: 只分析指定股票（可选，默认分析全部股票）
+        
         Returns:
             List[Dict]: 已完成交易的列表，每个字典包含交易的基本信息
         """
@@ -30,11 +60,8 @@ class HistoricalTradeService(BaseService):
             from flask import current_app
             current_app.logger.info("=== identify_completed_trades 开始 ===")
             
-            # 获取所有交易记录，按股票代码和交易日期排序
-            all_trades = TradeRecord.query.filter_by(is_corrected=False).order_by(
-                TradeRecord.stock_code.asc(),
-                TradeRecord.trade_date.asc()
-            ).all()
+            # 获取交易记录行，按股票代码和交易日期排序
+            all_trades = TradeReadModel.load_trades(stock_codes=stock_codes)
             
             current_app.logger.info(f"获取到 {len(all_trades)} 条交易记录")
             
@@ -51,13 +78,9 @@ class HistoricalTradeService(BaseService):
             
             # 对每只股票分析交易记录
             for stock_code, stock_trades in trades_by_stock.items():
-                current_app.logger.info(f"分析股票 {stock_code}，共 {len(stock_trades)} 条记录")
-                
                 # 分析这只股票的完整交易周期
                 stock_completed_trades = cls._analyze_stock_trades(stock_code, stock_trades)
                 completed_trades.extend(stock_completed_trades)
-                
-                current_app.logger.info(f"股票 {stock_code} 识别出 {len(stock_completed_trades)} 个完整交易")
             
             current_app.logger.info(f"总共识别出 {len(completed_trades)} 个完整交易")
             current_app.logger.info("=== identify_completed_trades 完成 ===")
@@ -80,27 +103,21 @@ class HistoricalTradeService(BaseService):
         Returns:
             List[Dict]: 完整交易周期列表
         """
-        from flask import current_app
-        current_app.logger.info(f"=== _analyze_stock_trades 开始，股票: {stock_code} ===")
-        
         completed_trades = []
         current_position = 0  # 当前持仓数量
         buy_records = []  # 当前持有的买入记录
         sell_records = []  # 当前交易周期的卖出记录
         
         for trade in trades:
-            current_app.logger.info(f"处理交易记录: {trade.trade_type} {trade.quantity} 股，价格 {trade.price}")
-            
             if trade.trade_type == 'buy':
                 # 买入操作
                 current_position += trade.quantity
                 buy_records.append(trade)
-                current_app.logger.info(f"买入后持仓: {current_position} 股")
                 
             elif trade.trade_type == 'sell':
                 # 卖出操作
                 if current_position <= 0:
-                    current_app.logger.warning(f"警告: 在没有持仓的情况下卖出 {trade.quantity} 股")
+                    logger.warning("没有持仓时卖出", stock_code=stock_code, trade_id=trade.id, quantity=trade.quantity)
                     continue
                 
                 sell_quantity = min(trade.quantity, current_position)
@@ -109,13 +126,8 @@ class HistoricalTradeService(BaseService):
                 # 记录所有卖出交易
                 sell_records.append(trade)
                 
-                current_app.logger.info(f"卖出 {sell_quantity} 股，剩余持仓: {current_position} 股")
-                
                 # 如果完全清仓，创建一个完整交易记录
                 if current_position == 0 and buy_records:
-                    current_app.logger.info("检测到完全清仓，创建完整交易记录")
-                    current_app.logger.info(f"买入记录数: {len(buy_records)}, 卖出记录数: {len(sell_records)}")
-                    
                     completed_trade = cls._create_completed_trade_data(
                         stock_code, buy_records, sell_records
                     )
@@ -124,9 +136,8 @@ class HistoricalTradeService(BaseService):
                     # 清空记录
                     buy_records = []
                     sell_records = []
-                    current_app.logger.info("完整交易记录已创建，重置买入和卖出记录")
         
-        current_app.logger.info(f"股票 {stock_code} 分析完成，识别出 {len(completed_trades)} 个完整交易")
+        logger.debug("股票交易分析完成", stock_code=stock_code, trades=len(trades), completed=len(completed_trades))
         return completed_trades
     
     @classmethod
@@ -143,10 +154,6 @@ class HistoricalTradeService(BaseService):
         Returns:
             Dict: 完整交易数据
         """
-        from flask import current_app
-        current_app.logger.info(f"=== _create_completed_trade_data 开始 ===")
-        current_app.logger.info(f"买入记录数: {len(buy_records)}, 卖出记录数: {len(sell_records)}")
-        
         # 获取股票名称（从第一条记录获取）
         stock_name = buy_records[0].stock_name if buy_records else sell_records[0].stock_name
         
@@ -157,44 +164,36 @@ class HistoricalTradeService(BaseService):
         # 计算持仓天数
         holding_days = (sell_date - buy_date).days
         
-        # 计算总投入本金和总收益
-        total_investment = sum(
-            float(record.price) * record.quantity for record in buy_records
-        )
-        
-        total_revenue = sum(
-            float(record.price) * record.quantity for record in sell_records
-        )
+        # 计算总投入本金和总收益（分）
+        total_investment = sum(price_fen_of(record) * record.quantity for record in buy_records)
+        total_revenue = sum(price_fen_of(record) * record.quantity for record in sell_records)
         
         total_return = total_revenue - total_investment
-        return_rate = total_return / total_investment if total_investment > 0 else 0
+        return_rate = ratio(total_return, total_investment)
         
         # 记录ID列表
         buy_records_ids = [record.id for record in buy_records]
         sell_records_ids = [record.id for record in sell_records]
         
-        current_app.logger.info(f"交易指标计算完成:")
-        current_app.logger.info(f"  持仓天数: {holding_days}")
-        current_app.logger.info(f"  总投入: {total_investment}")
-        current_app.logger.info(f"  总收益: {total_return}")
-        current_app.logger.info(f"  收益率: {return_rate:.4f}")
-        
         completed_trade_data = {
             'stock_code': stock_code,
             'stock_name': stock_name,
             'buy_date': buy_date,
             'sell_date': sell_date,
             'holding_days': holding_days,
-            'total_investment': Decimal(str(total_investment)),
-            'total_return': Decimal(str(total_return)),
+            'total_investment': fen_to_decimal(total_investment),
+            'total_return': fen_to_decimal(total_return),
             'return_rate': Decimal(str(return_rate)),
             'buy_records_ids': json.dumps(buy_records_ids),
             'sell_records_ids': json.dumps(sell_records_ids),
             'is_completed': True,
             'completion_date': sell_date
         }
-        
-        current_app.logger.info("=== _create_completed_trade_data 完成 ===")
+        logger.debug(
+            "完整交易数据已生成", stock_code=stock_code, buy_count=len(buy_records), sell_count=len(sell_records),
+            holding_days=holding_days, total_investment_fen=total_investment, total_return_fen=total_return,
+            return_rate=round(return_rate, 4)
+        )
         return completed_trade_data
     
     @classmethod
@@ -226,21 +225,18 @@ class HistoricalTradeService(BaseService):
             total_buy_quantity = sum(record.quantity for record in buy_records)
             total_sell_quantity = sum(record.quantity for record in sell_records)
             
-            # 财务计算
-            total_investment = sum(
-                float(record.price) * record.quantity for record in buy_records
-            )
+            # 财务计算（内部按整数分计算，输出时转为元）
+            investment_fen = sum(price_fen_of(record) * record.quantity for record in buy_records)
+            revenue_fen = sum(price_fen_of(record) * record.quantity for record in sell_records)
             
-            total_revenue = sum(
-                float(record.price) * record.quantity for record in sell_records
-            )
-            
-            total_return = total_revenue - total_investment
-            return_rate = total_return / total_investment if total_investment > 0 else 0
+            total_investment = fen_to_yuan(investment_fen)
+            total_revenue = fen_to_yuan(revenue_fen)
+            total_return = fen_to_yuan(revenue_fen - investment_fen)
+            return_rate = ratio(revenue_fen - investment_fen, investment_fen)
             
             # 平均价格
-            avg_buy_price = total_investment / total_buy_quantity if total_buy_quantity > 0 else 0
-            avg_sell_price = total_revenue / total_sell_quantity if total_sell_quantity > 0 else 0
+            avg_buy_price = investment_fen / (total_buy_quantity * FEN_PER_YUAN) if total_buy_quantity > 0 else 0
+            avg_sell_price = revenue_fen / (total_sell_quantity * FEN_PER_YUAN) if total_sell_quantity > 0 else 0
             
             # 日均收益率
             daily_return_rate = return_rate / holding_days if holding_days > 0 else 0
@@ -278,12 +274,17 @@ class HistoricalTradeService(BaseService):
             raise DatabaseError(f"计算交易指标失败: {str(e)}")
     
     @classmethod
-    def generate_historical_records(cls, force_regenerate: bool = False) -> Dict[str, Any]:
+    def generate_historical_records(cls, force_regenerate: bool = False, batch_size: int = None,
+                                    progress_callback: Callable[[int, int], None] = None) -> Dict[str, Any]:
         """
         生成历史交易记录
         
+        整批验证后按批次使用 executemany 插入，删除与插入在同一事务内完成。
+        
         Args:
             force_regenerate: 是否强制重新生成（删除现有记录）
+            batch_size: 每批插入的记录数（可选，默认取配置 HISTORICAL_TRADE_INSERT_BATCH_SIZE）
+            progress_callback: 每批插入后回调 (已处理数, 待插入总数)（可选）
             
         Returns:
             Dict: 生成结果统计
@@ -293,49 +294,54 @@ class HistoricalTradeService(BaseService):
             current_app.logger.info("=== generate_historical_records 开始 ===")
             current_app.logger.info(f"强制重新生成: {force_regenerate}")
             
-            # 如果强制重新生成，删除现有记录
+            if batch_size is None:
+                batch_size = cls._get_insert_batch_size()
+            elif not isinstance(batch_size, int) or batch_size <= 0:
+                raise ValidationError("批量插入大小必须是正整数", "batch_size")
+            
+            # 如果强制重新生成，删除现有记录（与插入一起提交）
             if force_regenerate:
                 current_app.logger.info("删除现有历史交易记录")
                 deleted_count = HistoricalTrade.query.delete()
-                db.session.commit()
+                db.session.execute(HistoricalTradeLink.__table__.delete())
+                cls.model.mark_data_changed(db.session)
                 current_app.logger.info(f"删除了 {deleted_count} 条现有记录")
             
             # 识别已完成的交易
             completed_trades = cls.identify_completed_trades()
             current_app.logger.info(f"识别出 {len(completed_trades)} 个完整交易")
             
-            # 统计信息
-            created_count = 0
+            # 跳过已存在的记录（一次查询取出现有记录的匹配键）
             skipped_count = 0
-            error_count = 0
+            if force_regenerate:
+                pending_trades = completed_trades
+            else:
+                existing_keys = cls._load_existing_keys()
+                pending_trades = []
+                for trade_data in completed_trades:
+                    if cls._record_key(trade_data['stock_code'], trade_data['buy_date'],
+                                       trade_data['sell_date']) in existing_keys:
+                        skipped_count += 1
+                    else:
+                        pending_trades.append(trade_data)
+            
+            # 整批验证，不合法的行记为错误
             errors = []
+            invalid_rows = cls.model.validate_rows(pending_trades)
+            for index, message in sorted(invalid_rows.items()):
+                trade_data = pending_trades[index]
+                errors.append(f"创建记录失败 {trade_data['stock_code']}: {message}")
+            valid_trades = [
+                trade_data for index, trade_data in enumerate(pending_trades) if index not in invalid_rows
+            ]
             
-            # 创建历史交易记录
-            for trade_data in completed_trades:
-                try:
-                    # 检查是否已存在相同的历史交易记录
-                    existing_record = cls._find_existing_record(trade_data)
-                    
-                    if existing_record and not force_regenerate:
-                        current_app.logger.info(f"跳过已存在的记录: {trade_data['stock_code']} {trade_data['buy_date']}")
-                        skipped_count += 1
-                        continue
-                    
-                    # 创建新的历史交易记录
-                    historical_trade = cls.create(trade_data)
-                    created_count += 1
-                    
-                    current_app.logger.info(f"创建历史交易记录: ID={historical_trade.id}, {trade_data['stock_code']}")
-                    
-                except Exception as e:
-                    error_count += 1
-                    error_msg = f"创建记录失败 {trade_data['stock_code']}: {str(e)}"
-                    errors.append(error_msg)
-                    current_app.logger.error(error_msg)
+            # 分批插入历史交易记录
+            created_count = cls._bulk_insert_records(valid_trades, batch_size, progress_callback)
             
             # 提交事务
             db.session.commit()
             
+            error_count = len(errors)
             result = {
                 'total_identified': len(completed_trades),
                 'created_count': created_count,
@@ -350,40 +356,102 @@ class HistoricalTradeService(BaseService):
             
             return result
             
+        except ValidationError:
+            raise
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f"生成历史交易记录失败: {str(e)}")
             raise DatabaseError(f"生成历史交易记录失败: {str(e)}")
     
+    @classmethod
+    def _get_insert_batch_size(cls) -> int:
+        """每批插入的记录数，配置无效时使用默认值"""
+        from flask import current_app
+        configured = current_app.config.get('HISTORICAL_TRADE_INSERT_BATCH_SIZE')
+        return configured if isinstance(configured, int) and configured > 0 else DEFAULT_INSERT_BATCH_SIZE
+    
+    @classmethod
+    def _bulk_insert_records(cls, trades: List[Dict[str, Any]], batch_size: int,
+                             progress_callback: Callable[[int, int], None] = None) -> int:
+        """
+        使用 core insert 分批插入已验证的历史交易记录（不提交事务）
+        
+        Returns:
+            int: 插入的记录数
+        """
+        from flask import current_app
+        columns = [column.name for column in cls.model.__table__.columns
+                   if column.name not in ('id', 'created_at', 'updated_at')]
+        statement = cls.model.__table__.insert()
+        
+        total = len(trades)
+        inserted = 0
+        for i in range(0, total, batch_size):
+            batch = [
+                {column: trade_data[column] for column in columns if column in trade_data}
+                for trade_data in trades[i:i + batch_size]
+            ]
+            db.session.execute(statement, batch)
+            inserted += len(batch)
+            
+            current_app.logger.info(f"已插入历史交易记录 {inserted}/{total}")
+            if progress_callback:
+                progress_callback(inserted, total)
+        
+        # core insert 不触发ORM事件，新记录的买入/卖出关联一次性按JSON列补齐
+        if inserted:
+            HistoricalTradeLink.backfill_from_json(db.session)
+            cls.model.mark_data_changed(db.session)
+        
+        return inserted
+    
     @classmethod
     def sync_historical_records(cls) -> Dict[str, Any]:
         """
         同步历史交易记录（增量更新）
         
+        只重新分析上次同步后交易记录有变更的股票，并只写入新增或发生变化的历史交易记录，
+        同步开销与变更量成正比。没有同步水位或水位失效时退化为全量同步。
+        
         Returns:
             Dict: 同步结果统计
         """
+        from flask import current_app
+        # 先取出进程内记录的变更，同步失败时放回
+        changed_codes, deleted_trade_ids = HistoricalTrade.take_trade_changes()
         try:
-            from flask import current_app
             current_app.logger.info("=== sync_historical_records 开始 ===")
             
-            # 获取最后一次同步的时间（从最新的历史交易记录获取）
-            last_sync_record = HistoricalTrade.query.order_by(
-                HistoricalTrade.created_at.desc()
-            ).first()
+            # 在分析之前读取水位，同步期间写入的交易记录留给下次同步
+            watermark = cls._get_trade_watermark()
+            dirty_codes = cls._collect_dirty_stocks(changed_codes, deleted_trade_ids)
+            full_sync = dirty_codes is None
             
-            last_sync_time = last_sync_record.created_at if last_sync_record else datetime.min
-            current_app.logger.info(f"上次同步时间: {last_sync_time}")
+            last_sync_time = cls._get_last_sync_time()
+            current_app.logger.info(
+                f"上次同步时间: {last_sync_time}，"
+                f"{'全量同步' if full_sync else f'增量同步 {len(dirty_codes)} 只股票'}"
+            )
+            
+            # 只识别变更股票的完整交易
+            if full_sync:
+                all_completed_trades = cls.identify_completed_trades()
+            elif dirty_codes:
+                all_completed_trades = cls.identify_completed_trades(sorted(dirty_codes))
+            else:
+                all_completed_trades = []
             
-            # 识别新的完整交易
-            all_completed_trades = cls.identify_completed_trades()
+            # 一次查询取出范围内的现有记录，按 (股票代码, 买入日期, 卖出日期) 匹配
+            existing_records = cls._load_existing_records(None if full_sync else dirty_codes)
             
             # 过滤出需要同步的交易（新的或更新的）
             new_trades = []
             updated_trades = []
             
             for trade_data in all_completed_trades:
-                existing_record = cls._find_existing_record(trade_data)
+                existing_record = existing_records.get(cls._record_key(
+                    trade_data['stock_code'], trade_data['buy_date'], trade_data['sell_date']
+                ))
                 
                 if not existing_record:
                     # 新交易
@@ -406,7 +474,7 @@ class HistoricalTradeService(BaseService):
                 try:
                     historical_trade = cls.create(trade_data)
                     created_count += 1
-                    current_app.logger.info(f"创建新历史交易记录: ID={historical_trade.id}")
+                    logger.debug("创建历史交易记录", id=historical_trade.id)
                 except Exception as e:
                     error_count += 1
                     error_msg = f"创建新记录失败: {str(e)}"
@@ -423,7 +491,7 @@ class HistoricalTradeService(BaseService):
                     
                     existing_record.save()
                     updated_count += 1
-                    current_app.logger.info(f"更新历史交易记录: ID={existing_record.id}")
+                    logger.debug("更新历史交易记录", id=existing_record.id)
                 except Exception as e:
                     error_count += 1
                     error_msg = f"更新记录失败: {str(e)}"
@@ -433,8 +501,16 @@ class HistoricalTradeService(BaseService):
             # 提交事务
             db.session.commit()
             
+            # 全部写入成功才推进水位，否则保留变更下次重新分析
+            if error_count == 0:
+                cls._save_trade_watermark(watermark)
+            else:
+                HistoricalTrade.mark_trades_changed(changed_codes, deleted_trade_ids)
+            
             result = {
-                'last_sync_time': last_sync_time.isoformat() if last_sync_time != datetime.min else None,
+                'last_sync_time': last_sync_time.isoformat() if last_sync_time else None,
+                'full_sync': full_sync,
+                'dirty_stock_count': None if full_sync else len(dirty_codes),
                 'total_checked': len(all_completed_trades),
                 'created_count': created_count,
                 'updated_count': updated_count,
@@ -450,13 +526,114 @@ class HistoricalTradeService(BaseService):
             
         except Exception as e:
             db.session.rollback()
+            HistoricalTrade.mark_trades_changed(changed_codes, deleted_trade_ids)
             current_app.logger.error(f"同步历史交易记录失败: {str(e)}")
             raise DatabaseError(f"同步历史交易记录失败: {str(e)}")
     
+    @classmethod
+    def _get_last_sync_time(cls) -> Optional[datetime]:
+        """上次同步时间（最新历史交易记录的创建时间）"""
+        last_sync_record = HistoricalTrade.query.order_by(
+            HistoricalTrade.created_at.desc()
+        ).first()
+        return last_sync_record.created_at if last_sync_record else None
+    
+    @classmethod
+    def _get_trade_watermark(cls) -> Dict[str, Any]:
+        """当前交易记录水位：最大ID、最后更新时间和记录数"""
+        max_id, max_updated_at, row_count = db.session.query(
+            func.max(TradeRecord.id),
+            func.max(TradeRecord.updated_at),
+            func.count(TradeRecord.id)
+        ).one()
+        return {
+            'max_id': max_id or 0,
+            'updated_at': max_updated_at.isoformat() if max_updated_at else None,
+            'row_count': row_count
+        }
+    
+    @classmethod
+    def _save_trade_watermark(cls, watermark: Dict[str, Any]) -> None:
+        """保存同步水位"""
+        Configuration.set_value(cls.SYNC_WATERMARK_KEY, watermark, '历史交易增量同步水位')
+    
+    @classmethod
+    def _collect_dirty_stocks(cls, changed_codes: Set[str], deleted_trade_ids: Set[int]) -> Optional[Set[str]]:
+        """
+        收集上次同步后交易记录有变更的股票
+        
+        Args:
+            changed_codes: 进程内记录的变更股票
+            deleted_trade_ids: 进程内记录的被删除交易记录ID
+            
+        Returns:
+            Set[str]: 需要重新分析的股票代码，None 表示需要全量同步
+        """
+        watermark = Configuration.get_value(cls.SYNC_WATERMARK_KEY)
+        if not isinstance(watermark, dict):
+            return None
+        
+        max_id = watermark.get('max_id') or 0
+        
+        # 水位内的记录数减少且不能由已记录的删除解释时，说明有未追踪到的删除，无法定位受影响的股票
+        surviving_count = db.session.query(func.count(TradeRecord.id)).filter(
+            TradeRecord.id <= max_id
+        ).scalar()
+        tracked_deletes = sum(1 for trade_id in deleted_trade_ids if trade_id <= max_id)
+        if surviving_count != watermark.get('row_count', 0) - tracked_deletes:
+            return None
+        
+        # 水位之后新增或修改过的交易记录
+        conditions = [TradeRecord.id > max_id]
+        if watermark.get('updated_at'):
+            conditions.append(TradeRecord.updated_at > datetime.fromisoformat(watermark['updated_at']))
+        
+        dirty_codes = {
+            stock_code for (stock_code,) in db.session.query(TradeRecord.stock_code).filter(
+                or_(*conditions)
+            ).distinct()
+        }
+        return dirty_codes | set(changed_codes)
+    
+    @classmethod
+    def _load_existing_records(cls, stock_codes: Optional[Set[str]] = None) -> Dict[Tuple, HistoricalTrade]:
+        """批量加载现有历史交易记录，按 (股票代码, 买入日期, 卖出日期) 建立索引"""
+        if stock_codes is None:
+            records = cls.model.query.all()
+        else:
+            codes = sorted(stock_codes)
+            records = []
+            for i in range(0, len(codes), BATCH_QUERY_SIZE):
+                records.extend(cls.model.query.filter(
+                    cls.model.stock_code.in_(codes[i:i + BATCH_QUERY_SIZE])
+                ).all())
+        
+        return {
+            cls._record_key(record.stock_code, record.buy_date, record.sell_date): record
+            for record in records
+        }
+    
+    @classmethod
+    def _load_existing_keys(cls) -> Set[Tuple]:
+        """只查询现有历史交易记录的匹配键，不加载完整对象"""
+        return {
+            cls._record_key(stock_code, buy_date, sell_date)
+            for stock_code, buy_date, sell_date in db.session.query(
+                HistoricalTrade.stock_code, HistoricalTrade.buy_date, HistoricalTrade.sell_date
+            ).all()
+        }
+    
+    @staticmethod
+    def _record_key(stock_code: str, buy_date, sell_date) -> Tuple:
+        """历史交易记录的匹配键"""
+        return stock_code, buy_date, sell_date
+    
     @classmethod
     def get_historical_trades(cls, filters: Dict[str, Any] = None, 
                             page: int = None, per_page: int = None,
-                            sort_by: str = 'completion_date', sort_order: str = 'desc') -> Dict[str, Any]:
+                            sort_by: str = 'completion_date', sort_order: str = 'desc',
+                            cursor: str = None, include_total: bool = False,
+                            fields: Any = None) -> Dict[str, Any]:
         """
         获取历史交易记录列表，支持筛选、分页和排序
         
@@ -466,19 +643,36 @@ class HistoricalTradeService(BaseService):
             per_page: 每页数量
             sort_by: 排序字段
             sort_order: 排序方向
+            cursor: 游标分页的游标（首页传空字符串），传入时忽略 page
+            include_total: 游标分页时是否返回近似总数
+            fields: 只查询并返回的列（逗号分隔或列表，总是包含 id），不含 metrics 等计算字段
             
         Returns:
             Dict: 历史交易记录列表和分页信息
         """
         try:
+            fields = parse_fields(cls.model, fields)
             query = cls.model.query
             
             # 应用筛选条件
             if filters:
                 query = cls._apply_filters(query, filters)
             
+            # 游标分页
+            if cursor is not None:
+                result = keyset_paginate(
+                    query, cls.model, sort_by, sort_order, per_page or 20,
+                    cursor=cursor, include_total=include_total, default_sort_by='completion_date', fields=fields
+                )
+                result['trades'] = cls._attach_trading_holding_days(
+                    serialize_items(result.pop('items'), cls.model, fields)
+                )
+                return result
+            
             # 应用排序
             query = cls._apply_sorting(query, sort_by, sort_order)
+            if fields:
+                query = project_query(query, cls.model, fields)
             
             # 应用分页
             if page and per_page:
@@ -488,7 +682,7 @@ class HistoricalTradeService(BaseService):
                     error_out=False
                 )
                 return {
-                    'trades': [trade.to_dict() for trade in pagination.items],
+                    'trades': cls._attach_trading_holding_days(serialize_items(pagination.items, cls.model, fields)),
                     'total': pagination.total,
                     'pages': pagination.pages,
                     'current_page': pagination.page,
@@ -499,17 +693,40 @@ class HistoricalTradeService(BaseService):
             else:
                 trades = query.all()
                 return {
-                    'trades': [trade.to_dict() for trade in trades],
+                    'trades': cls._attach_trading_holding_days(serialize_items(trades, cls.model, fields)),
                     'total': len(trades)
                 }
+        except ValidationError:
+            raise
         except Exception as e:
             raise DatabaseError(f"获取历史交易记录列表失败: {str(e)}")
     
+    @classmethod
+    def get_trades_containing_record(cls, trade_record_id: int) -> List[Dict[str, Any]]:
+        """
+        查询包含指定交易记录的历史交易（反向查询）
+        
+        Args:
+            trade_record_id: 交易记录ID
+            
+        Returns:
+            List[Dict]: 历史交易记录列表
+        """
+        try:
+            trades = HistoricalTradeLink.get_historical_trades_for_record(trade_record_id)
+            return cls._attach_trading_holding_days([trade.to_dict() for trade in trades])
+        except Exception as e:
+            raise DatabaseError(f"查询交易记录所属历史交易失败: {str(e)}")
+    
     @classmethod
     def get_trade_statistics(cls) -> Dict[str, Any]:
         """
         获取历史交易统计信息
         
+        一次条件聚合查询得到计数、汇总和极值，收益率和持仓天数的分位数由一次列查询
+        经NumPy计算；结果按历史交易数据版本缓存，数据未变化时直接返回缓存。
+        缓存和数据版本号都在进程内，其他进程写入的历史交易不会使本进程的缓存失效，只适用于单进程部署。
+        
         Returns:
             Dict: 统计信息
         """
@@ -517,24 +734,43 @@ class HistoricalTradeService(BaseService):
             from flask import current_app
             current_app.logger.info("=== get_trade_statistics 开始 ===")
             
-            # 基本统计
-            total_trades = cls.model.query.count()
-            profitable_trades = cls.model.query.filter(cls.model.total_return > 0).count()
-            loss_trades = cls.model.query.filter(cls.model.total_return < 0).count()
-            
-            # 收益统计
-            total_investment = db.session.query(func.sum(cls.model.total_investment)).scalar() or 0
-            total_return = db.session.query(func.sum(cls.model.total_return)).scalar() or 0
-            
-            # 收益率统计
-            avg_return_rate = db.session.query(func.avg(cls.model.return_rate)).scalar() or 0
-            max_return_rate = db.session.query(func.max(cls.model.return_rate)).scalar() or 0
-            min_return_rate = db.session.query(func.min(cls.model.return_rate)).scalar() or 0
-            
-            # 持仓天数统计
-            avg_holding_days = db.session.query(func.avg(cls.model.holding_days)).scalar() or 0
-            max_holding_days = db.session.query(func.max(cls.model.holding_days)).scalar() or 0
-            min_holding_days = db.session.query(func.min(cls.model.holding_days)).scalar() or 0
+            # 当前事务内有未提交的修改时直接计算，不读写缓存
+            data_version = cls.model.get_data_version()
+            use_cache = not cls.model.has_uncommitted_changes(db.session)
+            cached = cls._statistics_cache
+            if use_cache and cached is not None and cached[0] == data_version:
+                current_app.logger.info(f"使用缓存的统计信息（数据版本 {data_version}）")
+                return copy.deepcopy(cached[1])
+            
+            # 基本统计、收益统计、收益率和持仓天数统计（一次条件聚合查询）
+            (total_trades, profitable_trades, loss_trades, total_investment, total_return,
+             avg_return_rate, max_return_rate, min_return_rate,
+             avg_holding_days, max_holding_days, min_holding_days) = db.session.query(
+                func.count(cls.model.id),
+                func.sum(case((cls.model.total_return > 0, 1), else_=0)),
+                func.sum(case((cls.model.total_return < 0, 1), else_=0)),
+                func.sum(cls.model.total_investment),
+                func.sum(cls.model.total_return),
+                func.avg(cls.model.return_rate),
+                func.max(cls.model.return_rate),
+                func.min(cls.model.return_rate),
+                func.avg(cls.model.holding_days),
+                func.max(cls.model.holding_days),
+                func.min(cls.model.holding_days)
+            ).one()
+            
+            total_trades = total_trades or 0
+            profitable_trades = profitable_trades or 0
+            loss_trades = loss_trades or 0
+            total_investment = total_investment or 0
+            total_return = total_return or 0
+            
+            # 分位数（一次取出两列，跳过Decimal转换）
+            rows = db.session.query(
+                type_coerce(cls.model.return_rate, db.Float),
+                type_coerce(cls.model.holding_days, db.Float)
+            ).all()
+            values = np.array(rows, dtype=float).reshape(-1, 2)
             
             # 胜率
             win_rate = (profitable_trades / total_trades * 100) if total_trades > 0 else 0
@@ -550,23 +786,50 @@ class HistoricalTradeService(BaseService):
                 'total_investment': float(total_investment),
                 'total_return': float(total_return),
                 'overall_return_rate': round(overall_return_rate, 2),
-                'avg_return_rate': round(float(avg_return_rate) * 100, 2),
-                'max_return_rate': round(float(max_return_rate) * 100, 2),
-                'min_return_rate': round(float(min_return_rate) * 100, 2),
-                'avg_holding_days': round(float(avg_holding_days), 1),
+                'avg_return_rate': round(float(avg_return_rate or 0) * 100, 2),
+                'max_return_rate': round(float(max_return_rate or 0) * 100, 2),
+                'min_return_rate': round(float(min_return_rate or 0) * 100, 2),
+                'avg_holding_days': round(float(avg_holding_days or 0), 1),
                 'max_holding_days': int(max_holding_days) if max_holding_days else 0,
-                'min_holding_days': int(min_holding_days) if min_holding_days else 0
+                'min_holding_days': int(min_holding_days) if min_holding_days else 0,
+                'return_rate_percentiles': cls._percentiles(values[:, 0] * 100, 2),
+                'holding_days_percentiles': cls._percentiles(values[:, 1], 1)
             }
             
+            if use_cache:
+                cls._statistics_cache = (data_version, statistics)
+            
             current_app.logger.info(f"统计信息: {statistics}")
             current_app.logger.info("=== get_trade_statistics 完成 ===")
             
-            return statistics
+            return copy.deepcopy(statistics)
             
         except Exception as e:
             current_app.logger.error(f"获取交易统计失败: {str(e)}")
             raise DatabaseError(f"获取交易统计失败: {str(e)}")
     
+    @staticmethod
+    def _percentiles(values: np.ndarray, digits: int) -> Dict[str, float]:
+        """计算统计分位数，空值忽略，无数据时全部为0"""
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return {f'p{q}': 0 for q in STATISTICS_PERCENTILES}
+        results = np.percentile(values, STATISTICS_PERCENTILES)
+        return {f'p{q}': round(float(result), digits) for q, result in zip(STATISTICS_PERCENTILES, results)}
+    
+    @classmethod
+    def _attach_trading_holding_days(cls, trades: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为历史交易字典批量补充持仓交易日数（holding_days 仍为自然日数）"""
+        dated_trades = [trade for trade in trades if trade.get('buy_date') and trade.get('sell_date')]
+        if dated_trades:
+            trading_days = NonTradingDayService.calculate_holding_days_bulk(
+                [trade['buy_date'] for trade in dated_trades],
+                [trade['sell_date'] for trade in dated_trades]
+            )
+            for trade, days in zip(dated_trades, trading_days):
+                trade['trading_holding_days'] = days
+        return trades
+    
     @classmethod
     def _find_existing_record(cls, trade_data: Dict[str, Any]) -> Optional[HistoricalTrade]:
         """
@@ -617,7 +880,9 @@ class HistoricalTradeService(BaseService):
             query = query.filter(cls.model.stock_code == filters['stock_code'])
         
         if 'stock_name' in filters and filters['stock_name']:
-            query = query.filter(cls.model.stock_name.like(f"%{filters['stock_name']}%"))
+            query = query.filter(SearchIndex.like_filter(
+                cls.model, 'historical_trades', 'stock_name', f"%{filters['stock_name']}%"
+            ))
         
         if 'start_date' in filters and filters['start_date']:
             start_date = cls._parse_date(filters['start_date'])
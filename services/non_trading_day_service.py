@@ -46,6 +46,32 @@ class NonTradingDayService(BaseService):
         except Exception as e:
             raise DatabaseError(f"计算持仓天数失败: {str(e)}")
     
+    @classmethod
+    def calculate_holding_days_bulk(cls, buy_dates, sell_dates=None) -> List[int]:
+        """批量计算实际持仓交易日数
+        
+        Args:
+            buy_dates: 买入日期序列
+            sell_dates: 卖出日期序列，为None或其中元素为None时按今天计算
+            
+        Returns:
+            List[int]: 与buy_dates一一对应的持仓交易日数
+        """
+        try:
+            buy_dates = list(buy_dates)
+            if not buy_dates:
+                return []
+            
+            today = date.today()
+            if sell_dates is None:
+                sell_dates = [today] * len(buy_dates)
+            else:
+                sell_dates = [today if d is None else d for d in sell_dates]
+            
+            return cls.model.calculate_trading_days_bulk(buy_dates, sell_dates).tolist()
+        except Exception as e:
+            raise DatabaseError(f"批量计算持仓天数失败: {str(e)}")
+    
     @classmethod
     def get_non_trading_days_in_range(cls, start_date, end_date) -> List[Dict]:
         """获取指定日期范围内的非交易日"""
@@ -77,6 +103,7 @@ class NonTradingDayService(BaseService):
             }
             
             holiday = cls.create(data)
+            cls.model.invalidate_calendar()
             return holiday.to_dict()
         except ValidationError:
             raise
@@ -94,7 +121,9 @@ class NonTradingDayService(BaseService):
             if not holiday:
                 raise ValidationError(f"日期 {holiday_date} 不存在非交易日配置")
             
-            return holiday.delete()
+            result = holiday.delete()
+            cls.model.invalidate_calendar()
+            return result
         except ValidationError:
             raise
         except Exception as e:
@@ -117,6 +146,14 @@ class NonTradingDayService(BaseService):
         except Exception as e:
             raise DatabaseError(f"获取年度节假日失败: {str(e)}")
     
+    @classmethod
+    def offset_trading_days(cls, check_date, trading_days: int) -> str:
+        """获取指定日期之后（正数）或之前（负数）第N个交易日"""
+        try:
+            return cls.model.offset_trading_days(check_date, trading_days).isoformat()
+        except Exception as e:
+            raise DatabaseError(f"计算交易日偏移失败: {str(e)}")
+    
     @classmethod
     def get_next_trading_day(cls, check_date) -> Optional[str]:
         """获取指定日期之后的下一个交易日"""
@@ -152,6 +189,7 @@ class NonTradingDayService(BaseService):
                     # 跳过已存在的日期
                     continue
             
+            cls.model.invalidate_calendar()
             return added_holidays
         except Exception as e:
             raise DatabaseError(f"批量添加节假日失败: {str(e)}")
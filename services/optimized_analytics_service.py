@@ -226,6 +226,9 @@ class OptimizedAnalyticsService(BaseService):
         results = db.session.execute(sql).fetchall()
         holdings = {}
         
+        # 一次查询获取所有持仓股票的最新价格
+        latest_prices = StockPrice.get_latest_prices([row.stock_code for row in results])
+        
         for row in results:
             stock_code = row.stock_code
             quantity = int(row.net_quantity or 0)
@@ -233,7 +236,7 @@ class OptimizedAnalyticsService(BaseService):
             avg_cost = total_cost / quantity if quantity > 0 else 0
             
             # 获取当前价格
-            latest_price = StockPrice.get_latest_price(stock_code)
+            latest_price = latest_prices.get(stock_code)
             current_price = float(latest_price.current_price) if latest_price and latest_price.current_price else avg_cost
             
             market_value = current_price * quantity
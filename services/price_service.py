@@ -7,9 +7,11 @@ import pandas as pd
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional, Union
 import logging
+from flask import current_app
 
-from models.stock_price import StockPrice
+from models.stock_price import StockPrice, StockPriceArchive
 from services.base_service import BaseService
+from services.price_stream_service import PriceStreamService
 from error_handlers import ValidationError, ExternalAPIError
 from utils.validators import validate_stock_code
 from extensions import db
@@ -76,6 +78,7 @@ class PriceService(BaseService):
             )
             
             logger.info(f"成功刷新股票 {stock_code} 价格: {price_data['current_price']}")
+            PriceStreamService.notify_price_change()
             
             return {
                 'success': True,
@@ -225,6 +228,9 @@ class PriceService(BaseService):
             logger.info(f"批量刷新完成: {results['success_count']}/{len(stock_codes)} 成功, "
                        f"总耗时 {total_time:.2f}s (API: {api_time_seconds:.2f}s, 处理: {processing_time:.2f}s)")
             
+            if results['success_count']:
+                PriceStreamService.notify_price_change()
+            
         except Exception as e:
             logger.error(f"批量刷新失败: {e}")
             results['errors'].append({
@@ -244,7 +250,7 @@ class PriceService(BaseService):
             target_date: 目标日期，默认为今天
             
         Returns:
-            Dict: 价格信息字典，如果不存在返回None
+            Dict: 价格信息字典，日线已归档时返回所在周期的归档价格，如果不存在返回None
         """
         try:
             validate_stock_code(stock_code)
@@ -257,6 +263,11 @@ class PriceService(BaseService):
             if stock_price:
                 return stock_price.to_dict()
             
+            # 日线已归档时，返回覆盖该日期的周线/月线价格
+            archive = StockPriceArchive.get_covering_period(stock_code, target_date)
+            if archive:
+                return archive.to_price_dict()
+            
             return None
             
         except ValidationError as e:
@@ -293,6 +304,31 @@ class PriceService(BaseService):
             logger.error(f"获取最新价格时发生错误: {e}")
             raise ExternalAPIError(f"获取最新价格失败: {str(e)}")
     
+    def get_latest_prices(self, stock_codes: List[str]) -> Dict[str, Dict]:
+        """
+        批量获取多只股票的最新价格（单次查询）
+        
+        Args:
+            stock_codes: 股票代码列表
+            
+        Returns:
+            Dict[str, Dict]: {股票代码: 最新价格信息字典}，无价格数据的股票不包含在结果中
+        """
+        try:
+            for stock_code in stock_codes:
+                validate_stock_code(stock_code)
+            
+            latest_prices = StockPrice.get_latest_prices(stock_codes)
+            
+            return {code: price.to_dict() for code, price in latest_prices.items()}
+            
+        except ValidationError as e:
+            logger.error(f"批量获取最新价格时验证失败: {e}")
+            raise e
+        except Exception as e:
+            logger.error(f"批量获取最新价格时发生错误: {e}")
+            raise ExternalAPIError(f"批量获取最新价格失败: {str(e)}")
+    
     def get_price_history(self, stock_code: str, days: int = 30) -> List[Dict]:
         """
         获取股票价格历史
@@ -321,32 +357,73 @@ class PriceService(BaseService):
             logger.error(f"获取价格历史时发生错误: {e}")
             raise ExternalAPIError(f"获取价格历史失败: {str(e)}")
     
-    def cleanup_old_prices(self, days_to_keep: int = 90) -> Dict:
+    def cleanup_old_prices(self, days_to_keep: int = 90, weekly_days_to_keep: Optional[int] = None) -> Dict:
         """
-        清理旧的价格数据
+        按分层保留策略整理旧的价格数据
+        
+        最近 days_to_keep 天保留日线；更早的数据压缩为周线归档，
+        超过 weekly_days_to_keep 天的数据（含已有周线）进一步压缩为月线归档。
+        日线数据在归档后才会从价格表中移除，历史估值不会丢失。
         
         Args:
-            days_to_keep: 保留天数
+            days_to_keep: 日线保留天数
+            weekly_days_to_keep: 周线保留天数，默认取配置 PRICE_RETENTION_WEEKLY_DAYS
             
         Returns:
-            Dict: 清理结果
+            Dict: 整理结果
         """
+        if weekly_days_to_keep is None:
+            weekly_days_to_keep = current_app.config.get('PRICE_RETENTION_WEEKLY_DAYS', 730)
+        
+        if days_to_keep <= 0:
+            raise ValidationError("保留天数必须大于0", "days_to_keep")
+        if weekly_days_to_keep < days_to_keep:
+            raise ValidationError("周线保留天数不能小于日线保留天数", "weekly_days_to_keep")
+        
         try:
-            cutoff_date = date.today() - timedelta(days=days_to_keep)
+            today = date.today()
+            daily_cutoff = today - timedelta(days=days_to_keep)
+            # 月线边界对齐到月初，保证月线归档覆盖完整月份
+            monthly_cutoff = (today - timedelta(days=weekly_days_to_keep)).replace(day=1)
+            
+            old_rows = self.db.session.query(
+                StockPrice.stock_code,
+                StockPrice.stock_name,
+                StockPrice.current_price,
+                StockPrice.change_percent,
+                StockPrice.record_date
+            ).filter(
+                StockPrice.record_date < daily_cutoff
+            ).order_by(StockPrice.stock_code, StockPrice.record_date).all()
+            
+            weekly_rows = [row for row in old_rows if row.record_date >= monthly_cutoff]
+            monthly_rows = [row for row in old_rows if row.record_date < monthly_cutoff]
+            
+            archived_weekly = self._archive_price_rows(weekly_rows, StockPriceArchive.PERIOD_WEEK)
+            archived_monthly = self._archive_price_rows(monthly_rows, StockPriceArchive.PERIOD_MONTH)
+            rolled_up_weekly = self._roll_up_weekly_archives(monthly_cutoff)
             
-            # 删除指定日期之前的数据
             deleted_count = StockPrice.query.filter(
-                StockPrice.record_date < cutoff_date
-            ).delete()
+                StockPrice.record_date < daily_cutoff
+            ).delete(synchronize_session=False)
             
             self.db.session.commit()
+            StockPrice.clear_request_memo()
             
-            logger.info(f"清理了 {deleted_count} 条旧价格数据")
+            logger.info(
+                f"整理旧价格数据: 归档 {deleted_count} 条日线，"
+                f"周线 {archived_weekly} 条，月线 {archived_monthly} 条，合并周线 {rolled_up_weekly} 条"
+            )
             
             return {
                 'success': True,
-                'message': f'成功清理 {deleted_count} 条旧数据',
-                'deleted_count': deleted_count
+                'message': f'成功归档 {deleted_count} 条旧日线数据',
+                'deleted_count': deleted_count,
+                'archived_weekly': archived_weekly,
+                'archived_monthly': archived_monthly,
+                'rolled_up_weekly': rolled_up_weekly,
+                'daily_cutoff': daily_cutoff.isoformat(),
+                'monthly_cutoff': monthly_cutoff.isoformat()
             }
             
         except Exception as e:
@@ -354,7 +431,230 @@ class PriceService(BaseService):
             logger.error(f"清理旧价格数据时发生错误: {e}")
             raise ExternalAPIError(f"清理数据失败: {str(e)}")
     
-
+    def _archive_price_rows(self, rows, period_type: str) -> int:
+        """将日线价格行聚合为周期OHLC并合并进归档表，返回涉及的归档记录数"""
+        if not rows:
+            return 0
+        
+        # 行已按 (股票代码, 日期) 排序，按周期分组后首行为开盘、末行为收盘
+        groups = {}
+        for row in rows:
+            period_start, period_end = StockPriceArchive.get_period_bounds(row.record_date, period_type)
+            key = (row.stock_code, period_start)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {
+                    'period_end': period_end,
+                    'stock_name': row.stock_name,
+                    'first_date': row.record_date,
+                    'last_date': row.record_date,
+                    'open_price': row.current_price,
+                    'high_price': row.current_price,
+                    'low_price': row.current_price,
+                    'close_price': row.current_price,
+                    'close_change_percent': row.change_percent,
+                    'sample_count': 1
+                }
+                continue
+            
+            group['last_date'] = row.record_date
+            group['close_price'] = row.current_price
+            group['close_change_percent'] = row.change_percent
+            group['stock_name'] = row.stock_name or group['stock_name']
+            if row.current_price is not None:
+                if group['high_price'] is None or row.current_price > group['high_price']:
+                    group['high_price'] = row.current_price
+                if group['low_price'] is None or row.current_price < group['low_price']:
+                    group['low_price'] = row.current_price
+            group['sample_count'] += 1
+        
+        existing = self._load_archives(
+            {code for code, _ in groups}, period_type, min(start for _, start in groups)
+        )
+        
+        for (stock_code, period_start), group in groups.items():
+            archive = existing.get((stock_code, period_start))
+            if archive is None:
+                archive = StockPriceArchive(
+                    stock_code=stock_code,
+                    period_type=period_type,
+                    period_start=period_start,
+                    period_end=group['period_end'],
+                    sample_count=0
+                )
+                self.db.session.add(archive)
+            archive.merge_bar(
+                group['first_date'], group['last_date'],
+                group['open_price'], group['high_price'], group['low_price'],
+                group['close_price'], group['close_change_percent'],
+                group['sample_count'], group['stock_name']
+            )
+        
+        return len(groups)
+    
+    def _roll_up_weekly_archives(self, monthly_cutoff: date) -> int:
+        """将早于月线边界的周线归档合并为月线，返回被合并的周线数量"""
+        weekly_archives = StockPriceArchive.query.filter(
+            StockPriceArchive.period_type == StockPriceArchive.PERIOD_WEEK,
+            StockPriceArchive.period_end < monthly_cutoff
+        ).order_by(StockPriceArchive.stock_code, StockPriceArchive.first_date).all()
+        
+        if not weekly_archives:
+            return 0
+        
+        existing = self._load_archives(
+            {archive.stock_code for archive in weekly_archives},
+            StockPriceArchive.PERIOD_MONTH,
+            min(archive.period_start for archive in weekly_archives).replace(day=1)
+        )
+        
+        for weekly in weekly_archives:
+            month_start, month_end = StockPriceArchive.get_period_bounds(
+                weekly.period_start, StockPriceArchive.PERIOD_MONTH
+            )
+            monthly = existing.get((weekly.stock_code, month_start))
+            if monthly is None:
+                monthly = StockPriceArchive(
+                    stock_code=weekly.stock_code,
+                    period_type=StockPriceArchive.PERIOD_MONTH,
+                    period_start=month_start,
+                    period_end=month_end,
+                    sample_count=0
+                )
+                self.db.session.add(monthly)
+                existing[(weekly.stock_code, month_start)] = monthly
+            monthly.merge_bar(
+                weekly.first_date, weekly.last_date,
+                weekly.open_price, weekly.high_price, weekly.low_price,
+                weekly.close_price, weekly.close_change_percent,
+                weekly.sample_count, weekly.stock_name
+            )
+            self.db.session.delete(weekly)
+        
+        return len(weekly_archives)
+    
+    def _load_archives(self, stock_codes, period_type: str, min_period_start: date) -> Dict:
+        """批量加载已有归档记录，返回 {(股票代码, 周期起始日): 归档记录}"""
+        codes = list(stock_codes)
+        archives = {}
+        for i in range(0, len(codes), StockPrice.BATCH_QUERY_SIZE):
+            batch = codes[i:i + StockPrice.BATCH_QUERY_SIZE]
+            rows = StockPriceArchive.query.filter(
+                StockPriceArchive.stock_code.in_(batch),
+                StockPriceArchive.period_type == period_type,
+                StockPriceArchive.period_start >= min_period_start
+            ).all()
+            for archive in rows:
+                archives[(archive.stock_code, archive.period_start)] = archive
+        return archives
+    
+    def get_price_as_of(self, stock_code: str, target_date: date) -> Optional[Dict]:
+        """
+        获取指定日期的估值价格（跨日线与归档层透明读取）
+        
+        使用当日及之前最近的收盘价：日线价格，或最后交易日不晚于估值日期的周线/月线收盘价。
+        估值日期落在归档周期内部时，该周期的收盘价晚于估值日期，不能使用，
+        只能使用之前最近的收盘价（没有时使用该周期的开盘价），结果标记为近似价格。
+        
+        Args:
+            stock_code: 股票代码
+            target_date: 估值日期
+            
+        Returns:
+            Dict: 价格信息字典，granularity 标识数据粒度(day/week/month)，
+            approximate 为True时价格不是估值日期当日的精确价格
+        """
+        try:
+            validate_stock_code(stock_code)
+            
+            daily = StockPrice.query.filter(
+                StockPrice.stock_code == stock_code,
+                StockPrice.record_date <= target_date
+            ).order_by(StockPrice.record_date.desc()).first()
+            archive = StockPriceArchive.get_latest_before(stock_code, target_date)
+            
+            result, price_date = None, None
+            if daily and (archive is None or daily.record_date >= archive.last_date):
+                result = daily.to_dict()
+                result['granularity'] = 'day'
+                price_date = daily.record_date
+            elif archive:
+                result = archive.to_price_dict()
+                price_date = archive.last_date
+            
+            # 估值日期在归档周期的交易日之间，且之后没有更近的日线价格
+            covering = StockPriceArchive.get_covering_period(stock_code, target_date)
+            approximate = (
+                covering is not None
+                and covering.first_date <= target_date < covering.last_date
+                and (price_date is None or price_date < covering.first_date)
+            )
+            
+            if result is None and approximate:
+                result = covering.to_price_dict()
+                result.update({
+                    'current_price': result['open_price'],
+                    'change_percent': None,
+                    'record_date': covering.first_date.isoformat()
+                })
+            
+            if result is not None:
+                result['approximate'] = approximate
+            return result
+            
+        except ValidationError as e:
+            logger.error(f"获取估值价格时验证失败: {e}")
+            raise e
+        except Exception as e:
+            logger.error(f"获取估值价格时发生错误: {e}")
+            raise ExternalAPIError(f"获取估值价格失败: {str(e)}")
+    
+    def get_price_series(self, stock_code: str, start_date: date, end_date: date) -> List[Dict]:
+        """
+        获取日期区间内的价格序列（合并日线与归档层，按日期升序）
+        
+        Args:
+            stock_code: 股票代码
+            start_date: 开始日期
+            end_date: 结束日期
+            
+        Returns:
+            List[Dict]: 价格列表，归档周期以其最后交易日为记录日期
+        """
+        try:
+            validate_stock_code(stock_code)
+            
+            if start_date > end_date:
+                raise ValidationError("开始日期不能晚于结束日期", "start_date")
+            
+            daily_prices = StockPrice.query.filter(
+                StockPrice.stock_code == stock_code,
+                StockPrice.record_date >= start_date,
+                StockPrice.record_date <= end_date
+            ).order_by(StockPrice.record_date.asc()).all()
+            
+            # 日线优先：归档周期只用于日线尚未覆盖的更早区间
+            first_daily_date = daily_prices[0].record_date if daily_prices else None
+            series = [
+                archive.to_price_dict()
+                for archive in StockPriceArchive.get_range(stock_code, start_date, end_date)
+                if first_daily_date is None or archive.last_date < first_daily_date
+            ]
+            
+            for price in daily_prices:
+                item = price.to_dict()
+                item['granularity'] = 'day'
+                series.append(item)
+            
+            series.sort(key=lambda item: item['record_date'])
+            return series
+            
+        except ValidationError as e:
+            logger.error(f"获取价格序列时验证失败: {e}")
+            raise e
+        except Exception as e:
+            logger.error(f"获取价格序列时发生错误: {e}")
+            raise ExternalAPIError(f"获取价格序列失败: {str(e)}")
     
     def _get_market_data_cached(self, force_refresh: bool = False):
         """
@@ -471,31 +771,41 @@ class PriceService(BaseService):
             'details': []
         }
         
+        invalid_codes = set()
         for stock_code in stock_codes:
             try:
                 validate_stock_code(stock_code)
-                
-                latest_price = StockPrice.get_price_by_date(stock_code, today)
-                
-                if latest_price:
-                    cache_status['cached_today'] += 1
-                    status = 'cached'
-                else:
-                    cache_status['need_refresh'] += 1
-                    status = 'need_refresh'
-                
-                cache_status['details'].append({
-                    'stock_code': stock_code,
-                    'status': status,
-                    'last_update': latest_price.record_date.isoformat() if latest_price else None
-                })
-                
             except ValidationError:
+                invalid_codes.add(stock_code)
+        
+        # 一次查询获取所有股票的最新价格
+        latest_prices = StockPrice.get_latest_prices(
+            [code for code in stock_codes if code not in invalid_codes]
+        )
+        
+        for stock_code in stock_codes:
+            if stock_code in invalid_codes:
                 cache_status['details'].append({
                     'stock_code': stock_code,
                     'status': 'invalid',
                     'last_update': None
                 })
+                continue
+            
+            latest_price = latest_prices.get(stock_code)
+            
+            if latest_price and latest_price.record_date == today:
+                cache_status['cached_today'] += 1
+                status = 'cached'
+            else:
+                cache_status['need_refresh'] += 1
+                status = 'need_refresh'
+            
+            cache_status['details'].append({
+                'stock_code': stock_code,
+                'status': status,
+                'last_update': latest_price.record_date.isoformat() if latest_price else None
+            })
         
         return cache_status
     
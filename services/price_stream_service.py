@@ -0,0 +1,248 @@
+"""
+价格推送服务
+通过Server-Sent Events向所有已连接客户端推送价格变动和持仓浮盈
+
+所有连接共享一个后台广播线程：价格版本变化时只计算一次快照，
+再将同一份序列化后的事件分发到各客户端队列，连接数不会放大后端计算量。
+"""
+import json
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+from sqlalchemy import func
+from extensions import db
+from models.stock_price import StockPrice
+from models.trade_record import TradeRecord
+
+logger = logging.getLogger(__name__)
+
+
+class PriceStreamService:
+    """价格与持仓浮盈推送服务"""
+    
+    # 每个客户端队列的最大积压事件数，慢客户端只丢弃旧事件而不阻塞广播
+    SUBSCRIBER_QUEUE_SIZE = 5
+    DEFAULT_POLL_INTERVAL = 5
+    DEFAULT_HEARTBEAT_INTERVAL = 15
+    
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _subscribers: List[queue.Queue] = []
+    _broadcaster: Optional[threading.Thread] = None
+    
+    # 最近一次计算结果（新连接直接复用，不触发计算）
+    _version = None
+    _prices: Dict[str, Dict[str, Any]] = {}
+    _snapshot_event: Optional[str] = None
+    
+    @classmethod
+    def subscribe(cls, app=None) -> queue.Queue:
+        """注册一个客户端，返回其事件队列；传入app时按需启动广播线程"""
+        subscriber = queue.Queue(maxsize=cls.SUBSCRIBER_QUEUE_SIZE)
+        with cls._lock:
+            cls._subscribers.append(subscriber)
+            if cls._snapshot_event is not None:
+                subscriber.put_nowait(cls._snapshot_event)
+        
+        if app is not None:
+            cls._ensure_broadcaster(app)
+        
+        return subscriber
+    
+    @classmethod
+    def unsubscribe(cls, subscriber: queue.Queue) -> None:
+        """注销客户端"""
+        with cls._lock:
+            if subscriber in cls._subscribers:
+                cls._subscribers.remove(subscriber)
+    
+    @classmethod
+    def subscriber_count(cls) -> int:
+        """当前连接的客户端数量"""
+        with cls._lock:
+            return len(cls._subscribers)
+    
+    @classmethod
+    def notify_price_change(cls) -> None:
+        """价格写入后调用，立即唤醒广播线程检查新版本"""
+        cls._wakeup.set()
+    
+    @classmethod
+    def reset(cls) -> None:
+        """清空推送状态（主要用于测试）"""
+        with cls._lock:
+            cls._subscribers.clear()
+            cls._version = None
+            cls._prices = {}
+            cls._snapshot_event = None
+    
+    @classmethod
+    def stream(cls, subscriber: queue.Queue, heartbeat_interval: int = DEFAULT_HEARTBEAT_INTERVAL):
+        """生成SSE响应体；空闲时只发送心跳注释，不访问数据库"""
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield subscriber.get(timeout=heartbeat_interval)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            cls.unsubscribe(subscriber)
+    
+    @classmethod
+    def poll_once(cls) -> bool:
+        """检查价格版本，有变化时计算一次快照并广播，返回是否发送了事件"""
+        version = cls._get_price_version()
+        if version == cls._version and cls._snapshot_event is not None:
+            return False
+        
+        prices, holdings = cls._build_snapshot()
+        generated_at = datetime.now().isoformat()
+        
+        # 完整快照留给新连接；已连接客户端只接收价格增量
+        snapshot_event = cls._format_event('snapshot', {
+            'version': version,
+            'generated_at': generated_at,
+            'prices': prices,
+            'holdings': holdings
+        }, version)
+        update_event = cls._format_event('update', {
+            'version': version,
+            'generated_at': generated_at,
+            'prices': {
+                code: price for code, price in prices.items()
+                if cls._prices.get(code) != price
+            },
+            'removed_prices': sorted(set(cls._prices) - set(prices)),
+            'holdings': holdings
+        }, version)
+        
+        is_initial = cls._snapshot_event is None
+        cls._version = version
+        cls._prices = prices
+        cls._publish(snapshot_event if is_initial else update_event, snapshot_event)
+        return True
+    
+    @classmethod
+    def _publish(cls, event: str, snapshot_event: str) -> None:
+        """将同一份事件分发给所有客户端"""
+        with cls._lock:
+            cls._snapshot_event = snapshot_event
+            subscribers = list(cls._subscribers)
+        
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # 客户端消费过慢：丢弃最旧事件，保证其收到最新状态
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    pass
+    
+    @staticmethod
+    def _format_event(event_type: str, payload: Dict[str, Any], version) -> str:
+        """序列化为SSE消息"""
+        data = json.dumps(payload, ensure_ascii=False, default=str)
+        return f'id: {version}\nevent: {event_type}\ndata: {data}\n\n'
+    
+    @classmethod
+    def _get_price_version(cls) -> str:
+        """数据版本（价格表与交易记录的记录数和最后更新时间），持仓变化同样会触发推送"""
+        price_count, price_updated = db.session.query(
+            func.count(StockPrice.id),
+            func.max(StockPrice.updated_at)
+        ).one()
+        trade_count, trade_updated = db.session.query(
+            func.count(TradeRecord.id),
+            func.max(TradeRecord.updated_at)
+        ).one()
+        return '-'.join(str(part) for part in (
+            price_count, price_updated.timestamp() if price_updated else 0,
+            trade_count, trade_updated.timestamp() if trade_updated else 0
+        ))
+    
+    @classmethod
+    def _build_snapshot(cls):
+        """计算最新价格和各持仓浮盈（只读数据库，不访问行情接口）"""
+        from services.review_service import HoldingService
+        
+        positions = HoldingService._get_open_positions()
+        latest_prices = StockPrice.get_latest_prices([p['stock_code'] for p in positions])
+        
+        prices = {}
+        for stock_code, price in latest_prices.items():
+            prices[stock_code] = {
+                'current_price': float(price.current_price) if price.current_price is not None else None,
+                'change_percent': float(price.change_percent) if price.change_percent is not None else None,
+                'record_date': price.record_date.isoformat()
+            }
+        
+        holdings = []
+        for position in positions:
+            current_price = prices.get(position['stock_code'], {}).get('current_price')
+            avg_buy_price = position['avg_buy_price']
+            holding = {
+                'stock_code': position['stock_code'],
+                'stock_name': position['stock_name'],
+                'current_quantity': position['current_quantity'],
+                'avg_buy_price': avg_buy_price,
+                'current_price': current_price,
+                'floating_profit_ratio': None,
+                'floating_profit_amount': None,
+                'floating_profit_total': None
+            }
+            if current_price is not None and avg_buy_price:
+                profit_per_share = current_price - avg_buy_price
+                holding['floating_profit_ratio'] = round(profit_per_share / avg_buy_price, 6)
+                holding['floating_profit_amount'] = round(profit_per_share, 4)
+                holding['floating_profit_total'] = round(profit_per_share * position['current_quantity'], 2)
+            holdings.append(holding)
+        
+        return prices, holdings
+    
+    @classmethod
+    def _ensure_broadcaster(cls, app) -> None:
+        """按需启动广播线程（进程内只有一个）"""
+        with cls._lock:
+            if cls._broadcaster is not None:
+                return
+            cls._broadcaster = threading.Thread(
+                target=cls._run_broadcaster,
+                args=(app,),
+                name='price-stream-broadcaster',
+                daemon=True
+            )
+            cls._broadcaster.start()
+    
+    @classmethod
+    def _run_broadcaster(cls, app) -> None:
+        """广播循环：无客户端时退出，空闲连接不产生数据库查询"""
+        poll_interval = app.config.get('PRICE_STREAM_POLL_INTERVAL', cls.DEFAULT_POLL_INTERVAL)
+        
+        while True:
+            with cls._lock:
+                if not cls._subscribers:
+                    cls._broadcaster = None
+                    # 无订阅者期间价格可能变化，下次连接时重新计算完整快照
+                    cls._version = None
+                    cls._prices = {}
+                    cls._snapshot_event = None
+                    return
+            
+            try:
+                with app.app_context():
+                    cls.poll_once()
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"价格推送计算失败: {e}")
+            
+            cls._wakeup.wait(poll_interval)
+            cls._wakeup.clear()
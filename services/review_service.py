@@ -4,7 +4,7 @@
 import logging
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional, Any
-from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy import func, and_, or_, desc, asc, case
 from extensions import db
 from services.base_service import BaseService
 from models.review_record import ReviewRecord
@@ -13,6 +13,9 @@ from error_handlers import ValidationError, NotFoundError, DatabaseError
 
 logger = logging.getLogger(__name__)
 
+# 单次IN查询的最大参数数量（SQLite默认限制为999）
+BATCH_QUERY_SIZE = 500
+
 
 class ReviewService(BaseService):
     """复盘记录服务"""
@@ -203,6 +206,33 @@ class ReviewService(BaseService):
         except Exception as e:
             raise DatabaseError(f"获取最新复盘记录失败: {str(e)}")
     
+    @classmethod
+    def get_latest_reviews_by_stocks(cls, stock_codes: List[str]) -> Dict[str, ReviewRecord]:
+        """批量获取多只股票最新的复盘记录（每批一次查询）"""
+        try:
+            codes = list(dict.fromkeys(stock_codes))
+            latest_reviews = {}
+            for i in range(0, len(codes), BATCH_QUERY_SIZE):
+                batch = codes[i:i + BATCH_QUERY_SIZE]
+                
+                latest_dates = db.session.query(
+                    ReviewRecord.stock_code,
+                    func.max(ReviewRecord.review_date).label('max_date')
+                ).filter(ReviewRecord.stock_code.in_(batch)).group_by(ReviewRecord.stock_code).subquery()
+                
+                reviews = ReviewRecord.query.join(
+                    latest_dates,
+                    and_(
+                        ReviewRecord.stock_code == latest_dates.c.stock_code,
+                        ReviewRecord.review_date == latest_dates.c.max_date
+                    )
+                ).all()
+                latest_reviews.update({review.stock_code: review for review in reviews})
+            
+            return latest_reviews
+        except Exception as e:
+            raise DatabaseError(f"批量获取最新复盘记录失败: {str(e)}")
+    
     @classmethod
     def get_buy_price_for_stock(cls, stock_code: str) -> Optional[float]:
         """获取股票的成本价（平均买入价格）"""
@@ -446,85 +476,56 @@ class HoldingService:
     """持仓管理服务"""
     
     @classmethod
-    def get_current_holdings(cls, force_refresh_prices: bool = False) -> List[Dict[str, Any]]:
-        """获取当前持仓列表"""
+    def get_current_holdings(cls, force_refresh_prices: bool = False,
+                             stock_codes: Optional[List[str]] = None,
+                             with_prices: bool = True) -> List[Dict[str, Any]]:
+        """获取当前持仓列表
+        
+        持仓股票的交易记录、最新复盘记录和最新价格各批量加载一次，
+        持仓交易日数使用内存交易日历计算，查询次数不随持仓数量增长。
+        传入stock_codes时只加载这些股票的持仓；with_prices为False时不获取当前价格（current_price为None）。
+        """
         try:
-            # 查询所有买入记录，按股票代码分组
-            buy_records = db.session.query(
-                TradeRecord.stock_code,
-                TradeRecord.stock_name,
-                func.sum(TradeRecord.quantity).label('total_buy_quantity'),
-                (func.sum(TradeRecord.price * TradeRecord.quantity) / func.sum(TradeRecord.quantity)).label('avg_buy_price'),
-                func.min(TradeRecord.trade_date).label('first_buy_date'),
-                func.max(TradeRecord.trade_date).label('last_buy_date')
-            ).filter(
-                and_(
-                    TradeRecord.trade_type == 'buy',
-                    TradeRecord.is_corrected == False
-                )
-            ).group_by(TradeRecord.stock_code, TradeRecord.stock_name).all()
+            positions = cls._get_open_positions(stock_codes)
+            if not positions:
+                return []
             
-            # 查询所有卖出记录，按股票代码分组
-            sell_records = db.session.query(
-                TradeRecord.stock_code,
-                func.sum(TradeRecord.quantity).label('total_sell_quantity')
-            ).filter(
-                and_(
-                    TradeRecord.trade_type == 'sell',
-                    TradeRecord.is_corrected == False
-                )
-            ).group_by(TradeRecord.stock_code).all()
+            stock_codes = [position['stock_code'] for position in positions]
+            latest_reviews = ReviewService.get_latest_reviews_by_stocks(stock_codes)
+            current_prices = cls._get_current_prices(stock_codes, force_refresh_prices) if with_prices else {}
             
-            # 转换为字典便于查找
-            sell_dict = {record.stock_code: record.total_sell_quantity for record in sell_records}
+            # 未手动设置持仓天数的股票一次性向量化计算实际交易日数
+            auto_holding_days = cls._calculate_actual_holding_days_bulk([
+                position['current_holding_start_date'] for position in positions
+            ])
             
             holdings = []
-            for buy_record in buy_records:
-                stock_code = buy_record.stock_code
-                total_buy = int(buy_record.total_buy_quantity)
-                total_sell = int(sell_dict.get(stock_code, 0))
-                current_quantity = total_buy - total_sell
+            for position, auto_days in zip(positions, auto_holding_days):
+                stock_code = position['stock_code']
+                latest_review = latest_reviews.get(stock_code)
+                manual_holding_days = latest_review.holding_days if latest_review else None
+                current_holding_start_date = position['current_holding_start_date']
                 
-                # 只有当前持仓大于0的股票才算持仓
-                if current_quantity > 0:
-                    # 获取最新复盘记录
-                    latest_review = ReviewService.get_latest_review_by_stock(stock_code)
-                    
-                    # 获取当前持仓的实际开始日期
-                    current_holding_start_date = cls._get_current_holding_start_date(stock_code)
-                    
-                    # 计算实际持仓交易日数
-                    actual_holding_days = cls._calculate_actual_holding_days(
-                        current_holding_start_date,
-                        latest_review.holding_days if latest_review else None
-                    )
-                    
-                    # 保持原有的持仓天数计算（兼容性）
-                    holding_days = cls._calculate_holding_days(
-                        current_holding_start_date,
-                        latest_review.holding_days if latest_review else None
-                    )
-                    
-                    # 获取当前价格
-                    current_price = cls._get_current_price(stock_code, force_refresh_prices)
-                    
-                    holding = {
-                        'stock_code': stock_code,
-                        'stock_name': buy_record.stock_name,
-                        'current_quantity': current_quantity,
-                        'total_buy_quantity': total_buy,
-                        'total_sell_quantity': total_sell,
-                        'avg_buy_price': float(buy_record.avg_buy_price),
-                        'avg_price': float(buy_record.avg_buy_price),  # 兼容字段
-                        'current_price': current_price,
-                        'first_buy_date': current_holding_start_date.isoformat(),
-                        'last_buy_date': buy_record.last_buy_date.isoformat(),
-                        'holding_days': holding_days,  # 原有字段（兼容性）
-                        'actual_holding_days': actual_holding_days,  # 新增：实际交易日数
-                        'latest_review': latest_review.to_dict() if latest_review else None
-                    }
-                    
-                    holdings.append(holding)
+                # 手动设置优先，否则使用交易日历计算结果
+                actual_holding_days = manual_holding_days if manual_holding_days is not None else auto_days
+                
+                holding = {
+                    'stock_code': stock_code,
+                    'stock_name': position['stock_name'],
+                    'current_quantity': position['current_quantity'],
+                    'total_buy_quantity': position['total_buy_quantity'],
+                    'total_sell_quantity': position['total_sell_quantity'],
+                    'avg_buy_price': position['avg_buy_price'],
+                    'avg_price': position['avg_buy_price'],  # 兼容字段
+                    'current_price': current_prices.get(stock_code),
+                    'first_buy_date': current_holding_start_date.isoformat(),
+                    'last_buy_date': position['last_buy_date'].isoformat(),
+                    'holding_days': actual_holding_days,  # 原有字段（兼容性），与实际交易日数计算方式相同
+                    'actual_holding_days': actual_holding_days,  # 新增：实际交易日数
+                    'latest_review': latest_review.to_dict() if latest_review else None
+                }
+                
+                holdings.append(holding)
             
             # 按实际持仓天数倒序排列
             holdings.sort(key=lambda x: x['actual_holding_days'], reverse=True)
@@ -534,6 +535,68 @@ class HoldingService:
         except Exception as e:
             raise DatabaseError(f"获取当前持仓失败: {str(e)}")
     
+    @classmethod
+    def _get_open_positions(cls, stock_codes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """一次查询加载所有持仓股票的未订正交易记录，在内存中汇总持仓
+        
+        Args:
+            stock_codes: 只汇总这些股票，为None时汇总全部
+            
+        Returns:
+            List[Dict]: 当前持仓数量大于0的股票汇总，包含当前持仓周期的开始日期
+        """
+        net_quantity = func.sum(
+            case((TradeRecord.trade_type == 'buy', TradeRecord.quantity), else_=-TradeRecord.quantity)
+        )
+        held_codes = db.session.query(TradeRecord.stock_code).filter(
+            TradeRecord.is_corrected == False
+        )
+        if stock_codes is not None:
+            held_codes = held_codes.filter(TradeRecord.stock_code.in_(list(stock_codes)))
+        held_codes = held_codes.group_by(TradeRecord.stock_code).having(net_quantity > 0)
+        
+        records = db.session.query(
+            TradeRecord.id,
+            TradeRecord.stock_code,
+            TradeRecord.stock_name,
+            TradeRecord.trade_type,
+            TradeRecord.price,
+            TradeRecord.quantity,
+            TradeRecord.trade_date
+        ).filter(
+            and_(
+                TradeRecord.is_corrected == False,
+                TradeRecord.stock_code.in_(held_codes)
+            )
+        ).order_by(TradeRecord.stock_code, TradeRecord.trade_date, TradeRecord.id).all()
+        
+        records_by_code = {}
+        for record in records:
+            records_by_code.setdefault(record.stock_code, []).append(record)
+        
+        positions = []
+        for stock_code, stock_records in records_by_code.items():
+            buys = [r for r in stock_records if r.trade_type == 'buy']
+            if not buys:
+                continue
+            total_buy = sum(r.quantity for r in buys)
+            total_sell = sum(r.quantity for r in stock_records if r.trade_type == 'sell')
+            total_cost = sum(float(r.price) * r.quantity for r in buys)
+            
+            positions.append({
+                'stock_code': stock_code,
+                'stock_name': buys[-1].stock_name,
+                'current_quantity': total_buy - total_sell,
+                'total_buy_quantity': total_buy,
+                'total_sell_quantity': total_sell,
+                'avg_buy_price': total_cost / total_buy,
+                'first_buy_date': buys[0].trade_date,
+                'last_buy_date': buys[-1].trade_date,
+                'current_holding_start_date': cls._find_holding_start_date(stock_code, stock_records)
+            })
+        
+        return positions
+    
     @classmethod
     def get_holding_by_stock(cls, stock_code: str) -> Optional[Dict[str, Any]]:
         """获取特定股票的持仓信息"""
@@ -658,69 +721,53 @@ class HoldingService:
     
     @classmethod
     def _get_current_holding_start_date(cls, stock_code: str) -> datetime:
-        """获取当前持仓的实际开始日期
+        """获取当前持仓的实际开始日期"""
+        # 获取该股票所有未订正的交易记录，按时间排序
+        records = TradeRecord.query.filter(
+            and_(
+                TradeRecord.stock_code == stock_code,
+                TradeRecord.is_corrected == False
+            )
+        ).order_by(TradeRecord.trade_date, TradeRecord.id).all()
+        
+        return cls._find_holding_start_date(stock_code, records)
+    
+    @staticmethod
+    def _find_holding_start_date(stock_code: str, records) -> datetime:
+        """根据按时间排序的交易记录确定当前持仓的实际开始日期
         
         逻辑：
         1. 按时间顺序处理所有交易记录
         2. 跟踪累计持仓数量
         3. 当累计持仓归零后，下一次买入就是新持仓的开始
         """
-        try:
-            # 获取该股票所有未订正的交易记录，按时间排序
-            records = TradeRecord.query.filter(
-                and_(
-                    TradeRecord.stock_code == stock_code,
-                    TradeRecord.is_corrected == False
-                )
-            ).order_by(TradeRecord.trade_date, TradeRecord.id).all()
-            
-            if not records:
-                raise ValueError(f"股票 {stock_code} 没有找到交易记录")
-            
-            cumulative_quantity = 0
-            current_holding_start = None
-            
-            for record in records:
-                if record.trade_type == 'buy':
-                    # 如果当前没有持仓，这次买入就是新持仓的开始
-                    if cumulative_quantity == 0:
-                        current_holding_start = record.trade_date
-                    cumulative_quantity += record.quantity
-                elif record.trade_type == 'sell':
-                    cumulative_quantity -= record.quantity
-                    # 如果卖出后持仓归零，重置开始日期
-                    if cumulative_quantity <= 0:
-                        current_holding_start = None
-                        cumulative_quantity = 0  # 防止负数
-            
-            # 如果当前有持仓但没有找到开始日期，使用最早的买入日期
-            if current_holding_start is None and cumulative_quantity > 0:
-                first_buy = next((r for r in records if r.trade_type == 'buy'), None)
-                if first_buy:
-                    current_holding_start = first_buy.trade_date
-                    logger.warning(f"股票 {stock_code} 无法确定当前持仓开始日期，使用最早买入日期: {current_holding_start}")
-            
-            if current_holding_start is None:
-                raise ValueError(f"股票 {stock_code} 无法确定当前持仓开始日期")
-            
+        cumulative_quantity = 0
+        current_holding_start = None
+        
+        for record in records:
+            if record.trade_type == 'buy':
+                # 如果当前没有持仓，这次买入就是新持仓的开始
+                if cumulative_quantity == 0:
+                    current_holding_start = record.trade_date
+                cumulative_quantity += record.quantity
+            elif record.trade_type == 'sell':
+                cumulative_quantity -= record.quantity
+                # 如果卖出后持仓归零，重置开始日期
+                if cumulative_quantity <= 0:
+                    current_holding_start = None
+                    cumulative_quantity = 0  # 防止负数
+        
+        if current_holding_start is not None:
             logger.debug(f"股票 {stock_code} 当前持仓开始日期: {current_holding_start}")
             return current_holding_start
-            
-        except Exception as e:
-            logger.error(f"获取股票 {stock_code} 当前持仓开始日期失败: {e}")
-            # 回退到使用最早买入日期
-            first_buy = TradeRecord.query.filter(
-                and_(
-                    TradeRecord.stock_code == stock_code,
-                    TradeRecord.trade_type == 'buy',
-                    TradeRecord.is_corrected == False
-                )
-            ).order_by(TradeRecord.trade_date).first()
-            
-            if first_buy:
-                return first_buy.trade_date
-            else:
-                raise DatabaseError(f"股票 {stock_code} 没有找到买入记录")
+        
+        # 无法确定当前持仓开始日期时，回退到最早买入日期
+        first_buy = next((r for r in records if r.trade_type == 'buy'), None)
+        if first_buy is None:
+            raise DatabaseError(f"股票 {stock_code} 没有找到买入记录")
+        
+        logger.warning(f"股票 {stock_code} 无法确定当前持仓开始日期，使用最早买入日期: {first_buy.trade_date}")
+        return first_buy.trade_date
     
     @classmethod
     def _calculate_holding_days(cls, first_buy_date: datetime, manual_holding_days: Optional[int]) -> int:
@@ -741,6 +788,20 @@ class HoldingService:
             # 如果非交易日服务不可用，回退到简单计算
             return (date.today() - first_buy_date).days + 1
     
+    @classmethod
+    def _calculate_actual_holding_days_bulk(cls, first_buy_dates: List[date]) -> List[int]:
+        """批量计算截至今天的实际持仓交易日数（一次numpy.busday_count调用）"""
+        try:
+            from services.non_trading_day_service import NonTradingDayService
+            return NonTradingDayService.calculate_holding_days_bulk(first_buy_dates)
+        except Exception as e:
+            logger.warning(f"批量计算实际持仓天数失败: {e}，使用简单日期计算")
+            today = date.today()
+            return [
+                (today - (d.date() if isinstance(d, datetime) else d)).days + 1
+                for d in first_buy_dates
+            ]
+    
     @classmethod
     def _calculate_actual_holding_days(cls, first_buy_date: datetime, manual_holding_days: Optional[int]) -> int:
         """计算实际持仓交易日数（集成非交易日计算功能）"""
@@ -771,64 +832,73 @@ class HoldingService:
     @classmethod
     def _get_current_price(cls, stock_code: str, force_refresh: bool = False) -> Optional[float]:
         """获取股票当前价格（带缓存优化）"""
-        try:
-            from services.price_service import PriceService
-            from datetime import datetime, timedelta
-            
-            # 检查内存缓存（1分钟内有效）
-            now = datetime.now()
-            if (not force_refresh and 
-                cls._cache_timestamp and 
+        return cls._get_current_prices([stock_code], force_refresh).get(stock_code)
+    
+    @classmethod
+    def _get_current_prices(cls, stock_codes: List[str], force_refresh: bool = False) -> Dict[str, Optional[float]]:
+        """批量获取股票当前价格
+        
+        依次使用内存缓存（1分钟内有效）、数据库价格（5分钟内更新过）；
+        其余股票通过一次批量行情请求刷新，刷新失败时回退到数据库中的最新价格。
+        """
+        from services.price_service import PriceService
+        from models.stock_price import StockPrice
+        
+        now = datetime.now()
+        prices = {}
+        pending = []
+        
+        for stock_code in stock_codes:
+            if (not force_refresh and
+                cls._cache_timestamp and
                 now - cls._cache_timestamp < timedelta(minutes=1) and
                 stock_code in cls._price_cache):
-                logger.debug(f"使用内存缓存价格: {stock_code}")
-                return cls._price_cache[stock_code]
-            
-            price_service = PriceService()
-            
-            # 如果不强制刷新，检查数据库缓存是否足够新（5分钟内）
-            if not force_refresh:
-                price_data = price_service.get_latest_price(stock_code)
-                if price_data and price_data.get('current_price'):
-                    # 检查价格更新时间
-                    if 'updated_at' in price_data:
-                        try:
-                            updated_time = datetime.fromisoformat(price_data['updated_at'].replace('Z', '+00:00'))
-                            if datetime.now() - updated_time.replace(tzinfo=None) < timedelta(minutes=5):
-                                price = float(price_data['current_price'])
-                                # 更新内存缓存
-                                cls._price_cache[stock_code] = price
-                                cls._cache_timestamp = now
-                                return price
-                        except:
-                            pass
-            
-            # 强制刷新或缓存过期，从AKShare获取实时价格
-            try:
-                result = price_service.refresh_stock_price(stock_code, force_refresh=True)
-                if result.get('success') and result.get('data'):
-                    price = float(result['data'].get('current_price', 0))
-                    # 更新内存缓存
-                    cls._price_cache[stock_code] = price
-                    cls._cache_timestamp = now
-                    return price
-            except Exception as e:
-                logger.warning(f"获取股票 {stock_code} 实时价格失败: {e}")
+                prices[stock_code] = cls._price_cache[stock_code]
+            else:
+                pending.append(stock_code)
+        
+        if not pending:
+            return prices
+        
+        try:
+            stored_prices = StockPrice.get_latest_prices(pending)
+            
+            stale_codes = []
+            for stock_code in pending:
+                stored = stored_prices.get(stock_code)
+                if (not force_refresh and stored and stored.current_price and stored.updated_at and
+                        now - stored.updated_at < timedelta(minutes=5)):
+                    prices[stock_code] = float(stored.current_price)
+                else:
+                    stale_codes.append(stock_code)
+            
+            if stale_codes:
+                # 一次获取市场数据刷新所有过期股票
+                result = PriceService().refresh_multiple_stocks(stale_codes, force_refresh=True)
+                for item in result.get('results', []):
+                    data = item.get('data') or {}
+                    if data.get('stock_code') in stale_codes and data.get('current_price') is not None:
+                        prices[data['stock_code']] = float(data['current_price'])
                 
-                # 如果实时获取失败，返回缓存价格（如果有的话）
-                price_data = price_service.get_latest_price(stock_code)
-                if price_data and price_data.get('current_price'):
-                    price = float(price_data['current_price'])
-                    # 更新内存缓存
-                    cls._price_cache[stock_code] = price
-                    cls._cache_timestamp = now
-                    return price
-            
-            return None
+                for error in result.get('errors', []):
+                    logger.warning(f"获取股票 {error.get('stock_code')} 实时价格失败: {error.get('error')}")
+                
+                # 实时获取失败的股票回退到数据库价格
+                for stock_code in stale_codes:
+                    stored = stored_prices.get(stock_code)
+                    if stock_code not in prices and stored and stored.current_price:
+                        prices[stock_code] = float(stored.current_price)
             
         except Exception as e:
-            logger.error(f"获取股票 {stock_code} 当前价格时发生错误: {e}")
-            return None
+            logger.error(f"批量获取股票当前价格时发生错误: {e}")
+        
+        for stock_code in pending:
+            if stock_code in prices:
+                cls._price_cache[stock_code] = prices[stock_code]
+        if any(stock_code in prices for stock_code in pending):
+            cls._cache_timestamp = now
+        
+        return prices
     
     @classmethod
     def get_current_holdings_with_actual_days(cls, force_refresh_prices: bool = False) -> List[Dict[str, Any]]:
@@ -0,0 +1,93 @@
+"""
+统一全文检索服务
+在交易记录、复盘记录、案例、股票池和历史交易的全文索引上检索并按相关度合并结果
+"""
+from typing import Any, Dict, List
+
+from models.trade_record import TradeRecord
+from models.review_record import ReviewRecord
+from models.case_study import CaseStudy
+from models.stock_pool import StockPool
+from models.historical_trade import HistoricalTrade
+from models.search_index import SearchIndex
+from error_handlers import ValidationError, DatabaseError
+
+
+class SearchService:
+    """统一全文检索服务"""
+    
+    # 检索类型（即索引名称） -> 模型
+    SEARCH_MODELS = {
+        'trades': TradeRecord,
+        'reviews': ReviewRecord,
+        'cases': CaseStudy,
+        'stocks': StockPool,
+        'historical_trades': HistoricalTrade,
+    }
+    
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+    
+    @classmethod
+    def search(cls, query: str, types: List[str] = None, limit: int = None) -> Dict[str, Any]:
+        """
+        全文检索
+        
+        Args:
+            query: 检索词，空白分隔的多个词须同时出现
+            types: 检索类型列表（可选，默认全部类型）
+            limit: 返回的最大结果数（可选，默认20，最大100）
+        
+        Returns:
+            Dict: items（按相关度排序的结果，每项包含 type、id、score 和 record）及各类型命中数
+        """
+        query = (query or '').strip()
+        if not query:
+            raise ValidationError("检索词不能为空", "q")
+        
+        types = types or list(cls.SEARCH_MODELS)
+        invalid_types = [t for t in types if t not in cls.SEARCH_MODELS]
+        if invalid_types:
+            raise ValidationError(
+                f"检索类型无效: {', '.join(invalid_types)}，支持的类型: {', '.join(cls.SEARCH_MODELS)}", "types"
+            )
+        
+        limit = cls.DEFAULT_LIMIT if limit is None else limit
+        if limit < 1 or limit > cls.MAX_LIMIT:
+            raise ValidationError(f"结果数量必须在1-{cls.MAX_LIMIT}之间", "limit")
+        
+        try:
+            items = []
+            counts = {}
+            for search_type in types:
+                hits = SearchIndex.search(search_type, query, limit)
+                model = cls.SEARCH_MODELS[search_type]
+                records = {
+                    record.id: record
+                    for record in model.query.filter(model.id.in_([record_id for record_id, _ in hits])).all()
+                } if hits else {}
+                
+                type_items = [
+                    {
+                        'type': search_type,
+                        'id': record_id,
+                        'score': round(score, 6),
+                        'record': records[record_id].to_dict()
+                    }
+                    for record_id, score in hits if record_id in records
+                ]
+                counts[search_type] = len(type_items)
+                items.extend(type_items)
+            
+            # 各类型内已按相关度排序，稳定排序保持同分结果的原有顺序
+            items.sort(key=lambda item: item['score'], reverse=True)
+            
+            return {
+                'query': query,
+                'types': types,
+                'items': items[:limit],
+                'counts': counts,
+                'full_text_index': SearchIndex.is_available()
+            }
+        except Exception as e:
+            raise DatabaseError(f"全文检索失败: {str(e)}")
@@ -0,0 +1,263 @@
+"""
+板块排名动量分析
+一次查询载入最近N天的板块数据，整理为 板块 × 交易日 的排名和涨跌幅矩阵，
+趋势、排名变化、连续上榜天数、均值和TOPK统计都在矩阵上对全部板块一次向量化计算；
+矩阵按截止日期和数据版本缓存
+"""
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import type_coerce
+
+from extensions import db
+from models.sector_data import SectorData
+
+
+class SectorMatrix:
+    """板块 × 交易日 的排名和涨跌幅矩阵，缺失的数据为 NaN"""
+    
+    # 趋势只看最近7天，新旧两段平均排名相差超过2名才算上升或下降
+    TREND_DAYS = 7
+    TREND_THRESHOLD = 2
+    
+    def __init__(self, start_date: date, end_date: date, sectors: np.ndarray, dates: np.ndarray,
+                 ranks: np.ndarray, changes: np.ndarray):
+        """
+        Args:
+            start_date: 统计区间开始日期
+            end_date: 统计区间截止日期
+            sectors: 板块名称（行）
+            dates: 有数据的交易日，升序（列）
+            ranks: 排名矩阵
+            changes: 涨跌幅矩阵，有记录的单元格不为 NaN
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+        self.sectors = sectors
+        self.dates = dates
+        self.ranks = ranks
+        self.changes = changes
+        self.present = ~np.isnan(changes)
+    
+    @classmethod
+    def from_rows(cls, start_date: date, end_date: date, rows: List[tuple]) -> 'SectorMatrix':
+        """由 (板块名称, 日期, 排名, 涨跌幅) 行构造矩阵"""
+        if not rows:
+            empty = np.empty((0, 0))
+            return cls(start_date, end_date, np.array([], dtype=object), np.array([], dtype=object), empty, empty)
+        
+        names, record_dates, ranks, changes = zip(*rows)
+        sectors, sector_index = np.unique(np.array(names, dtype=object), return_inverse=True)
+        dates, date_index = np.unique(np.array(record_dates, dtype=object), return_inverse=True)
+        
+        rank_matrix = np.full((len(sectors), len(dates)), np.nan)
+        change_matrix = np.full((len(sectors), len(dates)), np.nan)
+        rank_matrix[sector_index, date_index] = np.array(ranks, dtype=float)
+        change_matrix[sector_index, date_index] = np.array(changes, dtype=float)
+        return cls(start_date, end_date, sectors, dates, rank_matrix, change_matrix)
+    
+    @property
+    def latest_date(self) -> Optional[date]:
+        """区间内最新的数据日期"""
+        return self.dates[-1] if len(self.dates) else None
+    
+    def trends(self, days: int) -> np.ndarray:
+        """
+        各板块的排名趋势（'up' / 'down' / 'stable'）
+        
+        取最近 min(days, 7) 天有排名的记录，由新到旧分为前后两段（较新的一段为 n // 2 条），
+        比较两段的平均排名；有排名的记录少于2条时为 'stable'
+        """
+        trend_start = self.end_date - timedelta(days=min(days, self.TREND_DAYS))
+        columns = np.array([d >= trend_start for d in self.dates], dtype=bool)
+        # 由新到旧排列
+        ranks = self.ranks[:, columns][:, ::-1]
+        valid = ~np.isnan(ranks)
+        values = np.where(valid, ranks, 0.0)
+        
+        count = valid.sum(axis=1)
+        recent_count = count // 2
+        recent = valid & (np.cumsum(valid, axis=1) <= recent_count[:, None])
+        early = valid & ~recent
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            recent_avg = (values * recent).sum(axis=1) / recent_count
+            early_avg = (values * early).sum(axis=1) / (count - recent_count)
+        
+        trends = np.full(len(self.sectors), 'stable', dtype=object)
+        enough = count >= 2
+        trends[enough & (recent_avg < early_avg - self.TREND_THRESHOLD)] = 'up'
+        trends[enough & (recent_avg > early_avg + self.TREND_THRESHOLD)] = 'down'
+        return trends
+    
+    def top_k_streaks(self, top_k: int) -> np.ndarray:
+        """截至最新交易日，各板块连续进入前K名的交易日数"""
+        in_top = self.ranks <= top_k
+        return np.cumprod(in_top[:, ::-1], axis=1).sum(axis=1)
+    
+    def top_performers(self, top_k: int, days: int) -> List[Dict[str, Any]]:
+        """
+        区间内进入过前K名的板块统计，按上榜次数降序、平均排名升序排列
+        
+        Returns:
+            List[Dict]: 上榜次数、平均/最好排名、最近上榜日期、上榜日平均涨跌幅、趋势和上榜频率
+        """
+        in_top = self.ranks <= top_k
+        appearances = in_top.sum(axis=1)
+        selected = np.flatnonzero(appearances)
+        if not len(selected):
+            return []
+        
+        in_top = in_top[selected]
+        counts = appearances[selected]
+        top_ranks = np.where(in_top, self.ranks[selected], 0.0)
+        avg_rank = top_ranks.sum(axis=1) / counts
+        best_rank = np.where(in_top, self.ranks[selected], np.inf).min(axis=1)
+        avg_change = np.where(in_top, self.changes[selected], 0.0).sum(axis=1) / counts
+        latest_column = in_top.shape[1] - 1 - np.argmax(in_top[:, ::-1], axis=1)
+        trends = self.trends(days)[selected]
+        
+        order = np.lexsort((self.sectors[selected], avg_rank, -counts))
+        return [
+            {
+                'sector_name': self.sectors[selected[i]],
+                'appearances': int(counts[i]),
+                'avg_rank': round(float(avg_rank[i]), 2),
+                'best_rank': int(best_rank[i]),
+                'latest_date': self.dates[latest_column[i]].isoformat(),
+                'avg_change_percent': round(float(avg_change[i]), 2),
+                'trend': trends[i],
+                'frequency_rate': round(int(counts[i]) / days * 100, 2)  # 进入榜单频率
+            }
+            for i in order
+        ]
+    
+    def momentum(self, top_k: int, days: int) -> List[Dict[str, Any]]:
+        """
+        全部板块的排名动量，按最新交易日的排名排列（最新交易日无排名的排在最后）
+        
+        Returns:
+            List[Dict]: 最新/上一交易日排名、排名变化（正数为上升）、区间平均/最好排名、平均涨跌幅、
+            最新涨跌幅、连续进入前K名的天数、进入前K名的次数和趋势
+        """
+        if not len(self.sectors):
+            return []
+        
+        ranked = ~np.isnan(self.ranks)
+        latest_rank = self.ranks[:, -1]
+        previous_rank = self.ranks[:, -2] if len(self.dates) > 1 else np.full(len(self.sectors), np.nan)
+        rank_count = ranked.sum(axis=1)
+        change_count = self.present.sum(axis=1)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_rank = np.where(ranked, self.ranks, 0.0).sum(axis=1) / rank_count
+            avg_change = np.where(self.present, self.changes, 0.0).sum(axis=1) / change_count
+        best_rank = np.where(ranked, self.ranks, np.inf).min(axis=1)
+        streaks = self.top_k_streaks(top_k)
+        appearances = (self.ranks <= top_k).sum(axis=1)
+        trends = self.trends(days)
+        
+        def optional(value, digits=None):
+            """NaN / inf 转为 None，其余转为整数或保留 digits 位小数"""
+            if np.isnan(value) or np.isinf(value):
+                return None
+            return round(float(value), digits) if digits is not None else int(value)
+        
+        order = np.lexsort((self.sectors, np.where(np.isnan(latest_rank), np.inf, latest_rank)))
+        return [
+            {
+                'sector_name': self.sectors[i],
+                'latest_rank': optional(latest_rank[i]),
+                'previous_rank': optional(previous_rank[i]),
+                'rank_change': optional(previous_rank[i] - latest_rank[i]),
+                'avg_rank': optional(avg_rank[i], digits=2),
+                'best_rank': optional(best_rank[i]),
+                'avg_change_percent': optional(avg_change[i], digits=2),
+                'latest_change_percent': optional(self.changes[i, -1], digits=2),
+                'top_k_streak': int(streaks[i]),
+                'top_k_appearances': int(appearances[i]),
+                'trend': trends[i]
+            }
+            for i in order
+        ]
+    
+    def summary(self, days: int) -> Dict[str, Any]:
+        """区间汇总：记录数、板块数、数据天数和涨跌幅统计"""
+        changes = self.changes[self.present]
+        data_days = len(self.dates)
+        return {
+            'period_days': days,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'latest_data_date': self.latest_date.isoformat() if self.latest_date else None,
+            'total_records': int(changes.size),
+            'unique_sectors': len(self.sectors),
+            'data_days': data_days,
+            'avg_change_percent': round(float(changes.mean()), 2) if changes.size else 0,
+            'max_change_percent': round(float(changes.max()), 2) if changes.size else 0,
+            'min_change_percent': round(float(changes.min()), 2) if changes.size else 0,
+            'data_completeness': round(data_days / days * 100, 2) if days > 0 else 0
+        }
+
+
+class SectorAnalyticsEngine:
+    """
+    板块矩阵的加载与缓存
+    
+    缓存和数据版本号都在进程内，其他进程写入的板块数据不会使本进程的缓存失效，只适用于单进程部署
+    """
+    
+    # 缓存的矩阵数量上限，超出时整体清空
+    MAX_CACHE_ENTRIES = 32
+    
+    # (截止日期, 天数) -> (数据版本号, 矩阵)
+    _cache_lock = threading.Lock()
+    _cache: Dict[tuple, tuple] = {}
+    
+    @classmethod
+    def get_matrix(cls, days: int, end_date: Optional[date] = None) -> SectorMatrix:
+        """
+        最近 days 天（截至 end_date，默认今天）的板块矩阵
+        
+        矩阵按截止日期缓存，板块数据变化后失效；当前事务内有未提交的板块数据修改时直接查询，不读写缓存
+        """
+        end_date = end_date or date.today()
+        key = (end_date, days)
+        data_version = SectorData.get_data_version()
+        use_cache = not SectorData.has_uncommitted_changes(db.session)
+        
+        if use_cache:
+            with cls._cache_lock:
+                cached = cls._cache.get(key)
+            if cached is not None and cached[0] == data_version:
+                return cached[1]
+        
+        matrix = cls._load_matrix(end_date - timedelta(days=days), end_date)
+        
+        if use_cache:
+            with cls._cache_lock:
+                if len(cls._cache) >= cls.MAX_CACHE_ENTRIES:
+                    cls._cache.clear()
+                cls._cache[key] = (data_version, matrix)
+        return matrix
+    
+    @classmethod
+    def clear_cache(cls) -> None:
+        """清空矩阵缓存"""
+        with cls._cache_lock:
+            cls._cache.clear()
+    
+    @classmethod
+    def _load_matrix(cls, start_date: date, end_date: date) -> SectorMatrix:
+        """一次查询载入区间内全部板块数据（涨跌幅跳过Decimal转换）"""
+        rows = db.session.execute(
+            db.select(
+                SectorData.sector_name,
+                SectorData.record_date,
+                SectorData.rank_position,
+                type_coerce(SectorData.change_percent, db.Float)
+            ).where(SectorData.record_date.between(start_date, end_date))
+        ).all()
+        return SectorMatrix.from_rows(start_date, end_date, [tuple(row) for row in rows])
@@ -1,16 +1,25 @@
 """
 板块分析服务
 """
+import json
 import akshare as ak
+import numpy as np
 import pandas as pd
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional, Any
 from sqlalchemy import desc, func, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from extensions import db
 from models.sector_data import SectorData, SectorRanking
 from services.base_service import BaseService
+from services.sector_analytics_engine import SectorAnalyticsEngine
 from error_handlers import ValidationError, ExternalAPIError
 from utils.trading_date_utils import get_trading_date, get_data_context
+from utils.pagination import CountCache
+from utils.serialization import parse_fields, project_query, serialize_items
+
+# 刷新已有板块时覆盖的列
+SECTOR_UPDATE_COLUMNS = ('sector_code', 'change_percent', 'rank_position', 'volume', 'market_cap', 'updated_at')
 
 
 class SectorAnalysisService(BaseService):
@@ -31,13 +40,8 @@ class SectorAnalysisService(BaseService):
             if context['date_adjusted']:
                 print(f"日期已调整: {context['current_date']} -> {trading_date} (原因: {context['adjustment_reason']})")
             
-            # 检查交易日是否已有数据，如果有则先删除以便更新
+            # 检查交易日是否已有数据，已有时整日数据在同一事务内按板块覆盖更新
             existing_data = SectorData.has_data_for_date(trading_date)
-            if existing_data:
-                # 删除交易日的旧数据以便更新
-                SectorData.query.filter_by(record_date=trading_date).delete()
-                SectorRanking.query.filter_by(record_date=trading_date).delete()
-                db.session.commit()
             
             # 获取AKShare板块数据
             try:
@@ -53,47 +57,13 @@ class SectorAnalysisService(BaseService):
                     "count": 0
                 }
             
-            # 批量插入数据
-            sector_records = []
-            ranking_data = []
-            
-            for idx, row in sector_df.iterrows():
-                try:
-                    # 创建板块数据记录
-                    sector_data = SectorData(
-                        sector_name=row.get('板块名称', ''),
-                        sector_code=row.get('板块代码', ''),
-                        change_percent=float(row.get('涨跌幅', 0)),
-                        record_date=trading_date,
-                        rank_position=idx + 1,
-                        volume=int(row.get('成交量', 0)) if pd.notna(row.get('成交量', 0)) else None,
-                        market_cap=float(row.get('总市值', 0)) if pd.notna(row.get('总市值', 0)) else None
-                    )
-                    sector_records.append(sector_data)
-                    
-                    # 准备排名数据
-                    ranking_data.append({
-                        'rank': idx + 1,
-                        'sector_name': row.get('板块名称', ''),
-                        'change_percent': float(row.get('涨跌幅', 0)),
-                        'volume': int(row.get('成交量', 0)) if pd.notna(row.get('成交量', 0)) else None,
-                        'market_cap': float(row.get('总市值', 0)) if pd.notna(row.get('总市值', 0)) else None
-                    })
-                    
-                except (ValueError, TypeError) as e:
-                    # 跳过有问题的数据行
-                    continue
+            sectors = cls._clean_sector_frame(sector_df)
             
-            # 批量保存板块数据
-            if sector_records:
-                db.session.add_all(sector_records)
-                db.session.commit()
-                
-                # 保存排名数据
-                SectorRanking.create_or_update(trading_date, ranking_data, len(sector_records))
+            if not sectors.empty:
+                cls._save_sector_frame(trading_date, sectors)
                 
                 action = "更新" if existing_data else "获取并保存"
-                message = f"成功{action}{len(sector_records)}条板块数据"
+                message = f"成功{action}{len(sectors)}条板块数据"
                 
                 # 如果日期被调整，在消息中说明
                 if context['date_adjusted']:
@@ -109,7 +79,7 @@ class SectorAnalysisService(BaseService):
                     "success": True,
                     "message": message,
                     "date": trading_date.isoformat(),
-                    "count": len(sector_records),
+                    "count": len(sectors),
                     "updated": existing_data,
                     "trading_date": trading_date.isoformat(),
                     "current_date": context['current_date'].isoformat(),
@@ -131,8 +101,96 @@ class SectorAnalysisService(BaseService):
             raise ExternalAPIError(f"刷新板块数据时发生错误: {str(e)}")
     
     @classmethod
-    def get_sector_ranking(cls, target_date: Optional[date] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """获取板块涨幅排名"""
+    def _clean_sector_frame(cls, sector_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        向量化清洗AKShare板块行情
+        
+        去掉板块名称为空、名称重复或涨跌幅无效（非数值或超出±100%）的行，成交量、市值的非数值和负数置空，
+        按行情顺序重新编排名
+        
+        Returns:
+            pd.DataFrame: 列为 SectorData 的字段名，成交量为可空整数
+        """
+        def column(name: str) -> pd.Series:
+            if name in sector_df.columns:
+                return sector_df[name]
+            return pd.Series(None, index=sector_df.index, dtype=object)
+        
+        names = column('板块名称').fillna('').astype(str).str.strip()
+        codes = column('板块代码').fillna('').astype(str).str.strip()
+        change_percent = pd.to_numeric(column('涨跌幅'), errors='coerce').round(2)
+        volume = pd.to_numeric(column('成交量'), errors='coerce')
+        market_cap = pd.to_numeric(column('总市值'), errors='coerce')
+        
+        valid = (names != '') & change_percent.between(-100, 100)
+        valid &= ~names.where(valid).duplicated()
+        
+        sectors = pd.DataFrame({
+            'sector_name': names[valid],
+            'sector_code': codes[valid],
+            'change_percent': change_percent[valid],
+            'volume': volume[valid].where(volume[valid] >= 0).round().astype('Int64'),
+            'market_cap': market_cap[valid].where(market_cap[valid] >= 0).round(2)
+        }).reset_index(drop=True)
+        sectors.insert(4, 'rank_position', np.arange(1, len(sectors) + 1))
+        return sectors
+    
+    @classmethod
+    def _save_sector_frame(cls, trading_date: date, sectors: pd.DataFrame) -> None:
+        """
+        在一个事务内写入交易日的板块数据和排名快照
+        
+        板块数据按 (板块名称, 日期) 批量 upsert，当日不再出现的板块随后删除；排名快照由同一份数据生成。
+        使用 core 语句写入，不创建ORM对象
+        """
+        now = datetime.utcnow()
+        records = sectors.astype(object).where(sectors.notna(), None).to_dict('records')
+        
+        rows = [dict(record, record_date=trading_date, created_at=now, updated_at=now) for record in records]
+        statement = sqlite_insert(SectorData.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['sector_name', 'record_date'],
+            set_={name: statement.excluded[name] for name in SECTOR_UPDATE_COLUMNS}
+        )
+        db.session.execute(statement, rows)
+        db.session.execute(SectorData.__table__.delete().where(
+            SectorData.record_date == trading_date,
+            SectorData.updated_at != now
+        ))
+        
+        ranking_data = [
+            {
+                'rank': record['rank_position'],
+                'sector_name': record['sector_name'],
+                'change_percent': record['change_percent'],
+                'volume': record['volume'],
+                'market_cap': record['market_cap']
+            }
+            for record in records
+        ]
+        statement = sqlite_insert(SectorRanking.__table__).values(
+            record_date=trading_date,
+            ranking_data=json.dumps(ranking_data, ensure_ascii=False),
+            total_sectors=len(records),
+            created_at=now,
+            updated_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['record_date'],
+            set_={name: statement.excluded[name] for name in ('ranking_data', 'total_sectors', 'updated_at')}
+        )
+        db.session.execute(statement)
+        SectorData.mark_data_changed(db.session)
+        db.session.commit()
+        
+        # core 语句不触发ORM事件，手动使总数缓存失效
+        CountCache.invalidate([SectorData.__tablename__, SectorRanking.__tablename__])
+    
+    @classmethod
+    def get_sector_ranking(cls, target_date: Optional[date] = None, limit: Optional[int] = None,
+                           fields: Any = None) -> List[Dict[str, Any]]:
+        """获取板块涨幅排名，传入 fields 时只返回这些列"""
+        fields = parse_fields(SectorData, fields)
         try:
             if target_date is None:
                 target_date = date.today()
@@ -143,22 +201,28 @@ class SectorAnalysisService(BaseService):
                 ranking_list = ranking_record.ranking_list
                 if limit:
                     ranking_list = ranking_list[:limit]
+                if fields:
+                    ranking_list = [
+                        {name: item[name] for name in fields if name in item} for item in ranking_list
+                    ]
                 return ranking_list
             
             # 如果排名表没有数据，从板块数据表获取
             query = SectorData.query.filter_by(record_date=target_date).order_by(SectorData.rank_position)
+            if fields:
+                query = project_query(query, SectorData, fields)
             if limit:
                 query = query.limit(limit)
             
-            sectors = query.all()
-            return [sector.to_dict() for sector in sectors]
+            return serialize_items(query.all(), SectorData, fields)
             
         except Exception as e:
             raise ValidationError(f"获取板块排名失败: {str(e)}")
     
     @classmethod
-    def get_sector_history(cls, sector_name: str, days: int = 30) -> List[Dict[str, Any]]:
-        """获取板块历史表现"""
+    def get_sector_history(cls, sector_name: str, days: int = 30, fields: Any = None) -> List[Dict[str, Any]]:
+        """获取板块历史表现，传入 fields 时只返回这些列"""
+        fields = parse_fields(SectorData, fields)
         try:
             if not sector_name:
                 raise ValidationError("板块名称不能为空", "sector_name")
@@ -169,12 +233,14 @@ class SectorAnalysisService(BaseService):
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
             
-            sectors = SectorData.query.filter(
+            query = SectorData.query.filter(
                 SectorData.sector_name == sector_name,
                 SectorData.record_date.between(start_date, end_date)
-            ).order_by(SectorData.record_date.desc()).all()
+            ).order_by(SectorData.record_date.desc())
+            if fields:
+                query = project_query(query, SectorData, fields)
             
-            return [sector.to_dict() for sector in sectors]
+            return serialize_items(query.all(), SectorData, fields)
             
         except ValidationError:
             raise
@@ -183,7 +249,7 @@ class SectorAnalysisService(BaseService):
     
     @classmethod
     def get_top_performers(cls, days: int = 30, top_k: int = 10) -> List[Dict[str, Any]]:
-        """获取最近N天TOPK板块统计"""
+        """获取最近N天TOPK板块统计（在板块矩阵上一次计算全部板块）"""
         try:
             if days <= 0:
                 raise ValidationError("查询天数必须大于0", "days")
@@ -191,77 +257,36 @@ class SectorAnalysisService(BaseService):
             if top_k <= 0:
                 raise ValidationError("TOPK值必须大于0", "top_k")
             
-            end_date = date.today()
-            start_date = end_date - timedelta(days=days)
+            return SectorAnalyticsEngine.get_matrix(days).top_performers(top_k, days)
             
-            # 查询指定时间范围内排名前K的板块
-            result = db.session.query(
-                SectorData.sector_name,
-                func.count().label('appearances'),
-                func.avg(SectorData.rank_position).label('avg_rank'),
-                func.min(SectorData.rank_position).label('best_rank'),
-                func.max(SectorData.record_date).label('latest_date'),
-                func.avg(SectorData.change_percent).label('avg_change_percent')
-            ).filter(
-                SectorData.record_date.between(start_date, end_date),
-                SectorData.rank_position <= top_k
-            ).group_by(SectorData.sector_name).order_by(
-                desc('appearances'), 'avg_rank'
-            ).all()
+        except ValidationError:
+            raise
+        except Exception as e:
+            raise ValidationError(f"获取TOPK板块统计失败: {str(e)}")
+    
+    @classmethod
+    def get_sector_momentum(cls, days: int = 30, top_k: int = 10) -> List[Dict[str, Any]]:
+        """获取全部板块的排名动量：排名变化、连续进入前K名天数、均值和趋势"""
+        try:
+            if days <= 0:
+                raise ValidationError("查询天数必须大于0", "days")
             
-            # 转换结果为字典列表
-            top_performers = []
-            for row in result:
-                # 计算趋势
-                trend = cls._calculate_trend(row.sector_name, days)
-                
-                top_performers.append({
-                    'sector_name': row.sector_name,
-                    'appearances': row.appearances,
-                    'avg_rank': round(float(row.avg_rank), 2),
-                    'best_rank': row.best_rank,
-                    'latest_date': row.latest_date.isoformat(),
-                    'avg_change_percent': round(float(row.avg_change_percent), 2),
-                    'trend': trend,
-                    'frequency_rate': round(row.appearances / days * 100, 2)  # 进入榜单频率
-                })
+            if top_k <= 0:
+                raise ValidationError("TOPK值必须大于0", "top_k")
             
-            return top_performers
+            return SectorAnalyticsEngine.get_matrix(days).momentum(top_k, days)
             
         except ValidationError:
             raise
         except Exception as e:
-            raise ValidationError(f"获取TOPK板块统计失败: {str(e)}")
+            raise ValidationError(f"获取板块排名动量失败: {str(e)}")
     
     @classmethod
     def _calculate_trend(cls, sector_name: str, days: int) -> str:
         """计算板块趋势"""
         try:
-            # 获取最近的排名数据
-            recent_data = cls.get_sector_history(sector_name, min(days, 7))
-            
-            if len(recent_data) < 2:
-                return 'stable'
-            
-            # 计算最近几天的平均排名变化
-            recent_ranks = [data.get('rank_position', 999) for data in recent_data if data.get('rank_position')]
-            
-            if len(recent_ranks) < 2:
-                return 'stable'
-            
-            # 简单的趋势判断：比较前半段和后半段的平均排名
-            # recent_data是按日期倒序排列的，所以索引0是最新的数据
-            mid = len(recent_ranks) // 2
-            recent_avg = sum(recent_ranks[:mid]) / mid if mid > 0 else recent_ranks[0]  # 较新的数据
-            early_avg = sum(recent_ranks[mid:]) / len(recent_ranks[mid:]) if len(recent_ranks[mid:]) > 0 else recent_ranks[-1]  # 较早的数据
-            
-            if recent_avg < early_avg - 2:  # 排名上升（数字变小）
-                return 'up'
-            elif recent_avg > early_avg + 2:  # 排名下降（数字变大）
-                return 'down'
-            else:
-                return 'stable'
-                
+            matrix = SectorAnalyticsEngine.get_matrix(days)
+            return dict(zip(matrix.sectors, matrix.trends(days))).get(sector_name, 'stable')
         except Exception:
             return 'stable'
     
@@ -269,53 +294,14 @@ class SectorAnalysisService(BaseService):
     def get_sector_analysis_summary(cls, days: int = 30) -> Dict[str, Any]:
         """获取板块分析汇总信息"""
         try:
-            end_date = date.today()
-            start_date = end_date - timedelta(days=days)
+            summary = SectorAnalyticsEngine.get_matrix(days).summary(days)
             
-            # 统计基本信息
-            total_records = SectorData.query.filter(
-                SectorData.record_date.between(start_date, end_date)
-            ).count()
-            
-            unique_sectors = db.session.query(
-                func.count(func.distinct(SectorData.sector_name))
-            ).filter(
-                SectorData.record_date.between(start_date, end_date)
-            ).scalar()
-            
-            unique_dates = db.session.query(
-                func.count(func.distinct(SectorData.record_date))
-            ).filter(
-                SectorData.record_date.between(start_date, end_date)
-            ).scalar()
+            # 区间内没有数据时取全部数据中的最新日期
+            if summary['latest_data_date'] is None:
+                latest_date = db.session.query(func.max(SectorData.record_date)).scalar()
+                summary['latest_data_date'] = latest_date.isoformat() if latest_date else None
             
-            # 获取最新数据日期
-            latest_date = db.session.query(
-                func.max(SectorData.record_date)
-            ).scalar()
-            
-            # 获取涨幅统计
-            change_stats = db.session.query(
-                func.avg(SectorData.change_percent).label('avg_change'),
-                func.max(SectorData.change_percent).label('max_change'),
-                func.min(SectorData.change_percent).label('min_change')
-            ).filter(
-                SectorData.record_date.between(start_date, end_date)
-            ).first()
-            
-            return {
-                'period_days': days,
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat(),
-                'latest_data_date': latest_date.isoformat() if latest_date else None,
-                'total_records': total_records,
-                'unique_sectors': unique_sectors,
-                'data_days': unique_dates,
-                'avg_change_percent': round(float(change_stats.avg_change), 2) if change_stats.avg_change else 0,
-                'max_change_percent': round(float(change_stats.max_change), 2) if change_stats.max_change else 0,
-                'min_change_percent': round(float(change_stats.min_change), 2) if change_stats.min_change else 0,
-                'data_completeness': round(unique_dates / days * 100, 2) if days > 0 else 0
-            }
+            return summary
             
         except Exception as e:
             raise ValidationError(f"获取板块分析汇总失败: {str(e)}")
@@ -343,6 +329,8 @@ class SectorAnalysisService(BaseService):
             # 删除排名数据
             ranking_deleted = SectorRanking.query.filter_by(record_date=target_date).delete()
             
+            # 批量删除不触发ORM事件，手动标记板块数据已修改
+            SectorData.mark_data_changed(db.session)
             db.session.commit()
             
             return {
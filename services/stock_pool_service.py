@@ -6,7 +6,9 @@ from datetime import datetime
 from sqlalchemy import and_, or_, desc, asc
 from extensions import db
 from models.stock_pool import StockPool
+from models.search_index import SearchIndex
 from services.base_service import BaseService
+from utils.pagination import keyset_paginate
 from error_handlers import ValidationError, NotFoundError, DatabaseError
 
 
@@ -47,11 +49,21 @@ class StockPoolService(BaseService):
     @classmethod
     def get_by_pool_type(cls, pool_type: str, status: str = 'active', 
                         page: int = None, per_page: int = None,
-                        sort_by: str = 'created_at', sort_order: str = 'desc') -> Dict[str, Any]:
-        """根据池类型获取股票列表"""
+                        sort_by: str = 'created_at', sort_order: str = 'desc',
+                        cursor: str = None, include_total: bool = False) -> Dict[str, Any]:
+        """根据池类型获取股票列表，传入 cursor（首页传空字符串）时使用游标分页"""
         try:
             query = cls.model.query.filter_by(pool_type=pool_type, status=status)
             
+            # 游标分页
+            if cursor is not None:
+                result = keyset_paginate(
+                    query, cls.model, sort_by, sort_order, per_page or 20,
+                    cursor=cursor, include_total=include_total, default_sort_by='created_at'
+                )
+                result['items'] = [item.to_dict() for item in result['items']]
+                return result
+            
             # 排序
             if hasattr(cls.model, sort_by):
                 order_func = desc if sort_order.lower() == 'desc' else asc
@@ -77,6 +89,8 @@ class StockPoolService(BaseService):
                     'items': [item.to_dict() for item in items],
                     'total': len(items)
                 }
+        except ValidationError:
+            raise
         except Exception as e:
             raise DatabaseError(f"获取股票池列表失败: {str(e)}")
     
@@ -200,17 +214,22 @@ class StockPoolService(BaseService):
     @classmethod
     def search_stocks(cls, filters: Dict[str, Any], 
                      page: int = None, per_page: int = None,
-                     sort_by: str = 'created_at', sort_order: str = 'desc') -> Dict[str, Any]:
-        """搜索股票池"""
+                     sort_by: str = 'created_at', sort_order: str = 'desc',
+                     cursor: str = None, include_total: bool = False) -> Dict[str, Any]:
+        """搜索股票池，传入 cursor（首页传空字符串）时使用游标分页"""
         try:
             query = cls.model.query
             
             # 应用筛选条件
             if filters.get('stock_code'):
-                query = query.filter(cls.model.stock_code.like(f"%{filters['stock_code']}%"))
+                query = query.filter(SearchIndex.like_filter(
+                    cls.model, 'stocks', 'stock_code', f"%{filters['stock_code']}%"
+                ))
             
             if filters.get('stock_name'):
-                query = query.filter(cls.model.stock_name.like(f"%{filters['stock_name']}%"))
+                query = query.filter(SearchIndex.like_filter(
+                    cls.model, 'stocks', 'stock_name', f"%{filters['stock_name']}%"
+                ))
             
             if filters.get('pool_type'):
                 query = query.filter_by(pool_type=filters['pool_type'])
@@ -221,7 +240,9 @@ class StockPoolService(BaseService):
                 query = query.filter_by(status='active')  # 默认只显示活跃记录
             
             if filters.get('add_reason'):
-                query = query.filter(cls.model.add_reason.like(f"%{filters['add_reason']}%"))
+                query = query.filter(SearchIndex.like_filter(
+                    cls.model, 'stocks', 'add_reason', f"%{filters['add_reason']}%"
+                ))
             
             if filters.get('start_date'):
                 start_date = datetime.fromisoformat(filters['start_date'])
@@ -237,6 +258,15 @@ class StockPoolService(BaseService):
             if filters.get('max_target_price'):
                 query = query.filter(cls.model.target_price <= float(filters['max_target_price']))
             
+            # 游标分页
+            if cursor is not None:
+                result = keyset_paginate(
+                    query, cls.model, sort_by, sort_order, per_page or 20,
+                    cursor=cursor, include_total=include_total, default_sort_by='created_at'
+                )
+                result['items'] = [item.to_dict() for item in result['items']]
+                return result
+            
             # 排序
             if hasattr(cls.model, sort_by):
                 order_func = desc if sort_order.lower() == 'desc' else asc
@@ -262,6 +292,8 @@ class StockPoolService(BaseService):
                     'items': [item.to_dict() for item in items],
                     'total': len(items)
                 }
+        except ValidationError:
+            raise
         except Exception as e:
             raise DatabaseError(f"搜索股票池失败: {str(e)}")
     
@@ -0,0 +1,332 @@
+"""
+策略回测服务
+用本地日线数据逐日回放历史交易的持仓周期，按策略规则模拟卖出，
+对比策略卖出与实际卖出的收益差异
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from extensions import db
+from models.historical_trade import HistoricalTrade
+from models.trade_record import TradeRecord
+from models.trading_strategy import TradingStrategy
+from services.daily_bar_service import DailyBarService
+from services.strategy_service import StrategyService, StrategyEvaluator, CompiledStrategy
+from error_handlers import ValidationError, DatabaseError
+
+
+class BacktestDataset:
+    """回测数据集（交易 × 持仓交易日矩阵），所有策略共享只读"""
+    
+    def __init__(self, trades: List[Dict[str, Any]], dates: np.ndarray, closes: np.ndarray,
+                 lengths: np.ndarray, cost_prices: np.ndarray, actual_return_rates: np.ndarray,
+                 investments: np.ndarray, skipped: List[Dict[str, Any]]):
+        self.trades = trades
+        self.dates = dates
+        self.closes = closes
+        self.lengths = lengths
+        self.cost_prices = cost_prices
+        self.actual_return_rates = actual_return_rates
+        self.investments = investments
+        self.skipped = skipped
+        
+        # 第j列对应持仓第j+1个交易日；超出持仓周期的位置为NaN
+        self.holding_days = np.broadcast_to(
+            np.arange(1, closes.shape[1] + 1, dtype=float), closes.shape
+        )
+        self.return_ratios = closes / cost_prices[:, None] - 1
+    
+    @property
+    def trade_count(self) -> int:
+        return len(self.trades)
+
+
+class StrategyBacktestService:
+    """策略回测服务
+    
+    模拟方式：按平均买入成本在买入日建仓，每个交易日收盘时按规则顺序取第一条命中的规则，
+    sell_all 以当日收盘价卖出全部剩余持仓并结束；sell_partial 按比例卖出剩余持仓，
+    同一条部分止盈规则在一次持仓中只执行一次；未被策略卖出的部分按实际收益率结算。
+    """
+    
+    ACTION_CODES = {'hold': 0, 'sell_all': 1, 'sell_partial': 2}
+    
+    @classmethod
+    def run_backtest(cls, strategy_ids: Optional[List[int]] = None,
+                     strategies: Optional[List[Dict[str, Any]]] = None,
+                     filters: Optional[Dict[str, Any]] = None,
+                     include_trades: bool = False,
+                     bar_service: Optional[DailyBarService] = None,
+                     max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        回测一组策略
+        
+        Args:
+            strategy_ids: 已保存策略的ID列表
+            strategies: 临时策略（规则变体）列表，格式 {'strategy_name': ..., 'rules': {...}}
+            filters: 历史交易筛选条件（stock_code、start_date、end_date）
+            include_trades: 是否返回每笔被策略触发卖出的交易明细
+            bar_service: 日线数据服务，默认使用配置的存储目录
+            max_workers: 并行回测的线程数
+        
+        Returns:
+            Dict: 数据集概况和每个策略的回测结果
+        """
+        compiled_strategies = cls._compile_strategies(strategy_ids, strategies)
+        
+        try:
+            dataset = cls.build_dataset(filters, bar_service)
+            
+            workers = max_workers or min(len(compiled_strategies), os.cpu_count() or 1)
+            if workers > 1:
+                # 数据集只读共享，NumPy运算期间释放GIL，多个策略可并行回测
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(
+                        lambda compiled: cls.simulate(dataset, compiled, include_trades),
+                        compiled_strategies
+                    ))
+            else:
+                results = [cls.simulate(dataset, compiled, include_trades) for compiled in compiled_strategies]
+            
+            return {
+                'trade_count': dataset.trade_count,
+                'skipped_count': len(dataset.skipped),
+                'skipped_trades': dataset.skipped,
+                'results': results
+            }
+        except ValidationError:
+            raise
+        except Exception as e:
+            raise DatabaseError(f"策略回测失败: {str(e)}")
+    
+    @classmethod
+    def _compile_strategies(cls, strategy_ids: Optional[List[int]],
+                            strategies: Optional[List[Dict[str, Any]]]) -> List[CompiledStrategy]:
+        """加载并编译待回测的策略"""
+        compiled = []
+        for strategy_id in strategy_ids or []:
+            compiled.append(StrategyEvaluator.compile_strategy(StrategyService.get_by_id(strategy_id)))
+        
+        for i, data in enumerate(strategies or []):
+            rules = data.get('rules')
+            StrategyService._validate_strategy_rules(rules)
+            strategy = TradingStrategy(
+                strategy_name=data.get('strategy_name') or f'策略变体{i + 1}',
+                rules=rules
+            )
+            compiled.append(CompiledStrategy(strategy))
+        
+        if not compiled:
+            raise ValidationError("请至少指定一个回测策略")
+        return compiled
+    
+    @classmethod
+    def build_dataset(cls, filters: Optional[Dict[str, Any]] = None,
+                      bar_service: Optional[DailyBarService] = None) -> BacktestDataset:
+        """加载历史交易和日线数据，构建交易 × 持仓交易日的收盘价矩阵"""
+        filters = filters or {}
+        bar_service = bar_service or DailyBarService()
+        
+        query = HistoricalTrade.query.filter(HistoricalTrade.is_completed == True)
+        if filters.get('stock_code'):
+            query = query.filter(HistoricalTrade.stock_code == filters['stock_code'])
+        if filters.get('start_date'):
+            query = query.filter(HistoricalTrade.buy_date >= DailyBarService._to_date(filters['start_date']))
+        if filters.get('end_date'):
+            end_date = DailyBarService._to_date(filters['end_date'])
+            query = query.filter(HistoricalTrade.sell_date < datetime.combine(end_date, datetime.max.time()))
+        historical_trades = query.order_by(HistoricalTrade.buy_date, HistoricalTrade.id).all()
+        
+        cost_prices = cls._get_average_buy_prices(historical_trades)
+        bars_by_code = bar_service.get_bars(sorted({t.stock_code for t in historical_trades}))
+        
+        trades, segments, skipped = [], [], []
+        for trade in historical_trades:
+            bars = bars_by_code.get(trade.stock_code)
+            buy_day = np.datetime64(trade.buy_date.date(), 'D')
+            sell_day = np.datetime64(trade.sell_date.date(), 'D')
+            if bars is not None and len(bars):
+                lo = np.searchsorted(bars['date'], buy_day, side='left')
+                hi = np.searchsorted(bars['date'], sell_day, side='right')
+                bars = bars[lo:hi]
+            
+            if bars is None or not len(bars):
+                skipped.append({'historical_trade_id': trade.id, 'stock_code': trade.stock_code,
+                                'reason': '缺少持仓期间的日线数据'})
+                continue
+            
+            cost_price = cost_prices.get(trade.id) or float(bars['close'][0])
+            trades.append({
+                'historical_trade_id': trade.id,
+                'stock_code': trade.stock_code,
+                'stock_name': trade.stock_name,
+                'buy_date': trade.buy_date.date().isoformat(),
+                'sell_date': trade.sell_date.date().isoformat(),
+                'cost_price': cost_price,
+                'total_investment': float(trade.total_investment),
+                'actual_return_rate': float(trade.return_rate),
+            })
+            segments.append(bars)
+        
+        max_days = max((len(bars) for bars in segments), default=0)
+        closes = np.full((len(segments), max_days), np.nan)
+        dates = np.full((len(segments), max_days), np.datetime64('NaT'), dtype='datetime64[D]')
+        for row, bars in enumerate(segments):
+            closes[row, :len(bars)] = bars['close']
+            dates[row, :len(bars)] = bars['date']
+        
+        return BacktestDataset(
+            trades=trades,
+            dates=dates,
+            closes=closes,
+            lengths=np.array([len(bars) for bars in segments], dtype=np.int64),
+            cost_prices=np.array([t['cost_price'] for t in trades], dtype=float),
+            actual_return_rates=np.array([t['actual_return_rate'] for t in trades], dtype=float),
+            investments=np.array([t['total_investment'] for t in trades], dtype=float),
+            skipped=skipped
+        )
+    
+    @classmethod
+    def _get_average_buy_prices(cls, historical_trades: List[HistoricalTrade]) -> Dict[int, float]:
+        """批量计算每笔历史交易的平均买入价（按买入记录数量加权）"""
+        buy_ids = {trade.id: trade.buy_records_list for trade in historical_trades}
+        all_ids = sorted({record_id for ids in buy_ids.values() for record_id in ids})
+        
+        records = {}
+        for start in range(0, len(all_ids), 500):
+            rows = db.session.query(TradeRecord.id, TradeRecord.price, TradeRecord.quantity).filter(
+                TradeRecord.id.in_(all_ids[start:start + 500])
+            ).all()
+            records.update({row.id: (float(row.price), row.quantity) for row in rows})
+        
+        prices = {}
+        for trade_id, ids in buy_ids.items():
+            matched = [records[record_id] for record_id in ids if record_id in records]
+            quantity = sum(q for _, q in matched)
+            if quantity > 0:
+                prices[trade_id] = sum(p * q for p, q in matched) / quantity
+        return prices
+    
+    @classmethod
+    def simulate(cls, dataset: BacktestDataset, compiled: CompiledStrategy,
+                 include_trades: bool = False) -> Dict[str, Any]:
+        """对数据集回放单个策略（对所有交易和持仓日向量化计算）"""
+        trade_count, day_count = dataset.closes.shape
+        
+        if trade_count == 0 or day_count == 0:
+            return cls._summarize(dataset, compiled, np.zeros(0), np.zeros(0, dtype=bool), [], include_trades)
+        
+        # 每个（交易, 持仓日）命中的第一条规则；NaN价格不会命中任何规则
+        matches = compiled.match(
+            dataset.holding_days.ravel(), dataset.return_ratios.ravel()
+        ).reshape(trade_count, day_count)
+        
+        action_codes = np.array(
+            [cls.ACTION_CODES.get(rule.get('action', 'hold'), 0) for rule in compiled.rules] + [0],
+            dtype=np.int8
+        )
+        sell_ratios = np.array(
+            [float(rule.get('sell_ratio', 0) or 0) for rule in compiled.rules] + [0.0]
+        )
+        # -1 映射到末尾的占位规则（hold）
+        actions = action_codes[matches]
+        
+        no_day = day_count
+        full_exit_mask = actions == 1
+        full_exit_day = np.where(full_exit_mask.any(axis=1), full_exit_mask.argmax(axis=1), no_day)
+        
+        # 每条部分止盈规则首次命中的持仓日（需早于全部卖出日）
+        partial_rules = [i for i, code in enumerate(action_codes[:-1]) if code == 2]
+        if partial_rules:
+            rule_hits = matches[:, :, None] == np.array(partial_rules)
+            partial_days = np.where(rule_hits.any(axis=1), rule_hits.argmax(axis=1), no_day)
+            partial_days = np.where(partial_days < full_exit_day[:, None], partial_days, no_day)
+            partial_ratios = np.broadcast_to(sell_ratios[partial_rules], partial_days.shape)
+            
+            # 按发生顺序计算每次卖出占初始持仓的比例
+            order = np.argsort(partial_days, axis=1, kind='stable')
+            ordered_days = np.take_along_axis(partial_days, order, axis=1)
+            ordered_ratios = np.where(ordered_days < no_day, np.take_along_axis(partial_ratios, order, axis=1), 0.0)
+            remaining_after = np.cumprod(1 - ordered_ratios, axis=1)
+            remaining_before = np.concatenate([np.ones((trade_count, 1)), remaining_after[:, :-1]], axis=1)
+            sold_fractions = remaining_before * ordered_ratios
+            remaining = remaining_after[:, -1]
+            
+            safe_days = np.minimum(ordered_days, day_count - 1)
+            partial_returns = np.take_along_axis(dataset.return_ratios, safe_days, axis=1)
+            partial_pnl = np.where(ordered_days < no_day, sold_fractions * partial_returns, 0.0).sum(axis=1)
+        else:
+            ordered_days = np.full((trade_count, 0), no_day)
+            remaining = np.ones(trade_count)
+            partial_pnl = np.zeros(trade_count)
+        
+        full_exit = full_exit_day < no_day
+        exit_returns = dataset.return_ratios[np.arange(trade_count), np.minimum(full_exit_day, day_count - 1)]
+        remaining_returns = np.where(full_exit, exit_returns, dataset.actual_return_rates)
+        strategy_returns = partial_pnl + remaining * remaining_returns
+        triggered = full_exit | (ordered_days < no_day).any(axis=1)
+        
+        details = []
+        if include_trades:
+            for row in np.flatnonzero(triggered):
+                trade = dataset.trades[row]
+                events = []
+                for day in ordered_days[row]:
+                    if day < no_day:
+                        events.append(cls._exit_event(dataset, compiled, matches, row, day, 'sell_partial'))
+                if full_exit[row]:
+                    events.append(cls._exit_event(dataset, compiled, matches, row, full_exit_day[row], 'sell_all'))
+                details.append({
+                    **trade,
+                    'strategy_return_rate': round(float(strategy_returns[row]), 4),
+                    'strategy_return': round(float(strategy_returns[row] * dataset.investments[row]), 2),
+                    'actual_return': round(float(dataset.actual_return_rates[row] * dataset.investments[row]), 2),
+                    'exits': events
+                })
+        
+        return cls._summarize(dataset, compiled, strategy_returns, triggered, details, include_trades)
+    
+    @classmethod
+    def _exit_event(cls, dataset: BacktestDataset, compiled: CompiledStrategy, matches: np.ndarray,
+                    row: int, day: int, exit_type: str) -> Dict[str, Any]:
+        """单次策略卖出明细"""
+        rule = compiled.rules[matches[row, day]]
+        return {
+            'exit_type': exit_type,
+            'exit_date': str(dataset.dates[row, day]),
+            'holding_days': int(day) + 1,
+            'exit_price': round(float(dataset.closes[row, day]), 2),
+            'return_rate': round(float(dataset.return_ratios[row, day]), 4),
+            'sell_ratio': float(rule.get('sell_ratio', 0) or 0) if exit_type == 'sell_partial' else 1.0,
+            'strategy_rule': StrategyEvaluator._format_rule_description(rule)
+        }
+    
+    @classmethod
+    def _summarize(cls, dataset: BacktestDataset, compiled: CompiledStrategy, strategy_returns: np.ndarray,
+                   triggered: np.ndarray, details: List[Dict[str, Any]], include_trades: bool) -> Dict[str, Any]:
+        """汇总单个策略的回测结果"""
+        actual_returns = dataset.actual_return_rates
+        investments = dataset.investments
+        actual_total = float((actual_returns * investments).sum()) if len(investments) else 0.0
+        strategy_total = float((strategy_returns * investments).sum()) if len(investments) else 0.0
+        
+        result = {
+            'strategy_id': compiled.strategy_id,
+            'strategy_name': compiled.strategy_name,
+            'trade_count': dataset.trade_count,
+            'triggered_count': int(triggered.sum()),
+            'actual_total_return': round(actual_total, 2),
+            'strategy_total_return': round(strategy_total, 2),
+            'return_difference': round(strategy_total - actual_total, 2),
+            'actual_avg_return_rate': round(float(actual_returns.mean()), 4) if len(actual_returns) else 0,
+            'strategy_avg_return_rate': round(float(strategy_returns.mean()), 4) if len(strategy_returns) else 0,
+            'actual_win_rate': round(float((actual_returns > 0).mean()), 4) if len(actual_returns) else 0,
+            'strategy_win_rate': round(float((strategy_returns > 0).mean()), 4) if len(strategy_returns) else 0,
+        }
+        if include_trades:
+            result['trades'] = details
+        return result
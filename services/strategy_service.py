@@ -1,14 +1,23 @@
 """
 交易策略服务
 """
+import threading
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Optional, Any
-from sqlalchemy import func, and_, or_, desc, asc
+from typing import List, Dict, Optional, Any, Tuple
+
+import numpy as np
+from sqlalchemy import event, func, and_, or_, desc, asc
+from sqlalchemy.orm import Session
 from extensions import db
 from services.base_service import BaseService
 from models.trading_strategy import TradingStrategy
 from models.stock_price import StockPrice
+from models.strategy_alert import StrategyAlert
+from utils.pagination import keyset_paginate
 from error_handlers import ValidationError, NotFoundError, DatabaseError
+from utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
 
 
 class StrategyService(BaseService):
@@ -63,8 +72,9 @@ class StrategyService(BaseService):
     @classmethod
     def get_strategies(cls, filters: Dict[str, Any] = None, page: int = None, 
                       per_page: int = None, sort_by: str = 'created_at', 
-                      sort_order: str = 'desc') -> Dict[str, Any]:
-        """获取交易策略列表"""
+                      sort_order: str = 'desc', cursor: str = None,
+                      include_total: bool = False) -> Dict[str, Any]:
+        """获取交易策略列表，传入 cursor（首页传空字符串）时使用游标分页"""
         try:
             query = TradingStrategy.query
             
@@ -76,6 +86,17 @@ class StrategyService(BaseService):
                 if filters.get('strategy_name'):
                     query = query.filter(TradingStrategy.strategy_name.like(f"%{filters['strategy_name']}%"))
             
+            # 游标分页
+            if cursor is not None:
+                pagination = keyset_paginate(
+                    query, TradingStrategy, sort_by, sort_order, per_page or 20,
+                    cursor=cursor, include_total=include_total, default_sort_by='created_at'
+                )
+                return {
+                    'strategies': [strategy.to_dict() for strategy in pagination.pop('items')],
+                    'pagination': pagination
+                }
+            
             # 应用排序
             if hasattr(TradingStrategy, sort_by):
                 order_func = desc if sort_order.lower() == 'desc' else asc
@@ -107,6 +128,8 @@ class StrategyService(BaseService):
                     'total': len(strategies)
                 }
                 
+        except ValidationError:
+            raise
         except Exception as e:
             raise DatabaseError(f"获取交易策略失败: {str(e)}")
     
@@ -181,9 +204,156 @@ class StrategyService(BaseService):
                 raise ValidationError(f"第{i+1}个规则的部分卖出操作必须包含sell_ratio字段")
 
 
+class CompiledStrategy:
+    """编译后的策略规则
+    
+    将策略规则JSON解析一次，转换为按规则顺序排列的数组（持仓天数上下界、条件编码、各类阈值），
+    评估时对所有持仓的持仓天数和盈亏比例做掩码运算，一次得到每个持仓命中的第一条规则。
+    """
+    
+    CONDITION_CODES = {
+        'loss_exceed': 1,
+        'profit_below': 2,
+        'profit_exceed': 3,
+        'profit_below_or_drawdown': 4,
+    }
+    
+    def __init__(self, strategy: TradingStrategy):
+        self.bind(strategy)
+        self.rules = [rule for rule in strategy.rules_list.get('rules', []) if isinstance(rule, dict)]
+        
+        rule_count = len(self.rules)
+        # 无效的持仓天数区间编译为空区间，永远不适用
+        self.day_low = np.full(rule_count, np.inf)
+        self.day_high = np.full(rule_count, -np.inf)
+        self.conditions = np.zeros(rule_count, dtype=np.int8)
+        self.loss_thresholds = np.zeros(rule_count)
+        self.profit_thresholds = np.zeros(rule_count)
+        self.drawdown_thresholds = np.zeros(rule_count)
+        
+        for i, rule in enumerate(self.rules):
+            day_range = rule.get('day_range', [])
+            try:
+                if len(day_range) == 2:
+                    self.day_low[i], self.day_high[i] = float(day_range[0]), float(day_range[1])
+            except (TypeError, ValueError):
+                pass
+            
+            self.conditions[i] = self.CONDITION_CODES.get(rule.get('condition', ''), 0)
+            self.loss_thresholds[i] = float(rule.get('loss_threshold', 0) or 0)
+            self.profit_thresholds[i] = float(rule.get('profit_threshold', 0) or 0)
+            self.drawdown_thresholds[i] = float(rule.get('drawdown_threshold', 0) or 0)
+    
+    def bind(self, strategy: TradingStrategy) -> None:
+        """关联策略对象，并缓存标识字段供后台线程读取（不触发数据库加载）"""
+        self.strategy = strategy
+        self.strategy_id = strategy.id
+        self.strategy_name = strategy.strategy_name
+    
+    def match(self, holding_days: np.ndarray, profit_loss_ratios: np.ndarray) -> np.ndarray:
+        """返回每个持仓命中的第一条规则下标，未命中为-1"""
+        if not self.rules or len(holding_days) == 0:
+            return np.full(len(holding_days), -1, dtype=np.int64)
+        
+        days = holding_days[:, None]
+        ratios = profit_loss_ratios[:, None]
+        
+        hits = (days >= self.day_low) & (days <= self.day_high)
+        triggered = np.zeros_like(hits)
+        # 只对规则中实际出现的条件类型计算比较，未知条件保持不触发
+        for code in np.unique(self.conditions[self.conditions > 0]):
+            columns = self.conditions == code
+            if code == 1:
+                triggered[:, columns] = ratios <= self.loss_thresholds[columns]
+            elif code == 2:
+                triggered[:, columns] = ratios < self.profit_thresholds[columns]
+            elif code == 3:
+                triggered[:, columns] = ratios >= self.profit_thresholds[columns]
+            else:
+                triggered[:, columns] = (
+                    (ratios < self.profit_thresholds[columns]) |
+                    (ratios <= -self.drawdown_thresholds[columns])
+                )
+        hits &= triggered
+        
+        return np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+
 class StrategyEvaluator:
     """策略评估引擎"""
     
+    # 编译结果按策略版本缓存：(策略ID, 规则JSON) -> CompiledStrategy
+    _compiled_cache: Dict[Tuple[int, str], CompiledStrategy] = {}
+    _compiled_lock = threading.Lock()
+    
+    @classmethod
+    def compile_strategy(cls, strategy: TradingStrategy) -> CompiledStrategy:
+        """获取策略的编译结果，规则变化后自动重新编译"""
+        if strategy.id is None:
+            # 未保存的策略没有稳定标识，不缓存
+            return CompiledStrategy(strategy)
+        
+        key = (strategy.id, strategy.rules)
+        compiled = cls._compiled_cache.get(key)
+        if compiled is None:
+            compiled = CompiledStrategy(strategy)
+            with cls._compiled_lock:
+                # 丢弃同一策略的旧版本
+                for stale_key in [k for k in cls._compiled_cache if k[0] == strategy.id]:
+                    cls._compiled_cache.pop(stale_key, None)
+                cls._compiled_cache[key] = compiled
+        else:
+            # 名称等非规则字段可能已修改，生成提醒时使用最新对象
+            compiled.bind(strategy)
+        return compiled
+    
+    @classmethod
+    def evaluate_holdings(cls, holdings: List[Dict[str, Any]], current_prices: Dict[str, float],
+                          strategies: List[TradingStrategy]) -> List[Dict[str, Any]]:
+        """向量化评估一组持仓在所有策略下的提醒
+        
+        Args:
+            holdings: 持仓列表
+            current_prices: 股票代码 -> 当前价格，缺少价格的持仓不评估
+            strategies: 参与评估的策略
+            
+        Returns:
+            List[Dict]: 提醒列表，按持仓顺序、策略顺序排列
+        """
+        holdings = [
+            h for h in holdings
+            if current_prices.get(h['stock_code']) is not None and h['avg_buy_price']
+        ]
+        if not holdings or not strategies:
+            return []
+        
+        prices = np.array([current_prices[h['stock_code']] for h in holdings], dtype=float)
+        avg_buy_prices = np.array([h['avg_buy_price'] for h in holdings], dtype=float)
+        holding_days = np.array([h['holding_days'] for h in holdings], dtype=float)
+        profit_loss_ratios = (prices - avg_buy_prices) / avg_buy_prices
+        
+        compiled_strategies = [cls.compile_strategy(strategy) for strategy in strategies]
+        # 矩阵[持仓, 策略] -> 命中规则下标
+        matches = np.column_stack([
+            compiled.match(holding_days, profit_loss_ratios) for compiled in compiled_strategies
+        ])
+        
+        alerts = []
+        for holding_index, strategy_index in np.argwhere(matches >= 0):
+            holding = holdings[holding_index]
+            compiled = compiled_strategies[strategy_index]
+            rule_index = int(matches[holding_index, strategy_index])
+            alert = cls._create_holding_alert(
+                holding['stock_code'], holding['stock_name'], holding['holding_days'],
+                holding['avg_buy_price'], float(prices[holding_index]), holding['current_quantity'],
+                float(profit_loss_ratios[holding_index]), compiled.rules[rule_index], compiled.strategy
+            )
+            alert['strategy_id'] = compiled.strategy.id
+            alert['rule_index'] = rule_index
+            alerts.append(alert)
+        
+        return alerts
+    
     @classmethod
     def evaluate_all_holdings(cls) -> List[Dict[str, Any]]:
         """评估所有持仓的策略提醒"""
@@ -203,24 +373,15 @@ class StrategyEvaluator:
             if not active_strategies:
                 return []
             
-            alerts = []
-            for holding in holdings:
-                stock_code = holding['stock_code']
-                
-                # 获取当前价格
-                current_price = cls._get_current_price(stock_code)
-                if current_price is None:
-                    continue
-                
-                # 评估每个激活的策略
-                for strategy in active_strategies:
-                    alert = cls.evaluate_holding_with_strategy(
-                        holding, current_price, strategy
-                    )
-                    if alert:
-                        alerts.append(alert)
+            # 一次查询获取所有持仓股票的最新价格
+            latest_prices = StockPrice.get_latest_prices([h['stock_code'] for h in holdings])
+            current_prices = {
+                stock_code: float(price.current_price)
+                for stock_code, price in latest_prices.items()
+                if price.current_price is not None
+            }
             
-            return alerts
+            return cls.evaluate_holdings(holdings, current_prices, active_strategies)
             
         except Exception as e:
             raise DatabaseError(f"评估持仓策略失败: {str(e)}")
@@ -278,15 +439,7 @@ class StrategyEvaluator:
             # 获取激活的策略
             active_strategies = StrategyService.get_active_strategies()
             
-            alerts = []
-            for strategy in active_strategies:
-                alert = cls.evaluate_holding_with_strategy(
-                    holding, current_price, strategy
-                )
-                if alert:
-                    alerts.append(alert)
-            
-            return alerts
+            return cls.evaluate_holdings([holding], {stock_code: current_price}, active_strategies)
             
         except Exception as e:
             raise DatabaseError(f"评估单个持仓策略失败: {str(e)}")
@@ -434,10 +587,9 @@ class StrategyEvaluator:
         """获取股票当前价格"""
         try:
             # 从股票价格缓存表获取最新价格
-            latest_price = StockPrice.query.filter_by(stock_code=stock_code)\
-                .order_by(StockPrice.record_date.desc()).first()
+            latest_price = StockPrice.get_latest_price(stock_code)
             
-            if latest_price:
+            if latest_price and latest_price.current_price is not None:
                 return float(latest_price.current_price)
             
             return None
@@ -447,43 +599,179 @@ class StrategyEvaluator:
             return None
 
 
+class StrategyAlertEngine:
+    """策略提醒引擎
+    
+    交易、价格、复盘和策略的变更通过ORM事件记录在会话中，修改数据的事务提交前
+    在同一事务的保存点内只重新评估受影响股票的持仓（策略变更时全量评估），结果按去重键写入提醒表，
+    评估失败时只回滚提醒，受影响的股票留待下次提交重新评估；
+    读取提醒只查询提醒表，不做评估也不写入。持仓天数随价格更新或手动评估刷新。
+    """
+    
+    @classmethod
+    def refresh(cls, stock_codes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """重新评估持仓，写入提醒表并提交
+        
+        Args:
+            stock_codes: 只重新评估这些股票，为None时全量评估
+            
+        Returns:
+            Dict: 评估的持仓数、新增/更新/解除的提醒数
+        """
+        try:
+            result = cls.apply(stock_codes)
+            db.session.commit()
+            return result
+        except Exception as e:
+            db.session.rollback()
+            raise DatabaseError(f"刷新策略提醒失败: {str(e)}")
+    
+    @classmethod
+    def apply(cls, stock_codes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """在当前事务内重新评估持仓并更新提醒表（不提交）"""
+        # 动态导入避免循环导入
+        from services.review_service import HoldingService
+        
+        started_at = datetime.now()
+        codes = None if stock_codes is None else sorted(set(stock_codes))
+        
+        # 评估使用数据库中的最新价格，不在评估时请求行情
+        holdings = HoldingService.get_current_holdings(stock_codes=codes, with_prices=False) if codes != [] else []
+        strategies = StrategyService.get_active_strategies()
+        latest_prices = StockPrice.get_latest_prices([h['stock_code'] for h in holdings])
+        current_prices = {
+            stock_code: float(price.current_price)
+            for stock_code, price in latest_prices.items()
+            if price.current_price is not None
+        }
+        alerts = StrategyEvaluator.evaluate_holdings(holdings, current_prices, strategies)
+        
+        holding_starts = {h['stock_code']: h['first_buy_date'] for h in holdings}
+        alerts_by_key = {
+            StrategyAlert.build_dedupe_key(
+                alert['stock_code'], holding_starts[alert['stock_code']],
+                alert['strategy_id'], alert['rule_index']
+            ): alert
+            for alert in alerts
+        }
+        
+        # 本次评估范围内已有的提醒（含已解除的，用于去重）
+        in_scope = StrategyAlert.query.filter(StrategyAlert.is_active == True)
+        if codes is not None:
+            in_scope = in_scope.filter(StrategyAlert.stock_code.in_(codes))
+        existing = {alert.dedupe_key: alert for alert in in_scope.all()}
+        missing_keys = [key for key in alerts_by_key if key not in existing]
+        for start in range(0, len(missing_keys), 500):
+            for alert in StrategyAlert.query.filter(
+                StrategyAlert.dedupe_key.in_(missing_keys[start:start + 500])
+            ).all():
+                existing[alert.dedupe_key] = alert
+        
+        created_count = updated_count = resolved_count = 0
+        for key, alert in alerts_by_key.items():
+            record = existing.get(key)
+            if record is None:
+                record = StrategyAlert(dedupe_key=key)
+                db.session.add(record)
+                created_count += 1
+            else:
+                updated_count += 1
+            record.apply_alert(alert, started_at)
+        
+        for key, record in existing.items():
+            if key not in alerts_by_key and record.is_active:
+                record.is_active = False
+                record.resolved_at = started_at
+                resolved_count += 1
+        
+        db.session.flush()
+        
+        return {
+            'evaluated_holdings': len(holdings),
+            'created_count': created_count,
+            'updated_count': updated_count,
+            'resolved_count': resolved_count,
+            'full_refresh': codes is None
+        }
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_changed_alerts(session):
+    """提交修改了交易、价格、复盘或策略的事务前，在同一事务的保存点内重新评估受影响的持仓提醒"""
+    session.flush()
+    full, codes = StrategyAlert.take_changes(session)
+    if not full and not codes:
+        return
+    savepoint = session.begin_nested()
+    try:
+        StrategyAlertEngine.apply(None if full else codes)
+        savepoint.commit()
+    except Exception as e:
+        # 只回滚保存点内写入的提醒，数据修改照常提交；
+        # 受影响的股票重新标记，在该会话下次提交或手动评估时再评估
+        savepoint.rollback()
+        StrategyAlert.mark_changed(session, None if full else codes)
+        logger.error("重新评估策略提醒失败", exc_info=True, full_refresh=full,
+                     stock_codes=sorted(codes), error=str(e))
+
+
 class HoldingAlertService:
-    """持仓提醒服务"""
+    """持仓提醒服务（读取提醒表）"""
+    
+    # 亏损超过该比例的提醒视为紧急
+    URGENT_LOSS_RATIO = -0.05
+    
+    @classmethod
+    def _active_alerts_query(cls):
+        """有效提醒查询"""
+        return StrategyAlert.query.filter(StrategyAlert.is_active == True).order_by(
+            StrategyAlert.holding_days.desc(), StrategyAlert.stock_code, StrategyAlert.strategy_id
+        )
     
     @classmethod
     def get_all_alerts(cls) -> List[Dict[str, Any]]:
         """获取所有持仓提醒"""
-        return StrategyEvaluator.evaluate_all_holdings()
+        return [alert.to_dict() for alert in cls._active_alerts_query().all()]
     
     @classmethod
     def get_alerts_by_stock(cls, stock_code: str) -> List[Dict[str, Any]]:
         """获取特定股票的持仓提醒"""
-        return StrategyEvaluator.evaluate_single_holding(stock_code)
+        query = cls._active_alerts_query().filter(StrategyAlert.stock_code == stock_code)
+        return [alert.to_dict() for alert in query.all()]
     
     @classmethod
     def get_alerts_by_type(cls, alert_type: str) -> List[Dict[str, Any]]:
         """按提醒类型筛选提醒"""
-        all_alerts = cls.get_all_alerts()
-        return [alert for alert in all_alerts if alert['alert_type'] == alert_type]
+        query = cls._active_alerts_query().filter(StrategyAlert.alert_type == alert_type)
+        return [alert.to_dict() for alert in query.all()]
     
     @classmethod
-    def get_urgent_alerts(cls) -> List[Dict[str, Any]]:
+    def get_urgent_alerts(cls, all_alerts: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """获取紧急提醒（止损提醒）"""
-        all_alerts = cls.get_all_alerts()
-        urgent_alerts = []
+        if all_alerts is None:
+            query = cls._active_alerts_query().filter(or_(
+                StrategyAlert.profit_loss_ratio <= cls.URGENT_LOSS_RATIO,
+                StrategyAlert.triggered_condition == 'loss_exceed'
+            ))
+            return [alert.to_dict() for alert in query.all()]
         
-        for alert in all_alerts:
-            # 亏损超过5%或触发止损条件的提醒视为紧急
-            if (alert['profit_loss_ratio'] <= -0.05 or 
-                alert['triggered_condition'] == 'loss_exceed'):
-                urgent_alerts.append(alert)
-        
-        return urgent_alerts
+        # 亏损超过5%或触发止损条件的提醒视为紧急
+        return [
+            alert for alert in all_alerts
+            if alert['profit_loss_ratio'] <= cls.URGENT_LOSS_RATIO
+            or alert['triggered_condition'] == 'loss_exceed'
+        ]
     
     @classmethod
-    def get_profit_alerts(cls) -> List[Dict[str, Any]]:
+    def get_profit_alerts(cls, all_alerts: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """获取止盈提醒"""
-        all_alerts = cls.get_all_alerts()
+        if all_alerts is None:
+            query = cls._active_alerts_query().filter(
+                StrategyAlert.alert_type.in_(['sell_all', 'sell_partial']),
+                StrategyAlert.profit_loss_ratio > 0
+            )
+            return [alert.to_dict() for alert in query.all()]
+        
         return [alert for alert in all_alerts 
                 if alert['alert_type'] in ['sell_all', 'sell_partial'] 
                 and alert['profit_loss_ratio'] > 0]
@@ -495,8 +783,8 @@ class HoldingAlertService:
         
         summary = {
             'total_alerts': len(all_alerts),
-            'urgent_alerts': len(cls.get_urgent_alerts()),
-            'profit_alerts': len(cls.get_profit_alerts()),
+            'urgent_alerts': len(cls.get_urgent_alerts(all_alerts)),
+            'profit_alerts': len(cls.get_profit_alerts(all_alerts)),
             'sell_all_alerts': len([a for a in all_alerts if a['alert_type'] == 'sell_all']),
             'sell_partial_alerts': len([a for a in all_alerts if a['alert_type'] == 'sell_partial']),
             'hold_alerts': len([a for a in all_alerts if a['alert_type'] == 'hold']),
@@ -0,0 +1,391 @@
+"""
+交易记录批量导入服务
+分块读取券商导出的CSV/Excel成交记录，向量化规范和验证后按批次事务写入
+"""
+import codecs
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, select
+
+from extensions import db
+from models.trade_record import TradeRecord
+from models.historical_trade import HistoricalTrade
+from models.strategy_alert import StrategyAlert
+from models.configuration import Configuration
+from services.historical_trade_service import HistoricalTradeService
+from utils.pagination import CountCache
+from error_handlers import ValidationError, DatabaseError
+
+# 单次IN查询的最大参数数量（SQLite默认限制为999）
+BATCH_QUERY_SIZE = 500
+
+# 每块读取和写入的默认行数
+DEFAULT_IMPORT_CHUNK_SIZE = 5000
+
+# 导入文件未提供交易原因时使用的默认原因
+DEFAULT_IMPORT_REASON = '批量导入'
+
+
+class TradeImportService:
+    """交易记录批量导入服务"""
+    
+    SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+    
+    # 标准字段 -> 券商导出文件中的常见列名
+    COLUMN_ALIASES = {
+        'stock_code': ('stock_code', '证券代码', '股票代码', '代码'),
+        'stock_name': ('stock_name', '证券名称', '股票名称', '名称'),
+        'trade_type': ('trade_type', '买卖标志', '买卖方向', '操作', '交易类型', '业务名称'),
+        'price': ('price', '成交价格', '成交均价', '成交价'),
+        'quantity': ('quantity', '成交数量', '数量'),
+        'trade_date': ('trade_date', '成交日期', '交易日期', '日期'),
+        'trade_time': ('trade_time', '成交时间', '时间'),
+        'reason': ('reason', '交易原因', '原因'),
+        'notes': ('notes', '备注'),
+        # 成交编号唯一标识一笔成交；只有合同编号时，同一委托的多笔部分成交共用编号
+        'broker_fill_id': ('broker_fill_id', '成交编号', '合同编号'),
+    }
+    
+    REQUIRED_COLUMNS = ('stock_code', 'stock_name', 'trade_type', 'price', 'quantity', 'trade_date')
+    
+    TRADE_TYPE_ALIASES = {
+        'buy': 'buy', 'b': 'buy', '买入': 'buy', '证券买入': 'buy', '买': 'buy',
+        'sell': 'sell', 's': 'sell', '卖出': 'sell', '证券卖出': 'sell', '卖': 'sell',
+    }
+    
+    @classmethod
+    def import_trades(cls, stream: BinaryIO, filename: str, default_reason: str = None,
+                      chunk_size: int = None, sync: bool = True) -> Dict[str, Any]:
+        """
+        批量导入成交记录
+        
+        每块数据一次验证、一次查重、一个事务写入；全部写入后统一触发一次历史交易增量同步。
+        
+        Args:
+            stream: 文件二进制流
+            filename: 文件名（用于判断格式）
+            default_reason: 文件中没有交易原因时使用的原因（可选，默认"批量导入"）
+            chunk_size: 每块行数（可选，默认取配置 TRADE_IMPORT_CHUNK_SIZE）
+            sync: 导入后是否同步历史交易记录
+        
+        Returns:
+            Dict: 导入结果，errors 中逐行列出错误（行号为文件中的行号，含表头）
+        """
+        from flask import current_app
+        
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension not in cls.SUPPORTED_EXTENSIONS:
+            raise ValidationError(
+                f"不支持的文件格式，支持: {', '.join(cls.SUPPORTED_EXTENSIONS)}", "file"
+            )
+        
+        if chunk_size is None:
+            chunk_size = cls._get_chunk_size()
+        elif not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValidationError("每块行数必须是正整数", "chunk_size")
+        
+        default_reason = (default_reason or DEFAULT_IMPORT_REASON).strip()
+        valid_reasons = {
+            'buy': set(Configuration.get_buy_reasons() or ()),
+            'sell': set(Configuration.get_sell_reasons() or ()),
+        }
+        
+        result = {
+            'total_rows': 0,
+            'imported_count': 0,
+            'duplicate_count': 0,
+            'error_count': 0,
+            'errors': [],
+        }
+        dedup_state = cls._new_dedup_state()
+        imported_codes: Set[str] = set()
+        
+        chunks = cls._read_csv(stream, chunk_size) if extension == '.csv' else cls._read_excel(stream, chunk_size)
+        for first_row_number, chunk in chunks:
+            result['total_rows'] += len(chunk)
+            
+            rows, errors = cls._normalize_chunk(chunk, first_row_number, default_reason, valid_reasons)
+            result['errors'].extend(errors)
+            
+            rows, duplicate_count = cls._drop_duplicates(rows, dedup_state)
+            result['duplicate_count'] += duplicate_count
+            
+            if rows:
+                cls._insert_chunk(rows)
+                result['imported_count'] += len(rows)
+                imported_codes.update(row['stock_code'] for row in rows)
+            
+            current_app.logger.info(
+                f"交易导入进度: 已读取 {result['total_rows']} 行，"
+                f"导入 {result['imported_count']} 条，重复 {result['duplicate_count']} 条"
+            )
+        
+        result['error_count'] = len(result['errors'])
+        result['errors'].sort(key=lambda error: error['row'])
+        result['success'] = result['error_count'] == 0
+        
+        if imported_codes:
+            cls._mark_trades_imported(imported_codes)
+            if sync:
+                result['sync_result'] = HistoricalTradeService.sync_historical_records()
+        
+        current_app.logger.info(
+            f"交易导入完成: 共 {result['total_rows']} 行，导入 {result['imported_count']} 条，"
+            f"重复 {result['duplicate_count']} 条，错误 {result['error_count']} 条"
+        )
+        return result
+    
+    @classmethod
+    def _get_chunk_size(cls) -> int:
+        """每块行数，配置无效时使用默认值"""
+        from flask import current_app
+        configured = current_app.config.get('TRADE_IMPORT_CHUNK_SIZE')
+        return configured if isinstance(configured, int) and configured > 0 else DEFAULT_IMPORT_CHUNK_SIZE
+    
+    @classmethod
+    def _read_csv(cls, stream: BinaryIO, chunk_size: int) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """分块读取CSV，返回 (块内首行的文件行号, 数据块)"""
+        encoding = cls._detect_encoding(stream)
+        reader = pd.read_csv(
+            stream, dtype=str, keep_default_na=False, encoding=encoding,
+            chunksize=chunk_size, skipinitialspace=True
+        )
+        row_number = 2
+        for chunk in reader:
+            yield row_number, chunk
+            row_number += len(chunk)
+    
+    @classmethod
+    def _read_excel(cls, stream: BinaryIO, chunk_size: int) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """以只读模式逐行读取第一个工作表并分块"""
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValidationError("缺少openpyxl依赖，无法导入Excel文件", "file")
+        
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = ['' if value is None else str(value) for value in header]
+            
+            row_number = 2
+            buffer = []
+            for values in rows:
+                buffer.append(['' if value is None else str(value) for value in values])
+                if len(buffer) >= chunk_size:
+                    yield row_number, pd.DataFrame(buffer, columns=columns)
+                    row_number += len(buffer)
+                    buffer = []
+            if buffer:
+                yield row_number, pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _detect_encoding(stream: BinaryIO) -> str:
+        """根据文件开头判断编码（券商导出常见GBK）"""
+        sample = stream.read(65536)
+        stream.seek(0)
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8-sig'
+        except UnicodeDecodeError:
+            return 'gb18030'
+    
+    @classmethod
+    def _normalize_chunk(cls, chunk: pd.DataFrame, first_row_number: int, default_reason: str,
+                         valid_reasons: Dict[str, Set[str]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        规范列名和取值并整块验证
+        
+        Returns:
+            Tuple: (通过验证的记录列表, 错误列表)
+        """
+        frame = cls._rename_columns(chunk)
+        missing = [column for column in cls.REQUIRED_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValidationError(f"导入文件缺少必需列: {', '.join(missing)}", "file")
+        
+        count = len(frame)
+        row_numbers = np.arange(first_row_number, first_row_number + count)
+        
+        def text_column(name):
+            if name not in frame.columns:
+                return pd.Series([''] * count, index=frame.index)
+            # 去除空白及部分券商导出的 ="600000" 形式
+            return frame[name].astype(str).str.strip().str.replace(r'^="?|"$', '', regex=True).str.strip()
+        
+        stock_code = text_column('stock_code').str.split('.').str[0]
+        stock_code = stock_code.where(~stock_code.str.fullmatch(r'\d{1,5}'), stock_code.str.zfill(6))
+        stock_name = text_column('stock_name')
+        trade_type = text_column('trade_type').str.lower().map(cls.TRADE_TYPE_ALIASES)
+        price = pd.to_numeric(text_column('price').str.replace(',', ''), errors='coerce')
+        quantity = pd.to_numeric(text_column('quantity').str.replace(',', ''), errors='coerce').abs()
+        trade_time = text_column('trade_time')
+        trade_date = pd.to_datetime(
+            (text_column('trade_date') + ' ' + trade_time).str.strip(), format='mixed', errors='coerce'
+        )
+        reason = text_column('reason').replace('', default_reason)
+        notes = text_column('notes')
+        fill_id = text_column('broker_fill_id')
+        
+        # 每条规则得到一个布尔掩码，True 表示该行不满足
+        is_star_market = stock_code.str.startswith('68')
+        reason_invalid = pd.Series(False, index=frame.index)
+        for side, reasons in valid_reasons.items():
+            if reasons:
+                reason_invalid |= (trade_type == side) & (reason != default_reason) & ~reason.isin(reasons)
+        
+        checks = [
+            (~stock_code.str.fullmatch(r'\d{6}'), "股票代码格式不正确，应为6位数字"),
+            (stock_name == '', "股票名称不能为空"),
+            (trade_type.isna(), "交易类型无法识别，应为买入或卖出"),
+            (price.isna(), "价格格式不正确"),
+            ((price <= 0) | (price > 9999.99), "价格必须大于0且不超过9999.99"),
+            (quantity.isna() | (quantity != quantity.round()), "数量必须是整数"),
+            ((quantity <= 0) | (quantity > 999999), "数量必须大于0且不超过999999"),
+            (~is_star_market & (quantity % 100 != 0), "数量必须是100的倍数且大于0"),
+            (trade_date.isna(), "成交日期格式不正确"),
+            (reason_invalid, "交易原因不在配置的选项中"),
+        ]
+        
+        errors = []
+        invalid = np.zeros(count, dtype=bool)
+        messages = [[] for _ in range(count)]
+        for mask, message in checks:
+            mask = mask.fillna(False).to_numpy(dtype=bool)
+            invalid |= mask
+            for position in np.flatnonzero(mask):
+                messages[position].append(message)
+        for position in np.flatnonzero(invalid):
+            errors.append({'row': int(row_numbers[position]), 'errors': messages[position]})
+        
+        valid = ~invalid
+        rows = [
+            {
+                'stock_code': code,
+                'stock_name': name,
+                'trade_type': side,
+                'price': round(float(unit_price), 2),
+                'quantity': int(amount),
+                'trade_date': timestamp.to_pydatetime(),
+                'reason': trade_reason,
+                'notes': note or None,
+                'broker_fill_id': broker_fill_id or None,
+            }
+            for code, name, side, unit_price, amount, timestamp, trade_reason, note, broker_fill_id in zip(
+                stock_code[valid], stock_name[valid], trade_type[valid], price[valid],
+                quantity[valid], trade_date[valid], reason[valid], notes[valid], fill_id[valid]
+            )
+        ]
+        return rows, errors
+    
+    @classmethod
+    def _rename_columns(cls, chunk: pd.DataFrame) -> pd.DataFrame:
+        """将券商列名映射为标准字段名（同一字段有多个候选列时按别名顺序选取），未识别的列忽略"""
+        headers = {}
+        for column in chunk.columns:
+            headers.setdefault(str(column).strip().lower(), column)
+        
+        mapping = {}
+        for field, aliases in cls.COLUMN_ALIASES.items():
+            for alias in aliases:
+                column = headers.get(alias)
+                if column is not None and column not in mapping:
+                    mapping[column] = field
+                    break
+        return chunk[list(mapping)].rename(columns=mapping)
+    
+    @staticmethod
+    def _fill_key(row: Dict[str, Any]) -> Tuple:
+        """成交内容键（不含成交编号）"""
+        return (row['stock_code'], row['trade_type'], row['trade_date'], round(float(row['price']), 2), int(row['quantity']))
+    
+    @staticmethod
+    def _new_dedup_state() -> Dict[str, Any]:
+        """
+        一次导入的去重状态
+        
+        fill_ids: 本次已处理的 (成交编号, 成交内容键)
+        matched: 无编号的成交已与多少条导入前就存在的记录对应
+        inserted: 本次写入的成交数量（后续批次查询已有记录时扣除）
+        """
+        return {'fill_ids': set(), 'matched': Counter(), 'inserted': Counter()}
+    
+    @classmethod
+    def _drop_duplicates(cls, rows: List[Dict[str, Any]], state: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        去除已导入过的成交
+        
+        有成交编号时按编号去重（文件内和数据库中编号相同的成交只保留一条）；
+        没有编号时只跳过与导入前已有记录对应的成交，每条已有记录最多对应一行，
+        文件内内容相同的多笔成交（如同价同量的部分成交）全部保留。
+        """
+        if not rows:
+            return rows, 0
+        
+        # 一次按股票和日期范围取出可能重复的已有成交
+        codes = sorted({row['stock_code'] for row in rows})
+        start = min(row['trade_date'] for row in rows)
+        end = max(row['trade_date'] for row in rows)
+        existing_counts = Counter()
+        existing_fill_ids = set()
+        for i in range(0, len(codes), BATCH_QUERY_SIZE):
+            existing = db.session.execute(
+                select(
+                    TradeRecord.stock_code, TradeRecord.trade_type, TradeRecord.trade_date,
+                    TradeRecord.price, TradeRecord.quantity, TradeRecord.broker_fill_id
+                ).where(and_(
+                    TradeRecord.stock_code.in_(codes[i:i + BATCH_QUERY_SIZE]),
+                    TradeRecord.trade_date.between(start, end)
+                ))
+            ).all()
+            for code, side, trade_date, price, quantity, fill_id in existing:
+                key = (code, side, trade_date, round(float(price), 2), int(quantity))
+                if fill_id:
+                    existing_fill_ids.add((fill_id, key))
+                existing_counts[key] += 1
+        
+        unique_rows = []
+        for row in rows:
+            key = cls._fill_key(row)
+            fill_id = row.get('broker_fill_id')
+            if fill_id:
+                if (fill_id, key) in existing_fill_ids or (fill_id, key) in state['fill_ids']:
+                    continue
+                state['fill_ids'].add((fill_id, key))
+            elif state['matched'][key] < existing_counts[key] - state['inserted'][key]:
+                state['matched'][key] += 1
+                continue
+            state['inserted'][key] += 1
+            unique_rows.append(row)
+        return unique_rows, len(rows) - len(unique_rows)
+    
+    @classmethod
+    def _insert_chunk(cls, rows: List[Dict[str, Any]]) -> None:
+        """一个事务内 executemany 写入一块记录"""
+        now = datetime.utcnow()
+        for row in rows:
+            row.update({'use_batch_profit_taking': False, 'is_corrected': False, 'created_at': now, 'updated_at': now})
+        try:
+            db.session.execute(TradeRecord.__table__.insert(), rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise DatabaseError(f"批量写入交易记录失败: {str(e)}")
+    
+    @classmethod
+    def _mark_trades_imported(cls, stock_codes: Set[str]) -> None:
+        """core insert 不触发ORM事件，手动标记受影响的股票和缓存，并重新评估这些股票的策略提醒"""
+        HistoricalTrade.mark_trades_changed(stock_codes)
+        CountCache.invalidate([TradeRecord.__tablename__])
+        StrategyAlert.mark_changed(db.session, stock_codes)
+        db.session.commit()
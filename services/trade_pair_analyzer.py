@@ -6,6 +6,8 @@ from typing import List, Dict, Tuple, Optional
 from decimal import Decimal
 from collections import defaultdict
 from models.trade_record import TradeRecord
+from models.read_models import TradeReadModel, TradeRow, price_fen_of
+from utils.money import compare_ratio, fen_to_decimal, ratio_decimal, to_fen
 from sqlalchemy import func
 
 
@@ -28,12 +30,9 @@ class TradePairAnalyzer:
         return completed_pairs
     
     @classmethod
-    def _group_trades_by_stock(cls) -> Dict[str, List[TradeRecord]]:
+    def _group_trades_by_stock(cls) -> Dict[str, List[TradeRow]]:
         """按股票代码分组交易记录"""
-        trades = TradeRecord.query.order_by(
-            TradeRecord.stock_code, 
-            TradeRecord.trade_date
-        ).all()
+        trades = TradeReadModel.load_trades(include_corrected=True)
         
         trades_by_stock = defaultdict(list)
         for trade in trades:
@@ -42,12 +41,12 @@ class TradePairAnalyzer:
         return dict(trades_by_stock)
     
     @classmethod
-    def _extract_trade_pairs(cls, trades: List[TradeRecord]) -> List[Dict]:
+    def _extract_trade_pairs(cls, trades: List[TradeRow]) -> List[Dict]:
         """
         从交易记录中提取买卖配对
-        使用FIFO（先进先出）原则进行配对
+        使用FIFO（先进先出）原则进行配对，金额按整数分计算，输出时转为 Decimal 元
         """
-        buy_queue = []  # 买入队列：[(trade, remaining_quantity), ...]
+        buy_queue = []  # 买入队列：[{'trade', 'price_fen', 'remaining_quantity'}, ...]
         completed_pairs = []
         
         for trade in trades:
@@ -55,27 +54,26 @@ class TradePairAnalyzer:
                 # 买入交易加入队列
                 buy_queue.append({
                     'trade': trade,
-                    'remaining_quantity': trade.quantity,
-                    'remaining_cost': trade.quantity * trade.price
+                    'price_fen': price_fen_of(trade),
+                    'remaining_quantity': trade.quantity
                 })
             
             elif trade.trade_type == 'sell':
                 # 卖出交易，与买入队列配对
                 sell_quantity = trade.quantity
-                sell_amount = trade.quantity * trade.price
+                sell_price_fen = price_fen_of(trade)
                 
                 while sell_quantity > 0 and buy_queue:
                     buy_item = buy_queue[0]
                     buy_trade = buy_item['trade']
-                    buy_remaining = buy_item['remaining_quantity']
                     
                     # 计算本次配对的数量
-                    pair_quantity = min(sell_quantity, buy_remaining)
+                    pair_quantity = min(sell_quantity, buy_item['remaining_quantity'])
                     
-                    # 计算成本和收入
-                    cost_per_share = buy_item['remaining_cost'] / buy_item['remaining_quantity']
-                    pair_cost = pair_quantity * cost_per_share
-                    pair_revenue = pair_quantity * trade.price
+                    # 计算成本和收入（分）
+                    cost_fen = pair_quantity * buy_item['price_fen']
+                    revenue_fen = pair_quantity * sell_price_fen
+                    profit_fen = revenue_fen - cost_fen
                     
                     # 创建配对记录
                     pair = {
@@ -85,12 +83,12 @@ class TradePairAnalyzer:
                         'buy_date': buy_trade.trade_date,
                         'sell_date': trade.trade_date,
                         'quantity': pair_quantity,
-                        'buy_price': cost_per_share,
-                        'sell_price': trade.price,
-                        'cost': pair_cost,
-                        'revenue': pair_revenue,
-                        'profit': pair_revenue - pair_cost,
-                        'profit_rate': (pair_revenue - pair_cost) / pair_cost if pair_cost > 0 else 0,
+                        'buy_price': fen_to_decimal(buy_item['price_fen']),
+                        'sell_price': fen_to_decimal(sell_price_fen),
+                        'cost': fen_to_decimal(cost_fen),
+                        'revenue': fen_to_decimal(revenue_fen),
+                        'profit': fen_to_decimal(profit_fen),
+                        'profit_rate': ratio_decimal(profit_fen, cost_fen),
                         'holding_days': (trade.trade_date - buy_trade.trade_date).days
                     }
                     completed_pairs.append(pair)
@@ -98,7 +96,6 @@ class TradePairAnalyzer:
                     # 更新剩余数量
                     sell_quantity -= pair_quantity
                     buy_item['remaining_quantity'] -= pair_quantity
-                    buy_item['remaining_cost'] -= pair_cost
                     
                     # 如果买入记录已完全配对，从队列中移除
                     if buy_item['remaining_quantity'] <= 0:
@@ -136,35 +133,44 @@ class TradePairAnalyzer:
                 'total_profit': 0
             })
         
-        # 统计每个交易对属于哪个区间
+        # 统计每个交易对属于哪个区间（收益率与区间边界按整数分交叉相乘比较，不经过浮点除法）
         total_trades = len(completed_pairs)
-        total_profit = 0
+        total_profit_fen = 0
         winning_trades = 0
+        range_profit_fen = [0] * len(distribution)
         
         for pair in completed_pairs:
-            profit_rate = pair['profit_rate']
-            total_profit += pair['profit']
+            profit_fen = to_fen(pair['profit'])
+            cost_fen = to_fen(pair['cost'])
+            total_profit_fen += profit_fen
+            # 成本为0时收益率按0处理
+            rate_fen = (profit_fen, cost_fen) if cost_fen > 0 else (0, 1)
             
-            if pair['profit'] > 0:
+            if profit_fen > 0:
                 winning_trades += 1
             
             # 找到对应的区间
-            for dist_item in distribution:
+            for index, dist_item in enumerate(distribution):
                 min_rate = dist_item['min_rate']
                 max_rate = dist_item['max_rate']
                 
                 # 检查是否在区间内
                 in_range = True
-                if min_rate is not None and profit_rate < min_rate:
+                if min_rate is not None and compare_ratio(*rate_fen, min_rate) < 0:
                     in_range = False
-                if max_rate is not None and profit_rate >= max_rate:
+                if max_rate is not None and compare_ratio(*rate_fen, max_rate) >= 0:
                     in_range = False
                 
                 if in_range:
                     dist_item['count'] += 1
-                    dist_item['total_profit'] += pair['profit']
+                    range_profit_fen[index] += profit_fen
                     break
         
+        total_profit = fen_to_decimal(total_profit_fen)
+        for dist_item, profit_fen in zip(distribution, range_profit_fen):
+            if dist_item['count']:
+                dist_item['total_profit'] = fen_to_decimal(profit_fen)
+        
         # 计算百分比
         for dist_item in distribution:
             if total_trades > 0:
@@ -194,19 +200,19 @@ class TradePairAnalyzer:
         for stock_code, trades in trades_by_stock.items():
             total_buy_quantity = 0
             total_sell_quantity = 0
-            total_cost = 0
+            total_cost_fen = 0
             
             for trade in trades:
                 if trade.trade_type == 'buy':
                     total_buy_quantity += trade.quantity
-                    total_cost += trade.quantity * trade.price
+                    total_cost_fen += trade.quantity * price_fen_of(trade)
                 elif trade.trade_type == 'sell':
                     total_sell_quantity += trade.quantity
             
             current_quantity = total_buy_quantity - total_sell_quantity
             
             if current_quantity > 0:
-                average_cost = total_cost / total_buy_quantity if total_buy_quantity > 0 else 0
+                average_cost = fen_to_decimal(total_cost_fen) / total_buy_quantity if total_buy_quantity > 0 else 0
                 current_holdings[stock_code] = {
                     'quantity': current_quantity,
                     'average_cost': average_cost,
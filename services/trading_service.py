@@ -9,11 +9,18 @@ from extensions import db
 from models.trade_record import TradeRecord, TradeCorrection
 from models.profit_taking_target import ProfitTakingTarget
 from models.configuration import Configuration
+from models.search_index import SearchIndex
+from models.effective_trade import EffectiveTrade
 from services.base_service import BaseService
 from services.profit_taking_service import ProfitTakingService
 from utils.batch_profit_compatibility import LegacyDataHandler
+from utils.pagination import keyset_paginate
+from utils.serialization import parse_fields, project_query, serialize_items
+from utils.structured_logging import get_logger, lazy
 from error_handlers import ValidationError, NotFoundError, DatabaseError
 
+logger = get_logger(__name__)
+
 
 class TradingService(BaseService):
     """交易记录管理服务"""
@@ -24,24 +31,17 @@ class TradingService(BaseService):
     def create_trade(cls, data: Dict[str, Any]) -> TradeRecord:
         """创建交易记录"""
         try:
-            from flask import current_app
-            current_app.logger.info("=== TradingService.create_trade 开始 ===")
-            current_app.logger.info(f"接收到的数据: {data}")
+            logger.debug("创建交易记录", data=lazy(lambda: dict(data)))
             
             # 验证交易原因是否在配置的选项中
-            current_app.logger.info("开始验证交易原因")
             cls._validate_trade_reason(data.get('trade_type'), data.get('reason'))
-            current_app.logger.info("交易原因验证通过")
             
             # 验证股票数量规则
-            current_app.logger.info("开始验证股票数量规则")
             cls._validate_stock_quantity(data.get('stock_code'), data.get('quantity'))
-            current_app.logger.info("股票数量规则验证通过")
             
             # 设置交易日期（如果未提供）
             if 'trade_date' not in data or data['trade_date'] is None:
                 data['trade_date'] = datetime.now()
-                current_app.logger.info(f"设置默认交易日期: {data['trade_date']}")
             
             # 检查是否使用分批止盈并提取分批止盈数据
             use_batch_profit = data.get('use_batch_profit_taking', False)
@@ -50,43 +50,35 @@ class TradingService(BaseService):
             # 提取分批止盈字段并转换为profit_targets格式
             if use_batch_profit and not profit_targets:
                 profit_targets = cls._extract_batch_profit_data(data)
-                current_app.logger.info(f"从表单数据提取的止盈目标: {profit_targets}")
             
             # 清理数据，移除分批止盈相关字段，只保留TradeRecord模型的字段
             clean_data = cls._clean_trade_data(data)
-            current_app.logger.info(f"清理后的交易数据: {clean_data}")
-            current_app.logger.info(f"使用分批止盈: {use_batch_profit}")
-            current_app.logger.info(f"止盈目标: {profit_targets}")
+            logger.debug(
+                "交易数据已清理", data=lazy(lambda: dict(clean_data)),
+                use_batch_profit=use_batch_profit, profit_targets=profit_targets
+            )
             
             if use_batch_profit and profit_targets:
                 # 使用分批止盈创建交易记录
-                current_app.logger.info("调用 create_trade_with_batch_profit")
                 return cls.create_trade_with_batch_profit(clean_data, profit_targets)
             else:
                 # 创建普通交易记录
-                current_app.logger.info("调用 cls.create 创建普通交易记录")
-                current_app.logger.info(f"传递给 cls.create 的数据: {clean_data}")
                 trade = cls.create(clean_data)
-                current_app.logger.info(f"普通交易记录创建成功，ID: {trade.id}")
+                logger.debug("交易记录创建成功", id=trade.id)
                 return trade
                 
         except Exception as e:
-            current_app.logger.error(f"TradingService.create_trade 发生错误: {str(e)}")
-            current_app.logger.error(f"错误类型: {type(e)}")
-            import traceback
-            current_app.logger.error(f"错误堆栈: {traceback.format_exc()}")
             if isinstance(e, (ValidationError, DatabaseError)):
+                logger.warning("创建交易记录失败", error=str(e))
                 raise e
+            logger.error("创建交易记录失败", exc_info=True, error=str(e))
             raise DatabaseError(f"创建交易记录失败: {str(e)}")
     
     @classmethod
     def create_trade_with_batch_profit(cls, data: Dict[str, Any], profit_targets: List[Dict]) -> TradeRecord:
         """创建带有分批止盈的交易记录"""
         try:
-            from flask import current_app
-            current_app.logger.info("=== create_trade_with_batch_profit 开始 ===")
-            current_app.logger.info(f"交易数据: {data}")
-            current_app.logger.info(f"止盈目标: {profit_targets}")
+            logger.debug("创建分批止盈交易记录", data=lazy(lambda: dict(data)), profit_targets=profit_targets)
             
             # 验证只有买入记录才能设置分批止盈
             if data.get('trade_type') != 'buy':
@@ -99,23 +91,19 @@ class TradingService(BaseService):
             data['use_batch_profit_taking'] = True
             
             # 创建交易记录
-            current_app.logger.info("开始创建交易记录")
             trade = cls.create(data)
-            current_app.logger.info(f"交易记录创建成功，ID: {trade.id}")
             
             # 创建止盈目标
-            current_app.logger.info("开始创建止盈目标")
             ProfitTakingService.create_profit_targets(trade.id, profit_targets)
-            current_app.logger.info("止盈目标创建成功")
             
             # 重新加载交易记录以包含止盈目标
             db.session.refresh(trade)
-            current_app.logger.info("=== create_trade_with_batch_profit 完成 ===")
+            logger.debug("分批止盈交易记录创建成功", id=trade.id, target_count=len(profit_targets))
             
             return trade
             
         except Exception as e:
-            current_app.logger.error(f"create_trade_with_batch_profit 发生错误: {str(e)}")
+            logger.error("创建分批止盈交易记录失败", error=str(e))
             db.session.rollback()
             if isinstance(e, (ValidationError, DatabaseError)):
                 raise e
@@ -222,17 +210,35 @@ class TradingService(BaseService):
     @classmethod
     def get_trades(cls, filters: Dict[str, Any] = None, 
                    page: int = None, per_page: int = None,
-                   sort_by: str = 'trade_date', sort_order: str = 'desc') -> Dict[str, Any]:
-        """获取交易记录列表，支持筛选、分页和排序"""
+                   sort_by: str = 'trade_date', sort_order: str = 'desc',
+                   cursor: str = None, include_total: bool = False,
+                   fields: Any = None) -> Dict[str, Any]:
+        """获取交易记录列表，支持筛选、分页和排序
+        
+        传入 cursor（首页传空字符串）时使用游标分页，按 (排序字段, id) 定位下一页；
+        传入 fields（逗号分隔的列名）时只查询并返回这些列（总是包含 id）
+        """
         try:
+            fields = parse_fields(cls.model, fields)
             query = cls.model.query
             
             # 应用筛选条件
             if filters:
                 query = cls._apply_filters(query, filters)
             
+            # 游标分页
+            if cursor is not None:
+                result = keyset_paginate(
+                    query, cls.model, sort_by, sort_order, per_page or 20,
+                    cursor=cursor, include_total=include_total, default_sort_by='trade_date', fields=fields
+                )
+                result['trades'] = serialize_items(result.pop('items'), cls.model, fields)
+                return result
+            
             # 应用排序
             query = cls._apply_sorting(query, sort_by, sort_order)
+            if fields:
+                query = project_query(query, cls.model, fields)
             
             # 应用分页
             if page and per_page:
@@ -242,7 +248,7 @@ class TradingService(BaseService):
                     error_out=False
                 )
                 return {
-                    'trades': [trade.to_dict() for trade in pagination.items],
+                    'trades': serialize_items(pagination.items, cls.model, fields),
                     'total': pagination.total,
                     'pages': pagination.pages,
                     'current_page': pagination.page,
@@ -253,9 +259,11 @@ class TradingService(BaseService):
             else:
                 trades = query.all()
                 return {
-                    'trades': [trade.to_dict() for trade in trades],
+                    'trades': serialize_items(trades, cls.model, fields),
                     'total': len(trades)
                 }
+        except ValidationError:
+            raise
         except Exception as e:
             raise DatabaseError(f"获取交易记录列表失败: {str(e)}")
     
@@ -435,6 +443,42 @@ class TradingService(BaseService):
         except Exception as e:
             raise DatabaseError(f"获取订正历史失败: {str(e)}")
     
+    @classmethod
+    def get_correction_chain(cls, trade_id: int) -> Dict[str, Any]:
+        """
+        获取交易记录所在的完整订正链
+        
+        订正链由有效交易映射在写入时解析，这里只需按根记录查询一次，不逐条回溯
+        
+        Returns:
+            Dict: 根记录ID（根记录被删除后仍为原ID，不在链上记录中）、当前有效记录ID、链上记录ID（按订正顺序）和全部订正历史（按时间倒序）
+        """
+        try:
+            chain_ids = EffectiveTrade.chain_ids(trade_id)
+            if not chain_ids:
+                raise NotFoundError(f"交易记录 {trade_id} 不存在")
+            
+            corrections = TradeCorrection.query.filter(
+                TradeCorrection.corrected_trade_id.in_(chain_ids)
+            ).order_by(TradeCorrection.created_at.desc(), TradeCorrection.id.desc()).all()
+            
+            history = []
+            for correction in corrections:
+                correction_dict = correction.to_dict()
+                correction_dict['corrected_fields'] = json.loads(correction.corrected_fields)
+                history.append(correction_dict)
+            
+            return {
+                'root_trade_id': EffectiveTrade.root_id(trade_id),
+                'effective_trade_id': EffectiveTrade.effective_id(trade_id),
+                'trade_ids': chain_ids,
+                'corrections': history
+            }
+        except Exception as e:
+            if isinstance(e, NotFoundError):
+                raise e
+            raise DatabaseError(f"获取订正链失败: {str(e)}")
+    
     @classmethod
     def _validate_trade_reason(cls, trade_type: str, reason: str):
         """验证交易原因是否在配置的选项中"""
@@ -478,7 +522,9 @@ class TradingService(BaseService):
             query = query.filter(cls.model.stock_code == filters['stock_code'])
         
         if 'stock_name' in filters and filters['stock_name']:
-            query = query.filter(cls.model.stock_name.like(f"%{filters['stock_name']}%"))
+            query = query.filter(SearchIndex.like_filter(
+                cls.model, 'trades', 'stock_name', f"%{filters['stock_name']}%"
+            ))
         
         if 'trade_type' in filters and filters['trade_type']:
             query = query.filter(cls.model.trade_type == filters['trade_type'])
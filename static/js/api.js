@@ -341,6 +341,14 @@ if (typeof window.ApiClient === 'undefined') {
         return this.request('GET', `/prices/${stockCode}`);
     }
 
+    // 订阅价格与持仓浮盈推送（SSE），返回EventSource，调用方负责close()
+    subscribePriceStream(onSnapshot, onUpdate) {
+        const source = new EventSource(`${this.baseURL}/prices/stream`);
+        source.addEventListener('snapshot', (event) => onSnapshot(JSON.parse(event.data)));
+        source.addEventListener('update', (event) => (onUpdate || onSnapshot)(JSON.parse(event.data)));
+        return source;
+    }
+
     // 板块分析相关API
     async getSectorRanking(params = {}) {
         return this.request('GET', '/sectors/ranking', params);
@@ -58,6 +58,10 @@ def db_session(app):
         for table in reversed(db.metadata.sorted_tables):
             db.session.execute(table.delete())
         db.session.commit()
+        NonTradingDay.invalidate_calendar()
+        StockPrice.clear_request_memo()
+        HistoricalTrade.bump_data_version()
+        SectorData.bump_data_version()
         yield db.session
         db.session.rollback()
 
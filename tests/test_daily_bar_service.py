@@ -0,0 +1,149 @@
+"""
+日线行情服务测试
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from datetime import date, datetime
+
+from services.daily_bar_service import DailyBarService, BAR_DTYPE
+from models.trade_record import TradeRecord
+from models.stock_pool import StockPool
+from error_handlers import ValidationError
+
+
+def make_hist_frame(dates, base_price=10.0):
+    """构造AKShare日线接口格式的数据"""
+    return pd.DataFrame({
+        '日期': dates,
+        '开盘': [base_price + i for i in range(len(dates))],
+        '收盘': [base_price + i + 0.5 for i in range(len(dates))],
+        '最高': [base_price + i + 1 for i in range(len(dates))],
+        '最低': [base_price + i - 1 for i in range(len(dates))],
+        '成交量': [1000 * (i + 1) for i in range(len(dates))],
+        '成交额': [10000.0 * (i + 1) for i in range(len(dates))],
+    })
+
+
+class TestDailyBarService:
+    """日线行情服务测试类"""
+    
+    @pytest.fixture
+    def service(self, tmp_path):
+        return DailyBarService(store_dir=tmp_path)
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_ingest_and_get_bars(self, mock_hist, service, db_session):
+        """测试拉取后可离线读取"""
+        mock_hist.return_value = make_hist_frame(['2024-01-02', '2024-01-03', '2024-01-04'])
+        
+        result = service.ingest(['000001'], start_date='2024-01-01', end_date='2024-01-04')
+        
+        assert result['updated_count'] == 1
+        assert result['appended_bars'] == 3
+        
+        bars = service.get_bars(['000001'])['000001']
+        assert bars.dtype == BAR_DTYPE
+        assert len(bars) == 3
+        assert bars['date'][0] == np.datetime64('2024-01-02')
+        assert bars['close'][-1] == pytest.approx(12.5)
+        assert bars['volume'].tolist() == [1000, 2000, 3000]
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_ingest_fetches_only_missing_dates(self, mock_hist, service, db_session):
+        """测试增量拉取只请求缺失的日期"""
+        mock_hist.return_value = make_hist_frame(['2024-01-02', '2024-01-03'])
+        service.ingest(['000001'], start_date='2024-01-01', end_date='2024-01-03')
+        
+        mock_hist.return_value = make_hist_frame(['2024-01-04', '2024-01-05'], base_price=20.0)
+        result = service.ingest(['000001'], end_date='2024-01-05')
+        
+        assert mock_hist.call_args.kwargs['start_date'] == '20240104'
+        assert mock_hist.call_args.kwargs['end_date'] == '20240105'
+        assert result['appended_bars'] == 2
+        
+        bars = service.get_bars('000001')['000001']
+        assert [str(d) for d in bars['date']] == ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_ingest_skips_up_to_date_stock(self, mock_hist, service, db_session):
+        """测试已是最新的股票不访问网络"""
+        mock_hist.return_value = make_hist_frame(['2024-01-02', '2024-01-03'])
+        service.ingest(['000001'], start_date='2024-01-01', end_date='2024-01-03')
+        mock_hist.reset_mock()
+        
+        result = service.ingest(['000001'], end_date='2024-01-03')
+        
+        mock_hist.assert_not_called()
+        assert result['up_to_date_count'] == 1
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_ingest_records_errors_per_stock(self, mock_hist, service, db_session):
+        """测试单只股票失败不影响其他股票"""
+        def side_effect(symbol, **kwargs):
+            if symbol == '000002':
+                raise Exception('network error')
+            return make_hist_frame(['2024-01-02'])
+        mock_hist.side_effect = side_effect
+        
+        result = service.ingest(['000001', '000002'], start_date='2024-01-01', end_date='2024-01-02')
+        
+        assert result['updated_count'] == 1
+        assert result['failed_count'] == 1
+        assert result['errors'][0]['stock_code'] == '000002'
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_get_bars_date_range(self, mock_hist, service, db_session):
+        """测试按日期区间读取"""
+        mock_hist.return_value = make_hist_frame(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'])
+        service.ingest(['000001'], start_date='2024-01-01', end_date='2024-01-05')
+        
+        bars = service.get_bars(['000001', '000002'], date(2024, 1, 3), '2024-01-04')
+        
+        assert [str(d) for d in bars['000001']['date']] == ['2024-01-03', '2024-01-04']
+        assert len(bars['000002']) == 0
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_get_close_matrix(self, mock_hist, service, db_session):
+        """测试收盘价矩阵按日期对齐"""
+        mock_hist.return_value = make_hist_frame(['2024-01-02', '2024-01-03'])
+        service.ingest(['000001'], start_date='2024-01-01', end_date='2024-01-03')
+        mock_hist.return_value = make_hist_frame(['2024-01-03', '2024-01-04'], base_price=20.0)
+        service.ingest(['000002'], start_date='2024-01-01', end_date='2024-01-04')
+        
+        dates, matrix = service.get_close_matrix(['000001', '000002'])
+        
+        assert len(dates) == 3
+        assert matrix.shape == (2, 3)
+        assert np.isnan(matrix[0, 2])
+        assert np.isnan(matrix[1, 0])
+        assert matrix[1, 1] == pytest.approx(20.5)
+    
+    def test_get_bars_invalid_stock_code(self, service):
+        """测试无效股票代码"""
+        with pytest.raises(ValidationError):
+            service.get_bars('../etc')
+    
+    def test_get_target_stock_codes(self, db_session):
+        """测试目标股票包含交易过和关注的股票"""
+        TradeRecord(
+            stock_code='000001', stock_name='平安银行', trade_type='buy',
+            price=10.0, quantity=100, trade_date=datetime(2024, 1, 2), reason='测试'
+        ).save()
+        StockPool(stock_code='000002', stock_name='万科A', pool_type='watch').save()
+        
+        assert DailyBarService.get_target_stock_codes() == ['000001', '000002']
+    
+    @patch('services.daily_bar_service.ak.stock_zh_a_hist')
+    def test_default_start_covers_first_trade(self, mock_hist, service, db_session):
+        """测试新股票首次拉取覆盖最早交易日期"""
+        TradeRecord(
+            stock_code='000001', stock_name='平安银行', trade_type='buy',
+            price=10.0, quantity=100, trade_date=datetime(2015, 6, 1), reason='测试'
+        ).save()
+        mock_hist.return_value = make_hist_frame([])
+        
+        service.ingest(['000001'], end_date='2024-01-05')
+        
+        assert mock_hist.call_args.kwargs['start_date'] == '20150502'
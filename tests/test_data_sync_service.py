@@ -0,0 +1,208 @@
+"""
+数据同步服务测试
+"""
+import pytest
+from unittest.mock import patch
+from datetime import datetime
+
+from extensions import db
+from models.trade_record import TradeRecord
+from models.historical_trade import HistoricalTrade, HistoricalTradeLink
+from services.data_sync_service import DataSyncService
+from services.historical_trade_service import HistoricalTradeService
+
+
+def create_trade_cycle(stock_code, buy_price=10.0, sell_price=11.0,
+                       buy_date=datetime(2024, 1, 2), sell_date=datetime(2024, 1, 16)):
+    """创建一个完整的买入-清仓周期"""
+    buy = TradeRecord(
+        stock_code=stock_code, stock_name='测试股票', trade_type='buy', price=buy_price,
+        quantity=1000, trade_date=buy_date, reason='测试'
+    ).save()
+    sell = TradeRecord(
+        stock_code=stock_code, stock_name='测试股票', trade_type='sell', price=sell_price,
+        quantity=1000, trade_date=sell_date, reason='测试', sell_ratio=1.0
+    ).save()
+    return buy, sell
+
+
+def get_links(historical_trade_id):
+    """按方向返回历史交易的关联交易记录ID"""
+    links = HistoricalTradeLink.query.filter_by(historical_trade_id=historical_trade_id).all()
+    return {
+        side: sorted(link.trade_record_id for link in links if link.side == side)
+        for side in ('buy', 'sell')
+    }
+
+
+class TestHistoricalTradeLinks:
+    """历史交易关联表测试"""
+    
+    def test_sync_writes_links(self, db_session):
+        """测试通过ORM创建的历史交易写入关联"""
+        buy, sell = create_trade_cycle('600101')
+        HistoricalTradeService.sync_historical_records()
+        
+        trade = HistoricalTrade.query.filter_by(stock_code='600101').one()
+        assert get_links(trade.id) == {'buy': [buy.id], 'sell': [sell.id]}
+        
+        trade.sell_records_list = [sell.id, buy.id + 100]
+        trade.save()
+        assert get_links(trade.id)['sell'] == [sell.id, buy.id + 100]
+        
+        trade.delete()
+        assert HistoricalTradeLink.query.count() == 0
+    
+    def test_bulk_generation_backfills_links(self, db_session):
+        """测试批量生成的历史交易按JSON列补齐关联"""
+        buy, sell = create_trade_cycle('600102')
+        HistoricalTradeService.generate_historical_records(force_regenerate=True)
+        
+        trade = HistoricalTrade.query.filter_by(stock_code='600102').one()
+        assert get_links(trade.id) == {'buy': [buy.id], 'sell': [sell.id]}
+        
+        # 迁移场景：关联缺失时按JSON列重建，已有关联的记录不重复写入
+        db_session.execute(HistoricalTradeLink.__table__.delete())
+        assert HistoricalTradeLink.backfill_from_json(db_session) == 2
+        assert HistoricalTradeLink.backfill_from_json(db_session) == 0
+    
+    def test_reverse_lookup(self, client, db_session):
+        """测试按交易记录反向查询所属历史交易"""
+        buy, sell = create_trade_cycle('600103')
+        create_trade_cycle('600104')
+        HistoricalTradeService.sync_historical_records()
+        
+        trades = HistoricalTradeService.get_trades_containing_record(sell.id)
+        assert [trade['stock_code'] for trade in trades] == ['600103']
+        
+        response = client.get(f'/api/historical-trades/by-trade-record/{buy.id}')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['total'] == 1
+        assert data['trades'][0]['stock_code'] == '600103'
+
+
+class TestIntegrityChecks:
+    """基于关联表的完整性检查测试"""
+    
+    @pytest.fixture
+    def synced_trades(self, db_session):
+        """两只股票各一个完整周期并生成历史交易"""
+        cycles = [create_trade_cycle('600201'), create_trade_cycle('600202', sell_price=9.0)]
+        HistoricalTradeService.sync_historical_records()
+        return cycles
+    
+    def test_clean_data_has_no_issues(self, synced_trades):
+        """测试数据一致时没有问题"""
+        assert DataSyncService._check_historical_trade_consistency() == []
+        assert DataSyncService._check_record_references() == []
+    
+    def test_invalid_reference_detected_and_removed(self, synced_trades, db_session):
+        """测试引用不存在的交易记录时报告问题并删除对应历史交易"""
+        _, sell = synced_trades[0]
+        db_session.execute(TradeRecord.__table__.delete().where(TradeRecord.id == sell.id))
+        db_session.commit()
+        trade_id = HistoricalTrade.query.filter_by(stock_code='600201').one().id
+        
+        assert DataSyncService._check_record_references() == [
+            f"历史交易记录 {trade_id} 引用了不存在的卖出记录ID"
+        ]
+        assert f"历史交易记录 {trade_id} 的卖出记录ID列表包含无效ID" in \
+            DataSyncService._check_historical_trade_consistency()
+        
+        result = DataSyncService._fix_invalid_references()
+        db_session.commit()
+        
+        assert result['removed_count'] == 1
+        assert HistoricalTrade.query.filter_by(stock_code='600201').count() == 0
+        assert HistoricalTradeLink.query.filter_by(historical_trade_id=trade_id).count() == 0
+    
+    def test_inconsistent_metrics_detected_and_fixed(self, synced_trades, db_session):
+        """测试指标与关联交易记录不一致时报告并修复"""
+        trade = HistoricalTrade.query.filter_by(stock_code='600202').one()
+        trade.total_investment = 12345
+        trade.save()
+        
+        issues = DataSyncService._check_historical_trade_consistency()
+        assert f"历史交易记录 {trade.id} 的总投入本金计算不正确" in issues
+        
+        result = DataSyncService._fix_data_inconsistencies()
+        db_session.commit()
+        
+        assert result['fixed_count'] == 1
+        trade = HistoricalTrade.query.filter_by(stock_code='600202').one()
+        assert float(trade.total_investment) == pytest.approx(10000.0)
+        assert float(trade.total_return) == pytest.approx(-1000.0)
+        assert trade.holding_days == 14
+        assert DataSyncService._check_historical_trade_consistency() == []
+    
+    def test_check_data_integrity_reports_bulk_violations(self, synced_trades, db_session):
+        """测试完整性检查批量返回孤立买入和重复记录"""
+        TradeRecord(
+            stock_code='600203', stock_name='测试股票', trade_type='buy', price=10.0,
+            quantity=500, trade_date=datetime(2024, 2, 1), reason='测试'
+        ).save()
+        trade = HistoricalTrade.query.filter_by(stock_code='600201').one()
+        duplicate = {column.name: getattr(trade, column.name) for column in HistoricalTrade.__table__.columns
+                     if column.name != 'id'}
+        db_session.execute(HistoricalTrade.__table__.insert().values(**duplicate))
+        db_session.commit()
+        
+        result = DataSyncService.check_data_integrity()
+        
+        assert result['mode'] == 'full'
+        assert result['orphaned_buys_count'] == 1
+        assert result['duplicate_records_count'] == 1
+        assert "发现 1 条重复的历史交易记录" in result['issues']
+        assert DataSyncService._check_orphaned_buy_records() == [{
+            'stock_code': '600203', 'total_buy_quantity': 500, 'total_sell_quantity': 0,
+            'remaining_quantity': 500, 'buy_records_count': 1
+        }]
+        assert len(DataSyncService._check_duplicate_historical_trades()[0]['record_ids']) == 2
+    
+    def test_incremental_check_only_rechecks_changed_stocks(self, synced_trades, db_session):
+        """测试增量检查只检查校验和变化的股票，未变化股票沿用上次结果"""
+        trade = HistoricalTrade.query.filter_by(stock_code='600202').one()
+        trade.total_investment = 12345
+        trade.save()
+        
+        full = DataSyncService.check_data_integrity(incremental=True)
+        assert full['mode'] == 'full'
+        assert full['is_valid'] is False
+        
+        with patch.object(DataSyncService, '_collect_violations',
+                          wraps=DataSyncService._collect_violations) as mock_collect:
+            unchanged = DataSyncService.check_data_integrity(incremental=True)
+            mock_collect.assert_not_called()
+            
+            # 只修改一只股票的交易记录
+            buy, _ = synced_trades[0]
+            buy.notes = '补充备注'
+            buy.save()
+            changed = DataSyncService.check_data_integrity(incremental=True)
+            mock_collect.assert_called_once_with({'600201'})
+        
+        assert unchanged['mode'] == 'incremental'
+        assert unchanged['checked_stock_count'] == 0
+        assert unchanged['issues'] == full['issues']
+        assert changed['checked_stock_count'] == 1
+        assert changed['issues'] == full['issues']
+        
+        # 修复后增量检查重新计算该股票
+        DataSyncService._fix_data_inconsistencies()
+        db_session.commit()
+        assert DataSyncService.check_data_integrity(incremental=True)['is_valid'] is True
+    
+    def test_checksum_covers_links(self, synced_trades, db_session):
+        """测试只修改关联表时校验和也会变化"""
+        before = DataSyncService._compute_stock_checksums()
+        trade = HistoricalTrade.query.filter_by(stock_code='600201').one()
+        db_session.execute(HistoricalTradeLink.__table__.delete().where(
+            HistoricalTradeLink.historical_trade_id == trade.id, HistoricalTradeLink.side == 'sell'
+        ))
+        db_session.commit()
+        
+        after = DataSyncService._compute_stock_checksums()
+        
+        assert after['600201'] != before['600201']
+        assert after['600202'] == before['600202']
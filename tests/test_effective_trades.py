@@ -0,0 +1,146 @@
+"""
+有效交易映射测试
+"""
+import json
+from datetime import datetime
+
+from extensions import db
+from models.configuration import Configuration
+from models.effective_trade import EffectiveTrade
+from models.read_models import TradeReadModel
+from models.trade_record import TradeRecord
+from services.trading_service import TradingService
+
+
+def _trade_data(reason='少妇B1战法', price=20.00):
+    return {
+        'stock_code': '000002',
+        'stock_name': '万科A',
+        'trade_type': 'buy',
+        'price': price,
+        'quantity': 500,
+        'trade_date': datetime(2025, 9, 1, 10, 0, 0),
+        'reason': reason
+    }
+
+
+def _create_chain():
+    """原始记录 -> 第一次订正 -> 第二次订正"""
+    Configuration.set_buy_reasons(['少妇B1战法', '少妇B2战法'])
+    original = TradingService.create_trade(_trade_data())
+    first = TradingService.correct_trade_record(original.id, _trade_data(price=21.00), '价格错误')
+    second = TradingService.correct_trade_record(first.id, _trade_data('少妇B2战法', 21.00), '原因错误')
+    return original.id, first.id, second.id
+
+
+class TestEffectiveTrades:
+    """有效交易映射测试"""
+
+    def test_chain_resolved_on_write(self, app, db_session):
+        """订正时整条链的有效记录指向最新订正"""
+        with app.app_context():
+            original_id, first_id, second_id = _create_chain()
+            other = TradingService.create_trade(_trade_data())
+
+            assert EffectiveTrade.resolve([original_id, first_id, second_id, other.id]) == {
+                original_id: second_id,
+                first_id: second_id,
+                second_id: second_id,
+                other.id: other.id
+            }
+            assert EffectiveTrade.chain_ids(first_id) == [original_id, first_id, second_id]
+            assert [EffectiveTrade.query.get(trade_id).depth for trade_id in (original_id, first_id, second_id)] == [0, 1, 2]
+            assert EffectiveTrade.effective_id(999999) is None
+
+    def test_correction_marks_original_corrected(self, app, db_session):
+        """直接插入的订正记录也会把上级记录标记为已订正"""
+        with app.app_context():
+            Configuration.set_buy_reasons(['少妇B1战法'])
+            original = TradingService.create_trade(_trade_data())
+            db.session.execute(TradeRecord.__table__.insert().values(
+                stock_code='000002', stock_name='万科A', trade_type='buy', price=22.00, quantity=500,
+                trade_date=datetime(2025, 9, 1, 10, 0, 0), reason='少妇B1战法', is_corrected=False,
+                original_record_id=original.id
+            ))
+            db.session.commit()
+
+            corrected_flag = db.session.execute(
+                db.select(TradeRecord.is_corrected).where(TradeRecord.id == original.id)
+            ).scalar_one()
+            assert corrected_flag is True
+            assert [row.price_fen for row in TradeReadModel.load_trades()] == [2200]
+
+    def test_delete_repoints_chain(self, app, db_session):
+        """删除链上最新的记录后，有效记录回退到剩余的最新记录"""
+        with app.app_context():
+            original_id, first_id, second_id = _create_chain()
+
+            db.session.execute(TradeRecord.__table__.delete().where(TradeRecord.id == second_id))
+            db.session.commit()
+
+            assert EffectiveTrade.resolve([original_id, first_id, second_id]) == {
+                original_id: first_id,
+                first_id: first_id
+            }
+
+    def test_rebuild_matches_triggers(self, app, db_session):
+        """从交易记录重建的映射与触发器维护的一致"""
+        with app.app_context():
+            _create_chain()
+            TradingService.create_trade(_trade_data())
+            columns = (EffectiveTrade.trade_id, EffectiveTrade.root_trade_id,
+                       EffectiveTrade.effective_trade_id, EffectiveTrade.depth)
+            maintained = db.session.execute(db.select(*columns).order_by(EffectiveTrade.trade_id)).all()
+
+            EffectiveTrade.rebuild(db.session.connection())
+            db.session.commit()
+
+            assert db.session.execute(db.select(*columns).order_by(EffectiveTrade.trade_id)).all() == maintained
+
+    def test_rebuild_keeps_corrections_of_deleted_root(self, app, db_session):
+        """根记录被删除后重建，剩余的订正记录仍在映射中且与触发器维护的一致"""
+        with app.app_context():
+            original_id, first_id, second_id = _create_chain()
+            db.session.execute(TradeRecord.__table__.delete().where(TradeRecord.id == original_id))
+            db.session.commit()
+            columns = (EffectiveTrade.trade_id, EffectiveTrade.root_trade_id,
+                       EffectiveTrade.effective_trade_id, EffectiveTrade.depth)
+            maintained = db.session.execute(db.select(*columns).order_by(EffectiveTrade.trade_id)).all()
+
+            EffectiveTrade.rebuild(db.session.connection())
+            db.session.commit()
+
+            assert db.session.execute(db.select(*columns).order_by(EffectiveTrade.trade_id)).all() == maintained
+            assert EffectiveTrade.resolve([first_id, second_id]) == {first_id: second_id, second_id: second_id}
+            assert EffectiveTrade.chain_ids(second_id) == [first_id, second_id]
+            # 根记录被删除后，订正链的根仍是被删除的原记录
+            chain = TradingService.get_correction_chain(second_id)
+            assert chain['root_trade_id'] == original_id
+            assert chain['trade_ids'] == [first_id, second_id]
+
+    def test_correction_chain_api(self, client, app, db_session):
+        """从链上任一记录都能取到完整订正链"""
+        with app.app_context():
+            original_id, first_id, second_id = _create_chain()
+
+            for trade_id in (original_id, first_id, second_id):
+                response = client.get(f'/api/trades/{trade_id}/chain')
+                assert response.status_code == 200
+                chain = json.loads(response.data)['data']
+                assert chain['root_trade_id'] == original_id
+                assert chain['effective_trade_id'] == second_id
+                assert chain['trade_ids'] == [original_id, first_id, second_id]
+                assert [c['corrected_trade_id'] for c in chain['corrections']] == [second_id, first_id]
+
+            response = client.get('/api/trades/999999/chain')
+            assert response.status_code == 404
+
+    def test_uncorrected_filter_uses_partial_index(self, app, db_session):
+        """未订正记录的常用过滤命中部分索引"""
+        with app.app_context():
+            statement = TradeReadModel.select_trades(
+                TradeRecord.trade_date >= datetime(2025, 9, 1), order_by_stock=False
+            )
+            sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+            assert 'idx_trade_records_effective_date' in plan
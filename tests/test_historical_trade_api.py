@@ -10,6 +10,7 @@ from extensions import db
 from models.historical_trade import HistoricalTrade
 from models.trade_record import TradeRecord
 from services.historical_trade_service import HistoricalTradeService
+from services.non_trading_day_service import NonTradingDayService
 
 
 class TestHistoricalTradeAPI:
@@ -134,6 +135,9 @@ class TestHistoricalTradeAPI:
             assert trade['stock_code'] == '000001'
             assert trade['stock_name'] == '平安银行'
             assert trade['holding_days'] == 14
+            assert trade['trading_holding_days'] == NonTradingDayService.calculate_holding_days(
+                trade['buy_date'][:10], trade['sell_date'][:10]
+            )
             assert float(trade['total_investment']) == 14750.00
             assert float(trade['total_return']) == 1750.00
     
@@ -6,6 +6,9 @@ import json
 from datetime import datetime, timedelta
 from decimal import Decimal
 from unittest.mock import Mock, patch, MagicMock
+import numpy as np
+from sqlalchemy import event
+from extensions import db
 
 from services.historical_trade_service import HistoricalTradeService
 from models.trade_record import TradeRecord
@@ -51,23 +54,19 @@ class TestHistoricalTradeService:
         self.mock_sell_record.trade_date = datetime(2024, 1, 15)
         self.mock_sell_record.is_corrected = False
     
-    @patch('services.historical_trade_service.TradeRecord')
+    @patch('services.historical_trade_service.TradeReadModel')
     @patch('flask.current_app')
-    def test_identify_completed_trades_success(self, mock_app, mock_trade_record):
+    def test_identify_completed_trades_success(self, mock_app, mock_read_model):
         """测试成功识别已完成交易"""
         # 准备测试数据
         mock_app.logger = Mock()
         
         # 模拟查询结果
-        mock_query = Mock()
-        mock_query.filter_by.return_value = mock_query
-        mock_query.order_by.return_value = mock_query
-        mock_query.all.return_value = [
+        mock_read_model.load_trades.return_value = [
             self.mock_buy_record1,
             self.mock_buy_record2,
             self.mock_sell_record
         ]
-        mock_trade_record.query = mock_query
         
         # 执行测试
         result = self.service.identify_completed_trades()
@@ -84,19 +83,15 @@ class TestHistoricalTradeService:
         assert completed_trade['holding_days'] == 14
         assert completed_trade['is_completed'] is True
     
-    @patch('services.historical_trade_service.TradeRecord')
+    @patch('services.historical_trade_service.TradeReadModel')
     @patch('flask.current_app')
-    def test_identify_completed_trades_no_trades(self, mock_app, mock_trade_record):
+    def test_identify_completed_trades_no_trades(self, mock_app, mock_read_model):
         """测试没有交易记录的情况"""
         # 准备测试数据
         mock_app.logger = Mock()
         
         # 模拟空查询结果
-        mock_query = Mock()
-        mock_query.filter_by.return_value = mock_query
-        mock_query.order_by.return_value = mock_query
-        mock_query.all.return_value = []
-        mock_trade_record.query = mock_query
+        mock_read_model.load_trades.return_value = []
         
         # 执行测试
         result = self.service.identify_completed_trades()
@@ -306,20 +301,27 @@ class TestHistoricalTradeService:
             'completion_date': datetime(2024, 1, 20)
         }]
         
-        with patch.object(self.service, 'identify_completed_trades', return_value=completed_trades):
-            with patch.object(self.service, '_find_existing_record', return_value=None):
-                with patch.object(self.service, 'create') as mock_create:
-                    mock_create.return_value = Mock(id=2)
-                    
-                    # 执行测试
-                    result = self.service.sync_historical_records()
-                    
-                    # 验证结果
-                    assert result['total_checked'] == 1
-                    assert result['created_count'] == 1
-                    assert result['updated_count'] == 0
-                    assert result['error_count'] == 0
-                    assert result['success'] is True
+        mock_historical_trade.take_trade_changes.return_value = (set(), set())
+        
+        with patch.object(self.service, 'identify_completed_trades', return_value=completed_trades), \
+                patch.object(self.service, '_get_trade_watermark', return_value={}), \
+                patch.object(self.service, '_collect_dirty_stocks', return_value=None), \
+                patch.object(self.service, '_load_existing_records', return_value={}), \
+                patch.object(self.service, '_save_trade_watermark') as mock_save_watermark:
+            with patch.object(self.service, 'create') as mock_create:
+                mock_create.return_value = Mock(id=2)
+                
+                # 执行测试
+                result = self.service.sync_historical_records()
+                
+                # 验证结果
+                assert result['full_sync'] is True
+                assert result['total_checked'] == 1
+                assert result['created_count'] == 1
+                assert result['updated_count'] == 0
+                assert result['error_count'] == 0
+                assert result['success'] is True
+                mock_save_watermark.assert_called_once()
     
     @patch('services.historical_trade_service.HistoricalTrade')
     def test_get_historical_trades_with_pagination(self, mock_historical_trade):
@@ -380,39 +382,20 @@ class TestHistoricalTradeService:
         """测试获取交易统计信息"""
         mock_app.logger = Mock()
         
-        # 模拟查询结果
-        mock_query = Mock()
-        mock_query.count.return_value = 10
-        mock_query.filter.return_value = mock_query
-        mock_historical_trade.query = mock_query
-        
-        # 模拟profitable_trades查询
-        profitable_query = Mock()
-        profitable_query.count.return_value = 7
-        mock_query.filter.return_value = profitable_query
-        
-        # 模拟loss_trades查询
-        loss_query = Mock()
-        loss_query.count.return_value = 3
-        
-        # 设置filter方法的返回值
-        def filter_side_effect(condition):
-            # 根据条件返回不同的查询对象
-            if "total_return > 0" in str(condition):
-                return profitable_query
-            elif "total_return < 0" in str(condition):
-                return loss_query
-            return mock_query
-        
-        mock_query.filter.side_effect = filter_side_effect
-        
-        # 模拟聚合查询
+        # 模拟条件聚合查询（一次查询返回全部汇总值）和分位数列查询
         mock_session = Mock()
-        mock_session.query.return_value.scalar.return_value = 100000  # 总投资
+        mock_session.query.return_value.one.return_value = (
+            10, 7, 3, Decimal('100000'), Decimal('5000'),
+            0.05, 0.3, -0.1, 12.5, 40, 2
+        )
+        mock_session.query.return_value.all.return_value = [
+            (0.1 * i - 0.2, float(i * 4)) for i in range(10)
+        ]
         mock_db.session = mock_session
         
         # 执行测试
-        result = self.service.get_trade_statistics()
+        with patch.object(HistoricalTradeService, '_statistics_cache', None):
+            result = self.service.get_trade_statistics()
         
         # 验证结果
         assert 'total_trades' in result
@@ -423,6 +406,11 @@ class TestHistoricalTradeService:
         assert 'total_return' in result
         assert isinstance(result['total_trades'], int)
         assert isinstance(result['win_rate'], (int, float))
+        assert result['win_rate'] == 70.0
+        assert result['overall_return_rate'] == 5.0
+        assert result['return_rate_percentiles']['p50'] == 25.0
+        assert result['holding_days_percentiles']['p50'] == 18.0
+        assert mock_session.query.call_count == 2
     
     def test_find_existing_record(self):
         """测试查找现有记录"""
@@ -673,4 +661,258 @@ class TestHistoricalTradeServiceIntegration:
         # 验证第二个交易
         second_trade = result[1]
         assert second_trade['buy_date'] == datetime(2024, 2, 1)
-        assert second_trade['sell_date'] == datetime(2024, 2, 20)
\ No newline at end of file
+        assert second_trade['sell_date'] == datetime(2024, 2, 20)
+
+def create_trade_cycle(stock_code, buy_price, sell_price, buy_date, sell_date):
+    """创建一个完整的买入-清仓周期"""
+    buy = TradeRecord(
+        stock_code=stock_code, stock_name='测试股票', trade_type='buy', price=buy_price,
+        quantity=1000, trade_date=buy_date, reason='测试'
+    ).save()
+    sell = TradeRecord(
+        stock_code=stock_code, stock_name='测试股票', trade_type='sell', price=sell_price,
+        quantity=1000, trade_date=sell_date, reason='测试', sell_ratio=1.0
+    ).save()
+    return buy, sell
+
+
+class TestIncrementalSync:
+    """历史交易增量同步测试"""
+    
+    @pytest.fixture
+    def synced_db(self, db_session):
+        """两只股票各一个完整周期，并完成首次全量同步"""
+        HistoricalTrade.take_trade_changes()
+        create_trade_cycle('000001', 10.0, 11.0, datetime(2024, 1, 2), datetime(2024, 1, 16))
+        create_trade_cycle('000002', 20.0, 19.0, datetime(2024, 1, 3), datetime(2024, 1, 17))
+        
+        result = HistoricalTradeService.sync_historical_records()
+        assert result['full_sync'] is True
+        assert result['created_count'] == 2
+        return db_session
+    
+    def test_sync_without_changes_skips_analysis(self, synced_db):
+        """测试没有变更时不重新分析任何股票"""
+        with patch.object(HistoricalTradeService, '_analyze_stock_trades') as mock_analyze:
+            result = HistoricalTradeService.sync_historical_records()
+        
+        mock_analyze.assert_not_called()
+        assert result['full_sync'] is False
+        assert result['dirty_stock_count'] == 0
+        assert result['total_checked'] == 0
+        assert HistoricalTrade.query.count() == 2
+    
+    def test_sync_reanalyzes_only_changed_stock(self, synced_db):
+        """测试只重新分析变更的股票并只更新变化的记录"""
+        sell = TradeRecord.query.filter_by(stock_code='000001', trade_type='sell').first()
+        sell.price = 12.0
+        sell.save()
+        
+        analyzed = []
+        original = HistoricalTradeService._analyze_stock_trades
+        
+        def spy(stock_code, trades):
+            analyzed.append(stock_code)
+            return original(stock_code, trades)
+        
+        with patch.object(HistoricalTradeService, '_analyze_stock_trades', side_effect=spy):
+            result = HistoricalTradeService.sync_historical_records()
+        
+        assert analyzed == ['000001']
+        assert result['dirty_stock_count'] == 1
+        assert result['created_count'] == 0
+        assert result['updated_count'] == 1
+        
+        record = HistoricalTrade.query.filter_by(stock_code='000001').one()
+        assert float(record.total_return) == pytest.approx(2000.0)
+    
+    def test_sync_detects_untracked_writes_by_watermark(self, synced_db):
+        """测试绕过ORM事件写入的交易记录由水位发现"""
+        for trade_type, price, trade_date in (('buy', 5.0, datetime(2024, 2, 1)),
+                                              ('sell', 6.0, datetime(2024, 2, 5))):
+            synced_db.execute(TradeRecord.__table__.insert().values(
+                stock_code='000003', stock_name='测试股票', trade_type=trade_type, price=price,
+                quantity=100, trade_date=trade_date, reason='测试', is_corrected=False
+            ))
+        synced_db.commit()
+        
+        result = HistoricalTradeService.sync_historical_records()
+        
+        assert result['full_sync'] is False
+        assert result['dirty_stock_count'] == 1
+        assert result['created_count'] == 1
+        assert HistoricalTrade.query.filter_by(stock_code='000003').count() == 1
+    
+    def test_sync_falls_back_to_full_on_untracked_delete(self, synced_db):
+        """测试无法定位的删除触发全量同步"""
+        synced_db.execute(TradeRecord.__table__.delete().where(TradeRecord.stock_code == '000002'))
+        synced_db.commit()
+        
+        result = HistoricalTradeService.sync_historical_records()
+        
+        assert result['full_sync'] is True
+        assert result['total_checked'] == 1
+    
+    def test_sync_tracked_delete_stays_incremental(self, synced_db):
+        """测试通过ORM删除的交易记录只重新分析所属股票"""
+        TradeRecord.query.filter_by(stock_code='000002', trade_type='sell').one().delete()
+        
+        result = HistoricalTradeService.sync_historical_records()
+        
+        assert result['full_sync'] is False
+        assert result['dirty_stock_count'] == 1
+        assert result['total_checked'] == 0
+
+
+class TestBulkGeneration:
+    """历史交易批量生成测试"""
+    
+    def test_generate_inserts_in_batches_with_progress(self, db_session):
+        """测试按批次插入并回报进度"""
+        for i in range(5):
+            create_trade_cycle(f'60000{i}', 10.0, 11.0, datetime(2024, 1, 2 + i), datetime(2024, 2, 1 + i))
+        progress = []
+        
+        result = HistoricalTradeService.generate_historical_records(
+            batch_size=2, progress_callback=lambda done, total: progress.append((done, total))
+        )
+        
+        assert result['created_count'] == 5
+        assert result['success'] is True
+        assert progress == [(2, 5), (4, 5), (5, 5)]
+        
+        record = HistoricalTrade.query.filter_by(stock_code='600000').one()
+        assert record.holding_days == 30
+        assert float(record.total_return) == pytest.approx(1000.0)
+        assert record.buy_records_list and record.sell_records_list
+        assert record.created_at is not None and record.is_completed is True
+    
+    def test_generate_skips_existing_and_force_regenerates(self, db_session):
+        """测试非强制生成跳过已存在记录，强制生成在同一事务内替换"""
+        create_trade_cycle('600001', 10.0, 11.0, datetime(2024, 1, 2), datetime(2024, 1, 16))
+        HistoricalTradeService.generate_historical_records()
+        
+        result = HistoricalTradeService.generate_historical_records()
+        assert result['skipped_count'] == 1
+        assert result['created_count'] == 0
+        
+        result = HistoricalTradeService.generate_historical_records(force_regenerate=True)
+        assert result['created_count'] == 1
+        assert HistoricalTrade.query.count() == 1
+    
+    def test_validate_rows_reports_invalid_rows(self):
+        """测试批量验证与逐条验证规则一致"""
+        valid = {
+            'stock_code': '000001', 'total_investment': Decimal('100'), 'holding_days': 3,
+            'buy_date': datetime(2024, 1, 1), 'sell_date': datetime(2024, 1, 4),
+            'buy_records_ids': [1], 'sell_records_ids': '[2]'
+        }
+        rows = [
+            dict(valid),
+            dict(valid, stock_code='ABC'),
+            dict(valid, total_investment=Decimal('0')),
+            dict(valid, holding_days=-1),
+            dict(valid, sell_date=datetime(2023, 12, 31)),
+        ]
+        
+        errors = HistoricalTrade.validate_rows(rows)
+        
+        assert sorted(errors) == [1, 2, 3, 4]
+        assert '股票代码' in errors[1]
+        assert rows[0]['buy_records_ids'] == '[1]'
+
+
+class TestTradeStatistics:
+    """历史交易统计测试"""
+    
+    @pytest.fixture
+    def generated_db(self, db_session):
+        """三个盈利周期和两个亏损周期"""
+        prices = [(10.0, 11.0), (10.0, 12.5), (20.0, 21.0), (10.0, 9.0), (20.0, 18.0)]
+        for i, (buy_price, sell_price) in enumerate(prices):
+            create_trade_cycle(f'60010{i}', buy_price, sell_price, datetime(2024, 1, 2), datetime(2024, 1, 3 + i * 5))
+        HistoricalTradeService.generate_historical_records()
+        return db_session
+    
+    @staticmethod
+    def count_queries(callback):
+        """统计回调执行的SQL语句数量"""
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            result = callback()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        return result, len(statements)
+    
+    def test_statistics_match_records(self, generated_db):
+        """测试聚合结果与逐条计算一致"""
+        stats = HistoricalTradeService.get_trade_statistics()
+        
+        records = HistoricalTrade.query.all()
+        return_rates = np.array([float(r.return_rate) for r in records]) * 100
+        holding_days = np.array([r.holding_days for r in records], dtype=float)
+        total_investment = sum(float(r.total_investment) for r in records)
+        total_return = sum(float(r.total_return) for r in records)
+        
+        assert stats['total_trades'] == 5
+        assert stats['profitable_trades'] == 3
+        assert stats['loss_trades'] == 2
+        assert stats['win_rate'] == 60.0
+        assert stats['total_investment'] == pytest.approx(total_investment)
+        assert stats['total_return'] == pytest.approx(total_return)
+        assert stats['overall_return_rate'] == round(total_return / total_investment * 100, 2)
+        assert stats['max_return_rate'] == round(return_rates.max(), 2)
+        assert stats['min_return_rate'] == round(return_rates.min(), 2)
+        assert stats['max_holding_days'] == 21
+        assert stats['min_holding_days'] == 1
+        assert stats['return_rate_percentiles']['p50'] == round(float(np.percentile(return_rates, 50)), 2)
+        assert stats['holding_days_percentiles'] == {
+            f'p{q}': round(float(np.percentile(holding_days, q)), 1) for q in (10, 25, 50, 75, 90)
+        }
+    
+    def test_statistics_use_two_queries_then_cache(self, generated_db):
+        """测试首次计算两次查询，数据未变化时不再查询"""
+        first, first_queries = self.count_queries(HistoricalTradeService.get_trade_statistics)
+        second, second_queries = self.count_queries(HistoricalTradeService.get_trade_statistics)
+        
+        assert first_queries == 2
+        assert second_queries == 0
+        assert second == first
+        
+        # 返回副本，修改结果不影响缓存
+        second['return_rate_percentiles']['p50'] = None
+        assert HistoricalTradeService.get_trade_statistics() == first
+    
+    def test_statistics_cache_invalidated_by_writes(self, generated_db):
+        """测试ORM写入、core批量生成和回滚都会使缓存失效"""
+        assert HistoricalTradeService.get_trade_statistics()['total_trades'] == 5
+        
+        # ORM修改
+        record = HistoricalTrade.query.filter_by(stock_code='600100').one()
+        record.total_return = Decimal('-100')
+        db.session.commit()
+        stats = HistoricalTradeService.get_trade_statistics()
+        assert stats['profitable_trades'] == 2
+        assert stats['loss_trades'] == 3
+        
+        # core批量插入
+        create_trade_cycle('600110', 10.0, 11.0, datetime(2024, 3, 1), datetime(2024, 3, 5))
+        HistoricalTradeService.generate_historical_records()
+        assert HistoricalTradeService.get_trade_statistics()['total_trades'] == 6
+        
+        # 事务内按未提交数据计算的结果在回滚后失效
+        db.session.delete(HistoricalTrade.query.filter_by(stock_code='600110').one())
+        db.session.flush()
+        assert HistoricalTradeService.get_trade_statistics()['total_trades'] == 5
+        db.session.rollback()
+        assert HistoricalTradeService.get_trade_statistics()['total_trades'] == 6
+    
+    def test_statistics_empty(self, db_session):
+        """测试没有历史交易时返回0"""
+        stats = HistoricalTradeService.get_trade_statistics()
+        
+        assert stats['total_trades'] == 0
+        assert stats['win_rate'] == 0
+        assert stats['return_rate_percentiles'] == {'p10': 0, 'p25': 0, 'p50': 0, 'p75': 0, 'p90': 0}
@@ -442,6 +442,31 @@ class TestStockPrice:
         assert latest is not None
         assert latest.stock_code == '000001'
 
+    
+    def test_get_latest_prices(self, db_session, sample_stock_price_data):
+        """测试批量获取最新价格"""
+        from datetime import timedelta
+        StockPrice(**sample_stock_price_data).save()
+        newer = dict(sample_stock_price_data, current_price=13.0,
+                     record_date=sample_stock_price_data['record_date'] + timedelta(days=1))
+        StockPrice(**newer).save()
+        
+        latest = StockPrice.get_latest_prices(['000001', '000002'])
+        assert list(latest.keys()) == ['000001']
+        assert float(latest['000001'].current_price) == 13.0
+    
+    def test_get_latest_prices_request_memo(self, app, db_session, sample_stock_price_data):
+        """测试同一请求内最新价格只查询一次，写入价格后缓存失效"""
+        StockPrice(**sample_stock_price_data).save()
+        
+        with app.test_request_context():
+            first = StockPrice.get_latest_prices(['000001'])
+            db_session.execute(StockPrice.__table__.update().values(current_price=99))
+            assert StockPrice.get_latest_prices(['000001'])['000001'] is first['000001']
+            
+            StockPrice.update_or_create('000001', '平安银行', 15.0, 1.0,
+                                        sample_stock_price_data['record_date'])
+            assert float(StockPrice.get_latest_price('000001').current_price) == 15.0
 
 class TestSectorData:
     """板块数据模型测试"""
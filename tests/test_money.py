@@ -0,0 +1,108 @@
+"""
+金额定点数运算测试
+"""
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock
+
+import numpy as np
+
+from models.trade_record import TradeRecord
+from models.read_models import TradeReadModel
+from services.analytics_service import AnalyticsService
+from services.historical_trade_service import HistoricalTradeService
+from services.trade_pair_analyzer import TradePairAnalyzer
+from utils.money import (
+    compare_ratio, div_round, fen_to_decimal, fen_to_yuan, group_sum_fen, ratio, to_bps, to_fen
+)
+
+
+class TestMoney:
+    """定点数换算测试"""
+    
+    @pytest.mark.parametrize('value, expected', [
+        (Decimal('10.07'), 1007), (10.07, 1007), ('1.005', 101), (1.005, 101), (-1.005, -101),
+        (3, 300), (2.675, 268), (None, 0)
+    ])
+    def test_to_fen(self, value, expected):
+        """元转分按十进制四舍五入"""
+        assert to_fen(value) == expected
+    
+    def test_ratios(self):
+        """比例和基点换算"""
+        assert to_bps(0.05) == 500
+        assert ratio(175000, 1475000) == 175000 / 1475000
+        assert ratio(100, 0) == 0
+        assert [div_round(5, 2), div_round(-5, 2), div_round(7, -2), div_round(4, 3)] == [3, -3, -4, 1]
+    
+    def test_compare_ratio_is_exact(self):
+        """比例比较不受浮点误差影响"""
+        # 买入 1.00 卖出 1.30：浮点计算 (1.3 - 1.0) / 1.0 = 0.30000000000000004，恰好在 30% 边界上
+        assert (1.3 - 1.0) / 1.0 != 0.3
+        assert compare_ratio(to_fen(1.3) - to_fen(1.0), to_fen(1.0), 0.3) == 0
+        assert compare_ratio(500, 10000, 0.05) == 0
+        assert compare_ratio(501, 10000, 0.05) > 0
+    
+    def test_group_sum(self):
+        """按分组汇总整数金额"""
+        totals = group_sum_fen([1, 3, 1], [2 ** 40, 5, 7], 4)
+        
+        assert totals.dtype == np.int64
+        assert totals.tolist() == [0, 2 ** 40 + 7, 0, 5]
+        assert fen_to_yuan(1007) == 10.07
+        assert fen_to_decimal(1007) == Decimal('10.07')
+
+
+class TestFenCalculations:
+    """盈亏计算使用整数分"""
+    
+    def test_trade_metrics_exact(self, app):
+        """交易指标金额精确到分，不累积浮点误差"""
+        buys = [Mock(price=Decimal('10.07'), quantity=300, trade_date=datetime(2024, 1, 2)) for _ in range(3)]
+        sells = [Mock(price=Decimal('10.57'), quantity=900, trade_date=datetime(2024, 1, 12))]
+        
+        with app.app_context():
+            metrics = HistoricalTradeService.calculate_trade_metrics(buys, sells)
+        
+        assert metrics['total_investment'] == 9063.0
+        assert metrics['total_return'] == 450.0
+        assert metrics['return_rate'] == 45000 / 906300
+        assert metrics['avg_buy_price'] == 10.07
+    
+    def test_read_rows_and_orm_records_agree(self, db_session):
+        """只读查询行与 ORM 记录的配对结果一致"""
+        TradeRecord(
+            stock_code='600001', stock_name='测试股票', trade_type='buy', price=10.07, quantity=300,
+            trade_date=datetime(2024, 1, 2), reason='少妇B1战法'
+        ).save()
+        TradeRecord(
+            stock_code='600001', stock_name='测试股票', trade_type='sell', price=10.57, quantity=300,
+            trade_date=datetime(2024, 1, 12), reason='少妇B1战法', sell_ratio=1.0
+        ).save()
+        
+        from_rows = TradePairAnalyzer._extract_trade_pairs(TradeReadModel.load_trades())
+        from_records = TradePairAnalyzer._extract_trade_pairs(TradeRecord.query.order_by(TradeRecord.id).all())
+        
+        assert from_rows == from_records
+        assert from_rows[0]['profit'] == Decimal('150.00')
+        assert from_rows[0]['profit_rate'] == Decimal(15000) / Decimal(302100)
+    
+    def test_monthly_buy_profits_keep_yuan_fields(self):
+        """月度买入收益记录同时保留元和分两套金额字段"""
+        trades = [
+            Mock(stock_code='600001', trade_type='buy', price=Decimal('10.07'), quantity=300,
+                 trade_date=datetime(2024, 1, 2)),
+            Mock(stock_code='600001', trade_type='sell', price=Decimal('10.57'), quantity=100,
+                 trade_date=datetime(2024, 1, 12))
+        ]
+        latest_prices = {'600001': Mock(current_price=Decimal('11.00'))}
+        
+        realized, unrealized = AnalyticsService._get_monthly_buy_total_profits(
+            trades, datetime(2024, 1, 1), datetime(2024, 1, 31, 23, 59, 59), latest_prices
+        )
+        
+        assert (realized['cost'], realized['total_profit'], realized['buy_price']) == (1007.0, 50.0, 10.07)
+        assert (realized['cost_fen'], realized['total_profit_fen']) == (100700, 5000)
+        assert (unrealized['current_price'], unrealized['cost'], unrealized['total_profit']) == (11.0, 2014.0, 186.0)
+        assert unrealized['total_profit_fen'] == 18600
@@ -22,12 +22,17 @@ class TestNonTradingDayModel(unittest.TestCase):
         self.test_date = date(2024, 1, 1)  # 2024年1月1日，星期一
         self.weekend_date = date(2024, 1, 6)  # 2024年1月6日，星期六
         self.sunday_date = date(2024, 1, 7)  # 2024年1月7日，星期日
+        NonTradingDay.invalidate_calendar()
     
-    @patch('models.non_trading_day.NonTradingDay.query')
-    def test_is_trading_day_weekday(self, mock_query):
+    def tearDown(self):
+        """测试后清理交易日历缓存"""
+        NonTradingDay.invalidate_calendar()
+    
+    @patch('models.non_trading_day.NonTradingDay._load_non_trading_dates')
+    def test_is_trading_day_weekday(self, mock_load):
         """测试工作日是否为交易日"""
-        # 模拟数据库查询返回None（没有找到非交易日记录）
-        mock_query.filter_by.return_value.first.return_value = None
+        # 模拟数据库中没有非交易日记录
+        mock_load.return_value = []
         
         # 测试工作日（星期一）
         result = NonTradingDay.is_trading_day(self.test_date)
@@ -43,12 +48,11 @@ class TestNonTradingDayModel(unittest.TestCase):
         result = NonTradingDay.is_trading_day(self.sunday_date)
         self.assertFalse(result)
     
-    @patch('models.non_trading_day.NonTradingDay.query')
-    def test_is_trading_day_holiday(self, mock_query):
+    @patch('models.non_trading_day.NonTradingDay._load_non_trading_dates')
+    def test_is_trading_day_holiday(self, mock_load):
         """测试节假日是否为交易日"""
-        # 模拟数据库查询返回节假日记录
-        mock_holiday = MagicMock()
-        mock_query.filter_by.return_value.first.return_value = mock_holiday
+        # 模拟数据库中配置了该节假日
+        mock_load.return_value = [self.test_date]
         
         result = NonTradingDay.is_trading_day(self.test_date)
         self.assertFalse(result)
@@ -58,12 +62,11 @@ class TestNonTradingDayModel(unittest.TestCase):
         result = NonTradingDay.is_trading_day('2024-01-06')  # 星期六
         self.assertFalse(result)
     
-    @patch('models.non_trading_day.NonTradingDay.is_trading_day')
-    def test_calculate_trading_days(self, mock_is_trading_day):
+    @patch('models.non_trading_day.NonTradingDay._load_non_trading_dates')
+    def test_calculate_trading_days(self, mock_load):
         """测试计算交易日数量"""
-        # 模拟is_trading_day方法
         # 假设2024-01-01到2024-01-05中，1,2,3,4,5都是交易日
-        mock_is_trading_day.side_effect = lambda d: d.weekday() < 5
+        mock_load.return_value = []
         
         start_date = date(2024, 1, 1)  # 星期一
         end_date = date(2024, 1, 5)    # 星期五
@@ -81,7 +84,7 @@ class TestNonTradingDayModel(unittest.TestCase):
     
     def test_calculate_trading_days_string_dates(self):
         """测试字符串日期格式的交易日计算"""
-        with patch.object(NonTradingDay, 'is_trading_day', return_value=True):
+        with patch.object(NonTradingDay, '_load_non_trading_dates', return_value=[]):
             result = NonTradingDay.calculate_trading_days('2024-01-01', '2024-01-01')
             self.assertEqual(result, 1)
     
@@ -98,11 +101,11 @@ class TestNonTradingDayModel(unittest.TestCase):
         result = NonTradingDay.get_non_trading_days_in_range(start_date, end_date)
         self.assertEqual(len(result), 2)
     
-    @patch('models.non_trading_day.NonTradingDay.is_trading_day')
-    def test_get_next_trading_day(self, mock_is_trading_day):
+    @patch('models.non_trading_day.NonTradingDay._load_non_trading_dates')
+    def test_get_next_trading_day(self, mock_load):
         """测试获取下一个交易日"""
         # 模拟1月1日不是交易日，1月2日是交易日
-        mock_is_trading_day.side_effect = lambda d: d.day == 2
+        mock_load.return_value = [date(2024, 1, 1)]
         
         check_date = date(2024, 1, 1)
         result = NonTradingDay.get_next_trading_day(check_date)
@@ -110,11 +113,11 @@ class TestNonTradingDayModel(unittest.TestCase):
         expected_date = date(2024, 1, 2)
         self.assertEqual(result, expected_date)
     
-    @patch('models.non_trading_day.NonTradingDay.is_trading_day')
-    def test_get_previous_trading_day(self, mock_is_trading_day):
+    @patch('models.non_trading_day.NonTradingDay._load_non_trading_dates')
+    def test_get_previous_trading_day(self, mock_load):
         """测试获取上一个交易日"""
         # 模拟1月2日不是交易日，1月1日是交易日
-        mock_is_trading_day.side_effect = lambda d: d.day == 1
+        mock_load.return_value = [date(2024, 1, 2)]
         
         check_date = date(2024, 1, 2)
         result = NonTradingDay.get_previous_trading_day(check_date)
@@ -0,0 +1,186 @@
+"""
+游标分页测试
+"""
+import pytest
+from datetime import datetime, timedelta
+
+from extensions import db
+from models.trade_record import TradeRecord
+from models.stock_pool import StockPool
+from services.trading_service import TradingService
+from services.stock_pool_service import StockPoolService
+from utils.pagination import CountCache, encode_cursor, decode_cursor, keyset_paginate
+from error_handlers import ValidationError
+
+
+def create_trades(count):
+    """创建交易记录，交易日期和价格都有重复值，止损价部分为空"""
+    base_date = datetime(2024, 3, 1)
+    for i in range(count):
+        TradeRecord(
+            stock_code=f'600{i % 7:03d}', stock_name='测试股票', trade_type='buy',
+            price=10 + i % 4, quantity=100, trade_date=base_date + timedelta(days=i // 3),
+            reason='测试', stop_loss_price=(9 - i % 3) if i % 2 else None
+        ).save()
+
+
+def collect_pages(sort_by, sort_order, per_page):
+    """按游标逐页读取全部记录ID"""
+    ids = []
+    cursor = ''
+    while True:
+        result = TradingService.get_trades(
+            per_page=per_page, sort_by=sort_by, sort_order=sort_order, cursor=cursor
+        )
+        ids.extend(trade['id'] for trade in result['trades'])
+        if not result['has_next']:
+            assert result['next_cursor'] is None
+            return ids
+        cursor = result['next_cursor']
+
+
+def expected_ids(sort_by, sort_order):
+    """用全量排序结果作为对照"""
+    column = getattr(TradeRecord, sort_by)
+    if sort_order == 'asc':
+        order = (column.asc(), TradeRecord.id.asc())
+    else:
+        order = (column.desc(), TradeRecord.id.desc())
+    return [trade.id for trade in TradeRecord.query.order_by(*order).all()]
+
+
+class TestKeysetPagination:
+    """游标分页测试类"""
+    
+    @pytest.mark.parametrize('sort_by,sort_order', [
+        ('trade_date', 'desc'),
+        ('trade_date', 'asc'),
+        ('price', 'asc'),
+        ('price', 'desc'),
+        ('stop_loss_price', 'asc'),
+        ('stop_loss_price', 'desc'),
+    ])
+    def test_pages_cover_all_rows_without_overlap(self, app, db_session, sort_by, sort_order):
+        """排序值重复及为空时逐页读取不重复、不遗漏，且顺序与全量排序一致"""
+        with app.app_context():
+            create_trades(23)
+            
+            ids = collect_pages(sort_by, sort_order, per_page=4)
+            
+            assert ids == expected_ids(sort_by, sort_order)
+            assert len(set(ids)) == 23
+    
+    def test_first_page_without_cursor_value(self, app, db_session):
+        """空游标返回第一页"""
+        with app.app_context():
+            create_trades(5)
+            
+            result = TradingService.get_trades(per_page=2, cursor='')
+            
+            assert len(result['trades']) == 2
+            assert result['has_next'] is True
+            assert result['next_cursor']
+            assert 'total' not in result
+    
+    def test_invalid_cursor(self, app, db_session):
+        """无法解析的游标返回验证错误"""
+        with app.app_context():
+            create_trades(3)
+            
+            with pytest.raises(ValidationError):
+                TradingService.get_trades(per_page=2, cursor='not-a-cursor')
+    
+    def test_cursor_from_other_sort_rejected(self, app, db_session):
+        """游标与当前排序条件不一致时返回验证错误"""
+        with app.app_context():
+            create_trades(5)
+            cursor = TradingService.get_trades(per_page=2, sort_by='price', cursor='')['next_cursor']
+            
+            with pytest.raises(ValidationError):
+                TradingService.get_trades(per_page=2, sort_by='trade_date', cursor=cursor)
+    
+    def test_cursor_round_trip(self):
+        """游标保留排序值类型"""
+        value = datetime(2024, 3, 1, 9, 30)
+        cursor = encode_cursor('trade_date', 'desc', value, 42)
+        
+        assert decode_cursor(cursor, 'trade_date', 'desc') == (value, 42)
+    
+    def test_unknown_sort_field_uses_default(self, app, db_session):
+        """非列的排序字段回退到默认排序字段"""
+        with app.app_context():
+            create_trades(6)
+            
+            result = TradingService.get_trades(per_page=10, sort_by='to_dict', cursor='')
+            
+            assert [trade['id'] for trade in result['trades']] == expected_ids('trade_date', 'desc')
+    
+    def test_approximate_total_cached_until_write(self, app, db_session):
+        """近似总数来自缓存，本进程写入对应表后失效"""
+        with app.app_context():
+            CountCache.invalidate()
+            create_trades(5)
+            
+            result = TradingService.get_trades(per_page=2, cursor='', include_total=True)
+            assert result['total'] == 5
+            assert result['total_is_approximate'] is True
+            
+            # 绕过ORM写入，缓存不会失效
+            db.session.execute(TradeRecord.__table__.delete().where(TradeRecord.id == result['trades'][0]['id']))
+            assert TradingService.get_trades(per_page=2, cursor='', include_total=True)['total'] == 5
+            
+            # 通过ORM写入后重新计数
+            create_trades(2)
+            assert TradingService.get_trades(per_page=2, cursor='', include_total=True)['total'] == 6
+    
+    def test_total_cached_per_filter(self, app, db_session):
+        """不同筛选条件的总数分别缓存"""
+        with app.app_context():
+            CountCache.invalidate()
+            create_trades(14)
+            
+            all_trades = TradingService.get_trades(per_page=2, cursor='', include_total=True)
+            filtered = TradingService.get_trades(
+                filters={'stock_code': '600001'}, per_page=2, cursor='', include_total=True
+            )
+            
+            assert all_trades['total'] == 14
+            assert filtered['total'] == 2
+    
+    def test_stock_pool_cursor(self, app, db_session):
+        """股票池游标分页"""
+        with app.app_context():
+            for i in range(5):
+                StockPool(
+                    stock_code=f'600{i:03d}', stock_name='测试股票', pool_type='watch',
+                    created_at=datetime(2024, 1, 1)
+                ).save()
+            
+            first = StockPoolService.search_stocks({}, per_page=3, cursor='')
+            second = StockPoolService.search_stocks({}, per_page=3, cursor=first['next_cursor'])
+            
+            ids = [item['id'] for item in first['items'] + second['items']]
+            assert len(set(ids)) == 5
+            assert second['has_next'] is False
+    
+    def test_per_page_must_be_positive(self, app, db_session):
+        """每页数量必须大于0"""
+        with app.app_context():
+            with pytest.raises(ValidationError):
+                keyset_paginate(TradeRecord.query, TradeRecord, 'trade_date', 'desc', 0)
+    
+    def test_trades_api_cursor(self, client, db_session):
+        """交易记录接口支持游标参数"""
+        create_trades(3)
+        
+        response = client.get('/api/trades?per_page=2&cursor=&include_total=true')
+        data = response.get_json()['data']
+        
+        assert response.status_code == 200
+        assert len(data['trades']) == 2
+        assert data['total'] == 3
+        
+        response = client.get(f"/api/trades?per_page=2&cursor={data['next_cursor']}")
+        data = response.get_json()['data']
+        assert len(data['trades']) == 1
+        assert data['has_next'] is False
@@ -314,6 +314,17 @@ class TestPriceAPI:
         assert data['error']['code'] == 'VALIDATION_ERROR'
         assert '保留天数必须大于0' in data['error']['message']
     
+    def test_cleanup_cache_non_integer_days(self, client):
+        """测试清理缓存时保留天数不是整数"""
+        for payload in ({'days_to_keep': '90'}, {'days_to_keep': 90, 'weekly_days_to_keep': '730'},
+                        {'days_to_keep': 90, 'weekly_days_to_keep': 30.5}, {'days_to_keep': True}):
+            response = client.post('/api/prices/cache/cleanup', json=payload)
+            
+            assert response.status_code == 400
+            data = response.get_json()
+            assert data['success'] is False
+            assert data['error']['code'] == 'VALIDATION_ERROR'
+    
     def test_get_batch_prices_success(self, client, db_session):
         """测试批量获取股票价格成功"""
         stock_codes = ['000001', '000002']
@@ -7,7 +7,7 @@ from datetime import date, timedelta
 import pandas as pd
 
 from services.price_service import PriceService
-from models.stock_price import StockPrice
+from models.stock_price import StockPrice, StockPriceArchive
 from error_handlers import ValidationError, ExternalAPIError
 
 
@@ -254,6 +254,35 @@ class TestPriceService:
         result = self.price_service.get_latest_price(self.test_stock_code)
         assert result is None
     
+    def test_get_latest_prices_batch(self, db_session):
+        """测试批量获取最新价格"""
+        yesterday = self.today - timedelta(days=1)
+        
+        for stock_code, price, record_date in [
+            ('000001', 10.0, yesterday),
+            ('000001', 10.5, self.today),
+            ('000002', 20.0, yesterday),
+        ]:
+            StockPrice(
+                stock_code=stock_code,
+                stock_name='测试股票',
+                current_price=price,
+                change_percent=0.0,
+                record_date=record_date
+            ).save()
+        
+        result = self.price_service.get_latest_prices(['000001', '000002', '000003'])
+        
+        assert set(result.keys()) == {'000001', '000002'}
+        assert result['000001']['current_price'] == 10.5
+        assert result['000001']['record_date'] == self.today.isoformat()
+        assert result['000002']['current_price'] == 20.0
+    
+    def test_get_latest_prices_invalid_code(self):
+        """测试批量获取最新价格时股票代码无效"""
+        with pytest.raises(ValidationError):
+            self.price_service.get_latest_prices(['000001', 'INVALID'])
+    
     def test_get_price_history_success(self):
         """测试获取价格历史成功"""
         # 创建多个价格记录
@@ -318,6 +347,121 @@ class TestPriceService:
         assert StockPrice.get_price_by_date(self.test_stock_code, old_date) is None
         assert StockPrice.get_price_by_date(self.test_stock_code, recent_date) is not None
     
+    def _save_prices(self, price_by_date):
+        """批量创建价格记录"""
+        for record_date, price in price_by_date.items():
+            StockPrice(
+                stock_code=self.test_stock_code,
+                stock_name=self.test_stock_name,
+                current_price=price,
+                change_percent=0.0,
+                record_date=record_date
+            ).save()
+    
+    def _old_week_dates(self, days_ago):
+        """返回指定天数前所在月份中同一周内的三个连续日期"""
+        month_start = (self.today - timedelta(days=days_ago)).replace(day=1)
+        monday = month_start + timedelta(days=7)
+        monday -= timedelta(days=monday.weekday())
+        return [monday + timedelta(days=i) for i in range(3)]
+    
+    def test_cleanup_old_prices_archives_weekly(self, db_session):
+        """测试旧日线被压缩为周线归档且仍可读取"""
+        old_dates = self._old_week_dates(150)
+        recent_date = self.today - timedelta(days=10)
+        self._save_prices({old_dates[0]: 10.0, old_dates[1]: 12.0, old_dates[2]: 11.0, recent_date: 13.0})
+        
+        result = self.price_service.cleanup_old_prices(90, 730)
+        
+        assert result['deleted_count'] == 3
+        assert result['archived_weekly'] == 1
+        assert result['archived_monthly'] == 0
+        assert StockPrice.get_price_by_date(self.test_stock_code, old_dates[0]) is None
+        
+        archive = StockPriceArchive.query.filter_by(stock_code=self.test_stock_code).one()
+        assert archive.period_type == 'week'
+        assert archive.sample_count == 3
+        assert float(archive.open_price) == 10.0
+        assert float(archive.high_price) == 12.0
+        assert float(archive.low_price) == 10.0
+        assert float(archive.close_price) == 11.0
+        
+        # 读取已归档日期时透明返回周线价格
+        price = self.price_service.get_stock_price(self.test_stock_code, old_dates[1])
+        assert price['granularity'] == 'week'
+        assert price['current_price'] == 11.0
+    
+    def test_cleanup_old_prices_rolls_up_weekly_to_monthly(self, db_session):
+        """测试超过周线保留期的周线归档合并为月线"""
+        old_dates = self._old_week_dates(400)
+        self._save_prices({old_dates[0]: 10.0, old_dates[1]: 9.0})
+        self.price_service.cleanup_old_prices(90, 730)
+        self._save_prices({old_dates[2]: 15.0})
+        
+        result = self.price_service.cleanup_old_prices(90, 180)
+        
+        assert result['archived_monthly'] == 1
+        assert result['rolled_up_weekly'] == 1
+        
+        archive = StockPriceArchive.query.filter_by(stock_code=self.test_stock_code).one()
+        assert archive.period_type == 'month'
+        assert archive.period_start == old_dates[0].replace(day=1)
+        assert archive.sample_count == 3
+        assert float(archive.open_price) == 10.0
+        assert float(archive.low_price) == 9.0
+        assert float(archive.close_price) == 15.0
+    
+    def test_cleanup_old_prices_invalid_retention(self):
+        """测试周线保留期小于日线保留期"""
+        with pytest.raises(ValidationError):
+            self.price_service.cleanup_old_prices(90, 30)
+    
+    def test_get_price_as_of_and_series_across_tiers(self, db_session):
+        """测试估值价格与价格序列跨日线和归档层读取"""
+        old_dates = self._old_week_dates(150)
+        recent_date = self.today - timedelta(days=10)
+        self._save_prices({old_dates[0]: 10.0, old_dates[2]: 11.0, recent_date: 13.0})
+        self.price_service.cleanup_old_prices(90, 730)
+        
+        as_of_old = self.price_service.get_price_as_of(self.test_stock_code, old_dates[2] + timedelta(days=20))
+        assert as_of_old['granularity'] == 'week'
+        assert as_of_old['current_price'] == 11.0
+        
+        as_of_recent = self.price_service.get_price_as_of(self.test_stock_code, self.today)
+        assert as_of_recent['granularity'] == 'day'
+        assert as_of_recent['current_price'] == 13.0
+        
+        series = self.price_service.get_price_series(self.test_stock_code, old_dates[0], self.today)
+        assert [item['granularity'] for item in series] == ['week', 'day']
+        assert [item['current_price'] for item in series] == [11.0, 13.0]
+    
+    def test_get_price_as_of_inside_archived_month(self, db_session):
+        """测试估值日期在月线归档周期中间时不使用晚于估值日期的收盘价"""
+        month_start = (self.today - timedelta(days=400)).replace(day=1)
+        first_day, mid_day, last_day = (month_start + timedelta(days=offset) for offset in (2, 14, 25))
+        self._save_prices({first_day: 10.0, mid_day: 12.0, last_day: 11.0})
+        self.price_service.cleanup_old_prices(90, 180)
+        
+        # 之前没有收盘价时使用该月的开盘价
+        as_of = self.price_service.get_price_as_of(self.test_stock_code, mid_day)
+        assert as_of['granularity'] == 'month'
+        assert as_of['approximate'] is True
+        assert as_of['current_price'] == 10.0
+        assert as_of['record_date'] == first_day.isoformat()
+        
+        # 有上月收盘价时使用上月收盘价
+        self._save_prices({month_start - timedelta(days=5): 9.0})
+        self.price_service.cleanup_old_prices(90, 180)
+        as_of = self.price_service.get_price_as_of(self.test_stock_code, mid_day)
+        assert as_of['approximate'] is True
+        assert as_of['current_price'] == 9.0
+        assert as_of['record_date'] < first_day.isoformat()
+        
+        # 估值日期为该月最后交易日时使用该月收盘价
+        as_of = self.price_service.get_price_as_of(self.test_stock_code, last_day)
+        assert as_of['approximate'] is False
+        assert as_of['current_price'] == 11.0
+    
     def test_get_cache_status_success(self):
         """测试获取缓存状态成功"""
         stock_codes = ['000001', '000002', 'INVALID']
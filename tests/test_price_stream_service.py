@@ -0,0 +1,115 @@
+"""
+价格推送服务测试
+"""
+import json
+import pytest
+from unittest.mock import patch
+from datetime import date, datetime
+
+from services.price_stream_service import PriceStreamService
+from models.trade_record import TradeRecord
+from models.stock_price import StockPrice
+
+
+def parse_event(message):
+    """解析SSE消息为 (事件类型, 数据)"""
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+class TestPriceStreamService:
+    """价格推送服务测试类"""
+    
+    @pytest.fixture(autouse=True)
+    def reset_stream(self):
+        PriceStreamService.reset()
+        yield
+        PriceStreamService.reset()
+    
+    def _buy(self, stock_code, stock_name, price, quantity):
+        TradeRecord(
+            stock_code=stock_code, stock_name=stock_name, trade_type='buy',
+            price=price, quantity=quantity, trade_date=datetime(2024, 1, 2), reason='测试'
+        ).save()
+    
+    def test_poll_once_fans_out_single_computation(self, db_session):
+        """测试多个客户端共享同一次计算结果"""
+        self._buy('000001', '平安银行', 10.0, 100)
+        StockPrice.update_or_create('000001', '平安银行', 11.0, 1.5, date.today())
+        subscribers = [PriceStreamService.subscribe() for _ in range(3)]
+        
+        with patch.object(PriceStreamService, '_build_snapshot',
+                          wraps=PriceStreamService._build_snapshot) as mock_build:
+            assert PriceStreamService.poll_once() is True
+        
+        assert mock_build.call_count == 1
+        messages = [subscriber.get_nowait() for subscriber in subscribers]
+        assert len(set(messages)) == 1
+        
+        event_type, data = parse_event(messages[0])
+        assert event_type == 'snapshot'
+        assert data['prices']['000001']['current_price'] == 11.0
+        holding = data['holdings'][0]
+        assert holding['floating_profit_amount'] == pytest.approx(1.0)
+        assert holding['floating_profit_total'] == pytest.approx(100.0)
+        assert holding['floating_profit_ratio'] == pytest.approx(0.1)
+    
+    def test_poll_once_skips_when_version_unchanged(self, db_session):
+        """测试数据未变化时不重复计算"""
+        self._buy('000001', '平安银行', 10.0, 100)
+        PriceStreamService.poll_once()
+        
+        with patch.object(PriceStreamService, '_build_snapshot') as mock_build:
+            assert PriceStreamService.poll_once() is False
+        
+        mock_build.assert_not_called()
+    
+    def test_update_event_contains_only_changed_prices(self, db_session):
+        """测试增量事件只包含变化的价格"""
+        self._buy('000001', '平安银行', 10.0, 100)
+        self._buy('000002', '万科A', 20.0, 100)
+        StockPrice.update_or_create('000001', '平安银行', 11.0, 1.0, date.today())
+        StockPrice.update_or_create('000002', '万科A', 21.0, 1.0, date.today())
+        subscriber = PriceStreamService.subscribe()
+        PriceStreamService.poll_once()
+        subscriber.get_nowait()
+        
+        StockPrice.update_or_create('000002', '万科A', 19.0, -5.0, date.today())
+        assert PriceStreamService.poll_once() is True
+        
+        event_type, data = parse_event(subscriber.get_nowait())
+        assert event_type == 'update'
+        assert list(data['prices']) == ['000002']
+        assert len(data['holdings']) == 2
+    
+    def test_new_subscriber_receives_cached_snapshot(self, db_session):
+        """测试新连接直接获得最近一次快照"""
+        self._buy('000001', '平安银行', 10.0, 100)
+        PriceStreamService.poll_once()
+        
+        subscriber = PriceStreamService.subscribe()
+        
+        event_type, data = parse_event(subscriber.get_nowait())
+        assert event_type == 'snapshot'
+        assert data['holdings'][0]['stock_code'] == '000001'
+    
+    def test_slow_subscriber_keeps_latest_event(self):
+        """测试慢客户端队列满时丢弃旧事件"""
+        subscriber = PriceStreamService.subscribe()
+        for i in range(PriceStreamService.SUBSCRIBER_QUEUE_SIZE + 2):
+            PriceStreamService._publish(f'event-{i}', 'snapshot')
+        
+        events = [subscriber.get_nowait() for _ in range(subscriber.qsize())]
+        assert len(events) == PriceStreamService.SUBSCRIBER_QUEUE_SIZE
+        assert events[-1] == f'event-{PriceStreamService.SUBSCRIBER_QUEUE_SIZE + 1}'
+    
+    def test_stream_heartbeat_and_unsubscribe(self):
+        """测试空闲连接发送心跳，断开后注销"""
+        subscriber = PriceStreamService.subscribe()
+        stream = PriceStreamService.stream(subscriber, heartbeat_interval=0.01)
+        
+        assert next(stream).startswith('retry:')
+        assert next(stream) == ': keep-alive\n\n'
+        
+        stream.close()
+        assert PriceStreamService.subscriber_count() == 0
@@ -0,0 +1,78 @@
+"""
+交易记录只读查询测试
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from extensions import db
+from models.trade_record import TradeRecord
+from models.read_models import TradeReadModel, TradeRow
+from services.analytics_service import AnalyticsService
+from services.historical_trade_service import HistoricalTradeService
+from services.expectation_comparison_service import ExpectationComparisonService
+from services.trade_pair_analyzer import TradePairAnalyzer
+
+
+def create_trade(stock_code, trade_type, price, quantity, trade_date, **kwargs):
+    """创建交易记录"""
+    return TradeRecord(
+        stock_code=stock_code, stock_name='测试股票', trade_type=trade_type, price=price,
+        quantity=quantity, trade_date=trade_date, reason='少妇B1战法', **kwargs
+    ).save()
+
+
+class TestTradeReadModel:
+    """交易记录行查询测试"""
+    
+    def test_rows_match_orm_records(self, db_session):
+        """行数据与 ORM 记录一致，价格为整数分"""
+        create_trade('600002', 'buy', 10.07, 300, datetime(2024, 3, 4))
+        create_trade('600001', 'buy', 19.99, 100, datetime(2024, 3, 2))
+        create_trade('600001', 'sell', 21.3, 100, datetime(2024, 3, 1))
+        
+        rows = TradeReadModel.load_trades()
+        records = TradeRecord.query.order_by(TradeRecord.stock_code, TradeRecord.trade_date).all()
+        
+        assert all(isinstance(row, TradeRow) for row in rows)
+        assert [row.id for row in rows] == [record.id for record in records]
+        for row, record in zip(rows, records):
+            assert type(row.price_fen) is int
+            assert row.price == record.price
+            assert row.amount_fen == int(record.price * 100) * record.quantity
+            assert (row.stock_code, row.trade_type, row.quantity, row.trade_date) == (
+                record.stock_code, record.trade_type, record.quantity, record.trade_date
+            )
+    
+    def test_filters(self, db_session):
+        """默认排除已订正记录，支持按股票和附加条件过滤"""
+        corrected = create_trade('600001', 'buy', 10.0, 100, datetime(2024, 3, 1))
+        corrected.is_corrected = True
+        corrected.save()
+        create_trade('600001', 'buy', 10.5, 100, datetime(2024, 3, 1))
+        create_trade('600002', 'buy', 11.0, 100, datetime(2024, 4, 1))
+        
+        assert len(TradeReadModel.load_trades()) == 2
+        assert len(TradeReadModel.load_trades(include_corrected=True)) == 3
+        assert [row.stock_code for row in TradeReadModel.load_trades(stock_codes=['600002', '600003'])] == ['600002']
+        assert [row.price_fen for row in TradeReadModel.load_trades(
+            TradeRecord.trade_date < datetime(2024, 4, 1)
+        )] == [1050]
+    
+    def test_analytics_do_not_hydrate_orm_objects(self, db_session):
+        """统计分析查询不创建 ORM 对象"""
+        create_trade('600001', 'buy', 10.0, 1000, datetime(2025, 9, 1))
+        create_trade('600001', 'sell', 11.0, 1000, datetime(2025, 9, 8), sell_ratio=1.0)
+        create_trade('600002', 'buy', 20.0, 500, datetime(2025, 9, 1))
+        db.session.expunge_all()
+        
+        completed = HistoricalTradeService.identify_completed_trades()
+        pairs = TradePairAnalyzer.analyze_completed_trades()
+        trades = ExpectationComparisonService._get_trades_by_time_range('all')
+        statistics = AnalyticsService.get_overall_statistics()
+        
+        assert len(db.session.identity_map) == 0
+        assert [trade['total_return'] for trade in completed] == [1000.0]
+        assert pairs[0]['profit'] == Decimal('1000')
+        assert len(trades) == 3 and all(isinstance(trade, TradeRow) for trade in trades)
+        assert statistics['realized_profit'] == 1000.0
+        assert statistics['total_buy_count'] == 2
@@ -6,6 +6,7 @@ from datetime import date, datetime, timedelta
 from services.review_service import ReviewService, HoldingService
 from models.review_record import ReviewRecord
 from models.trade_record import TradeRecord
+from models.non_trading_day import NonTradingDay
 from error_handlers import ValidationError, NotFoundError, DatabaseError
 
 
@@ -308,6 +309,77 @@ class TestHoldingService:
         holdings = HoldingService.get_current_holdings()
         assert holdings == []
     
+    def _count_holdings_queries(self, stock_count):
+        """创建指定数量的持仓并统计 get_current_holdings 执行的SQL语句数"""
+        from unittest.mock import patch
+        from sqlalchemy import event
+        from extensions import db
+        
+        for i in range(stock_count):
+            stock_code = f'{600000 + i:06d}'
+            TradeRecord(
+                stock_code=stock_code, stock_name=f'股票{i}', trade_type='buy',
+                price=10.0, quantity=1000, trade_date=datetime(2024, 1, 10), reason='买入原因'
+            ).save()
+            TradeRecord(
+                stock_code=stock_code, stock_name=f'股票{i}', trade_type='sell',
+                price=11.0, quantity=200, trade_date=datetime(2024, 1, 12), reason='部分止盈'
+            ).save()
+            ReviewService.create_review({'stock_code': stock_code, 'review_date': date(2024, 1, 15)})
+        
+        statements = []
+        
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        HoldingService._price_cache.clear()
+        HoldingService._cache_timestamp = None
+        NonTradingDay.invalidate_calendar()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            with patch('services.price_service.PriceService.refresh_multiple_stocks',
+                       return_value={'results': [], 'errors': []}) as mock_refresh:
+                holdings = HoldingService.get_current_holdings()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+        
+        assert len(holdings) == stock_count
+        assert mock_refresh.call_count == 1
+        return len(statements)
+    
+    def test_get_current_holdings_constant_queries(self, app, db_session):
+        """测试持仓数量增加时查询次数保持不变"""
+        single_queries = self._count_holdings_queries(1)
+        db_session.query(ReviewRecord).delete()
+        db_session.query(TradeRecord).delete()
+        db_session.commit()
+        
+        many_queries = self._count_holdings_queries(8)
+        
+        assert many_queries == single_queries
+    
+    def test_get_current_holdings_start_after_full_exit(self, app, db_session):
+        """测试清仓后重新买入时持仓从新买入日期开始计算"""
+        trades = [
+            ('buy', 1000, datetime(2024, 1, 10)),
+            ('sell', 1000, datetime(2024, 1, 12)),
+            ('buy', 500, datetime(2024, 2, 1)),
+        ]
+        for trade_type, quantity, trade_date in trades:
+            TradeRecord(
+                stock_code='000001', stock_name='平安银行', trade_type=trade_type,
+                price=12.50, quantity=quantity, trade_date=trade_date, reason='测试'
+            ).save()
+        
+        holdings = HoldingService.get_current_holdings()
+        
+        assert len(holdings) == 1
+        assert holdings[0]['current_quantity'] == 500
+        assert holdings[0]['first_buy_date'].startswith('2024-02-01')
+        assert holdings[0]['actual_holding_days'] == NonTradingDay.calculate_trading_days(
+            date(2024, 2, 1), date.today()
+        )
+    
     def test_get_holding_by_stock(self, app, db_session):
         """测试获取特定股票的持仓信息"""
         # 创建买入记录
@@ -0,0 +1,189 @@
+"""
+全文检索测试
+"""
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+
+from extensions import db
+from models.trade_record import TradeRecord
+from models.review_record import ReviewRecord
+from models.case_study import CaseStudy
+from models.stock_pool import StockPool
+from models.search_index import SearchIndex
+from services.search_service import SearchService
+from services.case_service import CaseService
+from services.stock_pool_service import StockPoolService
+from services.trading_service import TradingService
+from error_handlers import ValidationError
+
+
+def create_trade(stock_code, stock_name, reason='少妇B1战法', notes=None):
+    """创建买入记录"""
+    return TradeRecord(
+        stock_code=stock_code, stock_name=stock_name, trade_type='buy', price=10.0,
+        quantity=100, trade_date=datetime(2024, 3, 1), reason=reason, notes=notes
+    ).save()
+
+
+@pytest.fixture
+def search_data(db_session):
+    """各类型的检索数据"""
+    create_trade('600301', '平安银行', notes='放量突破平台，均线多头排列')
+    create_trade('600302', '招商银行', notes='缩量回踩均线')
+    create_trade('600303', '贵州茅台', notes='放量突破 放量突破 再次放量突破')
+    ReviewRecord(
+        stock_code='600301', review_date=date(2024, 3, 5), analysis='放量突破后继续持有', decision='hold'
+    ).save()
+    CaseStudy(
+        stock_code='600301', title='平安银行突破案例', image_path='cases/a.png',
+        tags=['突破', '银行'], notes='日线级别放量突破'
+    ).save()
+    CaseStudy(
+        stock_code='600304', title='高位回落', image_path='cases/b.png', tags=['回落'], notes='顶部放量'
+    ).save()
+    StockPool(stock_code='600305', stock_name='宁波银行', pool_type='watch', add_reason='等待放量突破').save()
+    return db_session
+
+
+class TestSearchIndex:
+    """全文索引同步与查询测试"""
+    
+    def test_index_created_with_tables(self, app):
+        """建表时同时建立全文索引"""
+        with app.app_context():
+            assert SearchIndex.is_available() is True
+    
+    def test_triggers_keep_index_in_sync(self, db_session):
+        """新增、修改、删除源表记录时索引同步更新"""
+        trade = create_trade('600311', '平安银行')
+        assert [hit[0] for hit in SearchIndex.search('trades', '平安银行')] == [trade.id]
+        
+        trade.stock_name = '招商银行'
+        db.session.commit()
+        assert SearchIndex.search('trades', '平安银行') == []
+        assert [hit[0] for hit in SearchIndex.search('trades', '招商银行')] == [trade.id]
+        
+        db.session.delete(trade)
+        db.session.commit()
+        assert SearchIndex.search('trades', '招商银行') == []
+    
+    def test_terms_must_all_match(self, search_data):
+        """多个词须同时出现，短词同样参与过滤"""
+        ids = [hit[0] for hit in SearchIndex.search('trades', '放量突破 平安')]
+        names = [db.session.get(TradeRecord, trade_id).stock_name for trade_id in ids]
+        
+        assert names == ['平安银行']
+    
+    def test_short_term_search(self, search_data):
+        """少于3个字符的词使用LIKE匹配"""
+        ids = [hit[0] for hit in SearchIndex.search('trades', '银行')]
+        
+        assert len(ids) == 2
+    
+    def test_ranked_by_relevance(self, search_data):
+        """按 bm25 相关度排序"""
+        hits = SearchIndex.search('trades', '放量突破')
+        names = [db.session.get(TradeRecord, trade_id).stock_name for trade_id, _ in hits]
+        
+        assert names == ['贵州茅台', '平安银行']
+        assert hits[0][1] > hits[1][1]
+    
+    def test_like_filter_uses_index(self, db_session):
+        """足够长的LIKE模式在索引表上匹配"""
+        long_filter = SearchIndex.like_filter(TradeRecord, 'trades', 'stock_name', '%平安银%')
+        short_filter = SearchIndex.like_filter(TradeRecord, 'trades', 'stock_name', '%平安%')
+        
+        assert 'trade_records_fts' in str(long_filter.compile())
+        assert 'trade_records_fts' not in str(short_filter.compile())
+
+
+class TestSearchFilters:
+    """列表筛选使用全文索引后的结果与 LIKE 一致"""
+    
+    @pytest.mark.parametrize('keyword', ['放量', '放量突破', '600301', '银行', 'PNG'])
+    def test_case_keyword_search_matches_like(self, search_data, keyword):
+        """案例关键词检索"""
+        expected = CaseStudy.query.filter(db.or_(
+            CaseStudy.title.like(f'%{keyword}%'),
+            CaseStudy.notes.like(f'%{keyword}%'),
+            CaseStudy.stock_code.like(f'%{keyword}%'),
+            CaseStudy.tags.like(f'%{keyword}%')
+        )).all()
+        
+        result = CaseService().search_cases(keyword=keyword)
+        
+        assert sorted(case['id'] for case in result['cases']) == sorted(case.id for case in expected)
+        assert sorted(case.id for case in CaseStudy.search_by_keyword(keyword)) == sorted(case.id for case in expected)
+    
+    def test_case_tag_filter(self, search_data):
+        """案例标签筛选"""
+        result = CaseService().search_cases(tags=['突破'])
+        
+        assert [case['title'] for case in result['cases']] == ['平安银行突破案例']
+        assert [case.title for case in CaseStudy.get_by_tag('回落')] == ['高位回落']
+    
+    def test_stock_pool_name_filter(self, search_data):
+        """股票池名称和加入理由筛选"""
+        assert StockPoolService.search_stocks({'stock_name': '宁波银'})['total'] == 1
+        assert StockPoolService.search_stocks({'add_reason': '放量突破'})['total'] == 1
+        assert StockPoolService.search_stocks({'stock_name': '平安银行'})['total'] == 0
+    
+    def test_trade_name_filter(self, search_data):
+        """交易记录股票名称筛选"""
+        result = TradingService.get_trades(filters={'stock_name': '招商银行'})
+        
+        assert [trade['stock_code'] for trade in result['trades']] == ['600302']
+
+
+class TestSearchService:
+    """统一检索服务测试"""
+    
+    def test_search_across_types(self, search_data):
+        """跨类型检索并统计各类型命中数"""
+        result = SearchService.search('放量突破')
+        
+        assert result['counts'] == {
+            'trades': 2, 'reviews': 1, 'cases': 1, 'stocks': 1, 'historical_trades': 0
+        }
+        assert {item['type'] for item in result['items']} == {'trades', 'reviews', 'cases', 'stocks'}
+        scores = [item['score'] for item in result['items']]
+        assert scores == sorted(scores, reverse=True)
+        assert result['full_text_index'] is True
+    
+    def test_search_selected_types_with_limit(self, search_data):
+        """按类型和数量限制检索"""
+        result = SearchService.search('银行', types=['trades', 'stocks'], limit=2)
+        
+        assert len(result['items']) == 2
+        assert set(result['counts']) == {'trades', 'stocks'}
+    
+    def test_search_without_index_falls_back_to_like(self, search_data):
+        """索引不可用时使用LIKE检索"""
+        with patch.object(SearchIndex, 'is_available', return_value=False):
+            result = SearchService.search('放量突破', types=['trades'])
+        
+        assert result['counts'] == {'trades': 2}
+        assert result['full_text_index'] is False
+    
+    @pytest.mark.parametrize('kwargs', [
+        {'query': '  '},
+        {'query': '银行', 'types': ['unknown']},
+        {'query': '银行', 'limit': 0},
+    ])
+    def test_search_validation(self, db_session, kwargs):
+        """检索参数验证"""
+        with pytest.raises(ValidationError):
+            SearchService.search(**kwargs)
+    
+    def test_search_api(self, client, search_data):
+        """统一检索接口"""
+        response = client.get('/api/search?q=放量突破&types=trades,cases')
+        data = response.get_json()
+        
+        assert response.status_code == 200
+        assert data['data']['counts'] == {'trades': 2, 'cases': 1}
+        assert data['data']['items'][0]['record']['stock_name'] == '贵州茅台'
+        
+        response = client.get('/api/search?q=')
+        assert response.status_code == 400
@@ -0,0 +1,137 @@
+"""
+板块排名动量矩阵测试
+"""
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import event
+
+from extensions import db
+from models.sector_data import SectorData
+from services.sector_analytics_engine import SectorAnalyticsEngine, SectorMatrix
+from services.sector_service import SectorAnalysisService
+
+
+def _add_sectors(db_session, ranks_by_sector, end_date=None):
+    """按 {板块: [最新, 前1天, ...] 的排名} 写入板块数据，None 表示当天没有数据"""
+    end_date = end_date or date.today()
+    for sector_name, ranks in ranks_by_sector.items():
+        for offset, rank in enumerate(ranks):
+            if rank is not None:
+                db_session.add(SectorData(
+                    sector_name=sector_name, change_percent=10 - rank / 10,
+                    record_date=end_date - timedelta(days=offset), rank_position=rank
+                ))
+    db_session.commit()
+
+
+class TestSectorMatrix:
+    """板块矩阵计算测试"""
+    
+    def test_trends_match_per_sector_rule(self):
+        """趋势按最近7天有排名的记录新旧两段比较"""
+        end_date = date(2025, 9, 10)
+        rows = []
+        for offset in range(5):
+            record_date = end_date - timedelta(days=offset)
+            rows.append(('上升', record_date, 6 + offset, 1.0))
+            rows.append(('下降', record_date, 5 - offset, 1.0))
+            rows.append(('稳定', record_date, 5, 1.0))
+        rows.append(('单日', end_date, 1, 1.0))
+        # 超出趋势窗口的记录不参与趋势计算
+        rows.append(('稳定', end_date - timedelta(days=20), 50, 1.0))
+        
+        matrix = SectorMatrix.from_rows(end_date - timedelta(days=30), end_date, rows)
+        trends = dict(zip(matrix.sectors, matrix.trends(30)))
+        
+        assert trends == {'上升': 'up', '下降': 'down', '稳定': 'stable', '单日': 'stable'}
+    
+    def test_momentum_rank_change_and_streak(self):
+        """排名变化、连续上榜天数和排序"""
+        end_date = date(2025, 9, 10)
+        rows = [
+            ('A', end_date, 1, 3.0), ('A', end_date - timedelta(days=1), 4, 1.0), ('A', end_date - timedelta(days=2), 2, 2.0),
+            ('B', end_date, 2, 2.0), ('B', end_date - timedelta(days=1), 1, 4.0), ('B', end_date - timedelta(days=2), 9, -1.0),
+            ('C', end_date - timedelta(days=1), 3, 0.5),
+        ]
+        
+        momentum = SectorMatrix.from_rows(end_date - timedelta(days=10), end_date, rows).momentum(top_k=3, days=10)
+        
+        assert [item['sector_name'] for item in momentum] == ['A', 'B', 'C']
+        a, b, c = momentum
+        assert (a['latest_rank'], a['previous_rank'], a['rank_change']) == (1, 4, 3)
+        assert (a['top_k_streak'], a['top_k_appearances'], a['best_rank']) == (1, 2, 1)
+        assert a['avg_change_percent'] == 2.0
+        assert (b['rank_change'], b['top_k_streak'], b['avg_rank']) == (-1, 2, 4.0)
+        assert c['latest_rank'] is None and c['rank_change'] is None and c['top_k_streak'] == 0
+    
+    def test_empty_matrix(self):
+        """没有数据时返回空结果"""
+        matrix = SectorMatrix.from_rows(date(2025, 9, 1), date(2025, 9, 10), [])
+        
+        assert matrix.top_performers(10, 10) == []
+        assert matrix.momentum(10, 10) == []
+        assert matrix.summary(10)['total_records'] == 0
+
+
+class TestSectorAnalyticsEngine:
+    """板块矩阵缓存测试"""
+    
+    def test_dashboard_uses_one_query(self, app, db_session):
+        """TOPK、动量、汇总和趋势共用一次查询载入的矩阵"""
+        with app.app_context():
+            _add_sectors(db_session, {'电子信息': [1, 1, 2], '新能源汽车': [2, 3, 1], '医疗器械': [3, 2, 3]})
+            
+            statements = []
+            
+            def count_statement(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+            
+            event.listen(db.engine, 'before_cursor_execute', count_statement)
+            try:
+                top_performers = SectorAnalysisService.get_top_performers(days=7, top_k=2)
+                momentum = SectorAnalysisService.get_sector_momentum(days=7, top_k=2)
+                summary = SectorAnalysisService.get_sector_analysis_summary(days=7)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count_statement)
+            
+            assert len(statements) == 1
+            assert [p['sector_name'] for p in top_performers] == ['电子信息', '新能源汽车', '医疗器械']
+            assert top_performers[0]['appearances'] == 3
+            assert momentum[0]['sector_name'] == '电子信息'
+            assert summary['total_records'] == 9
+            assert summary['data_days'] == 3
+    
+    def test_cache_invalidated_by_writes(self, app, db_session):
+        """ORM写入和批量刷新后缓存失效"""
+        with app.app_context():
+            _add_sectors(db_session, {'电子信息': [1]})
+            matrix = SectorAnalyticsEngine.get_matrix(7)
+            assert SectorAnalyticsEngine.get_matrix(7) is matrix
+            
+            _add_sectors(db_session, {'新能源汽车': [2]})
+            matrix = SectorAnalyticsEngine.get_matrix(7)
+            assert list(matrix.sectors) == ['新能源汽车', '电子信息']
+            
+            SectorAnalysisService._save_sector_frame(date.today(), pd.DataFrame({
+                'sector_name': ['医疗器械'], 'sector_code': [''], 'change_percent': [1.0],
+                'volume': pd.array([None], dtype='Int64'), 'rank_position': [1], 'market_cap': [None]
+            }))
+            assert list(SectorAnalyticsEngine.get_matrix(7).sectors) == ['医疗器械']
+    
+    def test_momentum_api(self, client, app, db_session):
+        """板块排名动量接口"""
+        with app.app_context():
+            _add_sectors(db_session, {'电子信息': [1, 2], '新能源汽车': [2, 1]})
+            
+            response = client.get('/api/sectors/momentum?days=7&top_k=1')
+            
+            assert response.status_code == 200
+            data = response.get_json()
+            assert data['meta']['count'] == 2
+            assert data['data'][0]['sector_name'] == '电子信息'
+            assert data['data'][0]['rank_change'] == 1
+            assert data['data'][0]['top_k_streak'] == 1
+            
+            response = client.get('/api/sectors/momentum?days=0')
+            assert response.status_code == 400
@@ -108,6 +108,61 @@ class TestSectorAnalysisService:
             assert result['count'] == 0
             assert '未获取到板块数据' in result['message']
     
+    def test_clean_sector_frame(self, service):
+        """测试向量化清洗：无效行被过滤，空值和负数置空，排名连续"""
+        raw_df = pd.DataFrame({
+            '板块名称': ['电子信息', '', '新能源汽车', '电子信息', '医疗器械', None],
+            '板块代码': ['BK0727', 'BK0001', None, 'BK0727', 'BK0726', 'BK0002'],
+            '涨跌幅': [5.234, 1.0, '2.10', 4.0, 'invalid', 3.0],
+            '成交量': [1000000, 1, None, 1, 2, 3],
+            '总市值': [500000000.0, 1.0, -1.0, 1.0, 2.0, 3.0]
+        })
+        
+        sectors = service._clean_sector_frame(raw_df)
+        
+        assert sectors['sector_name'].tolist() == ['电子信息', '新能源汽车']
+        assert sectors['sector_code'].tolist() == ['BK0727', '']
+        assert sectors['change_percent'].tolist() == [5.23, 2.10]
+        assert sectors['rank_position'].tolist() == [1, 2]
+        assert sectors['volume'].iloc[0] == 1000000
+        assert pd.isna(sectors['volume'].iloc[1])
+        assert pd.isna(sectors['market_cap'].iloc[1])
+    
+    def test_refresh_sector_data_upserts_trading_date(self, service, mock_akshare_data, db_session):
+        """测试重复刷新同一交易日时按板块覆盖，不再出现的板块被删除，排名快照同步更新"""
+        trading_date = date(2025, 9, 5)
+        refreshed_df = pd.DataFrame({
+            '板块名称': ['新能源汽车', '电子信息'],
+            '板块代码': ['BK0733', 'BK0727'],
+            '涨跌幅': [6.00, 1.00],
+            '成交量': [None, 2000000],
+            '总市值': [600000000.0, None]
+        })
+        
+        with patch('services.sector_service.get_trading_date', return_value=trading_date):
+            with patch('akshare.stock_board_industry_name_em', return_value=mock_akshare_data):
+                service.refresh_sector_data()
+            with patch('akshare.stock_board_industry_name_em', return_value=refreshed_df):
+                result = service.refresh_sector_data()
+        
+        assert result['success'] is True
+        assert result['count'] == 2
+        assert result['updated'] is True
+        
+        sectors = SectorData.get_by_date(trading_date)
+        assert [(s.sector_name, s.rank_position, float(s.change_percent)) for s in sectors] == [
+            ('新能源汽车', 1, 6.00), ('电子信息', 2, 1.00)
+        ]
+        assert sectors[0].volume is None
+        assert sectors[1].market_cap is None
+        
+        ranking = SectorRanking.get_by_date(trading_date)
+        assert ranking.total_sectors == 2
+        assert ranking.ranking_list == [
+            {'rank': 1, 'sector_name': '新能源汽车', 'change_percent': 6.0, 'volume': None, 'market_cap': 600000000.0},
+            {'rank': 2, 'sector_name': '电子信息', 'change_percent': 1.0, 'volume': 2000000, 'market_cap': None}
+        ]
+    
     def test_get_sector_ranking_with_date(self, service, sample_sector_data, db_session):
         """测试获取指定日期的板块排名"""
         # 添加测试数据
@@ -0,0 +1,184 @@
+"""
+模型序列化测试
+"""
+import json
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from models.trade_record import TradeRecord
+from models.historical_trade import HistoricalTrade
+from models.sector_data import SectorData
+from models.review_record import ReviewRecord
+from services.trading_service import TradingService
+from services.historical_trade_service import HistoricalTradeService
+from utils import serialization
+from utils.serialization import FastJSONProvider, get_serializer, parse_fields
+from error_handlers import ValidationError
+
+
+def create_trades(count=5):
+    """创建买入记录"""
+    return [
+        TradeRecord(
+            stock_code=f'6000{i:02d}', stock_name=f'股票{i}', trade_type='buy', price=10.5 + i,
+            quantity=100, trade_date=datetime(2024, 3, 1 + i, 9, 30), reason='少妇B1战法',
+            stop_loss_price=9.5, take_profit_ratio=0.2, sell_ratio=0.5
+        ).save()
+        for i in range(count)
+    ]
+
+
+class TestModelSerializer:
+    """序列化器测试"""
+    
+    def test_matches_column_conversion_rules(self, db_session):
+        """DateTime 转ISO字符串，声明转换的 Numeric 转 float"""
+        trade = create_trades(1)[0]
+        result = trade.to_dict()
+        
+        assert result['trade_date'] == '2024-03-01T09:30:00'
+        assert result['created_at'] == trade.created_at.isoformat()
+        assert isinstance(result['price'], float) and result['price'] == 10.5
+        assert result['take_profit_ratio'] == 0.2
+        assert result['notes'] is None
+        assert result['use_batch_profit_taking'] is False
+        assert set(column.name for column in TradeRecord.__table__.columns) <= set(result)
+    
+    def test_date_columns(self, db_session):
+        """声明转换的 Date 列转ISO字符串"""
+        sector = SectorData(
+            sector_name='银行', change_percent=Decimal('1.25'), record_date=date(2024, 3, 1), rank_position=1
+        )
+        
+        result = sector.to_dict()
+        
+        assert result['record_date'] == '2024-03-01'
+        assert result['change_percent'] == 1.25
+        assert result['market_cap'] is None
+    
+    def test_unlisted_columns_not_converted(self):
+        """未列出的 Numeric / Date 列保持原值"""
+        review = ReviewRecord(
+            stock_code='600000', review_date=date(2024, 3, 1), current_price=Decimal('10.50'), holding_days=1
+        )
+        
+        result = get_serializer(ReviewRecord).serialize(review)
+        
+        assert result['review_date'] == date(2024, 3, 1)
+        assert result['current_price'] == Decimal('10.50')
+    
+    def test_serializer_compiled_once(self):
+        """同一模型和字段组合复用序列化器"""
+        assert get_serializer(TradeRecord) is get_serializer(TradeRecord)
+        assert get_serializer(TradeRecord, ('id', 'price')) is get_serializer(TradeRecord, ['id', 'price'])
+        assert get_serializer(TradeRecord, ('id', 'price')) is not get_serializer(TradeRecord)
+    
+    def test_parse_fields(self):
+        """字段解析总是包含 id，无效字段报错"""
+        assert parse_fields(TradeRecord, None) is None
+        assert parse_fields(TradeRecord, ' , ') is None
+        assert parse_fields(TradeRecord, 'price, stock_code,price') == ('id', 'price', 'stock_code')
+        with pytest.raises(ValidationError):
+            parse_fields(TradeRecord, 'price,profit_targets')
+
+
+class TestSparseFieldsets:
+    """列表接口的 fields 参数测试"""
+    
+    def test_trades_projected_columns(self, db_session):
+        """只查询并返回指定列"""
+        create_trades()
+        
+        with patch.object(TradeRecord, 'to_dict') as to_dict:
+            result = TradingService.get_trades(fields='stock_code,price', page=1, per_page=3)
+        
+        to_dict.assert_not_called()
+        assert result['total'] == 5
+        assert result['trades'][0] == {'id': result['trades'][0]['id'], 'stock_code': '600004', 'price': 14.5}
+    
+    def test_keyset_pages_without_sort_column_in_fields(self, db_session):
+        """游标分页时排序列不在 fields 中也能翻页"""
+        create_trades()
+        
+        first = TradingService.get_trades(fields='stock_code', per_page=2, cursor='', sort_by='trade_date')
+        second = TradingService.get_trades(
+            fields='stock_code', per_page=2, cursor=first['next_cursor'], sort_by='trade_date'
+        )
+        
+        assert [trade['stock_code'] for trade in first['trades'] + second['trades']] == [
+            '600004', '600003', '600002', '600001'
+        ]
+        assert set(first['trades'][0]) == {'id', 'stock_code'}
+    
+    def test_historical_trades_fields(self, db_session):
+        """历史交易按字段返回，并在有买卖日期时补充持仓交易日数"""
+        HistoricalTrade(
+            stock_code='600000', stock_name='浦发银行', buy_date=datetime(2024, 3, 1), sell_date=datetime(2024, 3, 8),
+            holding_days=7, total_investment=1000, total_return=100, return_rate=0.1, completion_date=datetime(2024, 3, 8)
+        ).save()
+        
+        narrow = HistoricalTradeService.get_historical_trades(fields=['return_rate'])['trades'][0]
+        dated = HistoricalTradeService.get_historical_trades(fields='buy_date,sell_date')['trades'][0]
+        
+        assert set(narrow) == {'id', 'return_rate'} and narrow['return_rate'] == 0.1
+        assert dated['buy_date'] == '2024-03-01T00:00:00'
+        assert 'trading_holding_days' in dated
+    
+    def test_trades_api_fields(self, client, db_session):
+        """接口支持 fields 参数，无效字段返回400"""
+        create_trades(2)
+        
+        response = client.get('/api/trades?fields=stock_code,trade_date&sort_order=asc&page=1&per_page=10')
+        data = response.get_json()
+        
+        assert response.status_code == 200
+        assert data['data']['trades'][0] == {
+            'id': data['data']['trades'][0]['id'], 'stock_code': '600000', 'trade_date': '2024-03-01T09:30:00'
+        }
+        assert client.get('/api/trades?fields=unknown').status_code == 400
+
+
+class TestFastJSONProvider:
+    """JSON 编码测试"""
+    
+    PAYLOAD = {
+        'b': [Decimal('1.50'), date(2024, 3, 1), datetime(2024, 3, 1, 9, 30)],
+        'a': {'名称': '平安银行', 'empty': None, 'ok': True, 'rate': 0.125},
+    }
+    
+    def test_same_data_as_default_provider(self):
+        """解析后的数据与 Flask 默认提供者一致"""
+        app = Flask('json_test')
+        fast = FastJSONProvider(app)
+        default = DefaultJSONProvider(app)
+        
+        with app.app_context():
+            assert json.loads(fast.dumps(self.PAYLOAD)) == json.loads(default.dumps(self.PAYLOAD))
+            assert fast.response(self.PAYLOAD).get_json() == default.response(self.PAYLOAD).get_json()
+            assert '平安银行' in fast.response(self.PAYLOAD).get_data(as_text=True)
+    
+    def test_encoding_differences(self):
+        """orjson 直接输出UTF-8，NaN / Infinity 输出为 null"""
+        app = Flask('json_test')
+        fast = FastJSONProvider(app)
+        payload = {'name': '平安银行', 'values': [float('nan'), float('inf')]}
+        
+        with app.app_context():
+            assert json.loads(fast.dumps(payload)) == {'name': '平安银行', 'values': [None, None]}
+            assert '平安银行' in fast.dumps(payload)
+            assert '\\u5e73' in DefaultJSONProvider(app).dumps(payload)
+    
+    def test_fallback_without_orjson(self):
+        """未安装 orjson 时使用标准库"""
+        app = Flask('json_test')
+        fast = FastJSONProvider(app)
+        
+        with patch.object(serialization, 'orjson', None), app.app_context():
+            body = fast.response(self.PAYLOAD).get_data(as_text=True)
+        
+        assert json.loads(body) == json.loads(DefaultJSONProvider(app).dumps(self.PAYLOAD))
@@ -0,0 +1,129 @@
+"""
+策略回测服务测试
+"""
+import pytest
+import numpy as np
+from datetime import datetime
+
+from services.daily_bar_service import DailyBarService, BAR_DTYPE
+from services.strategy_backtest_service import StrategyBacktestService
+from services.strategy_service import StrategyService
+from models.trade_record import TradeRecord
+from models.historical_trade import HistoricalTrade
+from error_handlers import ValidationError
+
+
+STOP_LOSS_RULES = {"rules": [
+    {"day_range": [1, 5], "loss_threshold": -0.05, "action": "sell_all", "condition": "loss_exceed"}
+]}
+PARTIAL_PROFIT_RULES = {"rules": [
+    {"day_range": [1, 10], "profit_threshold": 0.1, "action": "sell_partial",
+     "sell_ratio": 0.5, "condition": "profit_exceed"}
+]}
+NEVER_RULES = {"rules": [
+    {"day_range": [20, 30], "loss_threshold": -0.05, "action": "sell_all", "condition": "loss_exceed"}
+]}
+
+
+def make_bars(dates, closes):
+    """构造日线结构化数组"""
+    bars = np.zeros(len(dates), dtype=BAR_DTYPE)
+    bars['date'] = np.array(dates, dtype='datetime64[D]')
+    bars['open'] = bars['high'] = bars['low'] = bars['close'] = closes
+    return bars
+
+
+class TestStrategyBacktestService:
+    """策略回测服务测试类"""
+    
+    @pytest.fixture
+    def bar_service(self, tmp_path, db_session):
+        service = DailyBarService(store_dir=tmp_path)
+        service._save_bars('000001', make_bars(
+            ['2023-12-29', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05',
+             '2024-01-08', '2024-01-09', '2024-01-10', '2024-01-11'],
+            [9.9, 10.0, 9.8, 9.3, 10.5, 11.2, 10.8, 10.5, 10.6]
+        ))
+        
+        buy = TradeRecord(
+            stock_code='000001', stock_name='平安银行', trade_type='buy', price=10.0,
+            quantity=1000, trade_date=datetime(2024, 1, 2, 10, 0), reason='测试'
+        ).save()
+        HistoricalTrade(
+            stock_code='000001', stock_name='平安银行',
+            buy_date=datetime(2024, 1, 2, 10, 0), sell_date=datetime(2024, 1, 10, 14, 0),
+            holding_days=8, total_investment=10000, total_return=500, return_rate=0.05,
+            buy_records_ids=[buy.id], sell_records_ids=[], completion_date=datetime(2024, 1, 10, 14, 0)
+        ).save()
+        # 没有日线数据的交易会被跳过
+        HistoricalTrade(
+            stock_code='000002', stock_name='万科A',
+            buy_date=datetime(2024, 1, 2), sell_date=datetime(2024, 1, 5),
+            holding_days=3, total_investment=5000, total_return=100, return_rate=0.02,
+            buy_records_ids=[], sell_records_ids=[], completion_date=datetime(2024, 1, 5)
+        ).save()
+        return service
+    
+    def test_stop_loss_exit(self, bar_service):
+        """测试全部清仓规则在首次触发日按收盘价卖出"""
+        result = StrategyBacktestService.run_backtest(
+            strategies=[{'strategy_name': '止损', 'rules': STOP_LOSS_RULES}],
+            include_trades=True, bar_service=bar_service
+        )
+        
+        assert result['trade_count'] == 1
+        assert result['skipped_count'] == 1
+        summary = result['results'][0]
+        assert summary['triggered_count'] == 1
+        assert summary['actual_total_return'] == pytest.approx(500)
+        assert summary['strategy_total_return'] == pytest.approx(-700, abs=0.1)
+        assert summary['return_difference'] == pytest.approx(-1200, abs=0.1)
+        
+        exit_event = summary['trades'][0]['exits'][0]
+        assert exit_event['exit_type'] == 'sell_all'
+        assert exit_event['exit_date'] == '2024-01-04'
+        assert exit_event['holding_days'] == 3
+    
+    def test_partial_exit_and_untriggered_strategy(self, bar_service):
+        """测试部分止盈只执行一次，剩余持仓按实际收益结算；未触发的策略与实际一致"""
+        result = StrategyBacktestService.run_backtest(
+            strategies=[
+                {'strategy_name': '部分止盈', 'rules': PARTIAL_PROFIT_RULES},
+                {'strategy_name': '不触发', 'rules': NEVER_RULES}
+            ],
+            include_trades=True, bar_service=bar_service
+        )
+        
+        partial, untouched = result['results']
+        assert partial['strategy_avg_return_rate'] == pytest.approx(0.5 * 0.12 + 0.5 * 0.05, abs=1e-4)
+        assert [e['exit_date'] for e in partial['trades'][0]['exits']] == ['2024-01-08']
+        assert untouched['triggered_count'] == 0
+        assert untouched['strategy_total_return'] == untouched['actual_total_return']
+        assert untouched['trades'] == []
+    
+    def test_parallel_matches_sequential(self, bar_service):
+        """测试并行回测与串行结果一致"""
+        strategy = StrategyService.create_strategy({'strategy_name': '已保存策略', 'rules': STOP_LOSS_RULES})
+        variants = [{'rules': PARTIAL_PROFIT_RULES}, {'rules': NEVER_RULES}]
+        
+        sequential = StrategyBacktestService.run_backtest(
+            strategy_ids=[strategy.id], strategies=variants, bar_service=bar_service, max_workers=1
+        )
+        parallel = StrategyBacktestService.run_backtest(
+            strategy_ids=[strategy.id], strategies=variants, bar_service=bar_service, max_workers=3
+        )
+        
+        assert parallel == sequential
+        assert [r['strategy_name'] for r in parallel['results']] == ['已保存策略', '策略变体1', '策略变体2']
+    
+    def test_requires_strategy(self, db_session):
+        """测试未指定策略"""
+        with pytest.raises(ValidationError):
+            StrategyBacktestService.run_backtest()
+    
+    def test_backtest_api_validation(self, client, db_session):
+        """测试回测接口参数校验"""
+        response = client.post('/api/strategies/backtest', json={'strategies': [{'rules': {'rules': [{}]}}]})
+        
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
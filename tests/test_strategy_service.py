@@ -1,12 +1,18 @@
 """
 交易策略服务测试
 """
+import json
 import pytest
 from datetime import date, datetime, timedelta
-from services.strategy_service import StrategyService, StrategyEvaluator, HoldingAlertService
+from unittest.mock import patch
+from extensions import db
+from services.strategy_service import (
+    StrategyService, StrategyEvaluator, HoldingAlertService, CompiledStrategy, StrategyAlertEngine
+)
 from models.trading_strategy import TradingStrategy
 from models.trade_record import TradeRecord
 from models.stock_price import StockPrice
+from models.strategy_alert import StrategyAlert
 from error_handlers import ValidationError, NotFoundError
 
 
@@ -207,6 +213,70 @@ class TestStrategyEvaluator:
             # 亏损12%，超过10%回撤阈值，应该触发
             assert StrategyEvaluator._rule_triggered(rule, -0.12, 5) == True
     
+    def test_evaluate_holdings_matches_rule_by_rule(self, app):
+        """测试向量化评估与逐条规则评估结果一致"""
+        with app.app_context():
+            strategies = [
+                TradingStrategy(strategy_name='策略A', is_active=True, rules={"rules": [
+                    {"day_range": [1, 5], "loss_threshold": -0.05, "action": "sell_all", "condition": "loss_exceed"},
+                    {"day_range": [1, 10], "profit_threshold": 0.1, "action": "sell_partial",
+                     "sell_ratio": 0.5, "condition": "profit_exceed"},
+                    {"day_range": [6, 20], "profit_threshold": 0.02, "action": "sell_all", "condition": "profit_below"}
+                ]}),
+                TradingStrategy(strategy_name='策略B', is_active=True, rules={"rules": [
+                    {"day_range": [3, 30], "profit_threshold": 0.15, "drawdown_threshold": 0.1,
+                     "action": "sell_all", "condition": "profit_below_or_drawdown"},
+                    {"day_range": [1], "action": "sell_all", "condition": "loss_exceed"}
+                ]})
+            ]
+            holdings = []
+            current_prices = {}
+            for i, (days, price) in enumerate([(1, 9.0), (2, 12.0), (5, 10.4), (7, 10.1), (15, 13.0), (40, 8.0)]):
+                stock_code = f'00000{i}'
+                holdings.append({
+                    'stock_code': stock_code, 'stock_name': f'股票{i}', 'holding_days': days,
+                    'avg_buy_price': 10.0, 'current_quantity': 1000
+                })
+                current_prices[stock_code] = price
+            
+            alerts = StrategyEvaluator.evaluate_holdings(holdings, current_prices, strategies)
+            
+            expected = []
+            for holding in holdings:
+                for strategy in strategies:
+                    alert = StrategyEvaluator.evaluate_holding_with_strategy(
+                        holding, current_prices[holding['stock_code']], strategy
+                    )
+                    if alert:
+                        expected.append(alert)
+            
+            def key(alert):
+                return (alert['stock_code'], alert['strategy_name'], alert['strategy_rule'],
+                        alert['alert_type'], alert['profit_loss_ratio'])
+            assert [key(a) for a in alerts] == [key(a) for a in expected]
+            assert len(alerts) > 0
+    
+    def test_compile_strategy_cached_per_rules_version(self, db_session):
+        """测试编译结果按规则版本缓存，规则修改后重新编译"""
+        strategy = StrategyService.create_strategy({
+            'strategy_name': '缓存策略',
+            'rules': {"rules": [
+                {"day_range": [1, 5], "loss_threshold": -0.05, "action": "sell_all", "condition": "loss_exceed"}
+            ]}
+        })
+        
+        compiled = StrategyEvaluator.compile_strategy(strategy)
+        assert isinstance(compiled, CompiledStrategy)
+        assert StrategyEvaluator.compile_strategy(strategy) is compiled
+        
+        strategy = StrategyService.update_strategy(strategy.id, {'rules': json.dumps({"rules": [
+            {"day_range": [1, 5], "loss_threshold": -0.1, "action": "sell_all", "condition": "loss_exceed"}
+        ]})})
+        recompiled = StrategyEvaluator.compile_strategy(strategy)
+        
+        assert recompiled is not compiled
+        assert recompiled.loss_thresholds.tolist() == [-0.1]
+    
     def test_create_holding_alert(self, app):
         """测试创建持仓提醒"""
         with app.app_context():
@@ -316,6 +386,151 @@ class TestHoldingAlertService:
             assert summary['total_alerts'] == 0
             assert summary['urgent_alerts'] == 0
             assert summary['profit_alerts'] == 0
+    
+    @pytest.fixture
+    def alert_db(self, db_session):
+        """测试结束后清理持仓数据，避免影响不使用db_session的测试"""
+        yield db_session
+        for table in reversed(db.metadata.sorted_tables):
+            db_session.execute(table.delete())
+        db_session.commit()
+    
+    @staticmethod
+    def _create_loss_holding(stock_code, current_price):
+        """创建止损策略、持仓和最新价格"""
+        StrategyService.create_strategy({
+            'strategy_name': '止损策略',
+            'rules': {"rules": [
+                {"day_range": [1, 60], "loss_threshold": -0.05, "action": "sell_all", "condition": "loss_exceed"}
+            ]}
+        })
+        TradeRecord(
+            stock_code=stock_code, stock_name='测试股票', trade_type='buy', price=10.0,
+            quantity=1000, trade_date=datetime.now() - timedelta(days=3), reason='测试'
+        ).save()
+        return StockPrice(
+            stock_code=stock_code, stock_name='测试股票', current_price=current_price,
+            change_percent=0, record_date=date.today()
+        ).save()
+    
+    def test_alerts_persisted_and_deduplicated(self, alert_db):
+        """测试提醒持久化、重复触发去重以及条件解除"""
+        price = self._create_loss_holding('601001', 9.0)
+        
+        alerts = HoldingAlertService.get_all_alerts()
+        assert len(alerts) == 1
+        assert alerts[0]['alert_type'] == 'sell_all'
+        first_seen_at = alerts[0]['first_seen_at']
+        
+        # 价格变化但仍触发：同一条提醒，首次触发时间不变
+        price.current_price = 8.5
+        price.save()
+        alerts = HoldingAlertService.get_all_alerts()
+        assert len(alerts) == 1
+        assert alerts[0]['first_seen_at'] == first_seen_at
+        assert alerts[0]['current_price'] == 8.5
+        assert StrategyAlert.query.count() == 1
+        
+        # 条件解除后不再返回，记录标记为已解除
+        price.current_price = 10.5
+        price.save()
+        assert HoldingAlertService.get_all_alerts() == []
+        record = StrategyAlert.query.one()
+        assert record.is_active is False
+        assert record.resolved_at is not None
+    
+    def test_read_apis_do_not_evaluate_or_commit(self, alert_db):
+        """测试读取接口只查询提醒表，不评估也不提交"""
+        self._create_loss_holding('601001', 9.0)
+        
+        with patch.object(StrategyEvaluator, 'evaluate_holdings',
+                          wraps=StrategyEvaluator.evaluate_holdings) as mock_evaluate, \
+                patch.object(db.session, 'commit') as mock_commit:
+            summary = HoldingAlertService.get_alerts_summary()
+            urgent_alerts = HoldingAlertService.get_urgent_alerts()
+            profit_alerts = HoldingAlertService.get_profit_alerts()
+            by_type = HoldingAlertService.get_alerts_by_type('sell_all')
+        
+        assert mock_evaluate.call_count == 0
+        assert mock_commit.call_count == 0
+        assert summary['total_alerts'] == 1
+        assert summary['urgent_alerts'] == 1
+        assert len(urgent_alerts) == 1
+        assert profit_alerts == []
+        assert len(by_type) == 1
+    
+    @patch('services.price_service.PriceService.refresh_multiple_stocks',
+           return_value={'results': [], 'errors': []})
+    def test_only_changed_stocks_reevaluated(self, mock_refresh, alert_db):
+        """测试价格变更后只重新评估对应股票"""
+        self._create_loss_holding('601001', 9.0)
+        TradeRecord(
+            stock_code='601002', stock_name='测试股票2', trade_type='buy', price=20.0,
+            quantity=500, trade_date=datetime.now() - timedelta(days=3), reason='测试'
+        ).save()
+        HoldingAlertService.get_all_alerts()
+        
+        from services.review_service import HoldingService
+        with patch.object(HoldingService, 'get_current_holdings',
+                          wraps=HoldingService.get_current_holdings) as mock_holdings:
+            StockPrice(
+                stock_code='601002', stock_name='测试股票2', current_price=18.0,
+                change_percent=0, record_date=date.today()
+            ).save()
+            alerts = HoldingAlertService.get_all_alerts()
+        
+        assert mock_holdings.call_args.kwargs['stock_codes'] == ['601002']
+        assert sorted(alert['stock_code'] for alert in alerts) == ['601001', '601002']
+    
+    def test_rolled_back_changes_not_evaluated(self, alert_db):
+        """测试回滚的修改不会写入提醒，之后的提交也不会重新评估"""
+        price = self._create_loss_holding('601001', 9.0)
+        
+        price.current_price = 10.5
+        db.session.flush()
+        db.session.rollback()
+        
+        with patch.object(StrategyEvaluator, 'evaluate_holdings',
+                          wraps=StrategyEvaluator.evaluate_holdings) as mock_evaluate:
+            db.session.commit()
+        
+        assert mock_evaluate.call_count == 0
+        assert len(HoldingAlertService.get_all_alerts()) == 1
+    
+    def test_failed_evaluation_keeps_data_and_retries(self, alert_db):
+        """测试提醒评估失败时交易照常提交，不写入部分提醒，受影响的股票在下次提交时重新评估"""
+        self._create_loss_holding('601001', 10.5)
+        assert HoldingAlertService.get_all_alerts() == []
+        
+        real_apply = StrategyAlertEngine.apply
+        
+        def failing_apply(stock_codes=None):
+            """写入提醒后再写入重复的去重键，自动刷新时违反唯一约束"""
+            result = real_apply(stock_codes)
+            for alert in StrategyAlert.query.all():
+                db.session.add(StrategyAlert(
+                    dedupe_key=alert.dedupe_key,
+                    **{field: getattr(alert, field) for field in StrategyAlert.ALERT_FIELDS}
+                ))
+            StrategyAlert.query.count()
+            return result
+        
+        with patch.object(StrategyAlertEngine, 'apply', side_effect=failing_apply) as mock_apply:
+            TradeRecord(
+                stock_code='601001', stock_name='测试股票', trade_type='buy', price=13.0,
+                quantity=1000, trade_date=datetime.now() - timedelta(days=1), reason='加仓'
+            ).save()
+        
+        assert mock_apply.call_count == 1
+        db.session.expire_all()
+        assert TradeRecord.query.filter_by(stock_code='601001').count() == 2
+        assert StrategyAlert.query.count() == 0
+        
+        # 下次提交时重新评估被标记的股票
+        db.session.commit()
+        alerts = HoldingAlertService.get_all_alerts()
+        assert len(alerts) == 1
+        assert alerts[0]['stock_code'] == '601001'
 
 
 @pytest.fixture
@@ -353,7 +568,7 @@ def sample_holding_data(app):
     with app.app_context():
         # 创建买入记录
         buy_record = TradeRecord(
-            stock_code='000001',
+            stock_code='601001',
             stock_name='测试股票',
             trade_type='buy',
             price=10.0,
@@ -365,7 +580,7 @@ def sample_holding_data(app):
         
         # 创建股票价格记录
         price_record = StockPrice(
-            stock_code='000001',
+            stock_code='601001',
             stock_name='测试股票',
             current_price=9.5,
             change_percent=-5.0,
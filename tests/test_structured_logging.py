@@ -0,0 +1,142 @@
+"""
+结构化日志测试
+"""
+import logging
+import pytest
+from datetime import datetime
+from logging.handlers import QueueHandler
+from unittest.mock import patch
+
+from flask import Flask
+
+from models.trade_record import TradeRecord
+from services.trading_service import TradingService
+from utils.structured_logging import (
+    LOGGER_NAMESPACE, configure_logging, get_logger, get_logging_stats, lazy,
+    reset_logging_stats, stop_log_listener
+)
+
+
+class ListHandler(logging.Handler):
+    """收集日志记录的处理器"""
+    
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def logging_app():
+    """独立的应用用于配置日志，结束后还原模块日志设置"""
+    logging_app = Flask('logging_test')
+    handler = ListHandler()
+    logging_app.logger.addHandler(handler)
+    logging_app.handler = handler
+    reset_logging_stats()
+    yield logging_app
+    
+    stop_log_listener()
+    configure_logging(Flask('logging_reset'))
+    namespace_logger = logging.getLogger(LOGGER_NAMESPACE)
+    namespace_logger.handlers = []
+    namespace_logger.setLevel(logging.NOTSET)
+    namespace_logger.propagate = True
+    reset_logging_stats()
+
+
+class TestStructuredLogger:
+    """结构化日志记录器测试"""
+    
+    def test_disabled_level_skips_lazy_fields(self, logging_app):
+        """级别未启用时不计算惰性字段"""
+        logging_app.config['LOG_LEVEL'] = 'INFO'
+        configure_logging(logging_app)
+        logger = get_logger('tests.gating')
+        calls = []
+        
+        logger.debug("调试事件", data=lazy(lambda: calls.append(1)))
+        
+        assert calls == []
+        assert logging_app.handler.records == []
+        assert logger.stats()['skipped'] == 1
+    
+    def test_structured_message(self, logging_app):
+        """事件和字段渲染为 key=value，惰性字段只计算一次"""
+        logging_app.config['LOG_LEVEL'] = 'DEBUG'
+        configure_logging(logging_app)
+        logger = get_logger('tests.message')
+        calls = []
+        
+        def expensive():
+            calls.append(1)
+            return {'price': 10.5}
+        
+        logger.info("保存模型", model='TradeRecord', data=lazy(expensive), note='a b')
+        
+        record = logging_app.handler.records[0]
+        assert record.getMessage() == '保存模型 model=TradeRecord data={"price": 10.5} note="a b"'
+        record.getMessage()
+        assert calls == [1]
+        assert record.event == '保存模型'
+        assert record.fields['model'] == 'TradeRecord'
+        assert record.name == f'{LOGGER_NAMESPACE}.tests.message'
+    
+    def test_per_module_levels(self, logging_app):
+        """按模块前缀设置级别"""
+        logging_app.config.update(LOG_LEVEL='WARNING', LOG_LEVELS='tests.verbose=DEBUG,tests.verbose.quiet=ERROR')
+        configure_logging(logging_app)
+        
+        get_logger('tests.verbose.child').debug("输出")
+        get_logger('tests.verbose.quiet').warning("过滤")
+        get_logger('tests.other').info("过滤")
+        
+        assert [record.getMessage() for record in logging_app.handler.records] == ['输出']
+    
+    def test_sampling(self, logging_app):
+        """采样只作用于 WARNING 以下的日志"""
+        logging_app.config.update(LOG_LEVEL='DEBUG', LOG_SAMPLE_RATES='tests.sampled=10')
+        configure_logging(logging_app)
+        logger = get_logger('tests.sampled.hot')
+        
+        for i in range(100):
+            logger.debug("热点", i=i)
+        logger.warning("告警")
+        
+        assert len(logging_app.handler.records) == 11
+        assert logger.stats() == {'emitted': 11, 'skipped': 0, 'sampled_out': 90, 'sample_every': 10}
+    
+    def test_async_queue_listener(self, logging_app):
+        """异步模式下处理器在后台线程写日志"""
+        logging_app.config.update(LOG_LEVEL='INFO', LOG_ASYNC=True)
+        logging_app.logger.setLevel(logging.INFO)
+        configure_logging(logging_app)
+        
+        assert [type(handler) for handler in logging_app.logger.handlers] == [QueueHandler]
+        assert logging.getLogger(LOGGER_NAMESPACE).handlers == logging_app.logger.handlers
+        
+        get_logger('tests.async').info("模块日志", n=1)
+        logging_app.logger.info("应用日志")
+        stop_log_listener()
+        
+        assert [record.getMessage() for record in logging_app.handler.records] == ['模块日志 n=1', '应用日志']
+    
+    def test_bulk_create_has_no_logging_cost(self, logging_app, db_session):
+        """默认级别下批量创建交易记录不格式化任何调试日志"""
+        logging_app.config['LOG_LEVEL'] = 'INFO'
+        configure_logging(logging_app)
+        
+        with patch.object(TradeRecord, 'to_dict', wraps=TradeRecord.to_dict, autospec=True) as to_dict:
+            for i in range(20):
+                TradingService.create_trade({
+                    'stock_code': '600000', 'stock_name': '浦发银行', 'trade_type': 'buy', 'price': 10.0,
+                    'quantity': 100, 'trade_date': datetime(2024, 3, 1 + i), 'reason': '少妇B1战法'
+                })
+        
+        to_dict.assert_not_called()
+        stats = get_logging_stats()
+        assert stats['models.base']['skipped'] == 40
+        assert sum(item['emitted'] for item in stats.values()) == 0
+        assert logging_app.handler.records == []
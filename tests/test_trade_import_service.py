@@ -0,0 +1,225 @@
+"""
+交易记录批量导入测试
+"""
+import io
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+
+from openpyxl import Workbook
+
+from models.trade_record import TradeRecord
+from services.trade_import_service import TradeImportService
+from services.historical_trade_service import HistoricalTradeService
+from error_handlers import ValidationError
+
+
+BROKER_CSV = (
+    "成交日期,成交时间,证券代码,证券名称,买卖标志,成交价格,成交数量,备注\n"
+    "20240301,09:30:01,=\"600000\",浦发银行,证券买入,10.50,1000,首次建仓\n"
+    "20240305,14:20:00,600000,浦发银行,证券卖出,11.20,1000,\n"
+    "20240306,10:00:00,1,平安银行,买入,12.00,200,\n"
+    "20240307,10:00:00,688001,华兴源创,买入,30.00,150,\n"
+)
+
+
+def csv_stream(content, encoding='utf-8'):
+    """构造上传文件流"""
+    return io.BytesIO(content.encode(encoding))
+
+
+def xlsx_stream(rows):
+    """构造Excel文件流"""
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+    return stream
+
+
+class TestTradeImportService:
+    """批量导入服务测试"""
+    
+    def test_import_broker_csv_in_gbk(self, db_session):
+        """GBK编码的券商中文表头CSV"""
+        result = TradeImportService.import_trades(csv_stream(BROKER_CSV, 'gbk'), 'trades.csv', sync=False)
+        
+        assert result['total_rows'] == 4
+        assert result['imported_count'] == 4
+        assert result['error_count'] == 0
+        
+        trades = TradeRecord.query.order_by(TradeRecord.trade_date).all()
+        assert [trade.stock_code for trade in trades] == ['600000', '600000', '000001', '688001']
+        assert [trade.trade_type for trade in trades] == ['buy', 'sell', 'buy', 'buy']
+        assert trades[0].trade_date == datetime(2024, 3, 1, 9, 30, 1)
+        assert float(trades[0].price) == 10.5
+        assert trades[0].reason == '批量导入'
+        assert trades[0].notes == '首次建仓'
+        assert trades[1].notes is None
+    
+    def test_import_xlsx(self, db_session):
+        """Excel文件导入"""
+        stream = xlsx_stream([
+            ['证券代码', '证券名称', '操作', '成交均价', '成交数量', '成交日期', '原因'],
+            ['600000', '浦发银行', '买入', 10.5, 1000, datetime(2024, 3, 1, 9, 30), '少妇B1战法'],
+            ['600000', '浦发银行', '卖出', 11.2, 1000, '2024-03-05', '止盈'],
+        ])
+        
+        result = TradeImportService.import_trades(stream, 'trades.xlsx', sync=False)
+        
+        assert result['imported_count'] == 2
+        trades = TradeRecord.query.order_by(TradeRecord.trade_date).all()
+        assert [trade.reason for trade in trades] == ['少妇B1战法', '止盈']
+    
+    def test_invalid_rows_reported_with_row_numbers(self, db_session):
+        """无效行逐行报告错误，有效行照常导入"""
+        content = (
+            "证券代码,证券名称,买卖标志,成交价格,成交数量,成交日期\n"
+            "600000,浦发银行,买入,10.50,1000,2024-03-01\n"
+            "60000A,浦发银行,买入,10.50,1000,2024-03-01\n"
+            "600001,邯郸钢铁,转托管,0,150,not a date\n"
+            "600002,,卖出,10.50,1000,2024-03-01\n"
+        )
+        
+        result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', sync=False)
+        
+        assert result['imported_count'] == 1
+        assert result['error_count'] == 3
+        assert result['success'] is False
+        assert [error['row'] for error in result['errors']] == [3, 4, 5]
+        assert result['errors'][0]['errors'] == ["股票代码格式不正确，应为6位数字"]
+        assert len(result['errors'][1]['errors']) == 4
+        assert result['errors'][2]['errors'] == ["股票名称不能为空"]
+    
+    def test_duplicates_skipped_against_database(self, db_session):
+        """已存在的成交被跳过，文件内内容相同的成交全部保留"""
+        TradeRecord(
+            stock_code='600000', stock_name='浦发银行', trade_type='buy', price=10.5, quantity=1000,
+            trade_date=datetime(2024, 3, 1, 9, 30, 1), reason='少妇B1战法'
+        ).save()
+        content = BROKER_CSV + "20240306,10:00:00,000001,平安银行,买入,12.00,200,\n"
+        
+        result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', sync=False)
+        
+        assert result['imported_count'] == 4
+        assert result['duplicate_count'] == 1
+        assert TradeRecord.query.count() == 5
+        
+        # 再次导入同一文件不会产生新记录
+        result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', sync=False)
+        assert result['imported_count'] == 0
+        assert result['duplicate_count'] == 5
+    
+    def test_identical_fills_without_time_all_imported(self, db_session):
+        """没有成交时间时，同一天同价同量的多笔成交不会被合并（分块时也一样）"""
+        content = (
+            "成交日期,证券代码,证券名称,买卖标志,成交价格,成交数量\n"
+            "20240301,600000,浦发银行,买入,10.50,100\n"
+            "20240301,600000,浦发银行,买入,10.50,100\n"
+            "20240301,600000,浦发银行,买入,10.50,100\n"
+        )
+        
+        result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', chunk_size=2, sync=False)
+        
+        assert result['imported_count'] == 3
+        assert result['duplicate_count'] == 0
+        assert TradeRecord.query.count() == 3
+        
+        # 已有3条时再导入只多出1条的文件，只写入多出的那一条
+        result = TradeImportService.import_trades(
+            csv_stream(content + "20240301,600000,浦发银行,买入,10.50,100\n"), 'trades.csv', chunk_size=2, sync=False
+        )
+        assert result['imported_count'] == 1
+        assert result['duplicate_count'] == 3
+    
+    def test_duplicates_by_broker_fill_id(self, db_session):
+        """有成交编号时按编号去重，编号不同的相同成交都保留"""
+        content = (
+            "成交日期,成交时间,成交编号,合同编号,证券代码,证券名称,买卖标志,成交价格,成交数量\n"
+            "20240301,09:30:01,F001,C01,600000,浦发银行,买入,10.50,100\n"
+            "20240301,09:30:01,F002,C01,600000,浦发银行,买入,10.50,100\n"
+            "20240301,09:30:01,F002,C01,600000,浦发银行,买入,10.50,100\n"
+        )
+        
+        result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', sync=False)
+        
+        assert result['imported_count'] == 2
+        assert result['duplicate_count'] == 1
+        assert sorted(t.broker_fill_id for t in TradeRecord.query.all()) == ['F001', 'F002']
+        
+        result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', sync=False)
+        assert result['imported_count'] == 0
+        assert result['duplicate_count'] == 3
+    
+    def test_chunked_import_keeps_row_numbers(self, db_session):
+        """分块读取时行号连续，每块一次写入"""
+        lines = ["证券代码,证券名称,买卖标志,成交价格,成交数量,成交日期"]
+        lines += [f"6000{i:02d},股票{i},买入,10.00,100,2024-03-01" for i in range(10)]
+        lines[8] = "600007,股票7,买入,-1,100,2024-03-01"
+        
+        with patch.object(TradeImportService, '_insert_chunk', wraps=TradeImportService._insert_chunk) as insert:
+            result = TradeImportService.import_trades(
+                csv_stream('\n'.join(lines)), 'trades.csv', chunk_size=3, sync=False
+            )
+        
+        assert insert.call_count == 4
+        assert result['imported_count'] == 9
+        assert [error['row'] for error in result['errors']] == [9]
+    
+    def test_single_sync_after_import(self, db_session):
+        """全部写入后只同步一次历史交易"""
+        with patch.object(
+            HistoricalTradeService, 'sync_historical_records', return_value={'success': True}
+        ) as sync:
+            result = TradeImportService.import_trades(csv_stream(BROKER_CSV), 'trades.csv', chunk_size=1)
+        
+        sync.assert_called_once()
+        assert result['sync_result'] == {'success': True}
+    
+    def test_imported_trades_synced_to_history(self, db_session):
+        """导入的完整交易同步为历史交易记录"""
+        result = TradeImportService.import_trades(csv_stream(BROKER_CSV), 'trades.csv')
+        
+        assert result['sync_result']['success'] is True
+        history = HistoricalTradeService.get_historical_trades(filters={'stock_code': '600000'})
+        assert history['total'] == 1
+    
+    def test_reason_validated_against_configuration(self, db_session):
+        """文件中的交易原因须在配置的选项中"""
+        content = (
+            "证券代码,证券名称,买卖标志,成交价格,成交数量,成交日期,原因\n"
+            "600000,浦发银行,买入,10.50,1000,2024-03-01,随便买买\n"
+        )
+        with patch('services.trade_import_service.Configuration.get_buy_reasons', return_value=['少妇B1战法']):
+            result = TradeImportService.import_trades(csv_stream(content), 'trades.csv', sync=False)
+        
+        assert result['imported_count'] == 0
+        assert result['errors'] == [{'row': 2, 'errors': ["交易原因不在配置的选项中"]}]
+    
+    @pytest.mark.parametrize('content, filename', [
+        (BROKER_CSV, 'trades.txt'),
+        ("证券代码,证券名称\n600000,浦发银行\n", 'trades.csv'),
+    ])
+    def test_invalid_file(self, db_session, content, filename):
+        """不支持的格式或缺少必需列"""
+        with pytest.raises(ValidationError):
+            TradeImportService.import_trades(csv_stream(content), filename, sync=False)
+    
+    def test_import_api(self, client, db_session):
+        """批量导入接口"""
+        response = client.post(
+            '/api/trades/import',
+            data={'file': (csv_stream(BROKER_CSV), 'trades.csv'), 'sync': 'false', 'default_reason': '券商导入'},
+            content_type='multipart/form-data'
+        )
+        data = response.get_json()
+        
+        assert response.status_code == 200
+        assert data['data']['imported_count'] == 4
+        assert TradeRecord.query.first().reason == '券商导入'
+        
+        response = client.post('/api/trades/import', data={}, content_type='multipart/form-data')
+        assert response.status_code == 400
@@ -0,0 +1,144 @@
+"""
+交易日历测试
+"""
+import pytest
+import numpy as np
+from datetime import date, datetime, timedelta
+
+from utils.trading_calendar import TradingCalendar
+from models.non_trading_day import NonTradingDay
+from services.non_trading_day_service import NonTradingDayService
+
+
+def brute_force_count(start_date, end_date, holidays):
+    """逐日计算交易日数量，作为对照"""
+    count = 0
+    current = start_date
+    while current <= end_date:
+        if current.weekday() < 5 and current not in holidays:
+            count += 1
+        current += timedelta(days=1)
+    return count
+
+
+class TestTradingCalendar:
+    """交易日历测试类"""
+    
+    HOLIDAYS = [date(2024, 1, 1), date(2024, 2, 9), date(2024, 2, 12), date(2024, 2, 13), date(2024, 2, 10)]
+    
+    @pytest.fixture
+    def calendar(self):
+        return TradingCalendar(self.HOLIDAYS)
+    
+    def test_is_trading_day(self, calendar):
+        """测试交易日判断"""
+        assert calendar.is_trading_day(date(2024, 1, 2)) is True
+        assert calendar.is_trading_day(date(2024, 1, 1)) is False
+        assert calendar.is_trading_day(date(2024, 1, 6)) is False
+        # 落在周末的节假日不重复计入
+        assert date(2024, 2, 10) not in calendar.holidays
+    
+    def test_count_trading_days_matches_brute_force(self, calendar):
+        """测试前缀和计数与逐日计算一致"""
+        holidays = set(self.HOLIDAYS)
+        ranges = [
+            (date(2024, 1, 1), date(2024, 1, 5)),
+            (date(2024, 2, 1), date(2024, 2, 29)),
+            (date(2023, 12, 30), date(2024, 3, 1)),
+            (date(2024, 1, 6), date(2024, 1, 7)),
+        ]
+        for start_date, end_date in ranges:
+            assert calendar.count_trading_days(start_date, end_date) == brute_force_count(start_date, end_date, holidays)
+        assert calendar.count_trading_days(date(2024, 1, 5), date(2024, 1, 1)) == 0
+    
+    def test_next_and_previous_trading_day(self, calendar):
+        """测试上/下一个交易日跳过周末和节假日"""
+        assert calendar.next_trading_day(date(2024, 2, 8)) == date(2024, 2, 14)
+        assert calendar.previous_trading_day(date(2024, 2, 14)) == date(2024, 2, 8)
+        assert calendar.previous_trading_day(date(2024, 1, 2)) == date(2023, 12, 29)
+    
+    def test_offset(self, calendar):
+        """测试交易日偏移"""
+        assert calendar.offset(date(2024, 2, 7), 2) == date(2024, 2, 14)
+        assert calendar.offset(date(2024, 2, 14), -3) == date(2024, 2, 6)
+        assert calendar.offset(date(2024, 2, 10), 0) == date(2024, 2, 14)
+        assert calendar.offset(date(2024, 2, 14), 0) == date(2024, 2, 14)
+    
+    def test_queries_outside_initial_range(self):
+        """测试超出覆盖区间时自动扩展"""
+        calendar = TradingCalendar([], start=date(2024, 1, 1), end=date(2024, 1, 31))
+        
+        assert calendar.count_trading_days(date(2023, 1, 1), date(2025, 12, 31)) == \
+            brute_force_count(date(2023, 1, 1), date(2025, 12, 31), set())
+        assert calendar.next_trading_day(date(2026, 1, 2)) == date(2026, 1, 5)
+    
+    def test_trading_days_between(self, calendar):
+        """测试区间交易日列表"""
+        assert calendar.trading_days_between(date(2024, 2, 8), date(2024, 2, 15)) == [
+            date(2024, 2, 8), date(2024, 2, 14), date(2024, 2, 15)
+        ]
+    
+    def test_count_trading_days_bulk_matches_scalar(self, calendar):
+        """测试向量化批量计数与逐个计数一致"""
+        starts = [date(2024, 1, 1), date(2024, 2, 1), date(2023, 12, 30), date(2024, 1, 6), date(2024, 1, 5)]
+        ends = [date(2024, 1, 5), date(2024, 2, 29), date(2024, 3, 1), date(2024, 1, 7), date(2024, 1, 1)]
+        
+        counts = calendar.count_trading_days_bulk(starts, ends)
+        
+        assert isinstance(counts, np.ndarray)
+        assert counts.tolist() == [
+            calendar.count_trading_days(start_date, end_date) for start_date, end_date in zip(starts, ends)
+        ]
+    
+    def test_count_trading_days_bulk_mixed_inputs(self, calendar):
+        """测试批量计数支持datetime、字符串和空值"""
+        counts = calendar.count_trading_days_bulk(
+            [datetime(2024, 2, 8, 14, 30), '2024-02-01', None],
+            ['2024-02-14 09:30:00', date(2024, 2, 2), date(2024, 2, 2)]
+        )
+        
+        assert counts.tolist() == [2, 2, 0]
+
+
+class TestTradingCalendarCache:
+    """交易日历缓存与失效测试"""
+    
+    def test_calendar_loaded_once(self, db_session):
+        """测试多次查询只加载一次非交易日"""
+        NonTradingDay.invalidate_calendar()
+        
+        first = NonTradingDay.get_calendar()
+        NonTradingDay.calculate_trading_days(date(2024, 1, 1), date(2024, 12, 31))
+        
+        assert NonTradingDay.get_calendar() is first
+    
+    def test_service_changes_invalidate_calendar(self, db_session):
+        """测试添加、删除节假日后交易日计数立即更新"""
+        start_date, end_date = date(2024, 1, 1), date(2024, 1, 5)
+        assert NonTradingDayService.calculate_trading_days(start_date, end_date) == 5
+        
+        NonTradingDayService.add_holiday(date(2024, 1, 1), '元旦')
+        assert NonTradingDayService.calculate_trading_days(start_date, end_date) == 4
+        
+        NonTradingDayService.bulk_add_holidays([{'date': '2024-01-02', 'name': '测试假日'}])
+        assert NonTradingDayService.calculate_trading_days(start_date, end_date) == 3
+        
+        NonTradingDayService.remove_holiday(date(2024, 1, 1))
+        assert NonTradingDayService.calculate_trading_days(start_date, end_date) == 4
+        assert NonTradingDayService.get_next_trading_day('2023-12-29') == '2024-01-01'
+        assert NonTradingDayService.offset_trading_days('2023-12-29', 2) == '2024-01-03'
+    
+    def test_service_holding_days_bulk(self, db_session):
+        """测试批量持仓天数使用最新节假日，卖出日期为空时按今天计算"""
+        NonTradingDayService.add_holiday(date(2024, 1, 1), '元旦')
+        today = date.today()
+        
+        result = NonTradingDayService.calculate_holding_days_bulk(
+            ['2024-01-01', date(2023, 12, 29), today - timedelta(days=10)],
+            ['2024-01-05', date(2024, 1, 2), None]
+        )
+        
+        assert result == [
+            4, 2, NonTradingDayService.calculate_holding_days(today - timedelta(days=10), today)
+        ]
+        assert NonTradingDayService.calculate_holding_days_bulk([]) == []
@@ -0,0 +1,96 @@
+"""
+金额定点数运算
+价格和金额在内部统一使用整数分（int64）表示，比例使用基点（万分之一）表示，
+只在接口输出时换算为元和小数比例，保证盈亏计算结果精确且可复现
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Optional, Union
+
+import numpy as np
+
+# 1元 = 100分
+FEN_PER_YUAN = 100
+# 1 = 10000个基点
+BPS_PER_UNIT = 10000
+
+Number = Union[int, float, Decimal, str]
+
+
+def to_fen(value: Optional[Number]) -> int:
+    """
+    元转为整数分（四舍五入），None 视为0
+    
+    浮点数先按十进制字符串转换，避免 10.07 之类的二进制误差
+    """
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value * FEN_PER_YUAN
+    if isinstance(value, float):
+        value = repr(value)
+    return int((Decimal(value) * FEN_PER_YUAN).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def fen_to_yuan(fen: int) -> float:
+    """整数分转为元"""
+    return fen / FEN_PER_YUAN
+
+
+def to_bps(ratio: Optional[Number]) -> int:
+    """小数比例转为基点（四舍五入），None 视为0"""
+    if ratio is None:
+        return 0
+    if isinstance(ratio, float):
+        ratio = repr(ratio)
+    return int((Decimal(ratio) * BPS_PER_UNIT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def div_round(numerator: int, denominator: int) -> int:
+    """整数除法，结果四舍五入（远离零）"""
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    if remainder * 2 >= abs(denominator):
+        quotient += 1
+    return quotient if (numerator >= 0) == (denominator > 0) else -quotient
+
+
+def ratio(numerator: int, denominator: int) -> float:
+    """两个整数金额之比，分母不大于0时为0"""
+    return numerator / denominator if denominator > 0 else 0
+
+
+def compare_ratio(numerator: int, denominator: int, threshold: Optional[Number]) -> int:
+    """
+    比较 numerator / denominator 与比例阈值，不经过浮点除法
+    
+    阈值按基点取整后交叉相乘比较，分母须大于0
+    
+    Returns:
+        int: 小于阈值返回-1，等于返回0，大于返回1
+    """
+    left = numerator * BPS_PER_UNIT
+    right = to_bps(threshold) * denominator
+    return (left > right) - (left < right)
+
+
+def fen_to_decimal(fen: int) -> Decimal:
+    """整数分转为精确的 Decimal 元"""
+    return Decimal(fen).scaleb(-2)
+
+
+def ratio_decimal(numerator: int, denominator: int) -> Union[Decimal, int]:
+    """两个整数金额之比（Decimal），分母不大于0时为0"""
+    return Decimal(numerator) / Decimal(denominator) if denominator > 0 else 0
+
+
+def group_sum_fen(groups: Any, amounts: Any, size: int) -> np.ndarray:
+    """
+    按分组下标汇总整数分金额（int64，不经过浮点）
+    
+    Args:
+        groups: 每笔金额的分组下标（0 <= 下标 < size）
+        amounts: 金额（分）
+        size: 分组数量
+    """
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, np.asarray(groups, dtype=np.intp), np.asarray(amounts, dtype=np.int64))
+    return totals
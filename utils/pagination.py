@@ -0,0 +1,193 @@
+"""
+键集（游标）分页
+按 (排序列, id) 定位下一页起点，任何深度的翻页都只读取一页数据，不执行 OFFSET
+"""
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Sequence
+
+from flask import current_app
+from sqlalchemy import and_, or_, event
+from sqlalchemy.orm import Session
+
+from error_handlers import ValidationError
+from utils.serialization import project_query
+
+# 近似总数缓存的默认有效期（秒）
+DEFAULT_COUNT_CACHE_TTL = 60
+
+
+class CountCache:
+    """列表查询总数缓存，按表分组；本进程内写入对应表时失效"""
+    
+    _lock = threading.Lock()
+    _entries: Dict[str, Dict[Any, tuple]] = {}
+    
+    @classmethod
+    def get_count(cls, query, table_name: str, ttl: int) -> int:
+        """返回缓存的总数，过期或不存在时执行一次 COUNT 查询"""
+        count_query = query.order_by(None)
+        compiled = count_query.statement.compile()
+        key = (str(compiled), repr(sorted(compiled.params.items(), key=lambda item: item[0])))
+        now = time.monotonic()
+        
+        with cls._lock:
+            cached = cls._entries.get(table_name, {}).get(key)
+        if cached and now - cached[1] < ttl:
+            return cached[0]
+        
+        count = count_query.count()
+        with cls._lock:
+            cls._entries.setdefault(table_name, {})[key] = (count, now)
+        return count
+    
+    @classmethod
+    def invalidate(cls, table_names=None) -> None:
+        """清除指定表（不传时清除全部）的缓存"""
+        with cls._lock:
+            if table_names is None:
+                cls._entries.clear()
+            else:
+                for table_name in table_names:
+                    cls._entries.pop(table_name, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_counts(session, flush_context):
+    """新增、修改（可能改变筛选结果）或删除记录后使对应表的总数缓存失效"""
+    table_names = {
+        getattr(obj, '__tablename__', None)
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    }
+    table_names.discard(None)
+    if table_names:
+        CountCache.invalidate(table_names)
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, record_id: int) -> str:
+    """生成不透明的游标（排序字段、方向、最后一条记录的排序值和ID）"""
+    if isinstance(value, datetime):
+        typed_value = ['datetime', value.isoformat()]
+    elif isinstance(value, date):
+        typed_value = ['date', value.isoformat()]
+    elif isinstance(value, Decimal):
+        typed_value = ['decimal', str(value)]
+    else:
+        typed_value = ['raw', value]
+    
+    payload = json.dumps([sort_by, sort_order, typed_value, record_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str):
+    """解析游标，返回 (排序值, 记录ID)；游标与当前排序不一致时视为无效"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_order, (value_type, value), record_id = json.loads(payload)
+        if value_type == 'datetime':
+            value = datetime.fromisoformat(value)
+        elif value_type == 'date':
+            value = date.fromisoformat(value)
+        elif value_type == 'decimal':
+            value = Decimal(value)
+        record_id = int(record_id)
+    except (ValueError, TypeError):
+        raise ValidationError("分页游标无效", "cursor")
+    
+    if cursor_sort_by != sort_by or cursor_sort_order != sort_order:
+        raise ValidationError("分页游标与当前排序条件不一致", "cursor")
+    
+    return value, record_id
+
+
+def keyset_paginate(query, model, sort_by: str, sort_order: str, per_page: int,
+                    cursor: Optional[str] = None, include_total: bool = False,
+                    default_sort_by: str = 'created_at', fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    键集分页
+    
+    Args:
+        query: 已应用筛选条件、未排序的查询
+        model: 查询的模型类
+        sort_by: 排序字段，不是模型的列时使用 default_sort_by
+        sort_order: 排序方向 asc/desc
+        per_page: 每页数量
+        cursor: 上一页返回的 next_cursor，为空时取第一页
+        include_total: 是否返回近似总数（来自缓存的 COUNT 结果）
+        default_sort_by: 默认排序字段
+        fields: 只查询的列（可选，由 parse_fields 解析），指定时 items 为只含这些列及排序列的行
+    
+    Returns:
+        Dict: items（模型对象或行的列表）、per_page、has_next、next_cursor，以及可选的 total
+    """
+    if per_page is None or per_page < 1:
+        raise ValidationError("每页数量必须大于0", "per_page")
+    
+    if sort_by not in model.__table__.columns:
+        sort_by = default_sort_by
+    sort_order = 'asc' if sort_order and sort_order.lower() == 'asc' else 'desc'
+    sort_column = getattr(model, sort_by)
+    id_column = model.id
+    
+    page_query = query
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by, sort_order)
+        page_query = page_query.filter(_after_condition(sort_column, id_column, sort_order, value, last_id))
+    
+    # SQLite 中 NULL 在升序时排最前、降序时排最后，条件构造与之保持一致
+    if sort_order == 'asc':
+        page_query = page_query.order_by(sort_column.asc(), id_column.asc())
+    else:
+        page_query = page_query.order_by(sort_column.desc(), id_column.desc())
+    
+    if fields:
+        page_query = project_query(page_query, model, fields, extra=(sort_by,))
+    
+    # 多取一条判断是否还有下一页
+    items = page_query.limit(per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    
+    result = {
+        'items': items,
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(
+            sort_by, sort_order, getattr(items[-1], sort_by), items[-1].id
+        ) if has_next else None
+    }
+    
+    if include_total:
+        result['total'] = CountCache.get_count(query, model.__tablename__, _get_count_cache_ttl())
+        result['total_is_approximate'] = True
+    
+    return result
+
+
+def _get_count_cache_ttl() -> int:
+    """获取总数缓存有效期配置"""
+    try:
+        ttl = current_app.config.get('KEYSET_COUNT_CACHE_TTL', DEFAULT_COUNT_CACHE_TTL)
+    except RuntimeError:
+        return DEFAULT_COUNT_CACHE_TTL
+    return ttl if isinstance(ttl, int) and ttl >= 0 else DEFAULT_COUNT_CACHE_TTL
+
+
+def _after_condition(sort_column, id_column, sort_order: str, value, last_id: int):
+    """排在 (value, last_id) 之后的记录的过滤条件"""
+    if sort_order == 'asc':
+        if value is None:
+            return or_(sort_column.isnot(None), and_(sort_column.is_(None), id_column > last_id))
+        return or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+    
+    if value is None:
+        return and_(sort_column.is_(None), id_column < last_id)
+    return or_(
+        sort_column < value,
+        and_(sort_column == value, id_column < last_id),
+        sort_column.is_(None)
+    )
@@ -0,0 +1,185 @@
+"""
+模型序列化工具
+按表结构为每个模型（及字段子集）生成一次序列化器，列表接口可通过 fields 参数只查询和返回指定列；
+安装了 orjson 时 JSON 响应使用 orjson 编码（与默认编码的差异见 FastJSONProvider）
+"""
+import threading
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+from extensions import db
+from error_handlers import ValidationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ModelSerializer:
+    """
+    由表结构生成的模型序列化器
+    
+    取值用一次 attrgetter 完成，只对需要转换的列（DateTime 列，以及模型在 serialize_as_float /
+    serialize_as_iso_date 中列出的列）逐个转换，适用于模型对象和 with_entities 查询返回的行。
+    """
+    
+    __slots__ = ('model', 'fields', '_getter', '_converters')
+    
+    def __init__(self, model, fields: Sequence[str]):
+        self.model = model
+        self.fields = tuple(fields)
+        getter = attrgetter(*self.fields)
+        self._getter = getter if len(self.fields) > 1 else (lambda obj: (getter(obj),))
+        self._converters = tuple(
+            (name, converter)
+            for name, converter in ((name, _column_converter(model, model.__table__.columns[name])) for name in self.fields)
+            if converter is not None
+        )
+    
+    def serialize(self, obj) -> Dict[str, Any]:
+        """序列化单个对象或行"""
+        result = dict(zip(self.fields, self._getter(obj)))
+        for name, converter in self._converters:
+            value = result[name]
+            if value is not None:
+                result[name] = converter(value)
+        return result
+    
+    def serialize_many(self, objs: Iterable) -> List[Dict[str, Any]]:
+        """序列化多个对象或行"""
+        return [self.serialize(obj) for obj in objs]
+
+
+def _datetime_to_iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _date_to_iso(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _column_converter(model, column):
+    """列值的转换函数，不需要转换时返回 None"""
+    column_type = column.type
+    if isinstance(column_type, db.DateTime):
+        return _datetime_to_iso
+    if column.name in model.serialize_as_iso_date:
+        return _date_to_iso
+    if column.name in model.serialize_as_float:
+        return float
+    return None
+
+
+_serializers = {}
+_serializers_lock = threading.Lock()
+
+
+def get_serializer(model, fields: Optional[Sequence[str]] = None) -> ModelSerializer:
+    """
+    获取模型的序列化器，同一模型和字段组合只生成一次
+    
+    Args:
+        model: 模型类
+        fields: 字段列表（可选，默认全部列，按表定义顺序）
+    """
+    key = (model, tuple(fields) if fields else None)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        with _serializers_lock:
+            serializer = _serializers.get(key)
+            if serializer is None:
+                serializer = _serializers[key] = ModelSerializer(
+                    model, fields or [column.name for column in model.__table__.columns]
+                )
+    return serializer
+
+
+def parse_fields(model, fields: Union[str, Sequence[str], None]) -> Optional[Tuple[str, ...]]:
+    """
+    解析 fields 参数（逗号分隔的列名），结果总是包含 id
+    
+    Returns:
+        Optional[Tuple[str, ...]]: 去重后的列名，未指定时返回 None
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    names = [name.strip() for name in fields if name and name.strip()]
+    if not names:
+        return None
+    
+    columns = model.__table__.columns
+    invalid = [name for name in names if name not in columns]
+    if invalid:
+        raise ValidationError(
+            f"字段无效: {', '.join(invalid)}，可选字段: {', '.join(column.name for column in columns)}", "fields"
+        )
+    return tuple(dict.fromkeys(['id'] + names))
+
+
+def project_query(query, model, fields: Sequence[str], extra: Sequence[str] = ()):
+    """只查询指定列（附加列用于排序或游标，不一定输出）"""
+    return query.with_entities(*(getattr(model, name) for name in dict.fromkeys(tuple(fields) + tuple(extra))))
+
+
+def serialize_items(items: Iterable, model, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """序列化列表查询结果：指定字段时 items 为 project_query 查询的行，否则调用模型的 to_dict"""
+    if fields:
+        return get_serializer(model, fields).serialize_many(items)
+    return [item.to_dict() for item in items]
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    使用 orjson 编码的 JSON 提供者
+    
+    Decimal、date 等类型仍由 Flask 默认规则转换，解析后的数据与默认提供者相同，但编码结果有两处不同：
+    非ASCII字符直接输出UTF-8（默认提供者转义为 \\uXXXX），NaN 和 Infinity 输出为 null（默认提供者输出
+    不符合JSON标准的 NaN / Infinity）。orjson 未安装或遇到其不支持的参数和数据时回退到标准库。
+    """
+    
+    def _orjson_options(self, kwargs: Dict[str, Any]) -> Optional[int]:
+        """将 json.dumps 参数转为 orjson 选项，有无法对应的参数时返回 None"""
+        if orjson is None:
+            return None
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        for key, value in kwargs.items():
+            if key == 'indent' and value == 2:
+                options |= orjson.OPT_INDENT_2
+            elif key == 'sort_keys' and value:
+                options |= orjson.OPT_SORT_KEYS
+            elif key not in ('separators', 'sort_keys'):
+                return None
+        if 'sort_keys' not in kwargs and self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+    
+    def _encode(self, obj: Any, **kwargs: Any) -> Optional[bytes]:
+        options = self._orjson_options(kwargs)
+        if options is None:
+            return None
+        try:
+            return orjson.dumps(obj, default=self.default, option=options)
+        except (orjson.JSONEncodeError, TypeError):
+            return None
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        encoded = self._encode(obj, **kwargs)
+        if encoded is None:
+            return super().dumps(obj, **kwargs)
+        return encoded.decode('utf-8')
+    
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args['indent'] = 2
+        encoded = self._encode(obj, **dump_args)
+        if encoded is None:
+            return super().response(obj)
+        return self._app.response_class(encoded + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,276 @@
+"""
+结构化日志工具
+提供按级别门控、参数惰性求值、热点路径采样的模块日志记录器，以及基于 QueueHandler/QueueListener 的异步日志输出
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Union
+
+# 模块日志记录器的公共父级名称
+LOGGER_NAMESPACE = 'stock_analysis'
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+_sample_rates = {}
+_configured_levels = set()
+_listener = None
+
+
+class LazyValue:
+    """惰性求值的日志字段，只有日志真正输出时才计算（且只计算一次）"""
+    
+    __slots__ = ('_func', '_value', '_evaluated')
+    
+    def __init__(self, func: Callable[[], Any]):
+        self._func = func
+        self._value = None
+        self._evaluated = False
+    
+    def value(self) -> Any:
+        if not self._evaluated:
+            self._value = self._func()
+            self._evaluated = True
+        return self._value
+    
+    def __str__(self):
+        return str(self.value())
+    
+    def __repr__(self):
+        return repr(self.value())
+
+
+def lazy(func: Callable[[], Any]) -> LazyValue:
+    """
+    包装代价较高的日志字段，例如 lazy(self.to_dict)
+    
+    Args:
+        func: 无参数的求值函数
+    """
+    return LazyValue(func)
+
+
+class StructuredMessage:
+    """事件名和字段组成的日志消息，格式化时才渲染为 event key=value ..."""
+    
+    __slots__ = ('event', 'fields')
+    
+    def __init__(self, event: str, fields: Dict[str, Any]):
+        self.event = event
+        self.fields = fields
+    
+    def __str__(self):
+        if not self.fields:
+            return self.event
+        return ' '.join([self.event] + [f'{key}={_render(value)}' for key, value in self.fields.items()])
+
+
+def _render(value: Any) -> str:
+    """渲染单个字段值，含空白的字符串和容器类型使用JSON"""
+    if isinstance(value, LazyValue):
+        value = value.value()
+    if isinstance(value, str):
+        return value if value and not any(c.isspace() for c in value) else json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+class StructuredLogger:
+    """
+    结构化模块日志记录器
+    
+    级别未启用时在构造日志记录之前直接返回，字段不会被格式化；
+    设置了采样率的记录器对 WARNING 以下的日志每 N 条只输出1条。
+    """
+    
+    __slots__ = ('name', 'logger', 'sample_every', '_sample_counter', 'emitted', 'skipped', 'sampled_out')
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.logger = logging.getLogger(f'{LOGGER_NAMESPACE}.{name}')
+        self.sample_every = 1
+        self._sample_counter = 0
+        # 输出、级别过滤和采样丢弃的条数（近似值，不加锁）
+        self.emitted = 0
+        self.skipped = 0
+        self.sampled_out = 0
+    
+    def is_enabled_for(self, level: int) -> bool:
+        """指定级别是否会输出"""
+        return self.logger.isEnabledFor(level)
+    
+    def log(self, level: int, event: str, exc_info: bool = False, **fields) -> None:
+        """
+        记录一条结构化日志
+        
+        Args:
+            level: 日志级别
+            event: 事件描述
+            exc_info: 是否附带当前异常堆栈
+            **fields: 事件字段，代价较高的值使用 lazy() 包装
+        """
+        if not self.logger.isEnabledFor(level):
+            self.skipped += 1
+            return
+        if self.sample_every > 1 and level < logging.WARNING:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_every:
+                self.sampled_out += 1
+                return
+        
+        self.emitted += 1
+        self.logger.log(
+            level, StructuredMessage(event, fields), exc_info=exc_info, stacklevel=3,
+            extra={'event': event, 'fields': fields}
+        )
+    
+    def debug(self, event: str, **fields) -> None:
+        self.log(logging.DEBUG, event, **fields)
+    
+    def info(self, event: str, **fields) -> None:
+        self.log(logging.INFO, event, **fields)
+    
+    def warning(self, event: str, **fields) -> None:
+        self.log(logging.WARNING, event, **fields)
+    
+    def error(self, event: str, exc_info: bool = False, **fields) -> None:
+        self.log(logging.ERROR, event, exc_info=exc_info, **fields)
+    
+    def stats(self) -> Dict[str, int]:
+        """日志输出统计"""
+        return {
+            'emitted': self.emitted,
+            'skipped': self.skipped,
+            'sampled_out': self.sampled_out,
+            'sample_every': self.sample_every
+        }
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """
+    获取模块日志记录器（通常传入 __name__）
+    
+    同名记录器只创建一次，采样率取配置中最长匹配的模块前缀。
+    """
+    structured = _loggers.get(name)
+    if structured is None:
+        with _loggers_lock:
+            structured = _loggers.get(name)
+            if structured is None:
+                structured = StructuredLogger(name)
+                structured.sample_every = _match_prefix(_sample_rates, name, 1)
+                _loggers[name] = structured
+    return structured
+
+
+def get_logging_stats() -> Dict[str, Dict[str, int]]:
+    """各模块日志记录器的输出统计"""
+    return {name: structured.stats() for name, structured in sorted(_loggers.items())}
+
+
+def reset_logging_stats() -> None:
+    """清零日志输出统计"""
+    for structured in list(_loggers.values()):
+        structured.emitted = structured.skipped = structured.sampled_out = 0
+        structured._sample_counter = 0
+
+
+def stop_log_listener() -> None:
+    """停止异步日志线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_log_listener)
+
+
+def _match_prefix(settings: Dict[str, Any], name: str, default: Any) -> Any:
+    """按模块名最长前缀匹配配置项"""
+    best = None
+    for prefix in settings:
+        if (name == prefix or name.startswith(prefix + '.')) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return default if best is None else settings[best]
+
+
+def _parse_mapping(value: Union[str, Dict[str, Any], None]) -> Dict[str, str]:
+    """解析 "models=WARNING,services.trading_service=DEBUG" 形式的配置"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {str(key): str(item) for key, item in value.items()}
+    mapping = {}
+    for item in str(value).split(','):
+        if '=' in item:
+            key, item_value = item.split('=', 1)
+            if key.strip():
+                mapping[key.strip()] = item_value.strip()
+    return mapping
+
+
+def _parse_level(level: Union[str, int]) -> int:
+    """日志级别名称转为数值，无法识别时为 INFO"""
+    if isinstance(level, int):
+        return level
+    resolved = logging.getLevelName(str(level).strip().upper())
+    return resolved if isinstance(resolved, int) else logging.INFO
+
+
+def configure_logging(app) -> None:
+    """
+    根据应用配置设置模块日志
+    
+    - LOG_LEVEL: 模块日志的默认级别
+    - LOG_LEVELS: 按模块前缀设置级别，如 "models=WARNING,services.historical_trade_service=DEBUG"
+    - LOG_SAMPLE_RATES: 按模块前缀设置采样率，如 "models=100"（每100条输出1条）
+    - LOG_ASYNC: 是否通过队列在后台线程写日志
+    
+    模块日志与应用日志使用相同的处理器；异步模式下两者都改为写入队列。
+    """
+    global _listener
+    
+    namespace_logger = logging.getLogger(LOGGER_NAMESPACE)
+    namespace_logger.setLevel(_parse_level(app.config.get('LOG_LEVEL', 'INFO')))
+    namespace_logger.propagate = False
+    
+    # 按模块设置级别，先还原上次配置过的模块
+    for name in _configured_levels:
+        logging.getLogger(f'{LOGGER_NAMESPACE}.{name}').setLevel(logging.NOTSET)
+    _configured_levels.clear()
+    for name, level in _parse_mapping(app.config.get('LOG_LEVELS')).items():
+        logging.getLogger(f'{LOGGER_NAMESPACE}.{name}').setLevel(_parse_level(level))
+        _configured_levels.add(name)
+    
+    # 采样率
+    _sample_rates.clear()
+    for name, rate in _parse_mapping(app.config.get('LOG_SAMPLE_RATES')).items():
+        try:
+            _sample_rates[name] = max(int(rate), 1)
+        except ValueError:
+            continue
+    for name, structured in list(_loggers.items()):
+        structured.sample_every = _match_prefix(_sample_rates, name, 1)
+    
+    stop_log_listener()
+    
+    handlers = [handler for handler in app.logger.handlers if not isinstance(handler, QueueHandler)]
+    if not handlers:
+        from flask.logging import default_handler
+        handlers = [default_handler]
+    
+    if app.config.get('LOG_ASYNC') is True:
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        handlers = [QueueHandler(log_queue)]
+        for handler in list(app.logger.handlers):
+            app.logger.removeHandler(handler)
+        app.logger.addHandler(handlers[0])
+    
+    namespace_logger.handlers = list(handlers)
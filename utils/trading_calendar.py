@@ -0,0 +1,162 @@
+"""
+交易日历
+将非交易日一次性加载到内存，使用前缀和索引回答交易日相关查询
+"""
+import threading
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+class TradingCalendar:
+    """内存交易日历
+    
+    在覆盖区间内为每个自然日记录截至该日之前的累计交易日数（前缀和），
+    交易日计数、上/下一个交易日和交易日偏移都是O(1)查询。
+    查询超出覆盖区间时自动扩展区间后重建索引。
+    """
+    
+    # A股开市日期之前不需要覆盖
+    DEFAULT_START = date(1990, 1, 1)
+    # 覆盖区间向未来额外延伸的天数
+    FUTURE_MARGIN_DAYS = 730
+    # 扩展区间时的额外余量，避免频繁重建
+    EXTEND_MARGIN_DAYS = 366
+    
+    def __init__(self, non_trading_dates: Iterable[date], start: Optional[date] = None,
+                 end: Optional[date] = None):
+        # 周末本身就是非交易日，只需记录落在工作日的节假日
+        self._holidays = frozenset(d for d in non_trading_dates if d.weekday() < 5)
+        
+        start = start or self.DEFAULT_START
+        end = end or date.today() + timedelta(days=self.FUTURE_MARGIN_DAYS)
+        if self._holidays:
+            start = min(start, min(self._holidays))
+            end = max(end, max(self._holidays))
+        
+        self._lock = threading.Lock()
+        self._busdaycalendar = None
+        self._build(start, end)
+    
+    def _build(self, start: date, end: date) -> None:
+        """构建 [start, end] 区间的前缀和索引"""
+        day_count = (end - start).days + 1
+        cumulative = [0] * (day_count + 1)
+        trading_dates = []
+        
+        current = start
+        for i in range(day_count):
+            is_trading = current.weekday() < 5 and current not in self._holidays
+            cumulative[i + 1] = cumulative[i] + is_trading
+            if is_trading:
+                trading_dates.append(current)
+            current += timedelta(days=1)
+        
+        # 一次性替换，读线程不会看到半成品索引
+        self._index = (start, end, cumulative, trading_dates)
+    
+    def _ensure_covers(self, *dates: date):
+        """确保覆盖区间包含给定日期，返回当前索引"""
+        index = self._index
+        start, end = index[0], index[1]
+        low, high = min(dates), max(dates)
+        if start <= low and high <= end:
+            return index
+        
+        with self._lock:
+            start, end = self._index[0], self._index[1]
+            if low < start or high > end:
+                self._build(
+                    min(start, low - timedelta(days=self.EXTEND_MARGIN_DAYS)),
+                    max(end, high + timedelta(days=self.EXTEND_MARGIN_DAYS))
+                )
+            return self._index
+    
+    @property
+    def holidays(self) -> frozenset:
+        """落在工作日的非交易日集合"""
+        return self._holidays
+    
+    @property
+    def busdaycalendar(self) -> np.busdaycalendar:
+        """numpy工作日历（周一至周五并剔除节假日），供向量化计算使用"""
+        if self._busdaycalendar is None:
+            self._busdaycalendar = np.busdaycalendar(
+                holidays=np.array(sorted(self._holidays), dtype='datetime64[D]')
+            )
+        return self._busdaycalendar
+    
+    @staticmethod
+    def to_datetime64(dates) -> np.ndarray:
+        """将日期序列转换为 datetime64[D] 数组，支持date/datetime/ISO字符串，None转为NaT"""
+        if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+            return dates.astype('datetime64[D]')
+        return np.array(
+            [d.date() if isinstance(d, datetime) else (d[:10] if isinstance(d, str) else d) for d in dates],
+            dtype='datetime64[D]'
+        )
+    
+    def count_trading_days_bulk(self, start_dates, end_dates) -> np.ndarray:
+        """批量计算 [start, end] 闭区间内的交易日数量
+        
+        一次 numpy.busday_count 调用完成整组计算；start晚于end或任一端为空时结果为0。
+        """
+        starts = self.to_datetime64(start_dates)
+        ends = self.to_datetime64(end_dates)
+        if starts.shape != ends.shape:
+            raise ValueError('开始日期与结束日期数量不一致')
+        
+        counts = np.zeros(starts.shape, dtype=np.int64)
+        valid = ~(np.isnat(starts) | np.isnat(ends))
+        if valid.any():
+            counts[valid] = np.busday_count(
+                starts[valid],
+                ends[valid] + np.timedelta64(1, 'D'),
+                busdaycal=self.busdaycalendar
+            )
+        return np.maximum(counts, 0)
+    
+    def is_trading_day(self, check_date: date) -> bool:
+        """判断是否为交易日"""
+        return check_date.weekday() < 5 and check_date not in self._holidays
+    
+    def count_trading_days(self, start_date: date, end_date: date) -> int:
+        """计算 [start_date, end_date] 闭区间内的交易日数量"""
+        if start_date > end_date:
+            return 0
+        start, _, cumulative, _ = self._ensure_covers(start_date, end_date)
+        return cumulative[(end_date - start).days + 1] - cumulative[(start_date - start).days]
+    
+    def next_trading_day(self, check_date: date) -> date:
+        """获取指定日期之后的下一个交易日"""
+        return self.offset(check_date, 1)
+    
+    def previous_trading_day(self, check_date: date) -> date:
+        """获取指定日期之前的上一个交易日"""
+        return self.offset(check_date, -1)
+    
+    def offset(self, check_date: date, trading_days: int) -> date:
+        """获取指定日期之后（正数）或之前（负数）第N个交易日；N为0时返回当日或其后第一个交易日"""
+        # 每个自然周至少有交易日的前提下，预留足够的自然日余量
+        margin = timedelta(days=abs(trading_days) * 7 + 31)
+        start, _, cumulative, trading_dates = self._ensure_covers(check_date - margin, check_date + margin)
+        
+        position = (check_date - start).days
+        if trading_days > 0:
+            # 截至当日（含）的交易日数即为下一个交易日的下标
+            target = cumulative[position + 1] + trading_days - 1
+        elif trading_days < 0:
+            # 当日之前的交易日数减N
+            target = cumulative[position] + trading_days
+        else:
+            target = cumulative[position]
+        
+        return trading_dates[target]
+    
+    def trading_days_between(self, start_date: date, end_date: date) -> List[date]:
+        """获取 [start_date, end_date] 闭区间内的所有交易日"""
+        if start_date > end_date:
+            return []
+        start, _, cumulative, trading_dates = self._ensure_covers(start_date, end_date)
+        return trading_dates[cumulative[(start_date - start).days]:cumulative[(end_date - start).days + 1]]